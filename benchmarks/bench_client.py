@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+comfy_workflow 클라이언트 쪽 성능 벤치마크 (GPU·외부 네트워크 없이 fake_comfy_server로 측정).
+
+    python benchmarks/bench_client.py                      # 전체, 표 출력
+    python benchmarks/bench_client.py --quick --save bench.json
+    python benchmarks/bench_client.py --quick --compare bench.json --tolerance 0.3   # 나빠지면 종료 코드 1
+
+측정 항목
+- build_workflow / prepare_workflow.fill / SweepPlan.jobs 처리량
+- /prompt 제출, 완료(WebSocket)까지 왕복, /view 다운로드 지연
+- 스윕 스크립트 계획(run_lora_comparison, run_prototype_gen)의 종단 간 초당 이미지 수
+  (서버 실행 시간 0이므로 클라이언트 오버헤드만 남음)
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import comfy_sweep as sweep  # noqa: E402
+import comfy_workflow as cw  # noqa: E402
+import run_lora_comparison  # noqa: E402
+import run_prototype_gen  # noqa: E402
+from comfy_telemetry import percentile  # noqa: E402
+from fake_comfy_server import FakeComfyServer  # noqa: E402
+
+# 지표 이름 → 값이 클수록 좋은지 (처리량) / 작을수록 좋은지 (지연)
+HIGHER_IS_BETTER = {
+    "build_workflow_per_s": True,
+    "prepare_fill_per_s": True,
+    "sweep_jobs_per_s": True,
+    "queue_prompt_p50_ms": False,
+    "queue_prompt_p95_ms": False,
+    "roundtrip_p50_ms": False,
+    "roundtrip_p95_ms": False,
+    "ws_roundtrip_p50_ms": False,
+    "download_mb_per_s": True,
+    "e2e_lora_images_per_s": True,
+    "e2e_prototype_images_per_s": True,
+    "e2e_lora_ws_images_per_s": True,
+}
+
+PLACEHOLDERS = {
+    "__PROMPT__": "pixel art, game asset, cozy room",
+    "__NEGATIVE__": "blur, photo",
+    "__CKPT_NAME__": "v1-5-pruned-emaonly.safetensors",
+    "__LORA_NAME__": "pixel.safetensors",
+    "__LORA_STRENGTH__": 0.7,
+    "__WIDTH__": 512,
+    "__HEIGHT__": 512,
+    "__STEPS__": 20,
+    "__CFG__": 7.0,
+    "__SAMPLER__": "euler",
+    "__SCHEDULER__": "normal",
+    "__FILENAME_PREFIX__": "bench",
+}
+BUILD_CONFIG = {
+    "modes": ["pixel_character", "lora_loader"],
+    "placeholders": PLACEHOLDERS,
+}
+
+
+def best_rate(fn: Callable[[int], None], count: int, repeat: int) -> float:
+    """fn(i)를 count번 실행하는 측정을 repeat번 해서 가장 빠른 초당 횟수를 반환합니다."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(count):
+            fn(i)
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def latencies_ms(fn: Callable[[], Any], count: int) -> List[float]:
+    """fn()을 count번 실행한 각 소요 시간(ms)을 정렬해 반환합니다. 첫 호출(연결 준비)은 버림."""
+    fn()
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)
+
+
+# ---------------------------------------------------------------------------
+# 워크플로 생성 (서버 없음)
+# ---------------------------------------------------------------------------
+def bench_build(count: int, repeat: int) -> Dict[str, float]:
+    placeholders = dict(PLACEHOLDERS)
+    config = dict(BUILD_CONFIG, placeholders=placeholders)
+
+    def build(i: int) -> None:
+        placeholders["__SEED__"] = i
+        cw.build_workflow(config)
+
+    prepared = cw.prepare_workflow(BUILD_CONFIG, ["__SEED__", "__PROMPT__"])
+
+    def fill(i: int) -> None:
+        prepared.fill({"__SEED__": i, "__PROMPT__": f"prompt {i}"})
+
+    plan = sweep_plan(run_lora_comparison.build_plan(ROOT_DIR), seeds=count)
+
+    def iterate_plan() -> None:
+        for _ in plan.jobs():
+            pass
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        iterate_plan()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "build_workflow_per_s": best_rate(build, count, repeat),
+        "prepare_fill_per_s": best_rate(fill, count, repeat),
+        "sweep_jobs_per_s": plan.count() / best,
+    }
+
+
+def sweep_plan(plan: sweep.SweepPlan, seeds: int) -> sweep.SweepPlan:
+    """스크립트의 계획에서 시드 축만 seeds개로 늘린 계획."""
+    specs = [spec._replace(seeds=range(1000, 1000 + seeds)) for spec in plan.specs]
+    return sweep.SweepPlan(
+        specs,
+        defaults=plan.defaults,
+        lora_defaults=plan.lora_defaults,
+        lora_aliases=plan.lora_aliases,
+        prefix=plan.prefix,
+        negative_default=plan.negative_default,
+    )
+
+
+def plan_checkpoints(plan: sweep.SweepPlan) -> List[str]:
+    names = set()
+    for job in plan.jobs():
+        names.update(cw.workflow_checkpoints(job.workflow))
+    return sorted(names)
+
+
+# ---------------------------------------------------------------------------
+# 서버 왕복 (fake_comfy_server)
+# ---------------------------------------------------------------------------
+def bench_roundtrip(count: int, download_mb: int) -> Dict[str, float]:
+    workflow = cw.build_workflow(dict(BUILD_CONFIG, placeholders=dict(PLACEHOLDERS, __SEED__=1)))
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp, FakeComfyServer(
+        checkpoints=cw.workflow_checkpoints(workflow)
+    ) as server:
+        # 큐에만 넣고 실행은 기다리지 않음 (/prompt 한 번의 비용)
+        queued = latencies_ms(lambda: cw.queue_prompt(workflow, server=server.url), count)
+        results["queue_prompt_p50_ms"] = percentile(queued, 50)
+        results["queue_prompt_p95_ms"] = percentile(queued, 95)
+        while server.pending or server.running:
+            time.sleep(0.01)
+
+        roundtrip = latencies_ms(lambda: cw.generate_image(workflow, server=server.url, save_dir=tmp), count)
+        results["roundtrip_p50_ms"] = percentile(roundtrip, 50)
+        results["roundtrip_p95_ms"] = percentile(roundtrip, 95)
+        ws_roundtrip = latencies_ms(
+            lambda: cw.generate_image(workflow, server=server.url, save_dir=tmp, output_mode="websocket"), count
+        )
+        results["ws_roundtrip_p50_ms"] = percentile(ws_roundtrip, 50)
+
+        server.image_bytes = download_mb * 1024 * 1024
+        paths = cw.generate_image(workflow, server=server.url, save_dir=tmp)
+        dest = Path(tmp) / "download.png"
+        rounds = 3
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cw.download_image(server.url, paths[0].name, dest)
+        results["download_mb_per_s"] = rounds * dest.stat().st_size / (1024 * 1024) / (time.perf_counter() - start)
+    return results
+
+
+async def _run_plan(plan: sweep.SweepPlan, server: str, save_dir: str, output_mode: str) -> int:
+    done = 0
+    async with cw.AsyncComfyPool([server]) as client:
+        async for _, result in sweep.iter_results(plan.jobs(), client, save_dir=save_dir, output_mode=output_mode):
+            if isinstance(result, Exception):
+                raise result
+            done += len(result)
+    return done
+
+
+def bench_e2e(seeds: int) -> Dict[str, float]:
+    """스윕 스크립트의 계획을 시드 seeds개로 늘려 처음부터 끝까지 실행한 초당 이미지 수."""
+    results: Dict[str, float] = {}
+    cases: List[Tuple[str, sweep.SweepPlan, str]] = [
+        ("e2e_lora_images_per_s", run_lora_comparison.build_plan(ROOT_DIR), "history"),
+        ("e2e_prototype_images_per_s", run_prototype_gen.build_plan(ROOT_DIR), "history"),
+        ("e2e_lora_ws_images_per_s", run_lora_comparison.build_plan(ROOT_DIR), "websocket"),
+    ]
+    for name, plan, output_mode in cases:
+        plan = sweep_plan(plan, seeds)
+        with tempfile.TemporaryDirectory() as tmp, FakeComfyServer(checkpoints=plan_checkpoints(plan)) as server:
+            start = time.perf_counter()
+            images = asyncio.run(_run_plan(plan, server.url, tmp, output_mode))
+            results[name] = images / (time.perf_counter() - start)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 결과 비교
+# ---------------------------------------------------------------------------
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """baseline보다 tolerance(비율) 넘게 나빠진 지표 설명 목록."""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if HIGHER_IS_BETTER[name]:
+            worse = value < base * (1 - tolerance)
+        else:
+            worse = value > base * (1 + tolerance)
+        if worse:
+            regressions.append(f"{name}: {base:.2f} → {value:.2f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="comfy_workflow 클라이언트 벤치마크")
+    parser.add_argument("--quick", action="store_true", help="반복 수를 줄여 빠르게 (CI용)")
+    parser.add_argument("--save", type=Path, help="결과를 JSON으로 저장")
+    parser.add_argument("--compare", type=Path, help="이전 결과 JSON과 비교해 나빠지면 종료 코드 1")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="허용하는 악화 비율 (기본 0.3 = 30%%)")
+    args = parser.parse_args(argv)
+
+    count, repeat, round_trips, seeds = (500, 3, 30, 50) if args.quick else (5000, 5, 200, 300)
+    results: Dict[str, float] = {}
+    results.update(bench_build(count, repeat))
+    results.update(bench_roundtrip(round_trips, download_mb=8))
+    results.update(bench_e2e(seeds))
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"{name.ljust(width)}  {value:12.2f}")
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n성능 저하:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
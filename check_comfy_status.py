@@ -1,14 +1,20 @@
+import os
+import sys
+
 import requests
 import json
 
 BASE_URL = "https://w2672t3cq8hyic-8188.proxy.runpod.net"
+# Several pods: pass URLs as arguments or set COMFY_SERVERS="https://a-8188...,https://b-8188..."
+SERVERS = [s.strip() for s in os.getenv("COMFY_SERVERS", BASE_URL).split(",") if s.strip()]
 
-def check_status():
-    print(f"Checking status for {BASE_URL}...")
+def check_status(base_url=BASE_URL):
+    base_url = base_url.rstrip("/")
+    print(f"Checking status for {base_url}...")
     
     # 1. Check Queue
     try:
-        res_queue = requests.get(f"{BASE_URL}/queue")
+        res_queue = requests.get(f"{base_url}/queue")
         res_queue.raise_for_status()
         queue_data = res_queue.json()
         
@@ -29,15 +35,14 @@ def check_status():
 
     # 2. Check History
     try:
-        res_history = requests.get(f"{BASE_URL}/history")
+        # Only the last 3 entries: the full /history grows with every prompt the pod has run
+        res_history = requests.get(f"{base_url}/history", params={"max_items": 3})
         res_history.raise_for_status()
         history_data = res_history.json()
         
         print(f"\n--- Recent History (Last 3) ---")
-        items = list(history_data.items())
-        total_items = len(items)
-        for i in range(max(0, total_items - 3), total_items):
-            prompt_id, details = items[i]
+        items = list(history_data.items())[-3:]
+        for prompt_id, details in items:
             status = details.get("status", {})
             completed = status.get("completed", False)
             outputs = details.get("outputs", {})
@@ -56,4 +61,5 @@ def check_status():
         print(f"Error checking history: {e}")
 
 if __name__ == "__main__":
-    check_status()
+    for server in sys.argv[1:] or SERVERS:
+        check_status(server)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+워크플로 해시 기반 결과 캐시.
+같은 워크플로(체크포인트, 시드, 프롬프트, cfg, steps …)를 다시 실행하면 서버에 보내지 않고
+이전에 받은 이미지를 돌려줍니다. 실패한 스윕을 다시 돌릴 때 빠진 이미지만 GPU에서 생성하게 됩니다.
+
+- 키: 빌드된 워크플로의 정규화 JSON(SHA-256). filename_prefix는 결과에 영향이 없으므로 제외
+- 저장: 캐시 폴더 objects/에 이미지 사본 (같은 파일시스템이면 하드링크라 디스크를 더 쓰지 않음)
+- 색인: SQLite (여러 프로세스가 같은 캐시를 써도 됨), 총 용량을 넘으면 가장 오래 안 쓴 항목부터 삭제
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+CACHE_DIR = Path(__file__).resolve().parent / ".comfy_cache"
+CACHE_MAX_BYTES = 10 * 1024 ** 3
+# 해시에서 제외하는 입력 (결과 이미지 내용과 무관)
+IGNORED_INPUTS = ("filename_prefix",)
+
+
+def workflow_hash(workflow: dict) -> str:
+    """
+    워크플로의 정규화 해시. 키 순서·공백과 filename_prefix 입력은 결과에 영향이 없으므로 무시합니다.
+    :param workflow: /prompt에 보낼 워크플로
+    :return: 16진수 SHA-256 문자열
+    """
+    canonical = {}
+    for node_id, node in workflow.items():
+        if isinstance(node, dict) and isinstance(node.get("inputs"), dict):
+            inputs = {k: v for k, v in node["inputs"].items() if k not in IGNORED_INPUTS}
+            node = dict(node, inputs=inputs)
+            # _meta(제목 등)는 UI용이라 결과와 무관
+            node.pop("_meta", None)
+        canonical[node_id] = node
+    source = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """가능하면 하드링크, 아니면 복사. dst는 임시 이름으로 만든 뒤 교체해 반쯤 쓴 파일이 남지 않게 합니다."""
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ResultCache:
+    """
+    워크플로 해시 → 결과 이미지 캐시.
+
+        cache = ResultCache()
+        paths = cw.generate_image(workflow, cache=cache)   # 두 번째부터는 서버에 보내지 않음
+
+    :param root: 캐시 폴더 (기본 .comfy_cache/)
+    :param max_bytes: 캐시 이미지 총 용량 상한. 넘으면 가장 오래 안 쓴 항목부터 지움
+    """
+
+    def __init__(self, root: Union[str, Path] = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite3"), timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " files TEXT NOT NULL,"
+                " bytes INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _blob(self, key: str, i: int, filename: str) -> Path:
+        return self.objects / f"{key}_{i}{Path(filename).suffix}"
+
+    def get(self, key: str, save_dir: Union[str, Path]) -> Optional[List[Path]]:
+        """
+        캐시에 있으면 save_dir에 원래 파일명으로 이미지를 두고 경로 목록을 반환합니다. 없으면 None.
+        save_dir에 같은 크기의 파일이 이미 있으면 그대로 씁니다.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT files FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        save_dir = Path(save_dir)
+        paths = []
+        for i, filename in enumerate(json.loads(row[0])):
+            blob = self._blob(key, i, filename)
+            target = save_dir / filename
+            try:
+                size = blob.stat().st_size
+                if not (target.exists() and target.stat().st_size == size):
+                    save_dir.mkdir(parents=True, exist_ok=True)
+                    _link_or_copy(blob, target)
+            except FileNotFoundError:
+                # 캐시 파일이 지워졌으면 항목을 버리고 다시 생성하게 함
+                self.discard(key)
+                return None
+            paths.append(target)
+        with self._lock, self._db:
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return paths
+
+    def put(self, key: str, paths: Sequence[Union[str, Path]]) -> None:
+        """생성된 이미지를 캐시에 넣습니다. 이미 있는 키면 덮어씁니다."""
+        if not paths:
+            return
+        files = []
+        total = 0
+        for i, path in enumerate(paths):
+            path = Path(path)
+            blob = self._blob(key, i, path.name)
+            _link_or_copy(path, blob)
+            files.append(path.name)
+            total += blob.stat().st_size
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, files, bytes, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(files, ensure_ascii=False), total, time.time()),
+            )
+        self.evict()
+
+    def discard(self, key: str) -> None:
+        """항목과 캐시 파일을 지웁니다."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT files FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if row is None:
+            return
+        for i, filename in enumerate(json.loads(row[0])):
+            try:
+                self._blob(key, i, filename).unlink()
+            except FileNotFoundError:
+                pass
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        총 용량이 max_bytes(기본 self.max_bytes) 이하가 될 때까지 가장 오래 안 쓴 항목을 지웁니다.
+        :return: 지운 항목 수
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        total = self.total_bytes()
+        if total <= limit:
+            return 0
+        with self._lock:
+            rows = self._db.execute("SELECT key, bytes FROM entries ORDER BY last_used").fetchall()
+        removed = 0
+        for key, size in rows:
+            if total <= limit:
+                break
+            self.discard(key)
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+GPU 시간 비용 모델: 텔레메트리 기록으로 워크플로 하나의 실행 시간을 제출 전에 예측하고,
+GPU 분(minute) 예산에 맞춰 스윕 계획의 시드 수를 줄입니다. 실행 뒤에는 예측과 실제 시간을 비교합니다.
+
+    model = CostModel.from_telemetry(TelemetryStore())
+    plan, entries = fit_budget(plan, model, budget_seconds=30 * 60)
+    print(budget_report(entries, 30 * 60))
+    meter = CostMeter(model)
+    async for job, paths in sweep.iter_results(meter.order(plan.jobs()), pool):
+        ...
+    print(meter.report(telemetry))   # 예측 vs 관측 GPU 시간
+
+- 샘플링: 초 = 계수 × 스텝 × 메가픽셀(1024²) × 배치 × 스텝당 모델 평가 수. 계수는 체크포인트 계열(sdxl/sd15)별,
+  기록이 MIN_SAMPLES개 이상이면 (계열, 샘플러)별 KSampler 실행 기록의 중앙값
+- 나머지 노드: 클래스별 실행 시간 p50 (기록이 없으면 comfy_graph.NODE_COST). LoRA는 LoraLoader 노드 수만큼 더해짐
+- 캐시 상태: 직전 prompt와 Merkle 해시가 같은 노드(같은 체크포인트 로더 등)는 0초로 봄
+- 확인: python comfy_cost.py [--hours 24] → 학습된 계수
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import comfy_workflow as cw
+from comfy_graph import DEFAULT_NODE_COST, NODE_COST, node_hashes
+from comfy_telemetry import TELEMETRY_DB, TelemetryStore, latent_batch, percentile
+
+SAMPLER_CLASSES = ("KSampler", "KSamplerAdvanced")
+# 기록이 없을 때 쓰는 샘플링 계수: 초 / (스텝 × 메가픽셀 × 배치 × 모델 평가 수)
+STEP_SECONDS = {"sdxl": 0.25, "sd15": 0.2}
+# 체크포인트 파일명(소문자)에 이 문자열이 있으면 SDXL 계열로 봄
+SDXL_MARKERS = ("xl", "illustrious", "pony", "noob")
+# 스텝마다 모델을 두 번 평가하는 샘플러
+SAMPLER_EVALS = {
+    "heun": 2,
+    "dpm_2": 2,
+    "dpm_2_ancestral": 2,
+    "dpmpp_2s_ancestral": 2,
+    "dpmpp_sde": 2,
+    "dpmpp_sde_gpu": 2,
+}
+MEGAPIXEL = 1024 * 1024
+# latent 크기를 모를 때(img2img 등) 계열별 기본 해상도
+DEFAULT_PIXELS = {"sdxl": 1024 * 1024, "sd15": 512 * 512}
+# 스텝 입력이 연결이거나 없을 때 (ComfyUI 기본값)
+DEFAULT_STEPS = 20
+# 노드 실행 시간 밖에서 prompt마다 드는 시간(초) 기본값
+PROMPT_OVERHEAD = 0.3
+# (계열, 샘플러)별 계수를 따로 쓰는 최소 기록 수
+MIN_SAMPLES = 3
+
+
+def ckpt_family(ckpt_name: str) -> str:
+    """체크포인트 파일명으로 계열(sdxl/sd15)을 추정합니다."""
+    lowered = ckpt_name.lower()
+    return "sdxl" if any(marker in lowered for marker in SDXL_MARKERS) else "sd15"
+
+
+def _pixels(resolution: str) -> Optional[int]:
+    """'512x768' → 픽셀 수. 형식이 다르면 None."""
+    try:
+        width, height = (int(part) for part in resolution.split("x"))
+    except ValueError:
+        return None
+    return width * height
+
+
+def _sampler_steps(cls: str, inputs: dict) -> int:
+    """샘플러 노드가 실제로 도는 스텝 수 (KSamplerAdvanced는 start_at_step ~ end_at_step 구간)."""
+    steps = inputs.get("steps")
+    steps = steps if isinstance(steps, int) else DEFAULT_STEPS
+    if cls == "KSamplerAdvanced":
+        start = inputs.get("start_at_step")
+        end = inputs.get("end_at_step")
+        start = start if isinstance(start, int) else 0
+        end = min(end, steps) if isinstance(end, int) else steps
+        return max(0, end - start)
+    return steps
+
+
+class CostModel:
+    """
+    워크플로의 GPU 실행 시간(초) 예측기. 기본값만으로도 쓸 수 있고, from_telemetry()로 기록에 맞춥니다.
+
+    :param step_seconds: {(계열, 샘플러): 계수}. 샘플러가 ""인 키는 계열 전체 (기본 STEP_SECONDS)
+    :param node_seconds: 샘플러가 아닌 노드 클래스별 실행 시간 (기본 NODE_COST)
+    :param overhead: prompt마다 더하는 시간(초)
+    :param families: 체크포인트 파일명 → 계열 (파일명으로 추정이 틀릴 때)
+    """
+
+    def __init__(
+        self,
+        step_seconds: Optional[Dict[Tuple[str, str], float]] = None,
+        node_seconds: Optional[Dict[str, float]] = None,
+        overhead: float = PROMPT_OVERHEAD,
+        families: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.step_seconds = (
+            {(family, ""): seconds for family, seconds in STEP_SECONDS.items()}
+            if step_seconds is None
+            else dict(step_seconds)
+        )
+        self.node_seconds = dict(NODE_COST if node_seconds is None else node_seconds)
+        self.overhead = overhead
+        self.families = dict(families or {})
+        # 학습에 쓴 기록 수 (describe()용)
+        self.samples: Dict[Tuple[str, str], int] = {}
+        self.prompts = 0
+
+    @classmethod
+    def from_telemetry(
+        cls,
+        store: TelemetryStore,
+        since: Optional[float] = None,
+        min_samples: int = MIN_SAMPLES,
+        **kwargs: Any,
+    ) -> "CostModel":
+        """
+        TelemetryStore 기록으로 계수를 맞춥니다. 기록이 min_samples개 미만인 계열·샘플러는 기본값을 씁니다.
+        :param since: 이 시각(epoch 초) 이후에 끝난 prompt만 (GPU 종류가 바뀌었을 때)
+        :param kwargs: __init__ 인자 (기본값 대신 쓸 값)
+        """
+        model = cls(**kwargs)
+        ratios: Dict[Tuple[str, str], List[float]] = {}
+        for run in store.node_runs(SAMPLER_CLASSES, since=since):
+            if not run["steps"]:
+                continue
+            family = model.family(run["ckpt"].split(",")[0])
+            sampler = run["sampler"].split("/")[0]
+            pixels = _pixels(run["resolution"]) or DEFAULT_PIXELS.get(family, MEGAPIXEL)
+            units = run["steps"] * pixels / MEGAPIXEL * run["batch"] * SAMPLER_EVALS.get(sampler, 1)
+            ratios.setdefault((family, ""), []).append(run["seconds"] / units)
+            if sampler:
+                ratios.setdefault((family, sampler), []).append(run["seconds"] / units)
+        for key, values in ratios.items():
+            if len(values) >= min_samples:
+                values.sort()
+                model.step_seconds[key] = percentile(values, 50)
+                model.samples[key] = len(values)
+        for entry in store.node_stats(by=(), since=since):
+            if entry["runs"] and entry["class_type"] not in SAMPLER_CLASSES:
+                model.node_seconds[entry["class_type"]] = entry["p50"]
+        overheads = sorted(max(0.0, run["seconds"] - run["node_seconds"]) for run in store.prompt_runs(since=since))
+        if overheads:
+            model.overhead = percentile(overheads, 50)
+        model.prompts = len(overheads)
+        return model
+
+    def family(self, ckpt_name: str) -> str:
+        return self.families.get(ckpt_name) or ckpt_family(ckpt_name)
+
+    def workflow_family(self, workflow: dict) -> str:
+        """첫 CheckpointLoaderSimple의 계열 (없으면 sd15)."""
+        for node_id in cw.find_nodes_by_class(workflow, "CheckpointLoaderSimple"):
+            name = workflow[node_id].get("inputs", {}).get("ckpt_name")
+            if isinstance(name, str):
+                return self.family(name)
+        return "sd15"
+
+    def sampler_seconds(self, family: str, cls: str, inputs: dict, pixels: int, batch: int = 1) -> float:
+        """샘플러 노드 하나의 예상 시간(초)."""
+        sampler = inputs.get("sampler_name")
+        sampler = sampler if isinstance(sampler, str) else ""
+        coefficient = self.step_seconds.get((family, sampler))
+        if coefficient is None:
+            coefficient = self.step_seconds.get((family, ""), STEP_SECONDS.get(family, STEP_SECONDS["sd15"]))
+        steps = _sampler_steps(cls, inputs)
+        return coefficient * steps * pixels / MEGAPIXEL * batch * SAMPLER_EVALS.get(sampler, 1)
+
+    def _predict(self, workflow: dict, hashes: Dict[str, str], previous: FrozenSet[str]) -> float:
+        family = self.workflow_family(workflow)
+        size = cw.latent_size(workflow)
+        pixels = size[0] * size[1] if size else DEFAULT_PIXELS.get(family, MEGAPIXEL)
+        batch = latent_batch(workflow)
+        seconds = self.overhead
+        for node_id, node in workflow.items():
+            if not isinstance(node, dict) or hashes.get(node_id) in previous:
+                continue
+            cls = node.get("class_type", "")
+            if cls in SAMPLER_CLASSES:
+                seconds += self.sampler_seconds(family, cls, node.get("inputs", {}), pixels, batch)
+            else:
+                seconds += self.node_seconds.get(cls, DEFAULT_NODE_COST)
+        return seconds
+
+    def predict(self, workflow: dict, previous: Optional[dict] = None) -> float:
+        """
+        워크플로 하나의 실행 시간(초)을 예측합니다.
+        :param previous: 서버에서 직전에 돈 워크플로. 해시가 같은 노드는 서버 캐시로 건너뛴다고 봄 (None이면 전부 실행)
+        """
+        seen = frozenset(node_hashes(previous).values()) if previous else frozenset()
+        return self._predict(workflow, node_hashes(workflow), seen)
+
+    def predict_sequence(self, workflows: Iterable[dict], previous: Optional[dict] = None) -> List[float]:
+        """workflows를 이 순서로 한 서버에서 돌릴 때 하나씩의 예상 시간(초). 앞 작업의 노드 캐시를 반영합니다."""
+        seen = frozenset(node_hashes(previous).values()) if previous else frozenset()
+        predictions = []
+        for workflow in workflows:
+            hashes = node_hashes(workflow)
+            predictions.append(self._predict(workflow, hashes, seen))
+            seen = frozenset(hashes.values())
+        return predictions
+
+    def describe(self) -> str:
+        """샘플링 계수와 주요 노드 시간 (기록 수, 기본값 여부)."""
+        lines = [f"샘플링 계수 (초 / 스텝·메가픽셀·장, 학습한 prompt {self.prompts}개):"]
+        for (family, sampler), seconds in sorted(self.step_seconds.items()):
+            samples = self.samples.get((family, sampler))
+            source = f"기록 {samples}개" if samples else "기본값"
+            lines.append(f"  {family}{'/' + sampler if sampler else ''}: {seconds:.4f} ({source})")
+        nodes = sorted(self.node_seconds.items(), key=lambda item: item[1], reverse=True)
+        lines.append(
+            "노드: "
+            + ", ".join(f"{cls} {seconds:.2f}s" for cls, seconds in nodes if cls not in SAMPLER_CLASSES)
+            + f" | prompt 오버헤드 {self.overhead:.2f}s"
+        )
+        return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 예산에 맞춘 스윕 계획
+# ---------------------------------------------------------------------------
+def _spec_costs(plan: Any, model: CostModel) -> Tuple[List[Tuple[float, float, int]], List[int]]:
+    """
+    spec마다 (첫 시드 조합들의 시간, 시드 하나를 더할 때 늘어나는 시간, 시드 수)와 시드당 작업 수.
+    시드가 가장 안쪽 축이므로 시드 2개짜리 계획을 만들면 작업이 (첫 시드, 둘째 시드) 쌍으로 나옵니다.
+    """
+    costs = []
+    combos = []
+    previous: Optional[dict] = None
+    for spec in plan.specs:
+        seeds = tuple(spec.seeds)
+        probe = plan.with_specs([spec._replace(seeds=seeds[:2])])
+        workflows = [job.workflow for job in probe.jobs()]
+        predictions = model.predict_sequence(workflows, previous)
+        if workflows:
+            previous = workflows[-1]
+        if len(seeds) >= 2:
+            costs.append((sum(predictions[0::2]), sum(predictions[1::2]), len(seeds)))
+            combos.append(len(workflows) // 2)
+        else:
+            costs.append((sum(predictions), 0.0, 1))
+            combos.append(len(workflows))
+    return costs, combos
+
+
+def fit_budget(
+    plan: Any,
+    model: CostModel,
+    budget_seconds: float,
+    min_seeds: int = 1,
+) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    예상 GPU 시간이 budget_seconds 안에 들도록 SweepPlan의 시드를 줄입니다.
+    시드가 가장 많은 설정부터 하나씩 줄이고 (같으면 뒤쪽 설정부터), 모든 설정이 min_seeds개가 되어도 넘으면
+    계획 뒤쪽 설정부터 통째로 뺍니다. 시드를 지정하지 않은 설정은 줄이지 않습니다.
+    :param plan: comfy_sweep.SweepPlan
+    :param model: CostModel
+    :param budget_seconds: GPU 시간 예산(초). 서버가 여러 대면 모든 서버의 합
+    :param min_seeds: 설정을 빼기 전까지 남길 최소 시드 수
+    :return: (줄인 계획, [{config, jobs_per_seed, seeds, kept, seconds}] 설정별 결과)
+    """
+    costs, combos = _spec_costs(plan, model)
+    kept = [count for _, _, count in costs]
+    floor = max(1, min_seeds)
+
+    def spec_seconds(i: int, count: int) -> float:
+        first, extra, _ = costs[i]
+        return first + (count - 1) * extra if count else 0.0
+
+    total = sum(spec_seconds(i, count) for i, count in enumerate(kept))
+    while total > budget_seconds:
+        trimmable = [i for i, count in enumerate(kept) if count > floor]
+        if trimmable:
+            i = max(trimmable, key=lambda i: (kept[i], i))
+            kept[i] -= 1
+        else:
+            remaining = [i for i, count in enumerate(kept) if count]
+            if not remaining:
+                break
+            kept[remaining[-1]] = 0
+        total = sum(spec_seconds(i, count) for i, count in enumerate(kept))
+
+    specs = []
+    entries = []
+    for i, (spec, count) in enumerate(zip(plan.specs, kept)):
+        if count:
+            specs.append(spec._replace(seeds=tuple(spec.seeds)[:count]) if spec.seeds else spec)
+        entries.append(
+            {
+                "config": spec.config.name,
+                "jobs_per_seed": combos[i],
+                "seeds": costs[i][2],
+                "kept": count,
+                "seconds": spec_seconds(i, count),
+                "full_seconds": spec_seconds(i, costs[i][2]),
+            }
+        )
+    return plan.with_specs(specs), entries
+
+
+def budget_report(entries: Sequence[Dict[str, Any]], budget_seconds: float) -> str:
+    """fit_budget() 결과를 설정마다 한 줄로 (시드 수 변화, 작업 수, 예상 GPU 분)."""
+    full = sum(entry["full_seconds"] for entry in entries)
+    planned = sum(entry["seconds"] for entry in entries)
+    lines = [f"GPU 예산 {budget_seconds / 60:.1f}분: 예상 {full / 60:.1f}분 → {planned / 60:.1f}분"]
+    for entry in entries:
+        if not entry["kept"]:
+            change = "제외"
+        elif entry["kept"] != entry["seeds"]:
+            change = f"시드 {entry['seeds']} → {entry['kept']}개"
+        else:
+            change = f"시드 {entry['seeds']}개 그대로"
+        lines.append(
+            f"  {entry['config']}: {change} (작업 {entry['jobs_per_seed'] * entry['kept']}개, "
+            f"예상 {entry['seconds'] / 60:.1f}분)"
+        )
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 예측 vs 관측
+# ---------------------------------------------------------------------------
+class CostMeter:
+    """
+    제출 순서대로 지나가는 작업(.workflow 속성이 있는 SweepJob/SweepBatch/SweepFusion)의 예상 시간을 더해 두고,
+    실행 뒤 텔레메트리에 기록된 실제 실행 시간과 비교합니다. 재배열·배치·합치기를 모두 적용한 스트림 끝에 둡니다.
+
+    :param model: CostModel
+    """
+
+    def __init__(self, model: CostModel) -> None:
+        self.model = model
+        self.reset()
+
+    def reset(self) -> None:
+        """통계를 초기화합니다."""
+        self.jobs = 0
+        self.predicted = 0.0
+        self.started = time.time()
+
+    def order(self, jobs: Iterable[Any]) -> Iterator[Any]:
+        """jobs를 그대로 내보내며 하나씩 예측합니다 (직전 작업의 노드 캐시 반영)."""
+        self.started = time.time()
+        previous: FrozenSet[str] = frozenset()
+        for job in jobs:
+            hashes = node_hashes(job.workflow)
+            self.predicted += self.model._predict(job.workflow, hashes, previous)
+            self.jobs += 1
+            previous = frozenset(hashes.values())
+            yield job
+
+    def summary(self, telemetry: Optional[TelemetryStore] = None, since: Optional[float] = None) -> Dict[str, Any]:
+        """{jobs, predicted} 와 telemetry가 있으면 since(기본 order() 시작) 이후 {prompts, actual} (초)."""
+        entry: Dict[str, Any] = {"jobs": self.jobs, "predicted": self.predicted}
+        if telemetry is not None:
+            runs = telemetry.prompt_runs(since=self.started if since is None else since)
+            entry.update(prompts=len(runs), actual=sum(run["seconds"] for run in runs))
+        return entry
+
+    def report(self, telemetry: Optional[TelemetryStore] = None, since: Optional[float] = None) -> str:
+        """
+        예상 GPU 시간과, telemetry가 있으면 실제로 실행된 prompt의 시간 합을 한 줄로 보여 줍니다.
+        결과 캐시로 건너뛴 작업은 관측에 없으므로 오차는 prompt당 평균으로 비교합니다.
+        """
+        entry = self.summary(telemetry, since)
+        line = f"GPU 시간 예상: 작업 {entry['jobs']}개 {entry['predicted'] / 60:.1f}분"
+        if "actual" in entry:
+            line += f" | 관측: prompt {entry['prompts']}개 {entry['actual'] / 60:.1f}분"
+            if entry["jobs"] and entry["prompts"]:
+                predicted = entry["predicted"] / entry["jobs"]
+                actual = entry["actual"] / entry["prompts"]
+                error = (actual - predicted) / predicted * 100 if predicted else 0.0
+                line += f" (prompt당 예상 {predicted:.1f}s / 실제 {actual:.1f}s, {error:+.0f}%)"
+        return line
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="텔레메트리로 학습한 GPU 시간 비용 모델 확인")
+    parser.add_argument("--db", type=Path, default=TELEMETRY_DB, help="텔레메트리 SQLite 파일")
+    parser.add_argument("--hours", type=float, help="최근 N시간 안에 끝난 prompt만으로 학습")
+    args = parser.parse_args(argv)
+    if not args.db.exists():
+        print(f"텔레메트리 기록 없음: {args.db} (기본 계수만 사용)")
+        print(CostModel().describe())
+        return 1
+    since = time.time() - args.hours * 3600 if args.hours else None
+    store = TelemetryStore(args.db)
+    try:
+        model = CostModel.from_telemetry(store, since=since)
+    finally:
+        store.close()
+    print(model.describe())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+"""
+워크플로 그래프 분석: 노드별 상류 부분그래프의 Merkle 해시, 서버 노드 캐시를 고려한 제출 순서,
+여러 변형 워크플로를 공통 노드를 공유하는 prompt 하나로 합치기(fuse_workflows),
+보내기 전 그래프 정리(optimize_workflow: 끊어진 참조 검사, 중복 노드 합치기, 출력에 닿지 않는 노드 제거).
+
+ComfyUI는 노드의 입력(상류 노드 출력 포함)이 직전 prompt와 같으면 그 노드를 다시 실행하지 않고
+execution_cached로 알립니다. 노드 해시 = (class_type, 값 입력, 상류 노드 해시·슬롯)의 해시이므로
+두 워크플로에서 해시가 같은 노드는 서버 캐시를 재사용할 수 있는 노드입니다.
+
+    planner = CachePlanner()
+    async for job, paths in sweep.iter_results(planner.order(jobs), pool):
+        ...
+    print(planner.report(telemetry, since=started))   # 예측 vs 관측 execution_cached
+"""
+
+import hashlib
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# 캐시 적중 시 절약되는 실행 비용 추정값(초). 없는 클래스는 DEFAULT_NODE_COST
+NODE_COST = {
+    "CheckpointLoaderSimple": 8.0,
+    "LoraLoader": 1.5,
+    "VAELoader": 1.0,
+    "ControlNetLoader": 1.5,
+    "KSampler": 10.0,
+    "KSamplerAdvanced": 10.0,
+    "VAEEncode": 0.5,
+    "VAEDecode": 0.5,
+    "CLIPTextEncode": 0.1,
+    "LoadImage": 0.05,
+}
+DEFAULT_NODE_COST = 0.05
+# 결과를 내는 노드 클래스. optimize_workflow()는 여기서 거슬러 올라가 닿지 않는 노드를 지움
+# (서버의 /object_info에서 output_node인 클래스를 쓰려면 comfy_validate.ObjectInfo.optimize)
+OUTPUT_NODE_CLASSES = frozenset(
+    {"SaveImage", "SaveImageWebsocket", "PreviewImage", "SaveAnimatedWEBP", "SaveAnimatedPNG"}
+)
+# 결과를 내지 않는 ComfyUI 기본 노드 클래스. 이것도 OUTPUT_NODE_CLASSES도 아닌 클래스(커스텀 저장·비디오 노드 등)는
+# 출력일 수 있으므로 optimize_workflow()가 지우거나 합치지 않고, 그 상류도 남김
+INTERMEDIATE_NODE_CLASSES = frozenset(
+    {
+        "CheckpointLoaderSimple",
+        "LoraLoader",
+        "LoraLoaderModelOnly",
+        "VAELoader",
+        "CLIPLoader",
+        "CLIPSetLastLayer",
+        "CLIPTextEncode",
+        "ConditioningCombine",
+        "ConditioningSetArea",
+        "ControlNetLoader",
+        "ControlNetApply",
+        "ControlNetApplyAdvanced",
+        "UpscaleModelLoader",
+        "ImageUpscaleWithModel",
+        "EmptyLatentImage",
+        "LatentUpscale",
+        "LatentUpscaleBy",
+        "KSampler",
+        "KSamplerAdvanced",
+        "VAEEncode",
+        "VAEEncodeForInpaint",
+        "VAEDecode",
+        "LoadImage",
+        "LoadImageMask",
+        "ImageScale",
+        "ImageScaleBy",
+    }
+)
+# fuse_workflows()가 저장 노드 filename_prefix 끝에 붙이는 변형 번호 (결과 파일을 변형별로 되찾는 데 씀)
+BRANCH_TAG = "__v{}"
+
+
+def is_link(value: Any, workflow: dict) -> bool:
+    """[node_id, slot] 형태로 workflow 안의 노드를 가리키는 입력인지 확인합니다."""
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and value[0] in workflow
+        and isinstance(value[1], int)
+    )
+
+
+def node_hashes(workflow: dict) -> Dict[str, str]:
+    """
+    노드마다 상류 부분그래프 전체를 반영한 Merkle 해시를 계산합니다.
+    노드 ID, _meta(제목)는 해시에 들어가지 않으므로 ID가 달라도 같은 계산이면 같은 해시입니다.
+    :return: {node_id: 16진수 해시}
+    :raises ValueError: 노드 참조에 순환이 있을 때
+    """
+    hashes: Dict[str, str] = {}
+    visiting: Set[str] = set()
+
+    def visit(root: str) -> None:
+        # 깊은 그래프에서도 재귀 한도에 걸리지 않도록 명시적 스택 사용
+        stack = [(root, False)]
+        while stack:
+            node_id, expanded = stack.pop()
+            if node_id in hashes:
+                continue
+            node = workflow[node_id]
+            inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+            if not expanded:
+                if node_id in visiting:
+                    raise ValueError(f"노드 참조에 순환이 있습니다: {node_id}")
+                visiting.add(node_id)
+                stack.append((node_id, True))
+                for value in inputs.values():
+                    if is_link(value, workflow) and value[0] not in hashes:
+                        stack.append((value[0], False))
+                continue
+            resolved = []
+            for key in sorted(inputs):
+                value = inputs[key]
+                if is_link(value, workflow):
+                    resolved.append((key, "link", hashes[value[0]], value[1]))
+                else:
+                    resolved.append((key, "value", value))
+            source = json.dumps(
+                [node.get("class_type"), resolved], sort_keys=True, separators=(",", ":"), ensure_ascii=False
+            )
+            hashes[node_id] = hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+            visiting.discard(node_id)
+
+    for node_id, node in workflow.items():
+        if isinstance(node, dict):
+            visit(node_id)
+    return hashes
+
+
+def predict_cached(previous: Optional[Iterable[str]], hashes: Dict[str, str]) -> List[str]:
+    """
+    직전 prompt의 노드 해시 집합이 previous일 때 이번 prompt에서 캐시로 건너뛸 노드 ID 목록.
+    서버 캐시는 직전 prompt의 노드만 기억한다고 가정합니다 (ComfyUI 기본 캐시).
+    """
+    if not previous:
+        return []
+    previous = previous if isinstance(previous, (set, frozenset)) else set(previous)
+    return [node_id for node_id, digest in hashes.items() if digest in previous]
+
+
+class _Pending:
+    __slots__ = ("job", "hashes", "digests", "cost", "overtaken")
+
+    def __init__(self, job: Any, workflow: dict, node_cost: Dict[str, float]) -> None:
+        self.job = job
+        self.hashes = node_hashes(workflow)
+        self.digests: FrozenSet[str] = frozenset(self.hashes.values())
+        # 해시 → 그 노드를 다시 실행하는 비용
+        self.cost: Dict[str, float] = {}
+        for node_id, digest in self.hashes.items():
+            cls = workflow[node_id].get("class_type", "")
+            self.cost[digest] = max(self.cost.get(digest, 0.0), node_cost.get(cls, DEFAULT_NODE_COST))
+        self.overtaken = 0
+
+    def saved(self, previous: FrozenSet[str]) -> float:
+        return sum(cost for digest, cost in self.cost.items() if digest in previous)
+
+
+class CachePlanner:
+    """
+    작업(.workflow 속성이 있는 SweepJob/SweepBatch 등) 스트림을 서버 노드 캐시 재사용이 커지도록 재배열합니다.
+    window개까지 미리 읽어, 직전에 보낸 작업과 해시가 같은 노드의 실행 비용 합이 가장 큰 작업을 다음으로 보냅니다.
+    점수가 같으면 먼저 들어온 작업이 우선입니다.
+
+    :param window: 미리 읽어 둘 작업 수
+    :param max_delay: 작업 하나가 뒤에 들어온 작업에 추월당할 수 있는 최대 횟수 (공정성 상한)
+    :param node_cost: 클래스별 실행 비용 추정값 (기본 NODE_COST)
+    """
+
+    def __init__(
+        self,
+        window: int = 16,
+        max_delay: int = 16,
+        node_cost: Optional[Dict[str, float]] = None,
+    ) -> None:
+        if window < 1:
+            raise ValueError("window는 1 이상이어야 합니다.")
+        if max_delay < 0:
+            raise ValueError("max_delay는 0 이상이어야 합니다.")
+        self.window = window
+        self.max_delay = max_delay
+        self.node_cost = dict(NODE_COST if node_cost is None else node_cost)
+        self.reset()
+
+    def reset(self) -> None:
+        """통계를 초기화합니다."""
+        self.jobs = 0
+        self.nodes = 0
+        self.cached_before = 0
+        self.cached_after = 0
+        self.saved_before = 0.0
+        self.saved_after = 0.0
+        self.started = time.time()
+
+    def order(self, jobs: Iterable[Any]) -> Iterator[Any]:
+        """jobs를 재배열해 내보내는 제너레이터. 입력은 최대 window개 앞까지만 읽습니다."""
+        self.started = time.time()
+        source = iter(jobs)
+        buffer: Deque[_Pending] = deque()
+        arrived: FrozenSet[str] = frozenset()
+        sent: FrozenSet[str] = frozenset()
+        exhausted = False
+        while True:
+            while not exhausted and len(buffer) < self.window:
+                job = next(source, None)
+                if job is None:
+                    exhausted = True
+                    break
+                item = _Pending(job, job.workflow, self.node_cost)
+                # 원래 순서대로 보냈을 때의 예측 (비교용)
+                self.cached_before += len(predict_cached(arrived, item.hashes))
+                self.saved_before += item.saved(arrived)
+                arrived = item.digests
+                buffer.append(item)
+            if not buffer:
+                return
+            chosen = self._pick(buffer, sent)
+            self.jobs += 1
+            self.nodes += len(chosen.hashes)
+            self.cached_after += len(predict_cached(sent, chosen.hashes))
+            self.saved_after += chosen.saved(sent)
+            sent = chosen.digests
+            yield chosen.job
+
+    def _pick(self, buffer: Deque[_Pending], previous: FrozenSet[str]) -> "_Pending":
+        index = 0
+        if buffer[0].overtaken < self.max_delay and previous:
+            best = buffer[0].saved(previous)
+            for i in range(1, len(buffer)):
+                score = buffer[i].saved(previous)
+                if score > best:
+                    best, index = score, i
+        chosen = buffer[index]
+        del buffer[index]
+        for i in range(index):
+            buffer[i].overtaken += 1
+        return chosen
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "nodes": self.nodes,
+            "cached_before": self.cached_before,
+            "cached_after": self.cached_after,
+            "saved_before": self.saved_before,
+            "saved_after": self.saved_after,
+        }
+
+    def report(self, telemetry: Any = None, since: Optional[float] = None) -> str:
+        """
+        예측한 캐시 적중 노드 수 (원래 순서 → 재배열 후)와, telemetry(TelemetryStore)가 있으면
+        since(기본 order() 시작 시각) 이후 서버가 실제로 보낸 execution_cached 노드 수를 함께 보여 줍니다.
+        """
+        line = (
+            f"노드 캐시 예측: {self.nodes}개 중 {self.cached_before}개 → {self.cached_after}개 적중 "
+            f"(절약 추정 {self.saved_before:.0f}s → {self.saved_after:.0f}s)"
+        )
+        if telemetry is not None:
+            observed = telemetry.cache_summary(since=self.started if since is None else since)
+            line += f" | 관측: {observed['nodes']}개 중 {observed['cached']}개 적중 (prompt {observed['prompts']}개)"
+        return line
+
+
+# ---------------------------------------------------------------------------
+# 변형 워크플로 합치기
+# ---------------------------------------------------------------------------
+class FusedWorkflow(NamedTuple):
+    """
+    fuse_workflows() 결과. workflow는 /prompt에 보낼 합쳐진 그래프,
+    prefixes[i]는 i번째 변형의 저장 노드 filename_prefix(변형 번호가 붙은 파일명 부분),
+    node_maps[i]는 i번째 변형의 원래 노드 ID → 합쳐진 그래프의 노드 ID입니다.
+    """
+
+    workflow: dict
+    prefixes: Tuple[Tuple[str, ...], ...]
+    node_maps: Tuple[Dict[str, str], ...]
+
+    def split(self, paths: Sequence[Path]) -> List[List[Path]]:
+        """
+        합쳐진 prompt의 결과 경로를 변형별로 나눕니다. ComfyUI는 "{prefix}_{번호}_.png",
+        websocket 모드는 "{prefix}_{prompt_id}_{번호}_.png"로 저장하므로 파일명 앞부분으로 구분합니다.
+        """
+        out: List[List[Path]] = []
+        for prefixes in self.prefixes:
+            heads = tuple(f"{prefix}_" for prefix in prefixes)
+            out.append([path for path in paths if Path(path).name.startswith(heads)])
+        return out
+
+
+def _tag_outputs(workflow: dict, index: int) -> Tuple[dict, Tuple[str, ...]]:
+    """저장 노드의 filename_prefix 끝에 변형 번호를 붙인 사본 (원본은 수정하지 않음)."""
+    tagged = dict(workflow)
+    prefixes = []
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict) or node.get("class_type") not in ("SaveImage", "SaveImageWebsocket"):
+            continue
+        inputs = node.get("inputs", {})
+        prefix = f"{inputs.get('filename_prefix', 'ComfyUI')}{BRANCH_TAG.format(index)}"
+        tagged[node_id] = dict(node, inputs=dict(inputs, filename_prefix=prefix))
+        prefixes.append(Path(prefix).name)
+    return tagged, tuple(prefixes)
+
+
+def fuse_workflows(workflows: Sequence[dict]) -> FusedWorkflow:
+    """
+    변형 워크플로 N개를 prompt 하나로 합칩니다. 상류 부분그래프까지 같은 노드(Merkle 해시가 같은 노드,
+    예: 같은 체크포인트 로더·같은 프롬프트의 CLIPTextEncode)는 하나만 남기고, 나머지(KSampler, VAEDecode,
+    SaveImage 등)는 변형마다 따로 둡니다. 저장 노드의 filename_prefix에는 변형 번호(__v0, __v1 …)가 붙어
+    FusedWorkflow.split()으로 결과를 변형별로 되찾을 수 있습니다.
+    :param workflows: build_workflow()/PreparedWorkflow.fill()로 만든 워크플로 목록 (수정하지 않음)
+    :return: FusedWorkflow
+    :raises ValueError: 워크플로가 없거나 노드 참조에 순환이 있을 때
+    """
+    if not workflows:
+        raise ValueError("합칠 워크플로가 없습니다.")
+    fused: Dict[str, dict] = {}
+    by_hash: Dict[str, str] = {}
+    prefixes = []
+    node_maps = []
+    for index, workflow in enumerate(workflows):
+        tagged, tags = _tag_outputs(workflow, index)
+        hashes = node_hashes(tagged)
+        mapping: Dict[str, str] = {}
+        for node_id, digest in hashes.items():
+            if digest not in by_hash:
+                by_hash[digest] = str(len(by_hash) + 1)
+            mapping[node_id] = by_hash[digest]
+        for node_id, digest in hashes.items():
+            new_id = mapping[node_id]
+            if new_id in fused:
+                continue
+            node = tagged[node_id]
+            inputs = {
+                key: [mapping[value[0]], value[1]] if is_link(value, tagged) else value
+                for key, value in node.get("inputs", {}).items()
+            }
+            fused[new_id] = dict(node, inputs=inputs)
+        prefixes.append(tags)
+        node_maps.append(mapping)
+    return FusedWorkflow(fused, tuple(prefixes), tuple(node_maps))
+
+
+# ---------------------------------------------------------------------------
+# 그래프 최적화 (끊어진 참조 검사, 중복 노드 합치기, 출력에 닿지 않는 노드 제거)
+# ---------------------------------------------------------------------------
+def _looks_like_link(value: Any) -> bool:
+    # 대상 노드가 있든 없든 [숫자 문자열 ID, 슬롯] 모양이면 노드 참조로 봄
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and value[0].isdigit()
+        and isinstance(value[1], int)
+    )
+
+
+def dangling_links(workflow: dict) -> List[Tuple[str, str, str]]:
+    """
+    워크플로에 없는 노드를 가리키는 입력 목록.
+    :return: [(노드 ID, 입력 키, 없는 대상 노드 ID), ...]
+    """
+    found = []
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        for key, value in node.get("inputs", {}).items():
+            if _looks_like_link(value) and value[0] not in workflow:
+                found.append((node_id, key, value[0]))
+    return found
+
+
+def output_nodes(workflow: dict, output_classes: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    출력 노드 ID 목록 (ComfyUI가 실행을 시작하는 지점).
+    :param output_classes: 출력 노드 클래스 (기본 OUTPUT_NODE_CLASSES)
+    """
+    classes = OUTPUT_NODE_CLASSES if output_classes is None else frozenset(output_classes)
+    return [
+        node_id
+        for node_id, node in workflow.items()
+        if isinstance(node, dict) and node.get("class_type") in classes
+    ]
+
+
+def _node_order(node_id: str) -> Tuple[int, Any]:
+    return (0, int(node_id)) if node_id.isdigit() else (1, node_id)
+
+
+def _resolve(node_id: str, replaced: Dict[str, str]) -> str:
+    while node_id in replaced:
+        node_id = replaced[node_id]
+    return node_id
+
+
+def _shallow_key(node: dict, replaced: Dict[str, str]) -> Tuple[Any, ...]:
+    """class_type + 입력값 (참조는 합쳐진 뒤의 대상 ID). 반복 적용하면 node_hashes가 같은 노드끼리 같아짐."""
+    parts: List[Any] = [node.get("class_type")]
+    inputs = node.get("inputs", {})
+    for key in sorted(inputs):
+        value = inputs[key]
+        if _looks_like_link(value):
+            parts.append((key, _resolve(value[0], replaced), value[1]))
+        else:
+            parts.append((key, repr(value)))
+    return tuple(parts)
+
+
+def optimize_workflow(
+    workflow: dict,
+    output_classes: Optional[Iterable[str]] = None,
+    known_classes: Optional[Iterable[str]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    /prompt에 보내기 전 그래프를 정리합니다. workflow를 in-place로 수정합니다.
+    1. 끊어진 노드 참조가 있으면 ValueError (서버에 큐잉되기 전에 배선 실수를 드러냄)
+    2. 상류 부분그래프까지 같은 노드(node_hashes가 같은 노드)는 ID가 가장 작은 것 하나만 남기고 참조를 옮김
+       (템플릿을 합칠 때 생기는 중복 체크포인트 로더 → 모델을 한 번만 읽음). 출력 노드는 합치지 않음
+    3. 출력 노드에서 거슬러 올라가 닿지 않는 노드를 제거
+       (text2img + upscale에서 연결이 끊긴 LoadImage 등). 출력 노드가 하나도 없으면 제거하지 않음
+    출력인지 모르는 클래스(known_classes 밖)의 노드는 출력 노드처럼 다룹니다 (지우거나 합치지 않고 상류도 남김).
+    build_workflow마다 호출되므로 해시 대신, 같은 class_type이 둘 이상인 노드만 입력값을 비교하고
+    합칠 것이 없어질 때까지 반복합니다 (결과는 Merkle 해시 비교와 같음).
+    :param output_classes: 출력 노드 클래스 (기본 OUTPUT_NODE_CLASSES)
+    :param known_classes: 출력 여부를 아는 클래스 전체, 예: 서버 /object_info의 클래스
+        (기본 output_classes + INTERMEDIATE_NODE_CLASSES)
+    :return: {사라진 노드 ID: 대신 쓰는 노드 ID (중복 합침) 또는 None (제거)}
+    :raises ValueError: 끊어진 참조나 출력에 닿는 순환이 있을 때
+    """
+    output_classes = OUTPUT_NODE_CLASSES if output_classes is None else frozenset(output_classes)
+    known_classes = (
+        output_classes | INTERMEDIATE_NODE_CLASSES if known_classes is None else frozenset(known_classes)
+    )
+    # 노드 참조를 한 번만 훑어 두고 (끊어진 참조 검사·참조 옮기기·도달 검사에 재사용)
+    links: Dict[str, List[Tuple[str, str]]] = {}
+    by_class: Dict[Any, List[str]] = {}
+    outputs = []
+    dangling = []
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        cls = node.get("class_type")
+        if cls in output_classes or cls not in known_classes:
+            outputs.append(node_id)
+        else:
+            by_class.setdefault(cls, []).append(node_id)
+        node_links = links[node_id] = []
+        for key, value in node.get("inputs", {}).items():
+            if _looks_like_link(value):
+                node_links.append((key, value[0]))
+                if value[0] not in workflow:
+                    dangling.append(f"{node_id}.{key} → {value[0]}")
+    if dangling:
+        raise ValueError(f"워크플로에 없는 노드를 참조합니다: {', '.join(dangling)}")
+    groups = [sorted(ids, key=_node_order) for ids in by_class.values() if len(ids) > 1]
+
+    replaced: Dict[str, str] = {}
+    changed = bool(groups)
+    while changed:
+        # 하나를 합치면 그 노드를 참조하던 하류 노드끼리 같아질 수 있으므로 변화가 없을 때까지 반복
+        changed = False
+        for ids in groups:
+            seen: Dict[Tuple[Any, ...], str] = {}
+            for node_id in ids:
+                if node_id in replaced:
+                    continue
+                survivor = seen.setdefault(_shallow_key(workflow[node_id], replaced), node_id)
+                if survivor != node_id:
+                    replaced[node_id] = survivor
+                    changed = True
+    removed: Dict[str, Optional[str]] = {}
+    if replaced:
+        for node_id in replaced:
+            del workflow[node_id]
+            del links[node_id]
+            removed[node_id] = _resolve(node_id, replaced)
+        for node_id, node_links in links.items():
+            for i, (key, target) in enumerate(node_links):
+                if target in replaced:
+                    survivor = _resolve(target, replaced)
+                    inputs = workflow[node_id]["inputs"]
+                    inputs[key] = [survivor, inputs[key][1]]
+                    node_links[i] = (key, survivor)
+
+    if outputs:
+        reachable: Set[str] = set()
+        visiting: Set[str] = set()
+        stack = [(node_id, False) for node_id in outputs]
+        while stack:
+            node_id, expanded = stack.pop()
+            if expanded:
+                visiting.discard(node_id)
+                reachable.add(node_id)
+                continue
+            if node_id in reachable:
+                continue
+            if node_id in visiting:
+                raise ValueError(f"노드 참조에 순환이 있습니다: {node_id}")
+            visiting.add(node_id)
+            stack.append((node_id, True))
+            for _, target in links[node_id]:
+                if target not in reachable:
+                    stack.append((target, False))
+        for node_id in [node_id for node_id in workflow if node_id not in reachable]:
+            del workflow[node_id]
+            removed[node_id] = None
+    return removed
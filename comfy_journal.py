@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+작업 기록(journal): 스크립트가 중간에 죽어도 서버 큐에 넣은 prompt를 잃지 않게 합니다.
+prompt_id는 /prompt 응답으로만 알 수 있어 프로세스가 끝나면 사라지므로, 다시 실행하면 같은 작업을
+유료 파드에 또 보내게 됩니다. JobJournal은 작업마다 워크플로 해시, 서버, prompt_id, 상태, 결과 경로를
+SQLite(WAL)에 남기고, 다음 실행에서는 /queue·/history로 그 prompt에 다시 붙습니다.
+
+    journal = JobJournal()
+    async for job, paths in sweep.iter_results(plan.jobs(), pool, journal=journal):
+        ...
+
+상태
+- submitting: prompt_id를 정하고 /prompt를 보내는 중 (서버는 아직 모를 수 있음)
+- queued: 서버 큐에 들어감
+- done: 결과를 받음 (outputs에 경로)
+- failed: 실행 실패 또는 서버에서 사라짐 → 다음 실행에서 다시 제출
+
+다시 실행할 때 (history 모드)
+- done이고 결과 파일이 남아 있으면 서버에 묻지 않고 그 경로를 돌려줌
+- 서버 큐에 아직 있거나 /history에 성공으로 남은 prompt는 다시 보내지 않고 기다렸다가 결과만 받음
+- /history에 에러로 남았거나 큐·기록 어디에도 없는 prompt만 다시 제출
+- 기록된 서버가 응답하지 않으면 상태를 모르는 것(unknown)으로 보고 다시 제출하지 않음 (기록도 그대로 둠)
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import comfy_workflow as cw
+
+JOURNAL_DB = Path(__file__).resolve().parent / ".comfy_journal.sqlite3"
+# 다시 붙은 prompt의 완료를 확인하는 간격(초). 원래 clientId가 아니므로 WebSocket 완료 메시지가 오지 않음
+REATTACH_POLL_INTERVAL = 2.0
+
+SUBMITTING = "submitting"
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+# prompt_status() 결과
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+STATUS_MISSING = "missing"
+# 서버가 응답하지 않아 확인하지 못함 → 살아 있을 수 있으므로 다시 제출하지 않음
+STATUS_UNKNOWN = "unknown"
+# 다시 붙을 수 있는 상태 (다시 제출하지 않음)
+LIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING, STATUS_SUCCESS)
+
+
+class JournalEntry(NamedTuple):
+    key: str
+    state: str
+    server: Optional[str]
+    prompt_id: Optional[str]
+    outputs: List[Path]
+    error: Optional[str]
+    attempts: int
+    updated: float
+
+
+def _history_status(server: str, prompt_id: str, timeout: int) -> Optional[str]:
+    entry = cw.get_history(server, prompt_id, timeout=timeout).get(prompt_id)
+    if entry is None:
+        return None
+    status = entry.get("status") or {}
+    # 구버전 ComfyUI는 status가 없음 → 기록이 있으면 성공으로 봄
+    return STATUS_ERROR if status.get("status_str") == "error" else STATUS_SUCCESS
+
+
+def prompt_status(server: str, prompt_id: str, timeout: int = cw.REQUEST_TIMEOUT) -> str:
+    """
+    서버에서 prompt의 현재 상태를 확인합니다. /history를 먼저 보고, 없으면 /queue를 봅니다.
+    :return: "pending", "running", "success", "error", "missing" 중 하나
+    """
+    status = _history_status(server, prompt_id, timeout)
+    if status is not None:
+        return status
+    queue = cw.get_queue(server, timeout=timeout)
+    if prompt_id in cw.queue_prompt_ids(queue, "queue_running"):
+        return STATUS_RUNNING
+    if prompt_id in cw.queue_prompt_ids(queue, "queue_pending"):
+        return STATUS_PENDING
+    # 큐에서 기록으로 옮겨지는 사이에 조회했을 수 있으므로 한 번 더 확인
+    return _history_status(server, prompt_id, timeout) or STATUS_MISSING
+
+
+async def wait_prompt(
+    server: str,
+    prompt_id: str,
+    timeout: Optional[float] = cw.WS_RECV_TIMEOUT,
+    poll_interval: float = REATTACH_POLL_INTERVAL,
+) -> None:
+    """
+    다른 프로세스가 넣은 prompt의 실행이 끝날 때까지 /history·/queue를 주기적으로 확인합니다.
+    실패했으면 cw.ExecutionError (실패한 노드·예외 정보 포함), 서버에서 사라지면 RuntimeError.
+    timeout(초)을 넘기면 서버에서 prompt를 취소하고 TimeoutError.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status = await asyncio.to_thread(prompt_status, server, prompt_id)
+        if status == STATUS_SUCCESS:
+            return
+        if status == STATUS_ERROR:
+            entry = (await asyncio.to_thread(cw.get_history, server, prompt_id)).get(prompt_id) or {}
+            raise cw.history_error(prompt_id, entry) or cw.ExecutionError(prompt_id)
+        if status == STATUS_MISSING:
+            raise RuntimeError(f"서버 큐와 기록에 prompt가 없습니다 (prompt_id={prompt_id})")
+        if deadline is not None and time.monotonic() >= deadline:
+            try:
+                await asyncio.to_thread(cw.cancel_prompt, server, prompt_id)
+            except Exception:
+                pass  # 취소 요청 실패로 시간 초과를 가리지 않음
+            raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})")
+        await asyncio.sleep(poll_interval)
+
+
+class JobJournal:
+    """
+    작업(워크플로 해시)별 제출 기록. 여러 프로세스(샤드)가 같은 파일을 써도 됩니다.
+
+    :param path: SQLite 파일 (기본 .comfy_journal.sqlite3)
+    """
+
+    def __init__(self, path: Union[str, Path] = JOURNAL_DB) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # 한 번의 기록마다 fsync하지 않아도 WAL이면 프로세스가 죽어도 커밋은 남음 (전원 장애만 예외)
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " key TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " server TEXT,"
+                " prompt_id TEXT,"
+                " outputs TEXT NOT NULL DEFAULT '[]',"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " updated REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row: tuple) -> JournalEntry:
+        key, state, server, prompt_id, outputs, error, attempts, updated = row
+        return JournalEntry(key, state, server, prompt_id, [Path(p) for p in json.loads(outputs)], error, attempts, updated)
+
+    def get(self, key: str) -> Optional[JournalEntry]:
+        """작업 기록을 찾습니다. 없으면 None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, state, server, prompt_id, outputs, error, attempts, updated FROM jobs WHERE key = ?",
+                (key,),
+            ).fetchone()
+        return None if row is None else self._entry(row)
+
+    def entries(self, states: Optional[Iterable[str]] = None) -> List[JournalEntry]:
+        """기록 목록 (states를 주면 그 상태만), 오래된 순."""
+        query = "SELECT key, state, server, prompt_id, outputs, error, attempts, updated FROM jobs"
+        params: Tuple[str, ...] = ()
+        if states is not None:
+            params = tuple(states)
+            query += f" WHERE state IN ({','.join('?' * len(params))})"
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY updated", params).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def submitting(self, key: str, prompt_id: str) -> None:
+        """/prompt를 보내기 직전: 응답 전에 죽어도 prompt_id로 서버에서 찾을 수 있게 남깁니다."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (key, state, server, prompt_id, attempts, updated) VALUES (?, ?, NULL, ?, 1, ?)"
+                " ON CONFLICT(key) DO UPDATE SET state = excluded.state, server = NULL,"
+                " prompt_id = excluded.prompt_id, error = NULL, attempts = attempts + 1, updated = excluded.updated",
+                (key, SUBMITTING, prompt_id, time.time()),
+            )
+
+    def queued(self, key: str, server: str, prompt_id: str) -> None:
+        """서버 큐에 들어간 prompt (다시 붙은 prompt 포함)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (key, state, server, prompt_id, updated) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET state = excluded.state, server = excluded.server,"
+                " prompt_id = excluded.prompt_id, updated = excluded.updated",
+                (key, QUEUED, server, prompt_id, time.time()),
+            )
+
+    def done(self, key: str, paths: Sequence[Union[str, Path]]) -> None:
+        """결과를 받은 작업."""
+        outputs = json.dumps([str(p) for p in paths], ensure_ascii=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, outputs = ?, error = NULL, updated = ? WHERE key = ?",
+                (DONE, outputs, time.time(), key),
+            )
+
+    def failed(self, key: str, error: Union[str, BaseException]) -> None:
+        """실행에 실패한 작업 (다음 실행에서 다시 제출)."""
+        message = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE key = ?",
+                (FAILED, message, time.time(), key),
+            )
+
+    def forget(self, key: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs WHERE key = ?", (key,))
+
+    def counts(self) -> Dict[str, int]:
+        """상태별 작업 수."""
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def last_update(self) -> Optional[float]:
+        """가장 최근에 바뀐 기록의 시각 (기록이 없으면 None). 클라이언트가 아직 작업 중인지 볼 때 씁니다."""
+        with self._lock:
+            (updated,) = self._db.execute("SELECT MAX(updated) FROM jobs").fetchone()
+        return updated
+
+    def locate(
+        self, entry: JournalEntry, servers: Sequence[str], timeout: int = cw.REQUEST_TIMEOUT
+    ) -> Tuple[Optional[str], str]:
+        """
+        기록된 prompt가 어느 서버에서 어떤 상태인지 확인합니다.
+        서버가 기록돼 있으면 그 서버만 확인하고, 응답하지 않으면 STATUS_UNKNOWN (잠깐 끊긴 것일 수 있으므로
+        다시 제출하면 안 됨). 서버를 모르는(submitting) 기록은 servers를 차례로 찾아보고,
+        어디에서도 찾지 못했는데 응답하지 않은 서버가 있었으면 STATUS_UNKNOWN.
+        :return: (서버 또는 None, prompt_status() 결과 또는 STATUS_UNKNOWN)
+        """
+        if entry.prompt_id is None:
+            return None, STATUS_MISSING
+        if entry.server:
+            try:
+                status = prompt_status(entry.server, entry.prompt_id, timeout)
+            except Exception:
+                return entry.server, STATUS_UNKNOWN
+            return (None, status) if status == STATUS_MISSING else (entry.server, status)
+        unreachable = False
+        for server in servers:
+            try:
+                status = prompt_status(server, entry.prompt_id, timeout)
+            except Exception:
+                unreachable = True
+                continue
+            if status != STATUS_MISSING:
+                return server, status
+        return None, STATUS_UNKNOWN if unreachable else STATUS_MISSING
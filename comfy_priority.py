@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+대화형 작업과 배치 작업을 나눠 보내는 우선순위 스케줄러.
+설정 하나를 손으로 고쳐 가며 돌리는 작업이 스윕이 쌓아 둔 수백 개의 prompt 뒤에서 기다리지 않게 합니다.
+
+    scheduler = PriorityScheduler(pool, batch_window=2)
+    sweep = asyncio.gather(*(scheduler.generate(wf) for wf in workflows))     # 서버에는 batch_window개만
+    paths = await scheduler.generate(workflow, priority=INTERACTIVE)          # 대기 중인 배치보다 먼저
+    print(scheduler.report())
+
+- interactive: 바로 ComfyUI front 플래그로 제출 → 지금 실행 중인 prompt 하나만 기다림
+- batch: 클라이언트에서 붙잡아 두고 서버에는 batch_window개만 걸어 둠 (실행이 끝나면 다운로드 전에 다음 것을 보냄)
+- 등급별 지연(요청 → 결과 저장) p50/p95와 클라이언트에서 붙잡혀 있던 시간을 집계
+
+다른 프로세스가 돌리는 배치(run_comfy_api.py 등)는 PipelinedRunner의 in_flight가 같은 창 역할을 하므로,
+손으로 돌리는 쪽만 front로 보내도 됩니다 (run_character_pipeline.py 기본, generate_image(front=True)).
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import comfy_workflow as cw
+from comfy_telemetry import percentile
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+# 서버 큐에 걸어 둘 배치 prompt 수 (실행 중 1 + 대기 1이면 GPU가 쉬지 않음)
+BATCH_WINDOW = 2
+
+
+class _ClassStats:
+    """우선순위 등급 하나의 작업 수·실패 수·지연 기록."""
+
+    def __init__(self) -> None:
+        self.jobs = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+        self.held: List[float] = []
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": latencies[-1] if latencies else 0.0,
+            "held_p95": percentile(sorted(self.held), 95),
+        }
+
+
+class PriorityScheduler:
+    """
+    interactive 작업은 서버 큐 맨 앞에, batch 작업은 작은 창으로 흘려 보내는 스케줄러.
+
+    :param client: AsyncComfyPool 또는 AsyncComfyClient
+    :param batch_window: 서버에 걸어 둘 batch prompt 수. 나머지는 클라이언트에서 순서대로 기다림
+    :param save_dir: 결과 저장 폴더 (기본 OUTPUTS_DIR)
+    :param timeout: prompt 하나의 제출부터 완료까지 시간 상한(초)
+    :param output_mode: "history" 또는 "websocket"
+    """
+
+    def __init__(
+        self,
+        client: Union[cw.AsyncComfyPool, cw.AsyncComfyClient],
+        batch_window: int = BATCH_WINDOW,
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = cw.WS_RECV_TIMEOUT,
+        output_mode: str = "history",
+    ) -> None:
+        if batch_window < 1:
+            raise ValueError("batch_window는 1 이상이어야 합니다.")
+        self.client = client
+        self.batch_window = batch_window
+        self.save_dir = save_dir
+        self.timeout = timeout
+        self.output_mode = output_mode
+        self._batch = asyncio.Semaphore(batch_window)
+        # 클라이언트에서 붙잡혀 있는 batch 작업 수
+        self.held = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """통계를 초기화합니다."""
+        self.stats: Dict[str, _ClassStats] = {priority: _ClassStats() for priority in PRIORITIES}
+
+    async def _run(self, workflow: dict, front: bool, executed: Callable[[], None]) -> List[Path]:
+        """제출 → 완료 대기 → executed() → 결과 저장."""
+        if isinstance(self.client, cw.AsyncComfyPool):
+            server, prompt_id = await self.client.submit(workflow, self.output_mode, self.save_dir, front=front)
+            try:
+                await self.client.wait(server, prompt_id, self.timeout)
+            finally:
+                executed()
+            return await self.client.fetch_outputs(server, prompt_id, self.save_dir)
+        prompt_id = await self.client.submit(workflow, self.output_mode, self.save_dir, front=front)
+        try:
+            await self.client.wait(prompt_id, self.timeout)
+        finally:
+            executed()
+        return await self.client.fetch_outputs(prompt_id, self.save_dir)
+
+    async def generate(self, workflow: dict, priority: str = BATCH) -> List[Path]:
+        """
+        워크플로 하나를 priority 등급으로 실행하고 저장된 경로 목록을 반환합니다.
+        batch는 서버에 batch_window개가 걸려 있으면 자리가 날 때까지 기다렸다가 보냅니다.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority는 {PRIORITIES} 중 하나여야 합니다: {priority}")
+        stats = self.stats[priority]
+        stats.jobs += 1
+        started = time.perf_counter()
+        holding = priority == BATCH
+        if holding:
+            self.held += 1
+            try:
+                await self._batch.acquire()
+            finally:
+                self.held -= 1
+        held = time.perf_counter() - started
+
+        def executed() -> None:
+            # 실행이 끝나면 다운로드 전에 자리를 비워 다음 batch가 바로 들어가게 함 (제출 실패 시에도 한 번만)
+            nonlocal holding
+            if holding:
+                holding = False
+                self._batch.release()
+
+        try:
+            paths = await self._run(workflow, priority == INTERACTIVE, executed)
+        except BaseException:
+            stats.failed += 1
+            raise
+        finally:
+            executed()
+        stats.latencies.append(time.perf_counter() - started)
+        stats.held.append(held)
+        return paths
+
+    async def generate_many(
+        self,
+        workflows: Iterable[dict],
+        priority: str = BATCH,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """여러 워크플로를 같은 등급으로 실행합니다. 결과 순서는 입력 순서와 같음."""
+        return await asyncio.gather(
+            *(self.generate(wf, priority) for wf in workflows), return_exceptions=return_exceptions
+        )
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """등급별 {jobs, failed, p50, p95, max, held_p95} (지연은 요청부터 결과 저장까지, 초)."""
+        return {priority: stats.summary() for priority, stats in self.stats.items()}
+
+    def report(self) -> str:
+        """등급마다 한 줄 (작업·실패 수, 지연 p50/p95/최대, 클라이언트 대기 p95)."""
+        lines = []
+        for priority, entry in self.summary().items():
+            if not entry["jobs"]:
+                continue
+            lines.append(
+                f"{priority}: 작업 {entry['jobs']}개 (실패 {entry['failed']}개), "
+                f"지연 p50 {entry['p50']:.2f}s / p95 {entry['p95']:.2f}s / 최대 {entry['max']:.2f}s, "
+                f"클라이언트 대기 p95 {entry['held_p95']:.2f}s"
+            )
+        return "\n".join(lines)
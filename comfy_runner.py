@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+서버 큐에 prompt를 정확히 K개만 걸어 두는 파이프라인 실행기.
+GPU가 작업하는 동안 다음 작업의 빌드·업로드(prepare)와 끝난 작업의 결과 다운로드를 동시에 진행하므로,
+서버 큐를 넘치게 채우지 않으면서 GPU가 쉬지 않고, 제출한 모든 prompt의 결과를 받아 옵니다.
+
+    async with cw.AsyncComfyPool(servers) as pool:
+        runner = PipelinedRunner(pool, in_flight=2, save_dir="outputs")
+        async for item, result in runner.run(items, prepare=build_and_upload):
+            ...                      # result: 저장된 경로 목록 또는 예외
+        print(runner.report())
+
+단계
+1. prepare: 작업마다 워크플로를 만듦 (기준 이미지 업로드 등 블로킹 작업 포함 가능, 스레드에서 실행).
+   prefetch개까지 미리 준비해 두고 제출 순서는 입력 순서를 지킴
+2. 제출: 실행 중 + 대기 prompt가 in_flight개 미만일 때만 /prompt (캐시 적중·검사 실패는 제출하지 않음).
+   journal을 주면 이전 실행이 이미 받은 결과는 그대로 쓰고, 서버에 남은 prompt에는 다시 붙음
+3. 수집: 실행이 끝나면 바로 자리를 비워 다음 prompt를 넣고, 결과 다운로드는 그와 겹쳐 진행
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+import comfy_journal as journal_mod
+import comfy_workflow as cw
+from comfy_cache import ResultCache, workflow_hash
+from comfy_journal import JobJournal
+
+# 서버 큐에 동시에 걸어 두는 prompt 수 기본값 (실행 중 1개 + 바로 다음 1개면 GPU 공백이 없음)
+RUNNER_IN_FLIGHT = 2
+
+_DONE = object()
+
+
+class _Submitted(NamedTuple):
+    server: str
+    prompt_id: str
+    # 이전 실행이 넣은 prompt에 다시 붙음 (WebSocket 완료 메시지가 오지 않아 폴링으로 기다림)
+    reattached: bool = False
+
+
+def _workflow_of(item: Any) -> dict:
+    """prepare가 없을 때: 워크플로 자체이거나 .workflow 속성이 있는 작업(SweepJob 등)."""
+    return item if isinstance(item, dict) else item.workflow
+
+
+class PipelinedRunner:
+    """
+    작업 스트림을 서버 큐 깊이 in_flight로 흘려 보내고 끝나는 대로 (작업, 결과)를 내보냅니다.
+
+    :param client: AsyncComfyPool 또는 AsyncComfyClient
+    :param in_flight: 서버에 걸어 둘 prompt 수 K (실행 중 + 대기). 실행이 끝나면 다운로드 전에 자리를 비움
+    :param prefetch: 미리 준비해 둘 작업 수 (기본 in_flight)
+    :param save_dir: 결과 저장 폴더 (기본 OUTPUTS_DIR)
+    :param timeout: prompt 하나의 제출부터 완료까지 시간 상한(초). 넘기면 서버에서 취소해 다음 작업에 GPU를 넘김
+    :param cache: ResultCache (결과가 있는 작업은 제출하지 않음)
+    :param output_mode: "history" 또는 "websocket"
+    :param validator: 제출 전에 워크플로를 검사하는 callable (comfy_validate.WorkflowValidator 등)
+    :param journal: JobJournal. 제출·완료를 기록하고, 이전 실행이 넣은 prompt는 다시 보내지 않고 결과만 받음
+    """
+
+    def __init__(
+        self,
+        client: Union[cw.AsyncComfyPool, cw.AsyncComfyClient],
+        in_flight: int = RUNNER_IN_FLIGHT,
+        prefetch: Optional[int] = None,
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = cw.WS_RECV_TIMEOUT,
+        cache: Optional[ResultCache] = None,
+        output_mode: str = "history",
+        validator: Optional[Callable[[dict], None]] = None,
+        journal: Optional[JobJournal] = None,
+    ) -> None:
+        if in_flight < 1:
+            raise ValueError("in_flight는 1 이상이어야 합니다.")
+        if prefetch is not None and prefetch < 1:
+            raise ValueError("prefetch는 1 이상이어야 합니다.")
+        self.client = client
+        self.in_flight = in_flight
+        self.prefetch = in_flight if prefetch is None else prefetch
+        self.save_dir = Path(save_dir) if save_dir else cw.OUTPUTS_DIR
+        self.timeout = timeout
+        self.cache = cache
+        self.output_mode = output_mode
+        self.validator = validator
+        self.journal = journal
+        self.reset()
+
+    def reset(self) -> None:
+        """통계를 초기화합니다."""
+        self.submitted = 0
+        self.cached = 0
+        # 작업 기록으로 이어받은 작업: 이미 받은 결과 / 서버에 남아 있던 prompt
+        self.resumed = 0
+        self.reattached = 0
+        self.failed = 0
+        self.images = 0
+        self.peak_in_flight = 0
+        # 자리가 비었는데 다음 작업 준비가 덜 돼 기다린 시간 (prepare가 병목인지)
+        self.prepare_wait = 0.0
+        # 첫 제출 뒤 서버에 걸린 prompt가 하나도 없던 시간 (GPU가 놀았을 수 있는 시간)
+        self.starved = 0.0
+        self.elapsed = 0.0
+        self._active = 0
+        self._idle_since: Optional[float] = None
+
+    # -- 서버 큐 깊이 추적 -------------------------------------------------
+    def _enter(self) -> None:
+        if self._idle_since is not None:
+            self.starved += time.perf_counter() - self._idle_since
+            self._idle_since = None
+        self._active += 1
+        self.peak_in_flight = max(self.peak_in_flight, self._active)
+
+    def _leave(self) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self._idle_since = time.perf_counter()
+
+    def _servers(self) -> List[str]:
+        if isinstance(self.client, cw.AsyncComfyPool):
+            return list(self.client.pool.servers)
+        return [self.client.server]
+
+    def _recover(self, key: str) -> Union[None, List[Path], _Submitted]:
+        """
+        작업 기록에서 이전 실행의 결과나 서버에 남은 prompt를 찾습니다 (블로킹, 스레드에서 호출).
+        :return: 저장된 경로 목록, 다시 붙을 prompt, 또는 None(새로 제출)
+        :raises ConnectionError: 기록된 prompt의 서버가 응답하지 않을 때 (다시 제출하지 않고 기록도 그대로 둠)
+        """
+        entry = self.journal.get(key)
+        if entry is None or entry.state == journal_mod.FAILED:
+            return None
+        if entry.state == journal_mod.DONE and entry.outputs and all(
+            p.parent == self.save_dir and p.exists() for p in entry.outputs
+        ):
+            return entry.outputs
+        if self.output_mode != "history":
+            # websocket 모드 이미지는 이전 연결로만 전송되어 다시 받을 수 없음
+            return None
+        server, status = self.journal.locate(entry, self._servers())
+        if status == journal_mod.STATUS_UNKNOWN:
+            raise ConnectionError(
+                f"서버가 응답하지 않아 이전 prompt 상태를 알 수 없습니다 (prompt_id={entry.prompt_id}, "
+                f"server={entry.server or ', '.join(self._servers())}). 중복 실행을 막기 위해 다시 제출하지 않습니다."
+            )
+        if status not in journal_mod.LIVE_STATUSES:
+            return None
+        return _Submitted(server, entry.prompt_id, reattached=True)
+
+    async def _submit(self, workflow: dict, key: Optional[str]) -> _Submitted:
+        prompt_id = None
+        if self.journal is not None:
+            # 응답 전에 죽어도 다음 실행이 이 ID로 서버에서 찾을 수 있게 먼저 기록
+            prompt_id = str(uuid.uuid4())
+            await asyncio.to_thread(self.journal.submitting, key, prompt_id)
+        submitted = await self.client.submit(workflow, self.output_mode, self.save_dir, prompt_id=prompt_id)
+        if isinstance(self.client, cw.AsyncComfyPool):
+            result = _Submitted(*submitted)
+        else:
+            result = _Submitted(self.client.server, submitted)
+        if self.journal is not None:
+            await asyncio.to_thread(self.journal.queued, key, result.server, result.prompt_id)
+        return result
+
+    async def _wait(self, submitted: _Submitted) -> None:
+        if submitted.reattached:
+            await journal_mod.wait_prompt(submitted.server, submitted.prompt_id, timeout=self.timeout)
+        elif isinstance(self.client, cw.AsyncComfyPool):
+            await self.client.wait(submitted.server, submitted.prompt_id, timeout=self.timeout)
+        else:
+            await self.client.wait(submitted.prompt_id, timeout=self.timeout)
+
+    async def _fetch(self, submitted: _Submitted) -> List[Path]:
+        if submitted.reattached:
+            self.save_dir.mkdir(parents=True, exist_ok=True)
+            return await asyncio.to_thread(
+                cw.collect_outputs, submitted.server, submitted.prompt_id, self.save_dir, skip_existing=True
+            )
+        if isinstance(self.client, cw.AsyncComfyPool):
+            return await self.client.fetch_outputs(submitted.server, submitted.prompt_id, save_dir=self.save_dir)
+        return await self.client.fetch_outputs(submitted.prompt_id, self.save_dir)
+
+    async def run(
+        self,
+        items: Iterable[Any],
+        prepare: Optional[Callable[[Any], dict]] = None,
+    ) -> AsyncIterator[Tuple[Any, Union[List[Path], Exception]]]:
+        """
+        items를 순서대로 제출하고 끝나는 대로 (작업, 저장된 경로 목록 또는 예외)를 내보냅니다.
+        :param items: 작업 스트림 (필요할 때만 다음 항목을 꺼냄)
+        :param prepare: 작업 → 워크플로. 블로킹 함수여도 됨 (스레드에서 실행).
+            없으면 작업 자체를 워크플로로 보거나 작업의 .workflow를 씀
+        """
+        source = iter(items)
+        out: "asyncio.Queue[Any]" = asyncio.Queue()
+        slots = asyncio.Semaphore(self.in_flight)
+        # 다운로드 중인 작업까지 합친 상한: 다운로드가 실행보다 느려도 작업이 끝없이 쌓이지 않게
+        outstanding = asyncio.Semaphore(2 * self.in_flight)
+        tracking: Set[asyncio.Task] = set()
+        started = time.perf_counter()
+
+        async def track(item: Any, submitted: _Submitted, key: Optional[str]) -> None:
+            try:
+                try:
+                    await self._wait(submitted)
+                finally:
+                    self._leave()
+                    slots.release()
+                paths = await self._fetch(submitted)
+                if self.cache is not None:
+                    await asyncio.to_thread(self.cache.put, key, paths)
+                if self.journal is not None:
+                    await asyncio.to_thread(self.journal.done, key, paths)
+            except Exception as e:
+                self.failed += 1
+                # 시간 초과(취소 요청이 실패했을 수 있음)·연결 끊김은 prompt가 서버에 살아 있을 수 있으므로
+                # 다음 실행이 서버 상태를 보고 다시 붙거나 다시 제출하게 둠
+                if self.journal is not None and not isinstance(e, OSError):
+                    await asyncio.to_thread(self.journal.failed, key, e)
+                out.put_nowait((item, e))
+                return
+            finally:
+                outstanding.release()
+            self.images += len(paths)
+            out.put_nowait((item, paths))
+
+        async def feed() -> None:
+            ready: Deque[Tuple[Any, Optional[asyncio.Future]]] = deque()
+            exhausted = False
+            try:
+                while True:
+                    while not exhausted and len(ready) < self.prefetch:
+                        item = next(source, _DONE)
+                        if item is _DONE:
+                            exhausted = True
+                            break
+                        # prepare가 없으면 꺼낼 때 바로 워크플로를 얻으므로 태스크를 만들지 않음
+                        ready.append((item, None if prepare is None else asyncio.ensure_future(
+                            asyncio.to_thread(prepare, item))))
+                    if not ready:
+                        break
+                    item, prepared = ready.popleft()
+                    if prepared is not None and not prepared.done():
+                        # 서버 큐에 자리가 있는데 준비가 덜 된 경우만 준비 대기로 셈
+                        waited = None if slots.locked() else time.perf_counter()
+                        await asyncio.wait((prepared,))
+                        if waited is not None:
+                            self.prepare_wait += time.perf_counter() - waited
+                    key = None
+                    try:
+                        workflow = _workflow_of(item) if prepared is None else prepared.result()
+                        if self.cache is not None or self.journal is not None:
+                            key = workflow_hash(workflow)
+                        if self.cache is not None:
+                            hit = await asyncio.to_thread(self.cache.get, key, self.save_dir)
+                            if hit is not None:
+                                self.cached += 1
+                                out.put_nowait((item, hit))
+                                continue
+                        recovered = None
+                        if self.journal is not None:
+                            recovered = await asyncio.to_thread(self._recover, key)
+                        if isinstance(recovered, list):
+                            self.resumed += 1
+                            out.put_nowait((item, recovered))
+                            continue
+                        if self.validator is not None and recovered is None:
+                            # 스키마 첫 다운로드·새로 받기가 이벤트 루프(완료 대기·WebSocket 처리)를 막지 않게
+                            await asyncio.to_thread(self.validator, workflow)
+                    except Exception as e:
+                        self.failed += 1
+                        out.put_nowait((item, e))
+                        continue
+                    # 캐시 적중·검사 실패는 서버 큐 자리를 차지하지 않음
+                    await outstanding.acquire()
+                    await slots.acquire()
+                    if recovered is not None:
+                        # 이전 실행이 넣은 prompt: 서버 큐 자리를 차지한 것으로 보고 결과만 기다림
+                        submitted = recovered
+                        self.reattached += 1
+                        await asyncio.to_thread(self.journal.queued, key, submitted.server, submitted.prompt_id)
+                    else:
+                        try:
+                            submitted = await self._submit(workflow, key)
+                        except Exception as e:
+                            slots.release()
+                            outstanding.release()
+                            self.failed += 1
+                            if self.journal is not None and not isinstance(e, OSError):
+                                await asyncio.to_thread(self.journal.failed, key, e)
+                            out.put_nowait((item, e))
+                            continue
+                        self.submitted += 1
+                    self._enter()
+                    task = asyncio.ensure_future(track(item, submitted, key))
+                    tracking.add(task)
+                    task.add_done_callback(tracking.discard)
+            finally:
+                for _, task in ready:
+                    if task is not None:
+                        task.cancel()
+            if tracking:
+                await asyncio.wait(set(tracking))
+
+        feeder = asyncio.ensure_future(feed())
+        feeder.add_done_callback(lambda _: out.put_nowait(_DONE))
+        try:
+            while True:
+                got = await out.get()
+                if got is _DONE:
+                    break
+                yield got
+            # 작업 스트림 자체의 예외 (prepare·제출 실패는 결과로 나감)
+            feeder.result()
+        finally:
+            feeder.cancel()
+            for task in list(tracking):
+                task.cancel()
+            self.elapsed += time.perf_counter() - started
+            if self._idle_since is not None:
+                self._idle_since = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "cached": self.cached,
+            "resumed": self.resumed,
+            "reattached": self.reattached,
+            "failed": self.failed,
+            "images": self.images,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "prepare_wait": self.prepare_wait,
+            "starved": self.starved,
+            "elapsed": self.elapsed,
+        }
+
+    def report(self) -> str:
+        """한 줄 요약 (제출·캐시·이어받기·실패 수, 서버 큐 깊이, 준비 대기·서버 공백 시간)."""
+        rate = self.images / self.elapsed if self.elapsed else 0.0
+        resumed = ""
+        if self.journal is not None:
+            resumed = f"이어받음 {self.resumed}개, 다시 붙음 {self.reattached}개, "
+        return (
+            f"제출 {self.submitted}개, 캐시 {self.cached}개, {resumed}실패 {self.failed}개, 이미지 {self.images}장 "
+            f"({rate:.2f}장/s) | 큐 깊이 {self.in_flight} (최대 {self.peak_in_flight}), "
+            f"준비 대기 {self.prepare_wait:.1f}s, 서버 공백 {self.starved:.1f}s"
+        )
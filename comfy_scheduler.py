@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+체크포인트·VAE·LoRA 조합이 같은 작업끼리 모아 제출 순서를 바꾸는 스케줄러.
+ComfyUI는 직전 prompt와 로더 노드 입력이 같으면 모델을 다시 읽지 않으므로, 같은 모델 조합을 연달아
+보내면 SDXL 체크포인트 재로딩(수 초)이 줄어듭니다.
+
+    scheduler = AffinityScheduler(window=64, max_delay=32)
+    async for job, paths in sweep.iter_results(scheduler.order(plan.jobs()), pool):
+        ...
+    print(scheduler.report())
+
+- 작업 스트림을 window개까지 미리 읽어, 지금 올라간 모델 조합과 같은 작업을 먼저 내보냄
+- 같은 조합이 없으면 가장 오래 기다린 작업의 조합으로 바꿈
+- 공정성: 어떤 작업도 뒤에 들어온 작업에 max_delay번 넘게 추월당하지 않음
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+# 모델 조합이 바뀔 때 드는 재로딩 시간 추정값(초). TelemetryStore 기록이 있으면 reload_seconds_from()으로 대체
+RELOAD_SECONDS = {"CheckpointLoaderSimple": 8.0, "VAELoader": 1.0, "LoraLoader": 1.5}
+# 모델을 읽는 노드 클래스 → 조합을 구분하는 입력
+LOADER_INPUTS = {
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "VAELoader": ("vae_name",),
+    "LoraLoader": ("lora_name", "strength_model", "strength_clip"),
+}
+
+ModelKey = Tuple[Tuple[str, tuple], ...]
+
+
+def model_key(workflow: dict) -> ModelKey:
+    """
+    워크플로가 올리는 모델 조합 (체크포인트, VAE, LoRA 스택과 가중치).
+    노드 ID와 무관하게 같은 조합이면 같은 키가 나옵니다.
+    :return: ((로더 클래스, 입력값들), ...) 정렬된 튜플
+    """
+    loaders = []
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        cls = node.get("class_type")
+        names = LOADER_INPUTS.get(cls)
+        if names is None:
+            continue
+        inputs = node.get("inputs", {})
+        loaders.append((cls, tuple(_hashable(inputs.get(name)) for name in names)))
+    return tuple(sorted(loaders, key=repr))
+
+
+def _hashable(value: Any) -> Any:
+    # 연결 입력 (["4", 0])도 키에 넣을 수 있게 튜플로
+    return tuple(value) if isinstance(value, list) else value
+
+
+def reload_cost(previous: Optional[ModelKey], key: ModelKey, reload_seconds: Dict[str, float]) -> float:
+    """previous 조합에서 key 조합으로 바꿀 때 새로 읽어야 하는 로더들의 추정 시간(초)."""
+    if previous == key:
+        return 0.0
+    loaded = set(previous or ())
+    return sum(reload_seconds.get(cls, 0.0) for cls, values in key if (cls, values) not in loaded)
+
+
+def reload_seconds_from(store: Any, defaults: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    TelemetryStore에 쌓인 로더 노드의 실행 시간 중앙값(p50)으로 재로딩 시간 추정값을 만듭니다.
+    기록이 없는 로더는 defaults(기본 RELOAD_SECONDS) 값을 씁니다.
+    """
+    seconds = dict(RELOAD_SECONDS if defaults is None else defaults)
+    for cls in LOADER_INPUTS:
+        for entry in store.node_stats(by=(), class_type=cls):
+            if entry["runs"]:
+                seconds[cls] = entry["p50"]
+    return seconds
+
+
+class _Pending:
+    __slots__ = ("job", "key", "overtaken")
+
+    def __init__(self, job: Any, key: ModelKey) -> None:
+        self.job = job
+        self.key = key
+        self.overtaken = 0
+
+
+class AffinityScheduler:
+    """
+    작업(.workflow 속성이 있는 SweepJob/SweepBatch 등)의 스트림을 모델 조합 기준으로 재배열합니다.
+
+    :param window: 미리 읽어 둘 작업 수. 클수록 더 많이 모으지만 첫 제출까지 더 많이 읽음
+    :param max_delay: 작업 하나가 뒤에 들어온 작업에 추월당할 수 있는 최대 횟수 (공정성 상한)
+    :param reload_seconds: 로더 클래스별 재로딩 시간 추정값 (기본 RELOAD_SECONDS)
+    """
+
+    def __init__(
+        self,
+        window: int = 64,
+        max_delay: int = 32,
+        reload_seconds: Optional[Dict[str, float]] = None,
+    ) -> None:
+        if window < 1:
+            raise ValueError("window는 1 이상이어야 합니다.")
+        if max_delay < 0:
+            raise ValueError("max_delay는 0 이상이어야 합니다.")
+        self.window = window
+        self.max_delay = max_delay
+        self.reload_seconds = dict(RELOAD_SECONDS if reload_seconds is None else reload_seconds)
+        self.reset()
+
+    def reset(self) -> None:
+        """통계를 초기화합니다."""
+        self.jobs = 0
+        self.switches_before = 0
+        self.switches_after = 0
+        self.reload_before = 0.0
+        self.reload_after = 0.0
+        self.max_overtaken = 0
+
+    def order(self, jobs: Iterable[Any]) -> Iterator[Any]:
+        """
+        jobs를 재배열해 내보내는 제너레이터. 입력은 필요한 만큼만(최대 window개 앞까지) 읽습니다.
+        같은 모델 조합 안에서는 원래 순서를 유지합니다.
+        """
+        source = iter(jobs)
+        buffer: Deque[_Pending] = deque()
+        arrived_key: Optional[ModelKey] = None
+        current: Optional[ModelKey] = None
+        exhausted = False
+        while True:
+            while not exhausted and len(buffer) < self.window:
+                job = next(source, None)
+                if job is None:
+                    exhausted = True
+                    break
+                key = model_key(job.workflow)
+                # 원래 순서대로 보냈을 때의 재로딩 (비교용)
+                if key != arrived_key:
+                    if arrived_key is not None:
+                        self.switches_before += 1
+                    self.reload_before += reload_cost(arrived_key, key, self.reload_seconds)
+                    arrived_key = key
+                buffer.append(_Pending(job, key))
+            if not buffer:
+                return
+            chosen = self._pick(buffer, current)
+            if chosen.key != current:
+                if current is not None:
+                    self.switches_after += 1
+                self.reload_after += reload_cost(current, chosen.key, self.reload_seconds)
+                current = chosen.key
+            self.jobs += 1
+            yield chosen.job
+
+    def _pick(self, buffer: Deque[_Pending], current: Optional[ModelKey]) -> _Pending:
+        """다음에 보낼 작업을 골라 buffer에서 빼고, 그보다 먼저 들어온 작업들의 추월 횟수를 올립니다."""
+        oldest = buffer[0]
+        index = 0
+        if oldest.overtaken < self.max_delay and oldest.key != current:
+            for i, item in enumerate(buffer):
+                if item.key == current:
+                    index = i
+                    break
+        chosen = buffer[index]
+        del buffer[index]
+        for i in range(index):
+            buffer[i].overtaken += 1
+            if buffer[i].overtaken > self.max_overtaken:
+                self.max_overtaken = buffer[i].overtaken
+        return chosen
+
+    @property
+    def saved_seconds(self) -> float:
+        """원래 순서 대비 줄어든 재로딩 시간 추정값(초)."""
+        return self.reload_before - self.reload_after
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "switches_before": self.switches_before,
+            "switches_after": self.switches_after,
+            "reload_before": self.reload_before,
+            "reload_after": self.reload_after,
+            "saved_seconds": self.saved_seconds,
+            "max_overtaken": self.max_overtaken,
+        }
+
+    def report(self) -> str:
+        """한 줄 요약 (모델 교체 횟수, 추정 절약 시간)."""
+        return (
+            f"모델 교체 {self.switches_before}회 → {self.switches_after}회, "
+            f"재로딩 추정 {self.reload_before:.0f}s → {self.reload_after:.0f}s "
+            f"(약 {self.saved_seconds:.0f}s 절약, 작업 {self.jobs}개, 최대 추월 {self.max_overtaken}회)"
+        )
+
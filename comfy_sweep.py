@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+선언형 스윕(sweep) 계획: 설정 파일 × 시드 × 체크포인트 × LoRA 이름/가중치 × 샘플러 조합을
+제너레이터로 하나씩 펼쳐 바로 제출할 수 있는 워크플로로 만듭니다.
+
+- 설정 파일(및 LoRA 유무)마다 그래프는 한 번만 빌드하고(PreparedWorkflow),
+  조합마다 바뀌는 입력값만 채워 복사합니다.
+- 전체 조합을 리스트로 만들지 않으므로 백만 개짜리 스윕도 메모리가 일정하고 첫 작업을 곧바로 제출합니다.
+- 작업 번호(index) 기준으로 결정적으로 나눌 수 있어(shard) 여러 프로세스가 한 계획을 나눠 실행할 수 있습니다.
+
+    plan = SweepPlan.from_entries([
+        {"config": "configs/lora_test_bg_v2.json", "seeds": [800, 801, 802], "lora_weights": [0.3, 0.45]},
+    ])
+    for job in plan.jobs(shard=0, num_shards=2):
+        cw.generate_image(job.workflow)
+"""
+
+import itertools
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import comfy_workflow as cw
+import run_character_pipeline as pipeline
+from comfy_cache import ResultCache
+from comfy_graph import FusedWorkflow, fuse_workflows
+from comfy_journal import JobJournal
+from comfy_runner import PipelinedRunner
+
+ROOT_DIR = Path(__file__).resolve().parent
+# iter_results()가 서버 큐에 동시에 걸어 두는 최대 작업 수 기본값
+SWEEP_MAX_PENDING = 8
+# batch_by_seed()가 한 프롬프트에 묶는 latent 픽셀 수 상한 (512² 16장, 768² 7장, 1024² 4장)
+BATCH_MAX_PIXELS = 2048 * 2048
+# fuse_variants()가 prompt 하나에 합치는 최대 변형 수 기본값
+FUSE_MAX_BRANCHES = 4
+
+# 작업마다 바뀌는 플레이스홀더 (나머지는 설정 파일 단위로 고정)
+_BASE_VARIABLES = ("__SEED__", "__CKPT_NAME__", "__SAMPLER__")
+_LORA_VARIABLES = ("__LORA_NAME__", "__LORA_STRENGTH__")
+# LoraLoader(1001) 출력을 KSampler·CLIP 인코더에 연결, VAEDecode는 체크포인트 내장 VAE 사용
+_LORA_CONNECTIONS = [
+    {"from_node": "1001", "from_slot": 0, "to_node": "3", "to_input": "model"},
+    {"from_node": "1001", "from_slot": 1, "to_node": "6", "to_input": "clip"},
+    {"from_node": "1001", "from_slot": 1, "to_node": "7", "to_input": "clip"},
+    {"from_node": "4", "from_slot": 2, "to_node": "8", "to_input": "vae"},
+]
+_BASE_CONNECTIONS = [
+    {"from_node": "4", "from_slot": 2, "to_node": "8", "to_input": "vae"},
+]
+
+
+class SweepSpec(NamedTuple):
+    """
+    설정 파일 하나에 대한 스윕 축. 비어 있는 축은 설정 파일(base_character)의 값 하나를 씁니다.
+    loras에 None을 넣으면 LoRA 없는 조합도 만듭니다 (이때 lora_weights 축은 적용하지 않음).
+    """
+
+    config: Path
+    seeds: Sequence[int] = ()
+    checkpoints: Sequence[str] = ()
+    loras: Sequence[Optional[str]] = ()
+    lora_weights: Sequence[float] = ()
+    samplers: Sequence[str] = ()
+
+    @classmethod
+    def from_dict(cls, entry: dict, root: Optional[Path] = None) -> "SweepSpec":
+        """EXECUTION_PLAN 항목({"config": ..., "seeds": [...], ...})을 SweepSpec으로 바꿉니다."""
+        config = Path(entry["config"])
+        if not config.is_absolute():
+            config = (root or ROOT_DIR) / config
+        return cls(
+            config=config,
+            seeds=tuple(entry.get("seeds", ())),
+            checkpoints=tuple(entry.get("checkpoints", ())),
+            loras=tuple(entry.get("loras", ())),
+            lora_weights=tuple(entry.get("lora_weights", ())),
+            samplers=tuple(entry.get("samplers", ())),
+        )
+
+
+class SweepJob(NamedTuple):
+    """펼쳐진 작업 하나. index는 계획 전체에서의 순번 (shard와 무관하게 같음)."""
+
+    index: int
+    config: Path
+    workflow: dict
+    meta: dict
+
+
+class SweepBatch(NamedTuple):
+    """
+    시드만 다른 연속 작업을 EmptyLatentImage batch_size로 묶은 프롬프트 하나.
+    iter_results()는 결과를 다시 원래 작업별로 나눠 내보냅니다.
+    """
+
+    jobs: Tuple[SweepJob, ...]
+    workflow: dict
+
+    @property
+    def index(self) -> int:
+        return self.jobs[0].index
+
+    @property
+    def config(self) -> Path:
+        return self.jobs[0].config
+
+    def split(self, paths: List[Path]) -> List[Tuple[SweepJob, List[Path]]]:
+        """
+        배치 결과 경로를 원래 작업별로 나눕니다. 저장 노드마다 이미지가 배치 순서대로 오므로
+        j번째 경로는 배치 인덱스 j % N 작업의 것입니다. 메타데이터의 seed는 실제 KSampler 시드(배치 시드)이고,
+        요청한 시드는 requested_seed, 배치 안의 위치는 batch_index로 남깁니다.
+        배치 이미지는 배치 시드와 batch_index로 정해지므로 requested_seed는 이름일 뿐입니다.
+        seed_exact는 requested_seed 하나로 단독 실행해 같은 이미지가 나오는지 (배치 첫 장만 True)를 적습니다.
+        """
+        size = len(self.jobs)
+        batch_seed = self.jobs[0].meta.get("seed")
+        out = []
+        for i, job in enumerate(self.jobs):
+            meta = dict(
+                job.meta,
+                seed=batch_seed,
+                requested_seed=job.meta.get("seed"),
+                batch_index=i,
+                batch_size=size,
+                seed_exact=i == 0,
+            )
+            out.append((SweepJob(job.index, job.config, self.workflow, meta), paths[i::size]))
+        return out
+
+
+class SweepFusion(NamedTuple):
+    """
+    같은 설정 파일·체크포인트의 변형(LoRA 가중치, cfg, 샘플러 등) 작업들을 합친 prompt 하나.
+    공통 상류 노드(체크포인트 로더, 같은 프롬프트 인코딩 등)는 한 번만 실행되고 변형마다 KSampler부터 따로 돕니다.
+    iter_results()는 결과를 다시 원래 작업별로 나눠 내보냅니다.
+    """
+
+    jobs: Tuple[SweepJob, ...]
+    fused: FusedWorkflow
+
+    @property
+    def index(self) -> int:
+        return self.jobs[0].index
+
+    @property
+    def config(self) -> Path:
+        return self.jobs[0].config
+
+    @property
+    def workflow(self) -> dict:
+        return self.fused.workflow
+
+    def split(self, paths: List[Path]) -> List[Tuple[SweepJob, List[Path]]]:
+        """합친 결과 경로를 저장 노드 filename_prefix의 변형 번호로 나눕니다. 메타데이터에 fused_index/fused_size를 남깁니다."""
+        size = len(self.jobs)
+        out = []
+        for i, (job, job_paths) in enumerate(zip(self.jobs, self.fused.split(paths))):
+            out.append((job._replace(meta=dict(job.meta, fused_index=i, fused_size=size)), job_paths))
+        return out
+
+
+class SweepPlan:
+    """
+    SweepSpec 목록을 작업 스트림으로 펼칩니다. 순서는 설정 파일 → 체크포인트 → LoRA/가중치 → 샘플러 → 시드
+    (시드가 가장 안쪽)라서 같은 체크포인트 작업이 연달아 나와 모델 재로딩이 줄어듭니다.
+
+    :param specs: SweepSpec 목록
+    :param defaults: base_character에 값이 없을 때 쓸 기본값 (steps, cfg, width, lora_weight 등)
+    :param lora_defaults: LoRA를 쓰는 조합에만 defaults 위에 덮어쓸 기본값 (예: {"steps": 30})
+    :param lora_aliases: 설정 파일의 lora_name → 서버에 실제로 있는 파일명
+    :param prefix: 파일명 접두사 앞에 붙일 문자열 (예: "proto_")
+    :param negative_default: 설정 파일에 negative_prompt가 없을 때 쓸 값
+    """
+
+    def __init__(
+        self,
+        specs: Iterable[SweepSpec],
+        defaults: Optional[Dict[str, Any]] = None,
+        lora_defaults: Optional[Dict[str, Any]] = None,
+        lora_aliases: Optional[Dict[str, str]] = None,
+        prefix: str = "",
+        negative_default: str = "",
+    ) -> None:
+        self.specs = list(specs)
+        self.defaults = dict(defaults or {})
+        self.lora_defaults = dict(lora_defaults or {})
+        self.lora_aliases = dict(lora_aliases or {})
+        self.prefix = prefix
+        self.negative_default = negative_default
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Iterable[dict],
+        root: Optional[Path] = None,
+        **kwargs: Any,
+    ) -> "SweepPlan":
+        """EXECUTION_PLAN 형식의 딕셔너리 목록으로 계획을 만듭니다. kwargs는 __init__과 같음."""
+        return cls([SweepSpec.from_dict(entry, root) for entry in entries], **kwargs)
+
+    def with_specs(self, specs: Iterable[SweepSpec]) -> "SweepPlan":
+        """기본값·LoRA 별칭·접두사는 그대로 두고 specs만 바꾼 계획 (예: 예산에 맞춰 시드를 줄일 때)."""
+        return type(self)(
+            specs,
+            defaults=self.defaults,
+            lora_defaults=self.lora_defaults,
+            lora_aliases=self.lora_aliases,
+            prefix=self.prefix,
+            negative_default=self.negative_default,
+        )
+
+    def _base(self, config: dict, with_lora: bool = False) -> dict:
+        defaults = {**self.defaults, **self.lora_defaults} if with_lora else self.defaults
+        return {**defaults, **config.get("base_character", {})}
+
+    def _axes(self, spec: SweepSpec, base: dict) -> Tuple[list, list, list, list]:
+        seeds = list(spec.seeds) or [base.get("seed", 42)]
+        checkpoints = list(spec.checkpoints) or [base.get("ckpt_name")]
+        samplers = list(spec.samplers) or [base.get("sampler_name", "dpmpp_2m")]
+        weights = list(spec.lora_weights) or [base.get("lora_weight", 0.7)]
+        loras = []
+        for name in list(spec.loras) or [base.get("lora_name")]:
+            if name:
+                loras.extend((name, weight) for weight in weights)
+            else:
+                loras.append((None, None))
+        return checkpoints, loras, samplers, seeds
+
+    def count(self) -> int:
+        """전체 작업 수. 설정 파일만 읽고 워크플로는 만들지 않습니다."""
+        total = 0
+        for spec in self.specs:
+            axes = self._axes(spec, self._base(pipeline.load_config(spec.config)))
+            n = 1
+            for axis in axes:
+                n *= len(axis)
+            total += n
+        return total
+
+    def _prepare(self, spec: SweepSpec, config: dict, with_lora: bool) -> Tuple[cw.PreparedWorkflow, dict]:
+        """설정 파일 + LoRA 유무 하나에 대한 (PreparedWorkflow, 공통 메타데이터)."""
+        if config.get("base_image"):
+            raise ValueError("img2img(base_image) 설정은 스윕으로 만들 수 없습니다. run_character_pipeline을 사용하세요.")
+        base = self._base(config, with_lora)
+        prompt = pipeline.build_prompt_from_config(config)
+        negative = config.get("negative_prompt", self.negative_default)
+        meta = {
+            "config": spec.config.name,
+            "prompt": prompt,
+            "negative_prompt": negative,
+            "steps": base.get("steps", 30),
+            "cfg": base.get("cfg", 7.0),
+            "scheduler": base.get("scheduler", "karras"),
+            "resolution": f"{base.get('width', 1024)}x{base.get('height', 1024)}",
+        }
+        placeholders = {
+            "__PROMPT__": prompt,
+            "__NEGATIVE__": negative,
+            "__FILENAME_PREFIX__": f"{self.prefix}{pipeline.build_filename_prefix(config)}",
+            "__WIDTH__": base.get("width", 1024),
+            "__HEIGHT__": base.get("height", 1024),
+            "__STEPS__": base.get("steps", 30),
+            "__CFG__": base.get("cfg", 7.0),
+            "__SCHEDULER__": base.get("scheduler", "karras"),
+        }
+        if with_lora:
+            placeholders["__MODEL_INPUT__"] = ["4", 0]
+            placeholders["__CLIP_INPUT__"] = ["4", 1]
+            wf_config = {
+                "modes": ["pixel_character", "lora_loader"],
+                "placeholders": placeholders,
+                "connections": _LORA_CONNECTIONS,
+                "optimize": True,  # 빌드한 그대로 제출하므로 안 쓰는 노드를 정리
+            }
+            return cw.prepare_workflow(wf_config, _BASE_VARIABLES + _LORA_VARIABLES), meta
+        wf_config = {
+            "modes": ["pixel_character"],
+            "placeholders": placeholders,
+            "connections": _BASE_CONNECTIONS,
+            "optimize": True,
+        }
+        return cw.prepare_workflow(wf_config, _BASE_VARIABLES), meta
+
+    def jobs(self, shard: int = 0, num_shards: int = 1) -> Iterator[SweepJob]:
+        """
+        작업을 하나씩 만들어 내보내는 제너레이터.
+        :param shard: 이 프로세스가 맡을 조각 번호 (0부터)
+        :param num_shards: 전체 조각 수. index % num_shards == shard인 작업만 만듭니다.
+        """
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"shard는 0 이상 {num_shards} 미만이어야 합니다: {shard}")
+        index = -1
+        for spec in self.specs:
+            config = pipeline.load_config(spec.config)
+            base = self._base(config)
+            checkpoints, loras, samplers, seeds = self._axes(spec, base)
+            prepared: Dict[bool, Tuple[cw.PreparedWorkflow, dict]] = {}
+            for ckpt, (lora, weight), sampler, seed in itertools.product(checkpoints, loras, samplers, seeds):
+                index += 1
+                if index % num_shards != shard:
+                    continue
+                with_lora = lora is not None
+                if with_lora not in prepared:
+                    prepared[with_lora] = self._prepare(spec, config, with_lora)
+                template, common = prepared[with_lora]
+                target_lora = self.lora_aliases.get(lora, lora) if with_lora else None
+                workflow = template.fill(
+                    {
+                        "__SEED__": seed,
+                        "__CKPT_NAME__": ckpt,
+                        "__SAMPLER__": sampler,
+                        "__LORA_NAME__": target_lora,
+                        "__LORA_STRENGTH__": weight,
+                    }
+                )
+                meta = dict(
+                    common,
+                    ckpt_name=ckpt,
+                    seed=seed,
+                    sampler=sampler,
+                    lora_name=target_lora or "NONE",
+                    lora_weight=weight if with_lora else config.get("base_character", {}).get("lora_weight", 0.0),
+                )
+                yield SweepJob(index, spec.config, workflow, meta)
+
+    def __iter__(self) -> Iterator[SweepJob]:
+        return self.jobs()
+
+
+def _batch_key(job: SweepJob) -> tuple:
+    return job.config, sorted((k, repr(v)) for k, v in job.meta.items() if k != "seed")
+
+
+def batch_by_seed(
+    jobs: Iterable[SweepJob],
+    max_batch: int = 4,
+    max_pixels: int = BATCH_MAX_PIXELS,
+) -> Iterator[Union[SweepJob, SweepBatch]]:
+    """
+    연속된 작업 중 시드만 다른 것들을 최대 max_batch개씩 SweepBatch로 묶습니다 (지연 처리).
+    묶을 수 없는 작업(EmptyLatentImage 없음, 혼자 남은 작업)은 그대로 내보냅니다.
+    배치의 둘째 장부터는 요청한 시드로 단독 실행한 결과와 다른 이미지이므로, 시드로 결과를 재현해야 하는
+    스윕에서는 쓰지 마세요 (스크립트의 --batch는 기본 꺼짐, 결과 메타데이터 seed_exact 참고).
+    :param max_pixels: width × height × 배치 크기 상한. 고해상도에서 VRAM 초과를 막습니다.
+    """
+    group: List[SweepJob] = []
+    key: Any = None
+    limit = 1
+
+    def flush() -> Union[SweepJob, SweepBatch]:
+        if len(group) == 1:
+            return group[0]
+        return SweepBatch(tuple(group), cw.make_seed_batch(group[0].workflow, len(group)))
+
+    for job in jobs:
+        job_key = _batch_key(job)
+        if group and (job_key != key or len(group) >= limit):
+            yield flush()
+            group = []
+        if not group:
+            key = job_key
+            size = cw.latent_size(job.workflow)
+            limit = max(1, min(max_batch, max_pixels // (size[0] * size[1]))) if size else 1
+        group.append(job)
+    if group:
+        yield flush()
+
+
+def _fuse_key(job: SweepJob) -> tuple:
+    return job.config, job.meta.get("ckpt_name")
+
+
+def fuse_variants(
+    jobs: Iterable[Union[SweepJob, SweepBatch]],
+    max_branches: int = FUSE_MAX_BRANCHES,
+) -> Iterator[Union[SweepJob, SweepBatch, SweepFusion]]:
+    """
+    연속된 작업 중 설정 파일과 체크포인트가 같은 것들을 최대 max_branches개씩 SweepFusion으로 합칩니다 (지연 처리).
+    N번의 /prompt 대신 한 번만 보내고, 서버는 공통 노드를 한 번만 실행합니다.
+    SweepBatch와 혼자 남은 작업은 그대로 내보냅니다.
+    """
+    group: List[SweepJob] = []
+    key: Any = None
+
+    def flush() -> Union[SweepJob, SweepFusion]:
+        if len(group) == 1:
+            return group[0]
+        return SweepFusion(tuple(group), fuse_workflows([job.workflow for job in group]))
+
+    for job in jobs:
+        if isinstance(job, SweepBatch):
+            if group:
+                yield flush()
+                group = []
+            yield job
+            continue
+        job_key = _fuse_key(job)
+        if group and (job_key != key or len(group) >= max_branches):
+            yield flush()
+            group = []
+        if not group:
+            key = job_key
+        group.append(job)
+    if group:
+        yield flush()
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """"1/4" 형식을 (1, 4)로 바꿉니다. 명령줄 --shard 인자용."""
+    try:
+        shard, num_shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard는 'i/n' 형식이어야 합니다: {text!r}") from None
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"shard는 0 이상 {num_shards} 미만이어야 합니다: {text!r}")
+    return shard, num_shards
+
+
+async def iter_results(
+    jobs: Iterable[Union[SweepJob, SweepBatch, SweepFusion]],
+    client: Union[cw.AsyncComfyPool, cw.AsyncComfyClient],
+    save_dir: Optional[Union[str, Path]] = None,
+    max_pending: int = SWEEP_MAX_PENDING,
+    timeout: Optional[float] = cw.WS_RECV_TIMEOUT,
+    cache: Optional[ResultCache] = None,
+    output_mode: str = "history",
+    validator: Optional[Callable[[dict], None]] = None,
+    journal: Optional[JobJournal] = None,
+) -> AsyncIterator[Tuple[SweepJob, Union[List[Path], Exception]]]:
+    """
+    jobs를 순서대로 제출하되 서버에는 최대 max_pending개만 걸어 두고,
+    끝나는 대로 (job, 저장된 경로 목록 또는 예외)를 내보냅니다.
+    jobs는 필요할 때만 다음 항목을 꺼내므로 제너레이터를 그대로 넘기면 됩니다.
+    SweepBatch/SweepFusion은 원래 작업별 (job, 경로)로 나눠 내보냅니다.
+    cache를 주면 결과가 이미 있는 작업은 제출하지 않고 캐시된 경로를 바로 내보냅니다.
+    output_mode="websocket"이면 이미지를 /view 대신 WebSocket으로 받습니다.
+    validator(예: comfy_validate.WorkflowValidator)를 주면 캐시에 없는 작업을 제출하기 전에 검사하고,
+    실패한 작업은 서버에 보내지 않고 그 예외(WorkflowValidationError)를 결과로 내보냅니다.
+    journal(comfy_journal.JobJournal)을 주면 제출·완료를 기록해, 스크립트가 죽었다 다시 실행될 때
+    이미 받은 결과는 그대로 쓰고 서버에 남은 prompt에는 다시 붙어 결과만 받습니다.
+    """
+    if max_pending < 1:
+        raise ValueError("max_pending은 1 이상이어야 합니다.")
+
+    def expand(job: Union[SweepJob, SweepBatch, SweepFusion], result: Any) -> List[Tuple[SweepJob, Any]]:
+        if not isinstance(job, (SweepBatch, SweepFusion)):
+            return [(job, result)]
+        if isinstance(result, Exception):
+            return [(member, result) for member in job.jobs]
+        return job.split(result)
+
+    # 스키마를 받은 뒤 검사는 마이크로초 단위라 러너가 이벤트 루프에서 바로 호출
+    runner = PipelinedRunner(
+        client,
+        in_flight=max_pending,
+        save_dir=save_dir,
+        timeout=timeout,
+        cache=cache,
+        output_mode=output_mode,
+        validator=validator,
+        journal=journal,
+    )
+    results = runner.run(jobs)
+    try:
+        async for job, result in results:
+            for item in expand(job, result):
+                yield item
+    finally:
+        # 호출한 쪽이 중간에 멈추면 걸어 둔 대기 작업도 정리
+        await results.aclose()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+서버 /history의 새 결과만 받아 오는 증분 동기화.
+전체 /history를 매번 받으면 서버 기록이 쌓일수록 느려지므로, 이미 본 prompt_id를 커서로 저장해 두고
+/history?max_items=N으로 최근 기록만 조회합니다. 새 결과 이미지는 여러 개를 동시에 받고,
+원하면 받은 기록을 서버에서 지워(prune) 다음 조회를 작게 유지합니다.
+
+    sync = HistorySync("outputs", prune=True)
+    for server in cw.servers_from_env():
+        print(sync.sync(server))
+
+- 조회: 최근 page개부터 시작해, 범위에 본 prompt가 들어올 때까지 4배씩 넓혀 다시 조회하고 그 뒤에 끝난 기록만 받음 (history_after, 최대 SYNC_MAX_PAGE, 넘으면 전체)
+- 다운로드 실패한 prompt는 다음 실행에서 /history/{prompt_id}로 하나씩 다시 확인
+- 커서: .comfy_sync.json (서버별 최근 SYNC_REMEMBER개 prompt_id)
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import comfy_workflow as cw
+
+SYNC_STATE = Path(__file__).resolve().parent / ".comfy_sync.json"
+# 첫 조회에서 가져오는 최근 기록 수
+SYNC_PAGE = 32
+# 이보다 넓혀야 하면 전체 /history를 받음
+SYNC_MAX_PAGE = 4096
+# 서버마다 기억하는 본 prompt_id 수 (ComfyUI 기본 기록 상한 10000보다 넉넉히)
+SYNC_REMEMBER = 20000
+# 동시에 받는 이미지 수
+SYNC_WORKERS = 8
+# 서버 기록 삭제 요청 한 번에 넣는 prompt 수
+PRUNE_CHUNK = 256
+
+
+def entry_images(entry: dict, folder_types: Iterable[str] = ("output",)) -> List[dict]:
+    """history 항목의 결과 이미지 정보 목록 (folder_types에 해당하는 것만, PreviewImage의 temp는 기본 제외)."""
+    # ComfyUI 버전에 따라 "outputs" 또는 "output"
+    outputs = entry.get("outputs") or entry.get("output") or {}
+    types = set(folder_types)
+    return [
+        img
+        for node_out in outputs.values()
+        if isinstance(node_out, dict)
+        for img in node_out.get("images") or []
+        if img.get("type", "output") in types
+    ]
+
+
+def entry_failed(entry: dict) -> bool:
+    return (entry.get("status") or {}).get("status_str") == "error"
+
+
+def history_after(server: str, seen: Iterable[str], page: int = SYNC_PAGE) -> Dict[str, dict]:
+    """
+    seen 중 가장 최근 prompt 뒤에 끝난 기록 (오래된 것부터, seen에 있는 것은 뺌).
+    조회 범위에 seen이 들어올 때까지 page부터 4배씩 넓힘 (SYNC_MAX_PAGE를 넘으면 전체).
+    seen이 서버 기록에 하나도 없으면 전부 새 기록으로 봅니다.
+    """
+    seen = seen if isinstance(seen, (set, frozenset)) else set(seen)
+    size = page
+    while True:
+        history = cw.get_recent_history(server, size)
+        if len(history) < size or any(pid in seen for pid in history):
+            break
+        if size >= SYNC_MAX_PAGE:
+            history = cw.get_recent_history(server)
+            break
+        size *= 4
+    ids = list(history)
+    start = 0
+    for index in range(len(ids) - 1, -1, -1):
+        if ids[index] in seen:
+            start = index + 1
+            break
+    return {pid: history[pid] for pid in ids[start:] if pid not in seen}
+
+
+class HistorySync:
+    """
+    서버별 커서를 유지하며 /history의 새 결과를 save_dir로 받습니다.
+
+    :param save_dir: 결과 저장 폴더
+    :param state_path: 커서 파일 (기본 .comfy_sync.json). None이면 저장하지 않음 (매번 최근 page개부터)
+    :param prune: True면 결과를 모두 받은 prompt의 기록을 서버에서 지움 (실패한 prompt 기록은 남김)
+    :param workers: 동시에 받는 이미지 수
+    :param page: 첫 조회의 max_items
+    :param folder_types: 받을 이미지 종류 (기본 "output"만, "temp"는 미리보기)
+    """
+
+    def __init__(
+        self,
+        save_dir: Union[str, Path],
+        state_path: Optional[Union[str, Path]] = SYNC_STATE,
+        prune: bool = False,
+        workers: int = SYNC_WORKERS,
+        page: int = SYNC_PAGE,
+        folder_types: Iterable[str] = ("output",),
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers는 1 이상이어야 합니다.")
+        if page < 1:
+            raise ValueError("page는 1 이상이어야 합니다.")
+        self.save_dir = Path(save_dir)
+        self.state_path = Path(state_path) if state_path is not None else None
+        self.prune = prune
+        self.workers = workers
+        self.page = page
+        self.folder_types = tuple(folder_types)
+        self._state: Dict[str, Dict[str, List[str]]] = self._load()
+
+    # -- 커서 ---------------------------------------------------------------
+    def _load(self) -> Dict[str, Dict[str, List[str]]]:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # 깨진 커서는 버리고 최근 기록부터 다시 (이미 받은 파일은 크기 비교로 건너뜀)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self) -> None:
+        """커서를 임시 파일에 쓴 뒤 교체해 중간에 죽어도 깨지지 않게 저장합니다."""
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.state_path)
+
+    def _server_state(self, server: str) -> Dict[str, List[str]]:
+        state = self._state.setdefault(server.rstrip("/"), {})
+        state.setdefault("seen", [])
+        state.setdefault("retry", [])
+        return state
+
+    def reset(self, server: Optional[str] = None) -> None:
+        """커서를 지웁니다 (server가 없으면 전부). 다음 sync()는 최근 기록부터 다시 확인합니다."""
+        if server is None:
+            self._state.clear()
+        else:
+            self._state.pop(server.rstrip("/"), None)
+
+    # -- 조회 ---------------------------------------------------------------
+    def _new_history(self, server: str, seen: set) -> Dict[str, dict]:
+        """본 것 중 가장 최근 prompt 뒤에 끝난 기록 (history_after와 같은 규칙). 받지 못한 것은 _retry_history가 맡음."""
+        return history_after(server, seen, self.page)
+
+    def _retry_history(self, server: str, prompt_ids: Iterable[str]) -> Dict[str, dict]:
+        """지난번에 받지 못한 prompt를 /history/{prompt_id}로 하나씩 조회합니다. 기록이 사라졌으면 뺍니다."""
+        found = {}
+        for pid in prompt_ids:
+            entry = cw.get_history(server, pid).get(pid)
+            if entry is not None:
+                found[pid] = entry
+        return found
+
+    # -- 동기화 -------------------------------------------------------------
+    def sync(self, server: str, prompt_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        server의 새 결과를 받습니다.
+        :param prompt_ids: 주면 커서와 무관하게 이 prompt들만 /history/{prompt_id}로 조회해 받음
+        :return: {"server", "entries", "files", "downloaded", "errors", "failed", "pruned"} 요약
+            (files: 새 prompt들의 결과 경로, downloaded: 그중 이번에 새로 받은 경로 (같은 파일이 있으면 건너뜀),
+            errors: 실행이 실패한 prompt 수, failed: 다운로드에 실패해 다음에 다시 볼 prompt 수)
+        """
+        server = server.rstrip("/")
+        state = self._server_state(server)
+        seen = set(state["seen"])
+        if prompt_ids is not None:
+            entries = self._retry_history(server, prompt_ids)
+        else:
+            entries = self._new_history(server, seen)
+            retry = [pid for pid in state["retry"] if pid not in entries]
+            entries.update(self._retry_history(server, retry))
+
+        downloads: List[Tuple[str, dict]] = []
+        errors: List[str] = []
+        for pid, entry in entries.items():
+            if entry_failed(entry):
+                errors.append(pid)
+                continue
+            downloads.extend((pid, img) for img in entry_images(entry, self.folder_types))
+
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+
+        def download(item: Tuple[str, dict]) -> Optional[Tuple[Path, bool]]:
+            _, img = item
+            dest = self.save_dir / img["filename"]
+            before = dest.stat().st_mtime_ns if dest.exists() else None
+            try:
+                cw.download_image(
+                    server,
+                    img["filename"],
+                    dest,
+                    subfolder=img.get("subfolder", ""),
+                    folder_type=img.get("type", "output"),
+                    skip_existing=True,
+                )
+            except Exception:
+                return None
+            return dest, dest.stat().st_mtime_ns != before
+
+        results: List[Optional[Tuple[Path, bool]]] = []
+        if downloads:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(downloads))) as executor:
+                results = list(executor.map(download, downloads))
+        incomplete = {pid for (pid, _), got in zip(downloads, results) if got is None}
+        synced = [pid for pid in entries if pid not in incomplete and pid not in errors]
+
+        done = [pid for pid in entries if pid not in incomplete and pid not in seen]
+        state["seen"] = (state["seen"] + done)[-SYNC_REMEMBER:]
+        # 다시 조회한 prompt는 받았거나 서버 기록에서 사라졌으므로 빼고, 이번에 못 받은 것만 남김
+        kept = [] if prompt_ids is None else [pid for pid in state["retry"] if pid not in entries]
+        state["retry"] = kept + [pid for pid in entries if pid in incomplete]
+
+        pruned = 0
+        if self.prune and synced:
+            for i in range(0, len(synced), PRUNE_CHUNK):
+                cw.delete_history(server, synced[i:i + PRUNE_CHUNK])
+            pruned = len(synced)
+        self.save()
+        return {
+            "server": server,
+            "entries": len(entries),
+            "files": [got[0] for got in results if got is not None],
+            "downloaded": [got[0] for got in results if got is not None and got[1]],
+            "errors": len(errors),
+            "failed": len(incomplete),
+            "pruned": pruned,
+        }
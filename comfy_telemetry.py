@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 이벤트 기반 노드별 실행 시간·캐시 적중 기록.
+ComfyUI는 노드 실행을 시작할 때마다 executing(node=ID)를 보내므로, 다음 executing까지의 시간을
+그 노드의 실행 시간으로 봅니다. execution_cached로 건너뛴 노드는 0초·캐시 적중으로 남깁니다.
+
+- 기록: TelemetryStore (SQLite, 여러 프로세스가 같은 파일을 써도 됨)
+- 연결: generate_image(..., telemetry=store), AsyncComfyClient/AsyncComfyPool(..., telemetry=store)
+- 집계: python comfy_telemetry.py [--by ckpt,resolution,sampler] → 노드 클래스별 p50/p95
+"""
+
+import argparse
+import math
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+TELEMETRY_DB = Path(__file__).resolve().parent / ".comfy_telemetry.sqlite3"
+# 집계 시 묶을 수 있는 작업 속성
+GROUP_FIELDS = ("ckpt", "resolution", "sampler")
+# 완료 메시지를 못 받은 prompt를 메모리에서 버리는 시간(초)
+TRACE_TTL = 6 * 3600
+
+
+def workflow_dimensions(workflow: dict) -> Dict[str, str]:
+    """
+    집계용 작업 속성 (체크포인트, 해상도, 샘플러)을 워크플로에서 뽑습니다. 없으면 빈 문자열.
+    :return: {"ckpt": ..., "resolution": "512x512", "sampler": "euler/normal"}
+    """
+    ckpts: List[str] = []
+    resolution = sampler = ""
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        cls = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if cls == "CheckpointLoaderSimple" and isinstance(inputs.get("ckpt_name"), str):
+            if inputs["ckpt_name"] not in ckpts:
+                ckpts.append(inputs["ckpt_name"])
+        elif cls == "EmptyLatentImage" and not resolution:
+            width, height = inputs.get("width"), inputs.get("height")
+            if isinstance(width, int) and isinstance(height, int):
+                resolution = f"{width}x{height}"
+        elif cls in ("KSampler", "KSamplerAdvanced") and not sampler:
+            name = inputs.get("sampler_name")
+            if isinstance(name, str):
+                scheduler = inputs.get("scheduler")
+                sampler = f"{name}/{scheduler}" if isinstance(scheduler, str) else name
+    return {"ckpt": ",".join(ckpts), "resolution": resolution, "sampler": sampler}
+
+
+def latent_batch(workflow: dict) -> int:
+    """EmptyLatentImage의 batch_size (prompt 하나가 만드는 이미지 수). 없거나 숫자가 아니면 1."""
+    for node in workflow.values():
+        if isinstance(node, dict) and node.get("class_type") == "EmptyLatentImage":
+            size = node.get("inputs", {}).get("batch_size")
+            if isinstance(size, int) and size > 0:
+                return size
+    return 1
+
+
+class PromptTrace:
+    """
+    prompt 하나의 WebSocket 이벤트 타임스탬프.
+    feed(msg)에 해당 prompt의 메시지를 순서대로 넣으면 노드별 (시간, 캐시 여부, 스텝 수)를 모읍니다.
+
+    :param prompt_id: 추적할 prompt ID
+    :param workflow: 제출한 워크플로 (노드 ID → class_type, 집계 속성)
+    :param server: 서버 URL (기록용)
+    :param queued: 제출 시각 (기본 지금). 큐 대기 시간 = execution_start - queued
+    """
+
+    def __init__(self, prompt_id: str, workflow: dict, server: str = "", queued: Optional[float] = None) -> None:
+        self.prompt_id = prompt_id
+        self.server = server
+        self.class_types = {
+            node_id: node.get("class_type", "")
+            for node_id, node in workflow.items()
+            if isinstance(node, dict)
+        }
+        self.dimensions = workflow_dimensions(workflow)
+        self.batch = latent_batch(workflow)
+        self.queued = time.time() if queued is None else queued
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.status = "pending"
+        # node_id → [시간(초), 캐시 여부, 스텝 수]
+        self.nodes: Dict[str, List[Any]] = {}
+        self._current: Optional[str] = None
+        self._current_start = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    def _close_current(self, at: float) -> None:
+        if self._current is not None:
+            entry = self.nodes.setdefault(self._current, [0.0, False, None])
+            entry[0] += at - self._current_start
+            self._current = None
+
+    def feed(self, msg: dict, at: Optional[float] = None) -> None:
+        """WebSocket JSON 메시지 하나를 반영합니다. at은 수신 시각 (기본 지금)."""
+        at = time.time() if at is None else at
+        kind = msg.get("type")
+        data = msg.get("data", {})
+        if kind == "execution_start":
+            self.started = at
+            self.status = "running"
+        elif kind == "execution_cached":
+            for node_id in data.get("nodes", []):
+                self.nodes[str(node_id)] = [0.0, True, None]
+        elif kind == "executing":
+            node_id = data.get("node")
+            self._close_current(at)
+            if node_id is None:
+                self.finished = at
+                if self.status in ("pending", "running"):
+                    self.status = "success"
+            else:
+                if self.started is None:
+                    self.started = at
+                self._current = str(node_id)
+                self._current_start = at
+        elif kind == "progress":
+            node_id = data.get("node") or self._current
+            if node_id is not None and isinstance(data.get("max"), int):
+                entry = self.nodes.setdefault(str(node_id), [0.0, False, None])
+                entry[2] = data["max"]
+        elif kind in ("execution_error", "execution_interrupted"):
+            self._close_current(at)
+            self.status = "error" if kind == "execution_error" else "interrupted"
+            self.finished = at
+
+    def rows(self) -> List[Tuple[str, str, float, bool, Optional[int]]]:
+        """(node_id, class_type, 시간, 캐시 여부, 스텝 수) 목록."""
+        return [
+            (node_id, self.class_types.get(node_id, ""), seconds, cached, steps)
+            for node_id, (seconds, cached, steps) in self.nodes.items()
+        ]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """정렬된 값의 nearest-rank 백분위수 (q는 0~100)."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class TelemetryStore:
+    """
+    prompt별 노드 실행 시간과 캐시 적중을 SQLite에 쌓습니다.
+
+        store = TelemetryStore()
+        cw.generate_image(workflow, telemetry=store)
+        for row in store.node_stats(by=("ckpt",)):
+            print(row)
+
+    begin()으로 추적을 시작하고 observe()에 WebSocket 메시지를 넣으면, 완료 메시지를 받을 때 기록합니다.
+    observe()는 WebSocket 수신 스레드에서 불러도 됩니다.
+
+    :param path: SQLite 파일 (기본 .comfy_telemetry.sqlite3)
+    """
+
+    def __init__(self, path: Union[str, Path] = TELEMETRY_DB) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._traces: Dict[str, PromptTrace] = {}
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prompts ("
+                " prompt_id TEXT PRIMARY KEY,"
+                " server TEXT NOT NULL,"
+                " ckpt TEXT NOT NULL,"
+                " resolution TEXT NOT NULL,"
+                " sampler TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " queued REAL NOT NULL,"
+                " started REAL,"
+                " finished REAL NOT NULL,"
+                " batch INTEGER NOT NULL DEFAULT 1)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(prompts)")}
+            if "batch" not in columns:
+                # 배치 크기 열이 없던 파일: 기존 기록은 한 장짜리로 봄 (다른 프로세스가 먼저 추가했으면 무시)
+                try:
+                    self._db.execute("ALTER TABLE prompts ADD COLUMN batch INTEGER NOT NULL DEFAULT 1")
+                except sqlite3.OperationalError:
+                    pass
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                " prompt_id TEXT NOT NULL,"
+                " node_id TEXT NOT NULL,"
+                " class_type TEXT NOT NULL,"
+                " seconds REAL NOT NULL,"
+                " cached INTEGER NOT NULL,"
+                " steps INTEGER,"
+                " PRIMARY KEY (prompt_id, node_id))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS prompts_finished ON prompts(finished)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def begin(
+        self, prompt_id: str, workflow: dict, server: str = "", queued: Optional[float] = None
+    ) -> PromptTrace:
+        """prompt 추적을 시작합니다. 제출 직전(또는 직후 메시지를 읽기 전)에 부르세요."""
+        trace = PromptTrace(prompt_id, workflow, server, queued)
+        with self._lock:
+            self._traces[prompt_id] = trace
+            self._expire(trace.queued)
+        return trace
+
+    def rename(self, old_id: str, new_id: str) -> None:
+        """서버가 다른 prompt_id를 발급했을 때 추적 중인 항목의 ID를 바꿉니다."""
+        with self._lock:
+            trace = self._traces.pop(old_id, None)
+            if trace is not None:
+                trace.prompt_id = new_id
+                self._traces[new_id] = trace
+
+    def discard(self, prompt_id: str) -> None:
+        """제출 실패 등으로 더 추적하지 않을 prompt를 버립니다."""
+        with self._lock:
+            self._traces.pop(prompt_id, None)
+
+    def _expire(self, now: float) -> None:
+        stale = [pid for pid, trace in self._traces.items() if now - trace.queued > TRACE_TTL]
+        for pid in stale:
+            del self._traces[pid]
+
+    def observe(self, msg: dict) -> None:
+        """WebSocket 메시지를 해당 prompt의 추적에 반영하고, 끝났으면 기록합니다."""
+        data = msg.get("data")
+        if not isinstance(data, dict):
+            return
+        prompt_id = data.get("prompt_id")
+        with self._lock:
+            trace = self._traces.get(prompt_id) if prompt_id else None
+        if trace is None:
+            return
+        trace.feed(msg)
+        if trace.done:
+            self.record(trace)
+
+    def record(self, trace: PromptTrace) -> None:
+        """끝난 prompt의 추적 결과를 저장합니다."""
+        dims = trace.dimensions
+        with self._lock, self._db:
+            self._traces.pop(trace.prompt_id, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO prompts"
+                " (prompt_id, server, ckpt, resolution, sampler, status, queued, started, finished, batch)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    trace.prompt_id, trace.server, dims["ckpt"], dims["resolution"], dims["sampler"],
+                    trace.status, trace.queued, trace.started, trace.finished or time.time(), trace.batch,
+                ),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO nodes (prompt_id, node_id, class_type, seconds, cached, steps)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(trace.prompt_id, n, cls, sec, int(cached), steps) for n, cls, sec, cached, steps in trace.rows()],
+            )
+
+    def node_stats(
+        self,
+        by: Sequence[str] = GROUP_FIELDS,
+        since: Optional[float] = None,
+        class_type: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        노드 클래스별 실행 시간 분포를 by 속성으로 나눠 집계합니다 (성공한 prompt만).
+        캐시 적중 노드는 횟수만 세고 시간 분포에서는 뺍니다.
+        :param by: GROUP_FIELDS 중 나눌 속성
+        :param since: 이 시각(epoch 초) 이후에 끝난 prompt만
+        :param class_type: 이 노드 클래스만
+        :return: [{속성..., class_type, runs, cached, p50, p95, mean, total}] (total 내림차순)
+        """
+        unknown = [field for field in by if field not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"by는 {GROUP_FIELDS} 중에서 골라야 합니다: {unknown}")
+        sql = (
+            "SELECT " + "".join(f"p.{field}, " for field in by)
+            + "n.class_type, n.seconds, n.cached FROM nodes n JOIN prompts p USING (prompt_id)"
+            " WHERE p.status = 'success'"
+        )
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND p.finished >= ?"
+            params.append(since)
+        if class_type is not None:
+            sql += " AND n.class_type = ?"
+            params.append(class_type)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+
+        groups: Dict[tuple, Tuple[List[float], List[int]]] = {}
+        for row in rows:
+            key = row[: len(by) + 1]
+            seconds, cached = row[-2], row[-1]
+            durations, hits = groups.setdefault(key, ([], [0]))
+            if cached:
+                hits[0] += 1
+            else:
+                durations.append(seconds)
+        stats = []
+        for key, (durations, hits) in groups.items():
+            durations.sort()
+            entry: Dict[str, Any] = dict(zip(list(by) + ["class_type"], key))
+            entry.update(
+                runs=len(durations),
+                cached=hits[0],
+                p50=percentile(durations, 50),
+                p95=percentile(durations, 95),
+                mean=sum(durations) / len(durations) if durations else 0.0,
+                total=sum(durations),
+            )
+            stats.append(entry)
+        stats.sort(key=lambda entry: entry["total"], reverse=True)
+        return stats
+
+    def cache_summary(self, since: Optional[float] = None) -> Dict[str, int]:
+        """since 이후 끝난 prompt의 기록된 노드 수와 그중 execution_cached로 건너뛴 노드 수."""
+        sql = (
+            "SELECT COUNT(DISTINCT p.prompt_id), COUNT(n.node_id), COALESCE(SUM(n.cached), 0)"
+            " FROM prompts p JOIN nodes n USING (prompt_id)"
+        )
+        params: List[Any] = []
+        if since is not None:
+            sql += " WHERE p.finished >= ?"
+            params.append(since)
+        with self._lock:
+            prompts, nodes, cached = self._db.execute(sql, params).fetchone()
+        return {"prompts": prompts, "nodes": nodes, "cached": cached}
+
+    def prompt_stats(self, since: Optional[float] = None) -> Dict[str, Any]:
+        """prompt 단위 큐 대기·실행 시간 p50/p95 (성공한 prompt만)."""
+        sql = "SELECT queued, started, finished FROM prompts WHERE status = 'success' AND started IS NOT NULL"
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND finished >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        waits = sorted(max(0.0, started - queued) for queued, started, _ in rows)
+        runs = sorted(finished - started for _, started, finished in rows)
+        return {
+            "prompts": len(rows),
+            "queue_p50": percentile(waits, 50),
+            "queue_p95": percentile(waits, 95),
+            "run_p50": percentile(runs, 50),
+            "run_p95": percentile(runs, 95),
+        }
+
+    def node_runs(self, class_types: Sequence[str], since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        class_types 노드가 실제로 실행된 기록 (캐시 적중 제외, 성공한 prompt만). 비용 모델 학습용.
+        :return: [{ckpt, resolution, sampler, batch, class_type, seconds, steps}] (steps는 progress를 못 받았으면 None)
+        """
+        if not class_types:
+            return []
+        sql = (
+            "SELECT p.ckpt, p.resolution, p.sampler, p.batch, n.class_type, n.seconds, n.steps"
+            " FROM nodes n JOIN prompts p USING (prompt_id)"
+            " WHERE p.status = 'success' AND n.cached = 0"
+            " AND n.class_type IN (" + ", ".join("?" for _ in class_types) + ")"
+        )
+        params: List[Any] = list(class_types)
+        if since is not None:
+            sql += " AND p.finished >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        fields = ("ckpt", "resolution", "sampler", "batch", "class_type", "seconds", "steps")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def prompt_runs(self, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        성공한 prompt별 실행 시간(execution_start → 완료)과 그중 노드 실행 시간 합.
+        :return: [{prompt_id, ckpt, resolution, sampler, batch, seconds, node_seconds}] (끝난 순서)
+        """
+        sql = (
+            "SELECT p.prompt_id, p.ckpt, p.resolution, p.sampler, p.batch, p.finished - p.started,"
+            " COALESCE(SUM(n.seconds), 0) FROM prompts p LEFT JOIN nodes n USING (prompt_id)"
+            " WHERE p.status = 'success' AND p.started IS NOT NULL"
+        )
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND p.finished >= ?"
+            params.append(since)
+        sql += " GROUP BY p.prompt_id ORDER BY p.finished"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        fields = ("prompt_id", "ckpt", "resolution", "sampler", "batch", "seconds", "node_seconds")
+        return [dict(zip(fields, row)) for row in rows]
+
+
+def format_report(stats: List[Dict[str, Any]], by: Sequence[str]) -> str:
+    """node_stats() 결과를 표로 만듭니다."""
+    headers = list(by) + ["class_type", "runs", "cached", "p50(s)", "p95(s)", "total(s)"]
+    lines = [
+        [str(entry[field]) or "-" for field in list(by) + ["class_type"]]
+        + [
+            str(entry["runs"]),
+            str(entry["cached"]),
+            f"{entry['p50']:.3f}",
+            f"{entry['p95']:.3f}",
+            f"{entry['total']:.1f}",
+        ]
+        for entry in stats
+    ]
+    widths = [max(len(h), *(len(line[i]) for line in lines)) if lines else len(h) for i, h in enumerate(headers)]
+    out = [headers, ["-" * w for w in widths]] + lines
+    return "\n".join("  ".join(cell.ljust(w) for cell, w in zip(line, widths)).rstrip() for line in out)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="노드별 실행 시간 p50/p95 집계")
+    parser.add_argument("--db", type=Path, default=TELEMETRY_DB, help="텔레메트리 SQLite 파일")
+    parser.add_argument(
+        "--by",
+        default=",".join(GROUP_FIELDS),
+        help=f"나눌 속성 (쉼표 구분, {','.join(GROUP_FIELDS)} 중. 빈 문자열이면 노드 클래스만)",
+    )
+    parser.add_argument("--class", dest="class_type", help="이 노드 클래스만 (예: KSampler)")
+    parser.add_argument("--hours", type=float, help="최근 N시간 안에 끝난 prompt만")
+    args = parser.parse_args(argv)
+    if not args.db.exists():
+        print(f"텔레메트리 기록 없음: {args.db}")
+        return 1
+    by = [field.strip() for field in args.by.split(",") if field.strip()]
+    since = time.time() - args.hours * 3600 if args.hours else None
+    store = TelemetryStore(args.db)
+    try:
+        try:
+            stats = store.node_stats(by=by, since=since, class_type=args.class_type)
+        except ValueError as e:
+            print(e)
+            return 2
+        summary = store.prompt_stats(since=since)
+    finally:
+        store.close()
+    print(
+        f"prompt {summary['prompts']}개 | 큐 대기 p50 {summary['queue_p50']:.2f}s p95 {summary['queue_p95']:.2f}s"
+        f" | 실행 p50 {summary['run_p50']:.2f}s p95 {summary['run_p95']:.2f}s"
+    )
+    print(format_report(stats, by))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
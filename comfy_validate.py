@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+서버의 /object_info 스키마로 워크플로를 큐에 넣기 전에 검사합니다.
+잘못된 출력 슬롯(cw.connect(workflow, "4", "8", "vae", 2)의 2 등), 없는 체크포인트, 잘못된 샘플러 이름은
+원래 /prompt 왕복이나 모델 로딩이 끝난 뒤에야 드러나지만, 여기서는 로컬에서 바로 잡습니다.
+
+    validator = WorkflowValidator(["http://127.0.0.1:8188"])
+    validator(workflow)            # 문제가 있으면 WorkflowValidationError
+    validator.checkpoints          # 서버에 있는 체크포인트 목록 (/models/checkpoints 대신)
+
+- 스키마는 서버마다 한 번 받아 .comfy_schema/에 (서버, ComfyUI 버전)별로 저장하고, 다음 실행부터는
+  /system_stats로 버전만 확인해 디스크에서 읽음 (SCHEMA_MAX_AGE가 지나면 다시 받음)
+- 검사: 노드 클래스, 입력 이름, 필수 입력, 값 타입·범위, 선택지(샘플러·스케줄러·모델 파일 목록),
+  연결 대상 노드·출력 슬롯 번호·출력 타입
+- 모델 파일 목록은 서버에 파일을 추가해도 버전이 바뀌지 않으므로, 저장된 스키마로 검사가 실패하면
+  한 번 새로 받아 다시 검사함
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import requests
+
+import comfy_workflow as cw
+from comfy_graph import optimize_workflow
+
+SCHEMA_DIR = Path(__file__).resolve().parent / ".comfy_schema"
+# 저장된 스키마를 다시 받기까지의 시간(초). 버전이 바뀌면 이와 무관하게 새로 받음
+SCHEMA_MAX_AGE = 24 * 3600
+
+
+class WorkflowValidationError(ValueError):
+    """워크플로가 서버 스키마와 맞지 않을 때 발생합니다. problems에 문제 목록이 있습니다."""
+
+    def __init__(self, problems: Sequence[str]) -> None:
+        self.problems = list(problems)
+        super().__init__("워크플로 검사 실패:\n  " + "\n  ".join(self.problems))
+
+
+class InputSpec(NamedTuple):
+    """
+    노드 입력 하나의 스키마.
+    - type: "INT"/"FLOAT"/"STRING"/"BOOLEAN"/"COMBO" 또는 연결 타입 ("MODEL", "IMAGE,MASK" …)
+    - choices: COMBO의 선택지 (업로드 파일 목록처럼 수시로 바뀌는 선택지는 None → 검사하지 않음)
+    """
+
+    type: str
+    choices: Optional[FrozenSet[Any]]
+    minimum: Optional[float]
+    maximum: Optional[float]
+
+
+class NodeSpec(NamedTuple):
+    inputs: Dict[str, InputSpec]
+    required: FrozenSet[str]
+    hidden: FrozenSet[str]
+    outputs: Tuple[str, ...]
+    # 결과를 내는 노드 (/object_info의 output_node). comfy_graph.optimize_workflow가 여기서부터 남길 노드를 찾음
+    output_node: bool = False
+
+
+def _compile_input(raw: Any) -> InputSpec:
+    kind = raw[0] if isinstance(raw, (list, tuple)) and raw else raw
+    opts = raw[1] if isinstance(raw, (list, tuple)) and len(raw) > 1 and isinstance(raw[1], dict) else {}
+    if isinstance(kind, list):
+        # 예전 형식: 선택지 목록이 타입 자리에 옴
+        choices: Optional[FrozenSet[Any]] = frozenset(_hashable(c) for c in kind)
+        kind = "COMBO"
+    elif kind == "COMBO":
+        choices = frozenset(_hashable(c) for c in opts.get("options", ()))
+    else:
+        choices = None
+    if opts.get("image_upload") or opts.get("remote"):
+        # 업로드할 때마다 늘어나는 목록이라 저장된 스키마로는 판단할 수 없음
+        choices = None
+    return InputSpec(str(kind), choices, opts.get("min"), opts.get("max"))
+
+
+def _hashable(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def compile_object_info(info: Dict[str, Any]) -> Dict[str, NodeSpec]:
+    """/object_info 응답을 검사용 NodeSpec 딕셔너리로 바꿉니다."""
+    specs = {}
+    for cls, entry in info.items():
+        sections = entry.get("input", {}) or {}
+        inputs = {}
+        for section in ("required", "optional"):
+            for name, raw in (sections.get(section) or {}).items():
+                inputs[name] = _compile_input(raw)
+        specs[cls] = NodeSpec(
+            inputs=inputs,
+            required=frozenset(sections.get("required") or ()),
+            hidden=frozenset(sections.get("hidden") or ()),
+            outputs=tuple(str(t) for t in entry.get("output", ())),
+            output_node=bool(entry.get("output_node")),
+        )
+    return specs
+
+
+def _merge_specs(first: NodeSpec, second: NodeSpec) -> NodeSpec:
+    """두 서버의 같은 클래스 스키마를 합칩니다 (선택지는 합집합 → 어느 서버에든 있으면 통과)."""
+    inputs = dict(first.inputs)
+    for name, spec in second.inputs.items():
+        mine = inputs.get(name)
+        if mine is not None and mine.choices is not None and spec.choices is not None:
+            spec = spec._replace(choices=mine.choices | spec.choices)
+        inputs[name] = spec
+    return NodeSpec(
+        inputs,
+        first.required & second.required,
+        first.hidden | second.hidden,
+        first.outputs,
+        first.output_node or second.output_node,
+    )
+
+
+def _types_match(produced: str, expected: str) -> bool:
+    if "*" in (produced, expected) or produced == expected:
+        return True
+    # "IMAGE,MASK"처럼 여러 타입을 받는 입력
+    return bool(set(produced.split(",")) & set(expected.split(",")))
+
+
+def _is_link(value: Any) -> bool:
+    # 대상 노드가 없어도 [숫자 문자열 ID, 슬롯] 모양이면 연결로 보고 대상을 검사함
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and value[0].isdigit()
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_value(spec: InputSpec, value: Any) -> Optional[str]:
+    """값 입력 하나를 검사해 문제 설명(없으면 None)을 반환합니다."""
+    kind = spec.type
+    if kind == "COMBO":
+        if spec.choices is not None and _hashable(value) not in spec.choices:
+            shown = sorted(map(str, spec.choices))[:8]
+            return f"{value!r}은(는) 선택지에 없습니다 (예: {', '.join(shown)})"
+        return None
+    if kind == "INT":
+        if not isinstance(value, int) or isinstance(value, bool):
+            return f"정수가 필요합니다: {value!r}"
+    elif kind == "FLOAT":
+        if not _is_number(value):
+            return f"숫자가 필요합니다: {value!r}"
+    elif kind == "STRING":
+        return None if isinstance(value, str) else f"문자열이 필요합니다: {value!r}"
+    elif kind == "BOOLEAN":
+        return None if isinstance(value, bool) else f"True/False가 필요합니다: {value!r}"
+    else:
+        return f"{kind} 타입은 다른 노드 출력과 연결해야 합니다: {value!r}"
+    if spec.minimum is not None and value < spec.minimum:
+        return f"{value}은(는) 최솟값 {spec.minimum}보다 작습니다"
+    if spec.maximum is not None and value > spec.maximum:
+        return f"{value}은(는) 최댓값 {spec.maximum}보다 큽니다"
+    return None
+
+
+class ObjectInfo:
+    """
+    서버 하나(또는 여러 서버를 합친) /object_info 스키마.
+    :param info: /object_info 응답 (클래스 이름 → 노드 정의)
+    :param version: ComfyUI 버전 (저장 파일 이름에 씀)
+    :param fetched_at: 서버에서 받은 시각 (time.time())
+    """
+
+    def __init__(self, info: Dict[str, Any], version: str = "unknown", fetched_at: Optional[float] = None) -> None:
+        self.version = version
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.specs = compile_object_info(info)
+
+    @classmethod
+    def merged(cls, infos: Sequence["ObjectInfo"]) -> "ObjectInfo":
+        """여러 서버 스키마를 합친 ObjectInfo (한 서버에만 있는 클래스·선택지도 통과)."""
+        merged = cls({}, version="+".join(info.version for info in infos))
+        merged.fetched_at = min((info.fetched_at for info in infos), default=merged.fetched_at)
+        for info in infos:
+            for name, spec in info.specs.items():
+                mine = merged.specs.get(name)
+                merged.specs[name] = spec if mine is None else _merge_specs(mine, spec)
+        return merged
+
+    def choices(self, class_type: str, input_name: str) -> List[Any]:
+        """COMBO 입력의 선택지 목록 (예: choices("KSampler", "sampler_name")). 없으면 빈 목록."""
+        spec = self.specs.get(class_type)
+        entry = spec.inputs.get(input_name) if spec else None
+        return sorted(entry.choices, key=str) if entry and entry.choices is not None else []
+
+    @property
+    def checkpoints(self) -> List[str]:
+        """CheckpointLoaderSimple이 고를 수 있는 체크포인트 파일 목록."""
+        return self.choices("CheckpointLoaderSimple", "ckpt_name")
+
+    @property
+    def output_classes(self) -> FrozenSet[str]:
+        """결과를 내는 노드 클래스 (output_node). 커스텀 저장·비디오 노드도 포함."""
+        return frozenset(name for name, spec in self.specs.items() if spec.output_node)
+
+    def optimize(self, workflow: dict) -> Dict[str, Optional[str]]:
+        """
+        서버 스키마의 output_node로 comfy_graph.optimize_workflow를 적용합니다 (기본 클래스 목록 대신).
+        서버에 없는 클래스의 노드는 지우지 않습니다. build_workflow의 "optimize"를 켜지 않은 워크플로에 쓰세요.
+        :return: optimize_workflow() 결과
+        """
+        return optimize_workflow(workflow, self.output_classes, frozenset(self.specs))
+
+    def problems(self, workflow: dict) -> List[str]:
+        """
+        워크플로의 문제 목록 (없으면 빈 목록). 서버에 보내지 않고 스키마만으로 검사합니다.
+        """
+        found = []
+        specs = self.specs
+        for node_id, node in workflow.items():
+            if not isinstance(node, dict):
+                found.append(f"{node_id}: 노드가 딕셔너리가 아닙니다")
+                continue
+            cls = node.get("class_type")
+            spec = specs.get(cls)
+            if spec is None:
+                found.append(f"{node_id}: 서버에 없는 노드 클래스 {cls!r}")
+                continue
+            inputs = node.get("inputs", {})
+            for name in spec.required:
+                if name not in inputs:
+                    found.append(f"{node_id}({cls}).{name}: 필수 입력이 없습니다")
+            for name, value in inputs.items():
+                entry = spec.inputs.get(name)
+                if entry is None:
+                    if name not in spec.hidden:
+                        found.append(f"{node_id}({cls}).{name}: 없는 입력 이름 (입력: {', '.join(spec.inputs)})")
+                    continue
+                if _is_link(value):
+                    problem = self._check_link(workflow, value, entry)
+                else:
+                    problem = _check_value(entry, value)
+                if problem:
+                    found.append(f"{node_id}({cls}).{name}: {problem}")
+        return found
+
+    def _check_link(self, workflow: dict, value: list, entry: InputSpec) -> Optional[str]:
+        source_id, slot = value
+        source = workflow.get(source_id)
+        if not isinstance(source, dict):
+            return f"없는 노드 {source_id}를 참조합니다"
+        source_spec = self.specs.get(source.get("class_type"))
+        if source_spec is None:
+            return None  # 원본 노드 쪽에서 이미 보고됨
+        outputs = source_spec.outputs
+        if not isinstance(slot, int) or not 0 <= slot < len(outputs):
+            return f"{source_id}({source['class_type']})의 출력 슬롯 {slot}이(가) 없습니다 (출력: {list(outputs)})"
+        produced = outputs[slot]
+        if entry.type == "COMBO" or _types_match(produced, entry.type):
+            return None
+        return f"{source_id}({source['class_type']}) 출력 {slot}은(는) {produced}인데 {entry.type}이(가) 필요합니다"
+
+    def validate(self, workflow: dict) -> None:
+        """문제가 있으면 WorkflowValidationError를 일으킵니다."""
+        found = self.problems(workflow)
+        if found:
+            raise WorkflowValidationError(found)
+
+    # -- 디스크 저장 -----------------------------------------------------
+    def save(self, path: Path, info: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        payload = {"version": self.version, "fetched_at": self.fetched_at, "object_info": info}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ObjectInfo":
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        return cls(payload["object_info"], payload.get("version", "unknown"), payload.get("fetched_at"))
+
+
+# ---------------------------------------------------------------------------
+# 서버에서 받기 (디스크 캐시)
+# ---------------------------------------------------------------------------
+def server_version(server: str, timeout: float = cw.REQUEST_TIMEOUT) -> str:
+    """/system_stats의 ComfyUI 버전. 버전을 알려 주지 않는 서버면 "unknown"."""
+    stats = cw.get_client(server).get_json("/system_stats", timeout=timeout)
+    version = (stats.get("system") or {}).get("comfyui_version")
+    return str(version) if version else "unknown"
+
+
+def schema_path(server: str, version: str, cache_dir: Union[str, Path] = SCHEMA_DIR) -> Path:
+    """(서버, 버전)별 스키마 저장 경로."""
+    digest = hashlib.sha1(server.rstrip("/").encode("utf-8")).hexdigest()[:12]
+    safe_version = re.sub(r"[^A-Za-z0-9._-]", "_", version)
+    return Path(cache_dir) / f"{digest}_{safe_version}.json"
+
+
+def load_object_info(
+    server: str = cw.DEFAULT_SERVER,
+    cache_dir: Union[str, Path] = SCHEMA_DIR,
+    max_age: float = SCHEMA_MAX_AGE,
+    refresh: bool = False,
+    timeout: float = cw.REQUEST_TIMEOUT,
+) -> ObjectInfo:
+    """
+    서버의 /object_info 스키마를 반환합니다. 같은 버전의 저장본이 max_age보다 새것이면 디스크에서 읽고,
+    아니면(또는 refresh=True) 서버에서 받아 저장합니다.
+    :raises requests.exceptions.RequestException: 서버에 연결할 수 없을 때
+    """
+    version = server_version(server, timeout=timeout)
+    path = schema_path(server, version, cache_dir)
+    if not refresh and path.exists():
+        try:
+            info = ObjectInfo.load(path)
+            if time.time() - info.fetched_at <= max_age:
+                return info
+        except (OSError, ValueError, KeyError):
+            pass  # 깨진 저장본은 새로 받음
+    raw = cw.get_client(server).get_json("/object_info", timeout=timeout)
+    info = ObjectInfo(raw, version)
+    info.save(path, raw)
+    return info
+
+
+class WorkflowValidator:
+    """
+    여러 서버의 스키마를 합쳐 워크플로를 검사하는 호출 가능한 객체 (comfy_sweep.iter_results(validator=)에 넘김).
+    스키마는 처음 쓸 때 받습니다. 저장된 스키마로 검사가 실패하면 서버에서 한 번 새로 받아 다시 검사합니다
+    (그 사이 서버에 추가된 체크포인트·LoRA 때문에 틀리게 실패하지 않도록).
+    응답하지 않는 서버는 빼고 응답한 서버의 스키마만 합치며, 그 서버는 max_age 동안 다시 묻지 않습니다.
+    블로킹 호출이므로 이벤트 루프에서는 asyncio.to_thread로 부르세요.
+
+    :param servers: 서버 주소 또는 목록
+    :param cache_dir: 스키마 저장 폴더 (기본 .comfy_schema/)
+    :param max_age: 저장본 유효 시간(초)
+    """
+
+    def __init__(
+        self,
+        servers: Union[str, Iterable[str]] = cw.DEFAULT_SERVER,
+        cache_dir: Union[str, Path] = SCHEMA_DIR,
+        max_age: float = SCHEMA_MAX_AGE,
+    ) -> None:
+        self.servers = [servers] if isinstance(servers, str) else list(servers)
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self._info: Optional[ObjectInfo] = None
+        self._created = time.time()
+        self._lock = threading.RLock()
+        # 스키마를 받지 못한 서버 → 실패 시각 (max_age가 지날 때까지 다시 묻지 않음)
+        self._failed: Dict[str, float] = {}
+
+    def _load(self, refresh: bool) -> ObjectInfo:
+        """
+        응답하는 서버의 스키마만 합칩니다.
+        :raises requests.exceptions.ConnectionError: 스키마를 받을 수 있는 서버가 하나도 없을 때
+        """
+        infos = []
+        error: Optional[Exception] = None
+        for server in self.servers:
+            with self._lock:
+                failed_at = self._failed.get(server)
+            if failed_at is not None and time.time() - failed_at < self.max_age:
+                continue
+            try:
+                infos.append(load_object_info(server, self.cache_dir, self.max_age, refresh=refresh))
+            except requests.exceptions.RequestException as e:
+                error = e
+                with self._lock:
+                    self._failed[server] = time.time()
+                continue
+            with self._lock:
+                self._failed.pop(server, None)
+        if not infos:
+            raise requests.exceptions.ConnectionError(
+                f"/object_info를 받을 수 있는 서버가 없습니다: {', '.join(self.servers)}"
+            ) from error
+        return infos[0] if len(infos) == 1 else ObjectInfo.merged(infos)
+
+    def _retry_due(self) -> bool:
+        """스키마에서 빠진 서버 중 다시 물어볼 때가 된 서버가 있는지."""
+        now = time.time()
+        with self._lock:
+            return any(now - failed_at >= self.max_age for failed_at in self._failed.values())
+
+    @property
+    def info(self) -> ObjectInfo:
+        with self._lock:
+            if self._info is None:
+                self._info = self._load(refresh=False)
+            return self._info
+
+    def refresh(self) -> ObjectInfo:
+        """스키마를 서버에서 새로 받습니다."""
+        info = self._load(refresh=True)
+        with self._lock:
+            self._info = info
+        return info
+
+    @property
+    def checkpoints(self) -> List[str]:
+        """어느 서버에든 있는 체크포인트 파일 목록."""
+        return self.info.checkpoints
+
+    def problems(self, workflow: dict) -> List[str]:
+        info = self.info
+        found = info.problems(workflow)
+        if found and (info.fetched_at < self._created or self._retry_due()):
+            # 이번 실행 전에 저장된 스키마 → 서버 쪽 파일 목록이 바뀌었을 수 있음
+            # (또는 빠졌던 서버를 다시 물어볼 때가 됨 → 그 서버에만 있는 모델일 수 있음)
+            found = self.refresh().problems(workflow)
+        return found
+
+    def __call__(self, workflow: dict) -> None:
+        found = self.problems(workflow)
+        if found:
+            raise WorkflowValidationError(found)
+
+
+_VALIDATORS: Dict[str, WorkflowValidator] = {}
+
+
+def validate_workflow(workflow: dict, server: str = cw.DEFAULT_SERVER) -> None:
+    """
+    서버 하나의 스키마로 워크플로를 검사합니다 (서버별 WorkflowValidator를 프로세스 안에서 재사용).
+    :raises WorkflowValidationError: 문제가 있을 때
+    """
+    validator = _VALIDATORS.get(server)
+    if validator is None:
+        validator = _VALIDATORS[server] = WorkflowValidator(server)
+    validator(workflow)
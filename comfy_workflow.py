@@ -4,40 +4,255 @@ ComfyUI 워크플로 동적 조립 및 실행 모듈.
 로컬 ComfyUI 서버와 HTTP/WebSocket으로 통신하며, JSON 템플릿을 합쳐 워크플로를 생성·실행합니다.
 """
 
+import asyncio
+import hashlib
+import io
 import json
+import mimetypes
+import os
+import random
+import socket
+import struct
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import requests
+import requests.adapters
+import urllib3
 import websocket
 
+from comfy_cache import ResultCache, workflow_hash
+from comfy_graph import OUTPUT_NODE_CLASSES, optimize_workflow
+from comfy_telemetry import TelemetryStore
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 없으면 기준 이미지를 원본 그대로 업로드
+    Image = None
+
 # ---------------------------------------------------------------------------
 # 상수
 # ---------------------------------------------------------------------------
 DEFAULT_SERVER = "http://127.0.0.1:8188"
 WS_SERVER = "ws://127.0.0.1:8188/ws"
 NODE_ID_OFFSET = 1000
+# 컴파일된 템플릿 캐시가 파일 mtime을 다시 확인하는 최소 간격(초)
+TEMPLATE_CHECK_INTERVAL = 1.0
 TEMPLATES_DIR = Path(__file__).resolve().parent / "node_templates"
 OUTPUTS_DIR = Path(__file__).resolve().parent / "outputs"
 REQUEST_TIMEOUT = 30
 WS_RECV_TIMEOUT = 3600
+# 여러 서버(파드) 사용 시: COMFY_SERVERS="http://a:8188,https://b-8188.proxy.runpod.net"
+SERVERS_ENV = "COMFY_SERVERS"
+POOL_POLL_INTERVAL = 2.0
+POOL_RETRY_AFTER = 30.0
+POOL_CHECKPOINT_TTL = 300.0
+# HTTP 커넥션 풀 / 재시도 / 서버별 circuit breaker
+HTTP_POOL_SIZE = 32
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_BACKOFF_MAX = 8.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+# 결과 이미지 다운로드: 동시 다운로드 수, 스트리밍 청크 크기(바이트)
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 결과 수신 방식: "history"(/history + /view) 또는 "websocket"(SaveImageWebsocket 바이너리 프레임)
+OUTPUT_MODES = ("history", "websocket")
+# WebSocket 바이너리 프레임 헤더 (이벤트 타입 4바이트 + 이미지 포맷 4바이트)
+WS_IMAGE_EVENT_TYPES = (1, 2)
+WS_IMAGE_FORMATS = {1: ".jpg", 2: ".png"}
+# WebSocket이 끊기면 같은 clientId로 다시 연결하고, 그동안 /queue·/history를 폴링해 완료를 확인
+# 폴링 간격(초)은 변화가 없으면 최소값에서 1.5배씩 최대값까지 늘어남
+FALLBACK_POLL_MIN = 0.5
+FALLBACK_POLL_MAX = 10.0
+# WebSocket과 HTTP 폴링이 모두 이 시간(초) 동안 실패하면 연결 오류로 포기
+WS_RECONNECT_GIVE_UP = 600.0
 
 
 # ---------------------------------------------------------------------------
 # 템플릿 로드 및 오프셋
 # ---------------------------------------------------------------------------
+class CompiledTemplate(NamedTuple):
+    """
+    한 번 읽어 분석해 둔 템플릿 (불변).
+    - nodes: MappingProxyType/tuple로 얼린 노드 딕셔너리
+    - ref_slots: 노드 참조 [node_id, slot]가 있는 위치 ((node_id, path, 참조 대상 int ID), ...)
+    - placeholder_slots: "__NAME__" → 그 문자열이 있는 위치 ((node_id, path), ...)
+    path는 노드 딕셔너리 기준 키/인덱스 튜플입니다 (예: ("inputs", "seed")).
+    """
+
+    name: str
+    mtime_ns: int
+    nodes: Mapping[str, Any]
+    ref_slots: Tuple[Tuple[str, Tuple[Any, ...], int], ...]
+    placeholder_slots: Mapping[str, Tuple[Tuple[str, Tuple[Any, ...]], ...]]
+
+    def instantiate(
+        self, offset: int = 0
+    ) -> Tuple[dict, Mapping[str, Tuple[Tuple[str, Tuple[Any, ...]], ...]]]:
+        """
+        offset을 적용한 새(수정 가능한) 워크플로와, 오프셋된 노드 ID 기준 플레이스홀더 위치를 반환합니다.
+        offset별 결과는 한 번만 만들어 JSON 문자열로 캐시하고, 이후에는 json.loads로 복사만 합니다.
+        """
+        key = (self.name, self.mtime_ns, offset)
+        cached = _INSTANCE_CACHE.get(key)
+        if cached is None:
+            workflow = {str(int(nid) + offset): _thaw(node) for nid, node in self.nodes.items()}
+            if offset:
+                # 노드 참조는 미리 찾아 둔 위치만 고침 (값 전체를 다시 훑지 않음)
+                for node_id, path, target in self.ref_slots:
+                    _get_path(workflow[str(int(node_id) + offset)], path)[0] = str(target + offset)
+            slots = MappingProxyType(
+                {
+                    name: tuple((str(int(node_id) + offset), path) for node_id, path in locations)
+                    for name, locations in self.placeholder_slots.items()
+                }
+            )
+            cached = _INSTANCE_CACHE[key] = (json.dumps(workflow), slots)
+        source, slots = cached
+        return json.loads(source), slots
+
+
+_TEMPLATE_CACHE: Dict[str, CompiledTemplate] = {}
+_TEMPLATE_CHECKED: Dict[str, float] = {}
+# (템플릿 이름, mtime_ns, offset) → (오프셋 적용된 JSON 문자열, 플레이스홀더 위치)
+_INSTANCE_CACHE: Dict[Tuple[str, int, int], Tuple[str, Mapping[str, Any]]] = {}
+# ((템플릿 이름, mtime_ns), ...) → (병합된 JSON 문자열, 플레이스홀더 위치)
+_MERGE_CACHE: Dict[Tuple[Tuple[str, int], ...], Tuple[str, Mapping[str, Any]]] = {}
+
+
+def _is_node_ref(val: Any) -> bool:
+    """[node_id(숫자 문자열), slot] 형태의 노드 참조인지 확인합니다."""
+    return (
+        isinstance(val, list)
+        and len(val) == 2
+        and isinstance(val[0], str)
+        and val[0].isdigit()
+        and isinstance(val[1], (int, float))
+    )
+
+
+def _is_placeholder(val: Any) -> bool:
+    return isinstance(val, str) and len(val) > 4 and val.startswith("__") and val.endswith("__")
+
+
+def _freeze(val: Any) -> Any:
+    if isinstance(val, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in val.items()})
+    if isinstance(val, list):
+        return tuple(_freeze(x) for x in val)
+    return val
+
+
+def _thaw(val: Any) -> Any:
+    if isinstance(val, MappingProxyType):
+        return {k: _thaw(v) for k, v in val.items()}
+    if isinstance(val, tuple):
+        return [_thaw(x) for x in val]
+    return val
+
+
+def _get_path(node: Any, path: Tuple[Any, ...]) -> Any:
+    for key in path:
+        node = node[key]
+    return node
+
+
+def _index_slots(
+    val: Any,
+    path: Tuple[Any, ...],
+    refs: List[Tuple[Tuple[Any, ...], int]],
+    placeholders: Optional[Dict[str, List[Tuple[Any, ...]]]],
+) -> None:
+    """_apply_offset_to_value / _replace_placeholders_recursive와 같은 규칙으로 위치만 기록합니다."""
+    if isinstance(val, dict):
+        for k, v in val.items():
+            _index_slots(v, path + (k,), refs, placeholders)
+    elif isinstance(val, list):
+        if _is_node_ref(val):
+            refs.append((path, int(val[0])))
+            return
+        for i, x in enumerate(val):
+            _index_slots(x, path + (i,), refs, placeholders)
+    elif placeholders is not None and _is_placeholder(val):
+        placeholders.setdefault(val, []).append(path)
+
+
+def compile_template(name: str) -> CompiledTemplate:
+    """
+    node_templates/{name}.json을 읽어 CompiledTemplate으로 만들고 프로세스 안에 캐시합니다.
+    파일 수정 시각(mtime)이 바뀌면 다시 읽습니다 (mtime 확인은 TEMPLATE_CHECK_INTERVAL초에 한 번).
+    """
+    cached = _TEMPLATE_CACHE.get(name)
+    now = time.monotonic()
+    if cached is not None and now - _TEMPLATE_CHECKED.get(name, 0.0) < TEMPLATE_CHECK_INTERVAL:
+        return cached
+    path = TEMPLATES_DIR / f"{name}.json"
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"템플릿을 찾을 수 없습니다: {path}") from None
+    _TEMPLATE_CHECKED[name] = now
+    if cached is not None and cached.mtime_ns == mtime_ns:
+        return cached
+
+    with open(path, "r", encoding="utf-8") as f:
+        template = json.load(f)
+    ref_slots = []
+    placeholder_slots: Dict[str, list] = {}
+    for node_id, node_data in template.items():
+        if not isinstance(node_data, dict):
+            continue
+        refs: List[Tuple[Tuple[Any, ...], int]] = []
+        found: Dict[str, List[Tuple[Any, ...]]] = {}
+        for key, val in node_data.items():
+            # 플레이스홀더 치환은 inputs 안에서만 일어남 (apply_placeholders와 동일)
+            _index_slots(val, (key,), refs, found if key == "inputs" else None)
+        ref_slots.extend((node_id, ref_path, target) for ref_path, target in refs)
+        for key, paths in found.items():
+            placeholder_slots.setdefault(key, []).extend((node_id, p) for p in paths)
+
+    compiled = CompiledTemplate(
+        name=name,
+        mtime_ns=mtime_ns,
+        nodes=_freeze(template),
+        ref_slots=tuple(ref_slots),
+        placeholder_slots=MappingProxyType({k: tuple(v) for k, v in placeholder_slots.items()}),
+    )
+    _TEMPLATE_CACHE[name] = compiled
+    return compiled
+
+
 def load_template(name: str) -> dict:
     """
     node_templates/ 폴더에서 JSON 템플릿을 로드합니다.
+    파일은 프로세스당 한 번만 읽고(수정 시각이 바뀌면 다시 읽음), 매번 새 딕셔너리를 반환합니다.
     :param name: 파일명(확장자 제외), 예: "text2img", "upscale"
     :return: 템플릿 워크플로 딕셔너리
     """
-    path = TEMPLATES_DIR / f"{name}.json"
-    if not path.exists():
-        raise FileNotFoundError(f"템플릿을 찾을 수 없습니다: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return compile_template(name).instantiate(0)[0]
 
 
 def _apply_offset_to_value(val: Any, offset: int) -> Any:
@@ -45,12 +260,7 @@ def _apply_offset_to_value(val: Any, offset: int) -> Any:
     if isinstance(val, dict):
         return {k: _apply_offset_to_value(v, offset) for k, v in val.items()}
     if isinstance(val, list):
-        if (
-            len(val) == 2
-            and isinstance(val[0], str)
-            and val[0].isdigit()
-            and isinstance(val[1], (int, float))
-        ):
+        if _is_node_ref(val):
             return [str(int(val[0]) + offset), val[1]]
         return [_apply_offset_to_value(x, offset) for x in val]
     return val
@@ -73,18 +283,60 @@ def apply_offset(template: dict, offset: int) -> dict:
     return result
 
 
+def _merge_compiled(
+    template_names: List[str],
+) -> Tuple[dict, Mapping[str, Sequence[Tuple[str, Tuple[Any, ...]]]]]:
+    """
+    merge_templates와 같지만 플레이스홀더 위치 목록도 함께 반환합니다.
+    같은 템플릿 조합(+ 각 파일 mtime)의 병합 결과는 캐시해 두고 복사만 합니다.
+    """
+    compiled = [compile_template(name) for name in template_names]
+    if len(compiled) == 1:
+        return compiled[0].instantiate(0)
+    key = tuple((c.name, c.mtime_ns) for c in compiled)
+    cached = _MERGE_CACHE.get(key)
+    if cached is None:
+        workflow: dict = {}
+        slots: Dict[str, List[Tuple[str, Tuple[Any, ...]]]] = {}
+        for i, template in enumerate(compiled):
+            nodes, template_slots = template.instantiate(i * NODE_ID_OFFSET)
+            workflow.update(nodes)
+            for name, locations in template_slots.items():
+                slots.setdefault(name, []).extend(locations)
+        frozen_slots = MappingProxyType({name: tuple(v) for name, v in slots.items()})
+        cached = _MERGE_CACHE[key] = (json.dumps(workflow), frozen_slots)
+    source, frozen_slots = cached
+    return json.loads(source), frozen_slots
+
+
 def merge_templates(template_names: List[str]) -> dict:
     """
     여러 템플릿을 1000 단위 오프셋으로 합쳐 하나의 워크플로로 만듭니다.
     :param template_names: 템플릿 이름 리스트 (예: ["text2img", "upscale"])
     :return: 병합된 워크플로
     """
-    workflow = {}
-    for i, name in enumerate(template_names):
-        template = load_template(name)
-        offset = i * NODE_ID_OFFSET
-        workflow.update(apply_offset(template, offset))
-    return workflow
+    return _merge_compiled(template_names)[0]
+
+
+def _fill_slots(
+    workflow: dict,
+    slots: Mapping[str, Sequence[Tuple[str, Tuple[Any, ...]]]],
+    replacements: Dict[str, Any],
+) -> None:
+    """
+    미리 기록한 위치에만 플레이스홀더 값을 넣습니다 (apply_placeholders의 빠른 경로).
+    connect 등으로 이미 다른 값이 들어간 위치는 건드리지 않습니다.
+    """
+    for key, value in replacements.items():
+        for node_id, path in slots.get(key, ()):
+            container = workflow.get(node_id)
+            try:
+                for part in path[:-1]:
+                    container = container[part]
+                if container[path[-1]] == key:
+                    container[path[-1]] = value
+            except (KeyError, IndexError, TypeError):
+                continue
 
 
 # ---------------------------------------------------------------------------
@@ -129,6 +381,21 @@ def find_nodes_by_class(workflow: dict, class_type: str) -> List[str]:
     ]
 
 
+def workflow_checkpoints(workflow: dict) -> List[str]:
+    """
+    워크플로가 로드하는 체크포인트 파일명(ckpt_name 입력) 목록을 반환합니다.
+    서버 선택 시 해당 체크포인트가 있는 서버만 고르는 데 사용합니다.
+    """
+    names = []
+    for data in workflow.values():
+        if not isinstance(data, dict):
+            continue
+        name = data.get("inputs", {}).get("ckpt_name")
+        if isinstance(name, str) and name not in names:
+            names.append(name)
+    return names
+
+
 def set_node_input(
     workflow: dict,
     node_id: Union[str, int],
@@ -150,6 +417,40 @@ def set_node_input(
     workflow[nid]["inputs"][key] = value
 
 
+def latent_size(workflow: dict) -> Optional[Tuple[int, int]]:
+    """
+    EmptyLatentImage의 (width, height)를 반환합니다. 없거나 값이 숫자가 아니면 None.
+    """
+    for node_id in find_nodes_by_class(workflow, "EmptyLatentImage"):
+        inputs = workflow[node_id].get("inputs", {})
+        width, height = inputs.get("width"), inputs.get("height")
+        if isinstance(width, int) and isinstance(height, int):
+            return width, height
+    return None
+
+
+def make_seed_batch(workflow: dict, batch_size: int) -> dict:
+    """
+    EmptyLatentImage의 batch_size를 바꾼 워크플로를 반환합니다 (원본은 수정하지 않음).
+    시드가 다른 작업 N개를 프롬프트 하나로 묶을 때 씁니다. KSampler는 워크플로의 시드 하나로
+    배치 전체 노이즈를 만들기 때문에, i번째 이미지는 seed+i로 단독 실행한 결과와 같지 않습니다.
+    :param workflow: 원본 워크플로 (PreparedWorkflow.fill 결과처럼 노드를 공유해도 됨)
+    :param batch_size: 한 프롬프트에서 만들 이미지 수
+    :return: EmptyLatentImage 노드만 새로 만든 워크플로
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size는 1 이상이어야 합니다: {batch_size}")
+    latent_ids = find_nodes_by_class(workflow, "EmptyLatentImage")
+    if not latent_ids:
+        raise ValueError("EmptyLatentImage가 없는 워크플로는 시드 배치를 만들 수 없습니다.")
+    batched = dict(workflow)
+    for node_id in latent_ids:
+        node = dict(batched[node_id])
+        node["inputs"] = dict(node.get("inputs", {}), batch_size=batch_size)
+        batched[node_id] = node
+    return batched
+
+
 def apply_placeholders(workflow: dict, replacements: Dict[str, Any]) -> None:
     """
     워크플로 전체에서 __NAME__ 형태의 플레이스홀더를 치환합니다.
@@ -189,15 +490,32 @@ def build_workflow(config: dict) -> dict:
         "connections": [                    # 모드 간 연결 (오프셋 적용된 노드 ID)
             {"from_node": "8", "from_slot": 0, "to_node": "1003", "to_input": "image"}
         ],
-        "placeholders": {"__PROMPT__": "a cat", "__SEED__": 42}  # 전역 플레이스홀더 (선택)
+        "placeholders": {"__PROMPT__": "a cat", "__SEED__": 42},  # 전역 플레이스홀더 (선택)
+        "optimize": False,                  # 출력에 닿지 않는 노드 제거·중복 노드 합치기 (기본 False)
+        "output_classes": ["VHS_VideoCombine"]  # OUTPUT_NODE_CLASSES 외에 출력으로 볼 노드 클래스 (선택)
     }
+    "optimize": True면 연결·치환 뒤 comfy_graph.optimize_workflow로 그래프를 정리하므로, 연결이 끊긴 노드
+    (예: text2img + upscale의 LoadImage 1001)나 템플릿마다 들어 있는 같은 체크포인트 로더가 결과에 남지 않습니다.
+    출력인지 모르는 클래스(커스텀 노드)는 상류와 함께 그대로 남깁니다. 노드를 지우므로 빌드한 뒤 connect로
+    이어 붙일 노드가 있으면 켜지 말고, 다 붙인 다음 optimize_workflow(workflow)를 직접 호출하세요.
     :return: ComfyUI /prompt 에 넣을 수 있는 워크플로 딕셔너리
     """
+    return _build_with_slots(config)[0]
+
+
+def _build_with_slots(
+    config: dict,
+    keep: Iterable[str] = (),
+) -> Tuple[dict, Dict[str, Tuple[Tuple[str, Tuple[Any, ...]], ...]]]:
+    """
+    build_workflow 본체. keep에 든 플레이스홀더는 치환하지 않고 남겨 두고,
+    그 위치 목록을 함께 반환합니다 (PreparedWorkflow용).
+    """
     modes = config.get("modes", [])
     if not modes:
         raise ValueError("config['modes']가 비어 있을 수 없습니다.")
 
-    workflow = merge_templates(modes)
+    workflow, slots = _merge_compiled(modes)
 
     # 연결 적용
     for conn in config.get("connections", []):
@@ -215,20 +533,488 @@ def build_workflow(config: dict) -> dict:
         for key, value in mode_params.items():
             if isinstance(key, str) and key.startswith("__") and key.endswith("__"):
                 placeholders[key] = value
+    keep = frozenset(keep)
+    for key in keep:
+        placeholders.pop(key, None)
+
+    if all(_is_placeholder(key) for key in placeholders):
+        _fill_slots(workflow, slots, placeholders)
+    else:
+        # __X__ 형태가 아닌 키는 미리 기록해 둔 위치가 없으므로 전체를 훑어 치환
+        apply_placeholders(workflow, placeholders)
+
+    if config.get("optimize", False):
+        extra_outputs = config.get("output_classes")
+        optimize_workflow(workflow, OUTPUT_NODE_CLASSES.union(extra_outputs) if extra_outputs else None)
+
+    kept = {}
+    for key in keep:
+        # connections로 덮어쓴 위치, 최적화로 사라진 노드는 제외
+        locations = tuple(
+            (node_id, path)
+            for node_id, path in slots.get(key, ())
+            if node_id in workflow and _get_path(workflow[node_id], path) == key
+        )
+        if locations:
+            kept[key] = locations
+    return workflow, kept
+
+
+class PreparedWorkflow:
+    """
+    한 번 빌드한 워크플로에서 일부 플레이스홀더(시드, 체크포인트 등)만 바꿔 가며
+    새 워크플로를 찍어 내는 틀. 스윕처럼 그래프 구조는 같고 입력값만 다른 작업을 많이 만들 때 씁니다.
+
+        prepared = cw.prepare_workflow(config, ["__SEED__"])
+        for seed in range(1000):
+            workflow = prepared.fill({"__SEED__": seed})
+
+    fill()은 노드와 inputs 딕셔너리만 새로 만들고, 바뀌지 않는 입력값(노드 참조 리스트 등)은
+    원본과 공유합니다. 결과 워크플로는 set_node_input/connect로 고쳐도 되지만,
+    입력값 리스트를 제자리에서 수정하면 다른 결과에도 반영되므로 주의하세요.
+    """
+
+    def __init__(
+        self,
+        workflow: dict,
+        slots: Mapping[str, Sequence[Tuple[str, Tuple[Any, ...]]]],
+    ) -> None:
+        self._base = workflow
+        self._slots = {key: tuple(locations) for key, locations in slots.items()}
+        # inputs 바로 아래가 아닌 깊은 위치는 해당 입력값 전체를 복사해야 함
+        self._deep = {
+            (node_id, path[1])
+            for locations in self._slots.values()
+            for node_id, path in locations
+            if len(path) > 2
+        }
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        """fill()에 넘겨야 하는 플레이스홀더 이름."""
+        return tuple(self._slots)
+
+    def fill(self, values: Mapping[str, Any]) -> dict:
+        """
+        플레이스홀더 값을 채운 새 워크플로를 반환합니다.
+        :param values: {"__SEED__": 42, ...} — variables의 모든 키가 있어야 함 (나머지 키는 무시)
+        """
+        missing = [key for key in self._slots if key not in values]
+        if missing:
+            raise KeyError(f"플레이스홀더 값이 없습니다: {missing}")
+        workflow = {}
+        for node_id, node in self._base.items():
+            if isinstance(node, dict) and isinstance(node.get("inputs"), dict):
+                node = dict(node)
+                node["inputs"] = dict(node["inputs"])
+            workflow[node_id] = node
+        for node_id, key in self._deep:
+            inputs = workflow[node_id]["inputs"]
+            inputs[key] = json.loads(json.dumps(inputs[key]))
+        for key, locations in self._slots.items():
+            value = values[key]
+            for node_id, path in locations:
+                container = workflow[node_id]
+                for part in path[:-1]:
+                    container = container[part]
+                container[path[-1]] = value
+        return workflow
 
-    apply_placeholders(workflow, placeholders)
-    return workflow
+
+def prepare_workflow(config: dict, variables: Iterable[str]) -> PreparedWorkflow:
+    """
+    build_workflow와 같은 config로 그래프를 한 번만 빌드하고, variables에 든 플레이스홀더는
+    비워 둔 PreparedWorkflow를 반환합니다. config의 placeholders에 variables 값이 있어도 무시합니다.
+    :param config: build_workflow의 config
+    :param variables: 작업마다 바뀌는 플레이스홀더 이름 (예: ["__SEED__", "__CKPT_NAME__"])
+    """
+    variables = list(variables)
+    bad = [key for key in variables if not _is_placeholder(key)]
+    if bad:
+        raise ValueError(f"__NAME__ 형태의 플레이스홀더만 변수로 쓸 수 있습니다: {bad}")
+    workflow, slots = _build_with_slots(config, keep=variables)
+    return PreparedWorkflow(workflow, slots)
 
 
 # ---------------------------------------------------------------------------
 # ComfyUI 서버 통신 및 이미지 생성
 # ---------------------------------------------------------------------------
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """연속 실패로 서버 회로가 열려 요청을 보내지 않고 바로 실패할 때 발생합니다."""
+
+
+def _request_not_sent(exc: Exception) -> bool:
+    """연결 자체가 안 된 오류인지 (요청 본문이 서버에 전달되지 않았음이 확실한지) 판단합니다."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class ComfyClient:
+    """
+    서버 하나에 대한 HTTP 클라이언트.
+    - keep-alive requests.Session + 크기를 정한 커넥션 풀 (RunPod HTTPS 프록시에서 매번 TCP+TLS 핸드셰이크 방지)
+    - 5xx / 연결 끊김 시 지터(jitter)를 넣은 지수 백오프로 재시도
+    - 연속 실패가 failure_threshold번 쌓이면 reset_timeout초 동안 회로를 열어 즉시 실패 (서버별 circuit breaker)
+
+    모듈 함수(queue_prompt, get_image 등)는 get_client(server)로 이 객체를 공유하므로
+    기존 스크립트를 고치지 않아도 연결이 재사용됩니다.
+    """
+
+    RETRY_STATUS = (500, 502, 503, 504)
+    # 요청이 서버에 닿지 않았을 가능성이 높은 상태 코드 (프록시가 파드에 연결 못 함)
+    RETRY_STATUS_UNSENT = (502, 503)
+
+    def __init__(
+        self,
+        server: str = DEFAULT_SERVER,
+        pool_size: int = HTTP_POOL_SIZE,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff: float = HTTP_BACKOFF,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        timeout: int = REQUEST_TIMEOUT,
+    ) -> None:
+        self.server = server.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def close(self) -> None:
+        self.session.close()
+
+    # -- circuit breaker ----------------------------------------------------
+    def _before_request(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"서버 회로가 열려 있습니다 ({self.server}, 연속 실패 {self._failures}회). "
+                    f"{self.reset_timeout:.0f}초 후 다시 시도합니다."
+                )
+            # half-open: 이번 요청 하나로 서버 상태를 확인
+            self._opened_at = time.monotonic()
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def circuit_open(self) -> bool:
+        with self._lock:
+            return (
+                self._opened_at is not None
+                and time.monotonic() - self._opened_at < self.reset_timeout
+            )
+
+    # -- 요청 ---------------------------------------------------------------
+    def _sleep_backoff(self, attempt: int) -> None:
+        # full jitter: 여러 클라이언트가 동시에 재시도해 서버를 다시 몰아치지 않도록
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt))))
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        idempotent: bool = True,
+        timeout: Optional[float] = None,
+        retry: bool = True,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        서버에 요청을 보내고 응답을 반환합니다 (HTTP 오류 상태는 호출자가 판단).
+        :param idempotent: False면(/prompt 등) 요청이 서버에 닿지 않았다고 볼 수 있는
+            연결 실패와 502/503만 재시도해 같은 작업이 두 번 큐에 들어가지 않게 합니다.
+        :param retry: False면 재시도하지 않음 (응답 본문까지 묶어 호출자가 직접 재시도할 때)
+        """
+        url = f"{self.server}/{path.lstrip('/')}"
+        retry_status = self.RETRY_STATUS if idempotent else self.RETRY_STATUS_UNSENT
+        max_retries = self.max_retries if retry else 0
+        attempt = 0
+        while True:
+            self._before_request()
+            try:
+                resp = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(False)
+                retryable = idempotent or _request_not_sent(e)
+                if not retryable or attempt >= max_retries:
+                    raise
+                self._sleep_backoff(attempt)
+                attempt += 1
+                continue
+            if resp.status_code in self.RETRY_STATUS:
+                self._record(False)
+                if resp.status_code in retry_status and attempt < max_retries:
+                    resp.close()
+                    self._sleep_backoff(attempt)
+                    attempt += 1
+                    continue
+            else:
+                self._record(True)
+            return resp
+
+    def get_json(self, path: str, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        resp = self.request("GET", path, timeout=timeout, **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    # -- ComfyUI API --------------------------------------------------------
+    def queue_prompt(
+        self,
+        workflow: dict,
+        client_id: Optional[str] = None,
+        prompt_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        front: bool = False,
+    ) -> str:
+        prompt_id = prompt_id or str(uuid.uuid4())
+        payload = {
+            "prompt": workflow,
+            "client_id": client_id or str(uuid.uuid4()),
+            "prompt_id": prompt_id,
+        }
+        if front:
+            payload["front"] = True
+        resp = self.request("POST", "/prompt", idempotent=False, timeout=timeout, json=payload)
+        if not resp.ok:
+            raise RuntimeError(f"ComfyUI /prompt 오류 ({resp.status_code}): {resp.text[:800]}")
+        data = resp.json()
+        if "prompt_id" in data:
+            return data["prompt_id"]
+        if "error" in data:
+            raise RuntimeError(f"ComfyUI 오류: {data['error']}")
+        return prompt_id
+
+    def upload_image(
+        self,
+        image_path: Union[str, Path],
+        subfolder: str = "",
+        folder_type: str = "input",
+        overwrite: bool = False,
+        timeout: Optional[float] = None,
+    ) -> dict:
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"이미지가 없습니다: {path}")
+        # 재시도 때마다 같은 내용을 다시 보낼 수 있도록 바이트로 읽어 둠
+        return self.upload_bytes(
+            path.read_bytes(),
+            path.name,
+            subfolder=subfolder,
+            folder_type=folder_type,
+            overwrite=overwrite,
+            timeout=timeout,
+        )
+
+    def upload_bytes(
+        self,
+        content: bytes,
+        filename: str,
+        subfolder: str = "",
+        folder_type: str = "input",
+        overwrite: bool = False,
+        timeout: Optional[float] = None,
+        content_type: Optional[str] = None,
+    ) -> dict:
+        """
+        메모리에 있는 이미지 바이트를 filename으로 업로드합니다.
+        content_type이 없으면 filename 확장자로 정합니다 (.jpg → image/jpeg, 모르면 application/octet-stream).
+        """
+        data = {"subfolder": subfolder, "type": folder_type}
+        if overwrite:
+            data["overwrite"] = "true"
+        content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        # 덮어쓰지 않는 업로드는 서버가 이름을 바꿔 새로 저장하므로 다시 보내면 파일이 하나 더 생김
+        resp = self.request(
+            "POST",
+            "/upload/image",
+            idempotent=overwrite,
+            timeout=timeout,
+            files={"image": (filename, content, content_type)},
+            data=data,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_history(self, prompt_id: str, timeout: Optional[float] = None) -> dict:
+        return self.get_json(f"/history/{prompt_id}", timeout=timeout)
+
+    def get_recent_history(self, max_items: Optional[int] = None, timeout: Optional[float] = None) -> dict:
+        params = {} if max_items is None else {"max_items": max_items}
+        return self.get_json("/history", timeout=timeout, params=params)
+
+    def delete_history(self, prompt_ids: Iterable[str], timeout: Optional[float] = None) -> None:
+        resp = self.request("POST", "/history", timeout=timeout, json={"delete": list(prompt_ids)})
+        resp.raise_for_status()
+
+    def get_available_checkpoints(self, timeout: Optional[float] = None) -> List[str]:
+        return self.get_json("/models/checkpoints", timeout=timeout)
+
+    def get_queue(self, timeout: Optional[float] = None) -> dict:
+        return self.get_json("/queue", timeout=timeout)
+
+    def delete_queued(self, prompt_ids: Iterable[str], timeout: Optional[float] = None) -> None:
+        resp = self.request("POST", "/queue", timeout=timeout, json={"delete": list(prompt_ids)})
+        resp.raise_for_status()
+
+    def interrupt(self, prompt_id: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        # 최신 ComfyUI는 prompt_id가 지금 실행 중일 때만 중단하고, 구버전은 본문을 무시하고 실행 중인 것을 중단
+        payload = {} if prompt_id is None else {"prompt_id": prompt_id}
+        resp = self.request("POST", "/interrupt", timeout=timeout, json=payload)
+        resp.raise_for_status()
+
+    def get_image(
+        self,
+        filename: str,
+        subfolder: str = "",
+        folder_type: str = "output",
+        timeout: Optional[float] = None,
+    ) -> bytes:
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        resp = self.request("GET", "/view", timeout=timeout, params=params)
+        resp.raise_for_status()
+        return resp.content
+
+    def download_image(
+        self,
+        filename: str,
+        dest: Union[str, Path],
+        subfolder: str = "",
+        folder_type: str = "output",
+        skip_existing: bool = False,
+        sha256: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Path:
+        """
+        /view 응답을 청크 단위로 임시 파일에 쓰고, 다 받으면 dest로 원자적으로 교체합니다.
+        이미지 전체를 메모리에 올리지 않으며, 중간에 끊기면 dest는 그대로 남습니다.
+        :param skip_existing: dest가 이미 있고 크기가 Content-Length와 같으면 본문을 받지 않음
+        :param sha256: 주면 dest가 이 해시와 같을 때 요청 없이 건너뛰고, 받은 파일도 검증
+        :return: dest 경로
+        """
+        dest = Path(dest)
+        if sha256 is not None and dest.exists() and _file_sha256(dest) == sha256:
+            return dest
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        # 요청과 본문 수신을 한 번의 재시도 단위로 묶음 (request()의 재시도와 겹치지 않게 retry=False)
+        attempt = 0
+        while True:
+            try:
+                with self.request("GET", "/view", timeout=timeout, retry=False, params=params, stream=True) as resp:
+                    if resp.status_code in self.RETRY_STATUS and attempt < self.max_retries:
+                        self._sleep_backoff(attempt)
+                        attempt += 1
+                        continue
+                    resp.raise_for_status()
+                    length = resp.headers.get("Content-Length")
+                    if length is not None and resp.headers.get("Content-Encoding"):
+                        length = None  # 압축 전송이면 파일 크기와 비교할 수 없음
+                    if (
+                        skip_existing
+                        and sha256 is None
+                        and length is not None
+                        and dest.exists()
+                        and dest.stat().st_size == int(length)
+                    ):
+                        return dest
+                    _stream_to_file(resp, dest, length, sha256)
+                return dest
+            except CircuitOpenError:
+                # 회로가 열렸으면 기다려도 보내지 않으므로 바로 실패
+                raise
+            except (
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ):
+                # 연결 실패·응답 도중 끊김: 처음부터 다시 받음
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep_backoff(attempt)
+                attempt += 1
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stream_to_file(
+    resp: requests.Response,
+    dest: Path,
+    length: Optional[str],
+    sha256: Optional[str],
+) -> None:
+    """응답 본문을 dest 옆 임시 파일에 받은 뒤 os.replace로 교체합니다."""
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256() if sha256 is not None else None
+    written = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                written += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+        if length is not None and written != int(length):
+            raise requests.exceptions.ChunkedEncodingError(
+                f"다운로드가 중간에 끊겼습니다: {dest.name} ({written}/{length} bytes)"
+            )
+        if digest is not None and digest.hexdigest() != sha256:
+            raise ValueError(f"체크섬이 일치하지 않습니다: {dest.name}")
+        # 결과 캐시가 하드링크로 공유할 수 있으므로 기존 파일을 덮어쓰지 않고 교체
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+_CLIENTS: Dict[str, ComfyClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(server: str = DEFAULT_SERVER) -> ComfyClient:
+    """서버별로 하나씩 공유되는 ComfyClient를 반환합니다 (없으면 생성)."""
+    key = server.rstrip("/")
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = ComfyClient(key)
+        return client
+
+
 def queue_prompt(
     workflow: dict,
     server: str = DEFAULT_SERVER,
     client_id: Optional[str] = None,
     prompt_id: Optional[str] = None,
     timeout: int = REQUEST_TIMEOUT,
+    front: bool = False,
 ) -> str:
     """
     워크플로를 /prompt에 전송하고 prompt_id를 반환합니다.
@@ -237,24 +1023,12 @@ def queue_prompt(
     :param client_id: WebSocket 클라이언트 ID (선택)
     :param prompt_id: 지정 시 해당 ID 사용, 없으면 UUID 생성
     :param timeout: 요청 타임아웃(초)
+    :param front: True면 대기 중인 prompt들보다 앞에 넣음 (ComfyUI front 플래그, 실행 중인 prompt는 그대로)
     :return: prompt_id
     """
-    prompt_id = prompt_id or str(uuid.uuid4())
-    payload = {
-        "prompt": workflow,
-        "client_id": client_id or str(uuid.uuid4()),
-        "prompt_id": prompt_id,
-    }
-    url = f"{server.rstrip('/')}/prompt"
-    resp = requests.post(url, json=payload, timeout=timeout)
-    if not resp.ok:
-        raise RuntimeError(f"ComfyUI /prompt 오류 ({resp.status_code}): {resp.text[:800]}")
-    data = resp.json()
-    if "prompt_id" in data:
-        return data["prompt_id"]
-    if "error" in data:
-        raise RuntimeError(f"ComfyUI 오류: {data['error']}")
-    return prompt_id
+    return get_client(server).queue_prompt(
+        workflow, client_id=client_id, prompt_id=prompt_id, timeout=timeout, front=front
+    )
 
 
 def upload_image(
@@ -269,26 +1043,158 @@ def upload_image(
     이미지를 ComfyUI 서버에 업로드합니다. img2img 등에서 기준 이미지로 사용.
     :return: {"name": filename, "subfolder": subfolder, "type": folder_type}
     """
-    path = Path(image_path)
-    if not path.exists():
-        raise FileNotFoundError(f"이미지가 없습니다: {path}")
-    url = f"{server.rstrip('/')}/upload/image"
-    with open(path, "rb") as f:
-        files = {"image": (path.name, f, "image/png")}
-        data = {"subfolder": subfolder, "type": folder_type}
-        if overwrite:
-            data["overwrite"] = "true"
-        resp = requests.post(url, files=files, data=data, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    return get_client(server).upload_image(
+        image_path, subfolder=subfolder, folder_type=folder_type, overwrite=overwrite, timeout=timeout
+    )
+
+
+def _prepare_reference(path: Path, max_size: Optional[Tuple[int, int]]) -> Tuple[bytes, str]:
+    """
+    업로드할 기준 이미지 바이트와 확장자를 만듭니다.
+    Pillow가 있으면 max_size 안에 들어가게 축소(비율 유지, 8의 배수)하고 PNG로 무손실 재압축합니다.
+    """
+    data = path.read_bytes()
+    if Image is None:
+        return data, path.suffix.lower() or ".png"
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        scale = 1.0
+        if max_size is not None:
+            scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+        if scale < 1.0:
+            # VAE는 8픽셀 단위로 인코딩하므로 8의 배수로 맞춤
+            size = (max(8, int(width * scale) // 8 * 8), max(8, int(height * scale) // 8 * 8))
+            img = img.resize(size, Image.LANCZOS)
+        if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", optimize=True)
+    encoded = buf.getvalue()
+    if scale >= 1.0 and len(encoded) >= len(data) and path.suffix.lower() == ".png":
+        return data, ".png"
+    return encoded, ".png"
+
+
+class UploadManager:
+    """
+    기준 이미지(img2img Identity Lock 등)를 내용 해시 이름으로 서버마다 한 번만 업로드합니다.
+    같은 파일을 시드·파츠마다 다시 쓰는 스윕에서 매번 multipart POST를 보내지 않게 합니다.
+
+    :param max_size: (width, height). 주면 업로드 전에 그 크기 안으로 축소합니다 (Pillow 필요, 없으면 원본).
+    :param subfolder: 서버 input 폴더 아래 하위 폴더
+    """
+
+    def __init__(self, max_size: Optional[Tuple[int, int]] = None, subfolder: str = "") -> None:
+        self.max_size = max_size
+        self.subfolder = subfolder
+        self._lock = threading.Lock()
+        # (server, digest) → 업로드 응답
+        self._uploaded: Dict[Tuple[str, str], dict] = {}
+        # (경로, mtime_ns, 크기, max_size) → (digest, 바이트, 확장자). 최근 것만 유지
+        self._prepared: "OrderedDict[tuple, Tuple[str, bytes, str]]" = OrderedDict()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def _prepare(self, path: Path, max_size: Optional[Tuple[int, int]]) -> Tuple[str, bytes, str]:
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size, max_size)
+        with self._lock:
+            cached = self._prepared.get(key)
+            if cached is not None:
+                self._prepared.move_to_end(key)
+                return cached
+        data, suffix = _prepare_reference(path, max_size)
+        prepared = (hashlib.sha256(data).hexdigest(), data, suffix)
+        with self._lock:
+            self._prepared[key] = prepared
+            while len(self._prepared) > 16:
+                self._prepared.popitem(last=False)
+        return prepared
+
+    def upload(
+        self,
+        server: str,
+        image_path: Union[str, Path],
+        max_size: Optional[Tuple[int, int]] = None,
+        timeout: int = REQUEST_TIMEOUT,
+    ) -> dict:
+        """
+        이미지를 server에 올리고 업로드 응답({"name", "subfolder", "type"})을 반환합니다.
+        같은 내용을 같은 서버에 이미 올렸으면 요청을 보내지 않습니다.
+        :param max_size: 이번 호출에만 쓸 최대 크기 (None이면 생성자 값)
+        """
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"이미지가 없습니다: {path}")
+        digest, data, suffix = self._prepare(path, max_size or self.max_size)
+        key = (server.rstrip("/"), digest)
+        with self._lock:
+            if key in self._uploaded:
+                return dict(self._uploaded[key])
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._uploaded:
+                    return dict(self._uploaded[key])
+            # 이름이 내용 해시라 같은 이름 = 같은 내용이므로 덮어써도 안전
+            result = get_client(server).upload_bytes(
+                data,
+                f"ref_{digest[:16]}{suffix}",
+                subfolder=self.subfolder,
+                folder_type="input",
+                overwrite=True,
+                timeout=timeout,
+            )
+            with self._lock:
+                self._uploaded[key] = result
+        return dict(result)
+
+    def forget(self, server: Optional[str] = None) -> None:
+        """업로드 기록을 지웁니다 (서버가 재시작되어 input 폴더가 비었을 때 등)."""
+        with self._lock:
+            if server is None:
+                self._uploaded.clear()
+            else:
+                server = server.rstrip("/")
+                self._uploaded = {k: v for k, v in self._uploaded.items() if k[0] != server}
+
+
+_UPLOADS = UploadManager()
+
+
+def upload_reference(
+    server: str,
+    image_path: Union[str, Path],
+    max_size: Optional[Tuple[int, int]] = None,
+    timeout: int = REQUEST_TIMEOUT,
+) -> dict:
+    """
+    기준 이미지를 서버마다 한 번만 업로드합니다 (프로세스 공용 UploadManager 사용).
+    :param max_size: (width, height) — 목표 해상도. 더 큰 이미지는 업로드 전에 축소
+    :return: upload_image와 같은 형식의 응답
+    """
+    return _UPLOADS.upload(server, image_path, max_size=max_size, timeout=timeout)
 
 
 def get_history(server: str, prompt_id: str, timeout: int = REQUEST_TIMEOUT) -> dict:
     """/history/{prompt_id} 결과를 반환합니다."""
-    url = f"{server.rstrip('/')}/history/{prompt_id}"
-    resp = requests.get(url, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    return get_client(server).get_history(prompt_id, timeout=timeout)
+
+
+def get_recent_history(
+    server: str = DEFAULT_SERVER,
+    max_items: Optional[int] = None,
+    timeout: int = REQUEST_TIMEOUT,
+) -> dict:
+    """
+    /history?max_items=N: 가장 최근에 끝난 prompt N개의 기록 (오래된 것부터). None이면 전체.
+    서버 기록이 쌓일수록 전체 조회는 느려지므로 가능하면 max_items를 주세요.
+    """
+    return get_client(server).get_recent_history(max_items, timeout=timeout)
+
+
+def delete_history(server: str, prompt_ids: Iterable[str], timeout: int = REQUEST_TIMEOUT) -> None:
+    """서버 /history에서 prompt 기록을 지웁니다 (출력 파일은 남음)."""
+    get_client(server).delete_history(prompt_ids, timeout=timeout)
 
 
 def get_available_checkpoints(
@@ -296,10 +1202,44 @@ def get_available_checkpoints(
     timeout: int = REQUEST_TIMEOUT,
 ) -> List[str]:
     """ComfyUI /models/checkpoints 에서 사용 가능한 체크포인트 파일명 목록을 반환합니다."""
-    url = f"{server.rstrip('/')}/models/checkpoints"
-    resp = requests.get(url, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    return get_client(server).get_available_checkpoints(timeout=timeout)
+
+
+def get_queue(server: str = DEFAULT_SERVER, timeout: int = REQUEST_TIMEOUT) -> dict:
+    """/queue 결과({"queue_running": [...], "queue_pending": [...]})를 반환합니다."""
+    return get_client(server).get_queue(timeout=timeout)
+
+
+def queue_prompt_ids(queue: dict, field: str) -> List[str]:
+    """/queue 응답의 field("queue_running" 또는 "queue_pending")에 있는 prompt_id 목록."""
+    # 큐 항목: [number, prompt_id, prompt, extra_data, outputs_to_execute]
+    return [item[1] for item in queue.get(field) or [] if isinstance(item, (list, tuple)) and len(item) > 1]
+
+
+def cancel_prompt(server: str, prompt_id: str, timeout: int = REQUEST_TIMEOUT) -> Optional[str]:
+    """
+    서버에서 prompt를 취소합니다. 대기 중이면 큐에서 지우고, 실행 중이면 /interrupt로 중단합니다.
+    큐에서 먼저 지운 뒤 실행 중인지 확인하므로, 그 사이에 실행이 시작돼도 놓치지 않습니다.
+    :return: "pending"(큐에서 지움), "running"(중단 요청) 또는 None(이미 끝났거나 서버에 없음)
+    """
+    client = get_client(server)
+    queue = client.get_queue(timeout=timeout)
+    pending = prompt_id in queue_prompt_ids(queue, "queue_pending")
+    if pending:
+        client.delete_queued([prompt_id], timeout=timeout)
+        queue = client.get_queue(timeout=timeout)
+    if prompt_id in queue_prompt_ids(queue, "queue_running"):
+        client.interrupt(prompt_id, timeout=timeout)
+        return "running"
+    return "pending" if pending else None
+
+
+def _cancel_quietly(server: str, prompt_id: str, timeout: int = REQUEST_TIMEOUT) -> None:
+    """시간 초과한 prompt를 취소합니다. 취소 요청이 실패해도 원래 오류(TimeoutError)를 가리지 않게 무시합니다."""
+    try:
+        cancel_prompt(server, prompt_id, timeout)
+    except Exception:
+        pass
 
 
 def get_image(
@@ -310,94 +1250,416 @@ def get_image(
     timeout: int = REQUEST_TIMEOUT,
 ) -> bytes:
     """/view 로 이미지 바이트를 가져옵니다."""
-    base = server.rstrip("/")
-    params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-    resp = requests.get(f"{base}/view", params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp.content
+    return get_client(server).get_image(filename, subfolder, folder_type, timeout=timeout)
+
+
+def download_image(
+    server: str,
+    filename: str,
+    dest: Union[str, Path],
+    subfolder: str = "",
+    folder_type: str = "output",
+    skip_existing: bool = False,
+    sha256: Optional[str] = None,
+    timeout: int = REQUEST_TIMEOUT,
+) -> Path:
+    """
+    /view 이미지를 dest에 스트리밍으로 저장합니다 (임시 파일 → 원자적 교체).
+    :param skip_existing: dest가 이미 있고 크기가 같으면 다시 받지 않음
+    :param sha256: 기대하는 SHA-256 (있으면 기존 파일 확인 및 받은 파일 검증에 사용)
+    :return: dest 경로
+    """
+    return get_client(server).download_image(
+        filename,
+        dest,
+        subfolder=subfolder,
+        folder_type=folder_type,
+        skip_existing=skip_existing,
+        sha256=sha256,
+        timeout=timeout,
+    )
+
+
+class ExecutionError(RuntimeError):
+    """
+    서버에서 prompt 실행이 실패(execution_error)했거나 중단(execution_interrupted)되었을 때 발생합니다.
+    실패한 노드와 서버 쪽 예외 정보를 속성으로 가집니다.
+    """
+
+    def __init__(
+        self,
+        prompt_id: Optional[str],
+        node_id: Optional[str] = None,
+        node_type: Optional[str] = None,
+        exception_type: Optional[str] = None,
+        exception_message: Optional[str] = None,
+        traceback: Optional[List[str]] = None,
+        interrupted: bool = False,
+    ) -> None:
+        self.prompt_id = prompt_id
+        self.node_id = node_id
+        self.node_type = node_type
+        self.exception_type = exception_type
+        self.exception_message = exception_message
+        self.traceback = list(traceback or [])
+        self.interrupted = interrupted
+        where = f", 노드 {node_id} ({node_type})" if node_id is not None else ""
+        if interrupted:
+            message = f"prompt 실행 중단 (prompt_id={prompt_id}{where})"
+        else:
+            detail = ": ".join(part for part in (exception_type, (exception_message or "").strip()) if part)
+            message = f"prompt 실행 실패 (prompt_id={prompt_id}{where})" + (f": {detail}" if detail else "")
+        super().__init__(message)
+
+    @classmethod
+    def from_event(cls, kind: str, data: dict) -> Optional["ExecutionError"]:
+        """execution_error / execution_interrupted 이벤트(WebSocket 메시지 또는 history status.messages 항목)면 예외를, 아니면 None."""
+        if kind not in ("execution_error", "execution_interrupted"):
+            return None
+        return cls(
+            data.get("prompt_id"),
+            node_id=data.get("node_id"),
+            node_type=data.get("node_type"),
+            exception_type=data.get("exception_type"),
+            exception_message=data.get("exception_message"),
+            traceback=data.get("traceback"),
+            interrupted=kind == "execution_interrupted",
+        )
+
+
+def _execution_failure(msg: dict, prompt_id: Optional[str] = None) -> Optional[ExecutionError]:
+    """WebSocket 메시지가 (prompt_id의) 실행 실패·중단 알림이면 ExecutionError를 반환합니다."""
+    data = msg.get("data") or {}
+    if prompt_id is not None and data.get("prompt_id") != prompt_id:
+        return None
+    return ExecutionError.from_event(msg.get("type", ""), data)
+
+
+def history_error(prompt_id: str, entry: dict) -> Optional[ExecutionError]:
+    """history 항목이 실행 실패로 끝났으면 ExecutionError를, 아니면 None을 반환합니다."""
+    status = entry.get("status")
+    if not isinstance(status, dict) or status.get("status_str") != "error":
+        return None
+    for event in status.get("messages") or []:
+        if isinstance(event, (list, tuple)) and len(event) == 2 and isinstance(event[1], dict):
+            error = ExecutionError.from_event(event[0], {"prompt_id": prompt_id, **event[1]})
+            if error is not None:
+                return error
+    return ExecutionError(prompt_id)
 
 
 def wait_execution_done(
     ws: websocket.WebSocket,
     prompt_id: str,
     recv_timeout: float = WS_RECV_TIMEOUT,
+    on_message: Optional[Callable[[dict], None]] = None,
+    on_binary: Optional[Callable[[bytes], None]] = None,
+    deadline: Optional[float] = None,
 ) -> None:
     """
     WebSocket으로 실행 완료(node is None)까지 대기합니다.
+    서버가 execution_error / execution_interrupted를 보내면 바로 ExecutionError를 던집니다.
+    :param recv_timeout: 메시지 하나를 기다리는 시간(초)
+    :param on_message: 받은 JSON 메시지마다 호출 (선택)
+    :param on_binary: 받은 바이너리 프레임마다 호출 (선택, SaveImageWebsocket 이미지 등)
+    :param deadline: time.monotonic() 기준 마감 시각. 진행 메시지가 계속 와도 이 시각을 넘기면 TimeoutError
     """
     while True:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})")
+            ws.settimeout(min(recv_timeout, remaining))
         try:
             out = ws.recv()
         except websocket.WebSocketTimeoutException:
             raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})")
         if isinstance(out, bytes):
+            if on_binary is not None:
+                on_binary(out)
             continue
         try:
             msg = json.loads(out)
         except json.JSONDecodeError:
             continue
-        if msg.get("type") != "executing":
-            continue
-        data = msg.get("data", {})
-        if data.get("node") is None and data.get("prompt_id") == prompt_id:
+        if on_message is not None:
+            on_message(msg)
+        error = _execution_failure(msg, prompt_id)
+        if error is not None:
+            raise error
+        if _is_execution_done(msg, prompt_id):
             break
 
 
-def generate_image(
-    workflow: dict,
-    server: str = DEFAULT_SERVER,
-    save_dir: Optional[Union[str, Path]] = None,
-    client_id: Optional[str] = None,
-    request_timeout: int = REQUEST_TIMEOUT,
-    ws_timeout: float = WS_RECV_TIMEOUT,
-) -> List[Path]:
+def use_websocket_output(workflow: dict) -> Tuple[dict, Dict[str, str]]:
     """
-    워크플로를 /prompt로 전송하고 WebSocket으로 진행 상황을 추적한 뒤,
-    결과 이미지를 save_dir(기본 ./outputs/)에 저장합니다.
-    :param workflow: build_workflow()로 만든 워크플로
-    :param server: ComfyUI 서버 URL
-    :param save_dir: 저장 디렉터리 (None이면 OUTPUTS_DIR)
-    :param client_id: WebSocket client_id (None이면 UUID)
-    :param request_timeout: HTTP 타임아웃(초)
-    :param ws_timeout: WebSocket recv 타임아웃(초)
-    :return: 저장된 이미지 파일 경로 리스트
+    SaveImage 노드를 SaveImageWebsocket으로 바꾼 사본을 만듭니다 (원본은 수정하지 않음).
+    서버는 이미지를 디스크에 쓰지 않고 WebSocket 바이너리 프레임으로 바로 보냅니다.
+    :return: (바뀐 워크플로, {저장 노드 ID: 원래 filename_prefix})
     """
-    save_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
-    save_dir.mkdir(parents=True, exist_ok=True)
+    converted = dict(workflow)
+    prefixes: Dict[str, str] = {}
+    for node_id in find_nodes_by_class(workflow, "SaveImage"):
+        inputs = workflow[node_id].get("inputs", {})
+        prefixes[node_id] = str(inputs.get("filename_prefix", "ComfyUI"))
+        converted[node_id] = {"class_type": "SaveImageWebsocket", "inputs": {"images": inputs.get("images")}}
+    for node_id in find_nodes_by_class(workflow, "SaveImageWebsocket"):
+        prefixes.setdefault(node_id, "ComfyUI")
+    if not prefixes:
+        raise ValueError("워크플로에 SaveImage 노드가 없어 WebSocket 출력으로 바꿀 수 없습니다.")
+    return converted, prefixes
+
+
+def decode_ws_image(frame: bytes) -> Optional[Tuple[memoryview, str]]:
+    """
+    이미지 바이너리 프레임이면 (이미지 바이트, 확장자)를, 아니면 None을 반환합니다.
+    프레임 앞 8바이트(이벤트 타입, 이미지 포맷)는 건너뜁니다.
+    """
+    if len(frame) < 8:
+        return None
+    event, fmt = struct.unpack(">II", frame[:8])
+    if event not in WS_IMAGE_EVENT_TYPES:
+        return None
+    return memoryview(frame)[8:], WS_IMAGE_FORMATS.get(fmt, ".png")
+
+
+class _WsImageCollector:
+    """
+    한 prompt의 SaveImageWebsocket 프레임을 파일(또는 on_image 콜백)로 넘깁니다.
+    같은 WebSocket으로 오는 KSampler 미리보기 프레임과 구분하기 위해,
+    지금 실행 중인 노드(executing 메시지)가 저장 노드일 때 온 프레임만 받습니다.
+    """
+
+    def __init__(
+        self,
+        prefixes: Dict[str, str],
+        save_dir: Path,
+        on_image: Optional[Callable[[bytes, dict], None]] = None,
+    ) -> None:
+        self.prompt_id: Optional[str] = None
+        self.prefixes = prefixes
+        self.save_dir = save_dir
+        self.on_image = on_image
+        self.paths: List[Path] = []
+        self.count = 0
+        # 수신 스레드에서 파일 쓰기·콜백이 실패하면 여기에 남겨 fetch 시점에 다시 던짐
+        self.error: Optional[BaseException] = None
+        # WebSocket이 끊긴 동안 실행돼 이미지 프레임을 놓쳤을 수 있음 (SaveImageWebsocket은 서버에 파일을 남기지 않음)
+        self.missed = False
+
+    def on_image_frame(self, node_id: str, frame: bytes) -> None:
+        decoded = decode_ws_image(frame)
+        if decoded is None or node_id not in self.prefixes:
+            return
+        data, ext = decoded
+        index = self.count
+        self.count += 1
+        if self.on_image is not None:
+            info = {"prompt_id": self.prompt_id, "node_id": node_id, "index": index, "format": ext}
+            self.on_image(bytes(data), info)
+            return
+        prefix = Path(self.prefixes[node_id]).name or "ComfyUI"
+        out_path = self.save_dir / f"{prefix}_{(self.prompt_id or '')[:8]}_{index:05d}_{ext}"
+        tmp_path = out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, out_path)
+        self.paths.append(out_path)
+
+    def result(self) -> List[Path]:
+        if self.missed:
+            raise ConnectionError(
+                f"WebSocket 연결이 끊긴 동안 실행돼 이미지 프레임을 놓쳤을 수 있습니다 (prompt_id={self.prompt_id}). "
+                "다시 제출하거나 history 모드를 쓰세요."
+            )
+        if self.on_image is None and not self.paths:
+            raise RuntimeError(
+                f"WebSocket으로 받은 이미지가 없습니다 (prompt_id={self.prompt_id}). "
+                "서버에 SaveImageWebsocket 노드가 있는지 확인하세요."
+            )
+        return self.paths
 
+
+def _executing_node(msg: dict) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """executing 메시지면 (prompt_id, node)를, 아니면 None을 반환합니다."""
+    if msg.get("type") != "executing":
+        return None
+    data = msg.get("data", {})
+    return data.get("prompt_id"), data.get("node")
+
+
+def _ws_url(server: str) -> str:
+    """HTTP 서버 URL을 WebSocket(/ws) URL로 변환합니다."""
     base = server.rstrip("/")
     host = base.replace("http://", "").replace("https://", "").split("/")[0]
-    ws_url = f"wss://{host}/ws" if base.startswith("https") else f"ws://{host}/ws"
+    return f"wss://{host}/ws" if base.startswith("https") else f"ws://{host}/ws"
+
+
+def _is_execution_done(msg: dict, prompt_id: Optional[str] = None) -> bool:
+    """executing 메시지의 node가 None이면 해당 prompt 실행이 끝난 것입니다."""
+    if msg.get("type") != "executing":
+        return False
+    data = msg.get("data", {})
+    if data.get("node") is not None:
+        return False
+    return prompt_id is None or data.get("prompt_id") == prompt_id
+
+
+def _poll_prompts(
+    server: str, prompt_ids: Iterable[str], timeout: int = REQUEST_TIMEOUT
+) -> Tuple[Dict[str, Optional[ExecutionError]], Set[str]]:
+    """
+    WebSocket 없이 prompt들의 진행 상황을 확인합니다. /queue는 한 번만 조회하고,
+    큐에 없는 prompt만 /history/{prompt_id}로 확인하므로 기다리는 prompt가 많아도 요청이 적습니다.
+    :return: ({끝난 prompt_id: 실패면 ExecutionError, 성공이면 None}, 실행 중인 prompt_id 집합)
+    """
+    queue = get_queue(server, timeout=timeout)
+    running = set(queue_prompt_ids(queue, "queue_running"))
+    queued = running | set(queue_prompt_ids(queue, "queue_pending"))
+    finished: Dict[str, Optional[ExecutionError]] = {}
+    for prompt_id in prompt_ids:
+        if prompt_id in queued:
+            continue
+        # 큐에도 기록에도 없으면 아직 제출 중이거나 기록으로 옮겨지는 중 → 다음 폴링에서 다시 확인
+        entry = get_history(server, prompt_id, timeout=timeout).get(prompt_id)
+        if entry is not None:
+            finished[prompt_id] = history_error(prompt_id, entry)
+    return finished, running
+
+
+async def _wait_polling(
+    server: str,
+    prompt_id: str,
+    timeout: Optional[float] = WS_RECV_TIMEOUT,
+    request_timeout: int = REQUEST_TIMEOUT,
+) -> None:
+    """
+    WebSocket 없이 /queue·/history 폴링으로 prompt 실행이 끝날 때까지 기다립니다
+    (AsyncComfyPool이 연결 오류로 닫은 클라이언트로 보낸 prompt). 간격은 FALLBACK_POLL_MIN부터 늘어남.
+    실패하면 ExecutionError, timeout(초)을 넘기면 서버에서 취소하고 TimeoutError,
+    서버에 WS_RECONNECT_GIVE_UP초 동안 닿지 않으면 ConnectionError.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    interval = FALLBACK_POLL_MIN
+    last_contact = time.monotonic()
+    while True:
+        try:
+            finished, _ = await asyncio.to_thread(_poll_prompts, server, [prompt_id], request_timeout)
+        except (requests.exceptions.RequestException, ValueError):
+            if time.monotonic() - last_contact > WS_RECONNECT_GIVE_UP:
+                raise ConnectionError(f"서버와 연결할 수 없습니다: {server}") from None
+        else:
+            last_contact = time.monotonic()
+            if prompt_id in finished:
+                error = finished[prompt_id]
+                if error is not None:
+                    raise error
+                return
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            await asyncio.to_thread(_cancel_quietly, server, prompt_id, request_timeout)
+            raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})")
+        await asyncio.sleep(interval if deadline is None else min(interval, deadline - now))
+        interval = min(interval * 1.5, FALLBACK_POLL_MAX)
 
-    cid = client_id or str(uuid.uuid4())
-    prompt_id = queue_prompt(workflow, server=server, client_id=cid, timeout=request_timeout)
 
+def _open_ws(server: str, client_id: str, timeout: float) -> websocket.WebSocket:
     ws = websocket.WebSocket()
-    try:
-        ws.settimeout(ws_timeout)
-        ws.connect(f"{ws_url}?clientId={cid}")
-        wait_execution_done(ws, prompt_id, recv_timeout=ws_timeout)
-    finally:
-        ws.close()
+    ws.settimeout(timeout)
+    ws.connect(f"{_ws_url(server)}?clientId={client_id}")
+    return ws
+
+
+def _wait_disconnected(
+    server: str,
+    prompt_id: str,
+    client_id: str,
+    deadline: float,
+    request_timeout: int = REQUEST_TIMEOUT,
+    collector: Optional["_WsImageCollector"] = None,
+) -> Optional[websocket.WebSocket]:
+    """
+    WebSocket이 끊긴 뒤: 같은 clientId로 다시 연결을 시도하면서 /queue·/history로 prompt 완료를 확인합니다.
+    다시 연결한 다음에도 한 번 더 확인하므로 그 사이에 끝난 prompt를 놓치지 않습니다.
+    :return: 다시 연결된 WebSocket (계속 메시지로 대기), 또는 None (이미 성공으로 끝남)
+    """
+    interval = FALLBACK_POLL_MIN
+    last_contact = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})")
+        if now - last_contact > WS_RECONNECT_GIVE_UP:
+            raise ConnectionError(f"서버와 연결할 수 없습니다 (prompt_id={prompt_id})")
+        ws = None
+        try:
+            ws = _open_ws(server, client_id, min(request_timeout, deadline - now))
+        except (websocket.WebSocketException, OSError):
+            pass
+        try:
+            finished, running = _poll_prompts(server, [prompt_id], request_timeout)
+        except (requests.exceptions.RequestException, ValueError):
+            finished, running = None, set()
+        if ws is not None or finished is not None:
+            last_contact = time.monotonic()
+        if finished is not None and collector is not None and (prompt_id in finished or prompt_id in running):
+            collector.missed = True
+        if finished is not None and prompt_id in finished:
+            if ws is not None:
+                ws.close()
+            error = finished[prompt_id]
+            if error is not None:
+                raise error
+            return None
+        if ws is not None:
+            return ws
+        time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+        interval = min(interval * 1.5, FALLBACK_POLL_MAX)
+
 
-    history = get_history(server, prompt_id, timeout=request_timeout)
+def collect_outputs(
+    server: str,
+    prompt_id: str,
+    save_dir: Path,
+    timeout: int = REQUEST_TIMEOUT,
+    skip_existing: bool = False,
+) -> List[Path]:
+    """
+    /history에서 prompt 결과를 조회해 이미지를 save_dir에 저장합니다.
+    이미지가 여러 장이면 DOWNLOAD_WORKERS개까지 동시에 스트리밍으로 받습니다.
+    """
+    history = get_history(server, prompt_id, timeout=timeout)
     if prompt_id not in history:
         raise RuntimeError(f"history에 prompt_id가 없습니다: {prompt_id}")
+    error = history_error(prompt_id, history[prompt_id])
+    if error is not None:
+        raise error
 
     # ComfyUI 버전에 따라 "outputs" 또는 "output" 등일 수 있음
     outputs = history[prompt_id].get("outputs") or history[prompt_id].get("output") or {}
-    saved_paths = []
-    for node_id, node_out in outputs.items():
-        if "images" not in node_out:
-            continue
-        for img in node_out["images"]:
-            subfolder = img.get("subfolder", "")
-            folder_type = img.get("type", "output")
-            filename = img["filename"]
-            data = get_image(server, filename, subfolder, folder_type, timeout=request_timeout)
-            out_path = save_dir / filename
-            out_path.write_bytes(data)
-            saved_paths.append(out_path)
+    images = [
+        img
+        for node_out in outputs.values()
+        if "images" in node_out
+        for img in node_out["images"]
+    ]
+
+    def download(img: dict) -> Path:
+        return download_image(
+            server,
+            img["filename"],
+            save_dir / img["filename"],
+            subfolder=img.get("subfolder", ""),
+            folder_type=img.get("type", "output"),
+            skip_existing=skip_existing,
+            timeout=timeout,
+        )
+
+    if len(images) > 1:
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(images))) as executor:
+            saved_paths = list(executor.map(download, images))
+    else:
+        saved_paths = [download(img) for img in images]
 
     if not saved_paths:
         status = history[prompt_id].get("status", [])
@@ -417,6 +1679,150 @@ def generate_image(
     return saved_paths
 
 
+def generate_image(
+    workflow: dict,
+    server: "ServerSpec" = DEFAULT_SERVER,
+    save_dir: Optional[Union[str, Path]] = None,
+    client_id: Optional[str] = None,
+    request_timeout: int = REQUEST_TIMEOUT,
+    ws_timeout: float = WS_RECV_TIMEOUT,
+    cache: Optional[ResultCache] = None,
+    output_mode: str = "history",
+    on_image: Optional[Callable[[bytes, dict], None]] = None,
+    telemetry: Optional[TelemetryStore] = None,
+    front: bool = False,
+) -> List[Path]:
+    """
+    워크플로를 /prompt로 전송하고 WebSocket으로 진행 상황을 추적한 뒤,
+    결과 이미지를 save_dir(기본 ./outputs/)에 저장합니다.
+    WebSocket이 끊기면 같은 clientId로 다시 연결하고, 그동안은 /queue·/history를 폴링해 완료를 확인합니다
+    (서버에서 끝난 prompt를 다시 보내지 않음).
+    여러 워크플로를 연달아 실행할 때는 AsyncComfyClient를 쓰면 GPU 유휴 시간이 줄어듭니다.
+    :param workflow: build_workflow()로 만든 워크플로
+    :param server: ComfyUI 서버 URL, 서버 URL 리스트 또는 ServerPool.
+        여러 서버면 필요한 체크포인트가 있고 큐가 가장 짧은 서버로 보냅니다.
+    :param save_dir: 저장 디렉터리 (None이면 OUTPUTS_DIR)
+    :param client_id: WebSocket client_id (None이면 UUID)
+    :param request_timeout: HTTP 타임아웃(초)
+    :param ws_timeout: 제출부터 실행 완료까지 기다리는 시간(초). 넘기면 서버에서 prompt를 취소
+        (대기 중이면 큐에서 삭제, 실행 중이면 /interrupt)하고 TimeoutError를 던져 GPU를 붙잡고 있지 않게 합니다
+    :param cache: 결과 캐시. 같은 워크플로(filename_prefix 제외)의 결과가 있으면 서버에 보내지 않고 반환
+    :param output_mode: "history"면 /history + /view로 받고, "websocket"이면 SaveImage를
+        SaveImageWebsocket으로 바꿔 이미지를 WebSocket 프레임으로 바로 받습니다 (HTTP 왕복·서버 디스크 쓰기 없음)
+    :param on_image: websocket 모드에서 이미지마다 on_image(bytes, info)를 호출하고 파일은 쓰지 않음
+        (info: prompt_id, node_id, index, format)
+    :param telemetry: 노드별 실행 시간·캐시 적중을 기록할 TelemetryStore (선택)
+    :param front: True면 서버 큐에서 대기 중인 prompt(다른 프로세스의 스윕 등)보다 먼저 실행
+    :return: 저장된 이미지 파일 경로 리스트
+    :raises ExecutionError: 서버에서 실행이 실패하거나 중단됨 (실패한 노드·예외 정보 포함)
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"output_mode는 {OUTPUT_MODES} 중 하나여야 합니다: {output_mode}")
+    if cache is not None:
+        key = workflow_hash(workflow)
+        cached = cache.get(key, Path(save_dir) if save_dir else OUTPUTS_DIR)
+        if cached is not None:
+            return cached
+        paths = generate_image(
+            workflow,
+            server=server,
+            save_dir=save_dir,
+            client_id=client_id,
+            request_timeout=request_timeout,
+            ws_timeout=ws_timeout,
+            output_mode=output_mode,
+            on_image=on_image,
+            telemetry=telemetry,
+            front=front,
+        )
+        cache.put(key, paths)
+        return paths
+
+    pool = as_server_pool(server)
+    if pool is not None:
+        with pool.lease(workflow_checkpoints(workflow)) as chosen:
+            return generate_image(
+                workflow,
+                server=chosen,
+                save_dir=save_dir,
+                client_id=client_id,
+                request_timeout=request_timeout,
+                ws_timeout=ws_timeout,
+                output_mode=output_mode,
+                on_image=on_image,
+                telemetry=telemetry,
+                front=front,
+            )
+
+    save_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    collector = None
+    on_binary = None
+    current = {"node": None}
+    if output_mode == "websocket":
+        workflow, prefixes = use_websocket_output(workflow)
+        collector = _WsImageCollector(prefixes, save_dir, on_image)
+
+        def on_binary(frame: bytes) -> None:
+            if current["node"] is not None:
+                collector.on_image_frame(current["node"], frame)
+
+    def on_message(msg: dict) -> None:
+        if collector is not None:
+            executing = _executing_node(msg)
+            if executing is not None and executing[0] == collector.prompt_id:
+                current["node"] = executing[1]
+        if telemetry is not None:
+            try:
+                telemetry.observe(msg)
+            except Exception:
+                pass  # 기록 실패로 생성까지 실패하지 않게 함
+
+    cid = client_id or str(uuid.uuid4())
+    # 캐시된 프롬프트는 곧바로 끝나므로, 완료 메시지를 놓치지 않게 WebSocket을 먼저 연결
+    ws: Optional[websocket.WebSocket] = _open_ws(server, cid, ws_timeout)
+    try:
+        queued = time.time()
+        prompt_id = queue_prompt(workflow, server=server, client_id=cid, timeout=request_timeout, front=front)
+        if telemetry is not None:
+            # 메시지는 아래 wait_execution_done에서야 읽으므로 여기서 시작해도 놓치지 않음
+            telemetry.begin(prompt_id, workflow, server, queued)
+        if collector is not None:
+            collector.prompt_id = prompt_id
+        deadline = time.monotonic() + ws_timeout
+        try:
+            while ws is not None:
+                try:
+                    wait_execution_done(
+                        ws,
+                        prompt_id,
+                        recv_timeout=ws_timeout,
+                        on_message=on_message,
+                        on_binary=on_binary,
+                        deadline=deadline,
+                    )
+                    break
+                except TimeoutError:
+                    raise
+                except (websocket.WebSocketException, OSError):
+                    # RunPod 프록시 등에서 연결이 끊겨도 prompt는 서버에서 계속 실행되므로 다시 붙음
+                    ws.close()
+                    ws = None  # 다시 연결될 때까지 닫을 소켓 없음
+                    current["node"] = None
+                    ws = _wait_disconnected(server, prompt_id, cid, deadline, request_timeout, collector)
+        except TimeoutError:
+            _cancel_quietly(server, prompt_id, request_timeout)
+            raise
+    finally:
+        if ws is not None:
+            ws.close()
+
+    if collector is not None:
+        return collector.result()
+    return collect_outputs(server, prompt_id, save_dir, timeout=request_timeout)
+
+
 # ---------------------------------------------------------------------------
 # 유틸
 # ---------------------------------------------------------------------------
@@ -446,3 +1852,868 @@ def update_workflow_by_node_id(
     if "inputs" not in workflow[nid]:
         workflow[nid]["inputs"] = {}
     workflow[nid]["inputs"].update(updates)
+
+
+# ---------------------------------------------------------------------------
+# 비동기 클라이언트 (WebSocket 1개로 여러 프롬프트 다중화)
+# ---------------------------------------------------------------------------
+async def _cache_lookup(
+    cache: Optional[ResultCache],
+    workflow: dict,
+    save_dir: Optional[Union[str, Path]],
+) -> Tuple[Optional[str], Optional[List[Path]]]:
+    """(캐시 키, 적중 시 경로 목록)을 반환합니다. cache가 None이면 (None, None)."""
+    if cache is None:
+        return None, None
+    key = workflow_hash(workflow)
+    out_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
+    return key, await asyncio.to_thread(cache.get, key, out_dir)
+
+
+async def _cache_store(cache: Optional[ResultCache], key: Optional[str], paths: List[Path]) -> None:
+    if cache is not None and key is not None:
+        await asyncio.to_thread(cache.put, key, paths)
+
+
+class AsyncComfyClient:
+    """
+    /ws?clientId= 연결 하나를 계속 유지하면서 여러 프롬프트를 동시에 추적하는 asyncio 클라이언트.
+    WebSocket 수신은 백그라운드 스레드가 담당하고, 완료 메시지를 prompt_id별 Future로 전달합니다.
+    HTTP 호출(/prompt, /history, /view)은 기존 모듈 함수를 asyncio.to_thread로 실행합니다.
+
+    수백 개의 워크플로를 한 번에 제출해 두고 await 할 수 있으므로
+    서버 큐가 비지 않고, 이미지 사이의 클라이언트 쪽 공백이 사라집니다.
+
+        async with AsyncComfyClient(server) as client:
+            results = await client.generate_many(workflows, save_dir="outputs")
+
+    telemetry(TelemetryStore)를 주면 제출한 prompt마다 노드별 실행 시간·캐시 적중을 기록합니다.
+
+    WebSocket이 끊기면 수신 스레드가 같은 clientId로 다시 연결하고, 그동안 이벤트 루프에서
+    /queue(한 번) + 큐에 없는 prompt의 /history로 완료를 확인합니다. 다시 연결되면 한 번 더 확인한 뒤
+    메시지 추적으로 돌아가므로 끊긴 사이에 끝난 prompt도 놓치지 않습니다.
+    """
+
+    def __init__(
+        self,
+        server: str = DEFAULT_SERVER,
+        client_id: Optional[str] = None,
+        request_timeout: int = REQUEST_TIMEOUT,
+        telemetry: Optional[TelemetryStore] = None,
+    ) -> None:
+        self.server = server
+        self.client_id = client_id or str(uuid.uuid4())
+        self.request_timeout = request_timeout
+        self.telemetry = telemetry
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ws: Optional[websocket.WebSocket] = None
+        self._reader: Optional[threading.Thread] = None
+        self._closed = False
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Future 등록 전에 끝난 prompt → 실패했으면 ExecutionError (서버가 prompt_id를 바꿔 돌려준 경우 등)
+        self._early_done: "OrderedDict[str, Optional[ExecutionError]]" = OrderedDict()
+        # websocket 출력 모드 prompt의 이미지 수신기 (수신 스레드에서 사용)
+        self._collectors: Dict[str, _WsImageCollector] = {}
+        self._executing: Tuple[Optional[str], Optional[str]] = (None, None)
+        # 연결이 끊긴 동안의 폴링 태스크와, 다시 연결되면 폴링을 깨우는 이벤트
+        self._connected = False
+        self._stop = threading.Event()
+        self._poller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.reconnects = 0
+
+    async def __aenter__(self) -> "AsyncComfyClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """WebSocket을 열고 수신 스레드를 시작합니다."""
+        if self._ws is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+        self._stop.clear()
+        self._wake = asyncio.Event()
+        self._ws = await asyncio.to_thread(self._open)
+        self._connected = True
+        self._reader = threading.Thread(
+            target=self._reader_loop, name=f"comfy-ws-{self.client_id[:8]}", daemon=True
+        )
+        self._reader.start()
+
+    def _open(self) -> websocket.WebSocket:
+        ws = _open_ws(self.server, self.client_id, self.request_timeout)
+        # 수신 스레드는 메시지가 올 때까지 블록하고, close()에서 소켓을 끊어 깨웁니다.
+        ws.settimeout(None)
+        return ws
+
+    async def close(self) -> None:
+        """WebSocket을 닫고, 아직 기다리는 prompt가 있으면 ConnectionError로 끝냅니다."""
+        self._closed = True
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            # close()만으로는 다른 스레드의 블로킹 recv가 깨지지 않으므로 소켓 양방향을 먼저 끊음
+            sock = ws.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            try:
+                ws.shutdown()
+            except Exception:
+                pass
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join, 5)
+            self._reader = None
+        self._fail_all(ConnectionError("AsyncComfyClient가 닫혔습니다."))
+
+    def _reader_loop(self) -> None:
+        while not self._closed:
+            ws = self._ws
+            if ws is None:
+                return
+            try:
+                out = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception:
+                if self._closed:
+                    return
+                # 서버에서는 prompt가 계속 실행되므로 기다리는 쪽을 실패시키지 않고 폴링으로 넘김
+                self._connected = False
+                self._executing = (None, None)
+                self._call_in_loop(self._on_disconnect)
+                if not self._reconnect(ws):
+                    return
+                continue
+            if isinstance(out, bytes):
+                # 이미지 프레임은 직전 executing 메시지의 (prompt, 노드)에 속함
+                prompt_id, node_id = self._executing
+                collector = self._collectors.get(prompt_id) if prompt_id else None
+                if collector is not None and node_id is not None:
+                    try:
+                        collector.on_image_frame(node_id, out)
+                    except Exception as e:
+                        collector.error = e
+                continue
+            try:
+                msg = json.loads(out)
+            except json.JSONDecodeError:
+                continue
+            executing = _executing_node(msg)
+            if executing is not None:
+                self._executing = executing
+            if self.telemetry is not None:
+                # 수신 시각이 곧 이벤트 시각이므로 이벤트 루프를 거치지 않고 여기서 기록
+                try:
+                    self.telemetry.observe(msg)
+                except Exception:
+                    pass
+            self._call_in_loop(self._dispatch, msg)
+
+    def _reconnect(self, dead: websocket.WebSocket) -> bool:
+        """수신 스레드에서: 같은 clientId로 다시 연결될 때까지 지수 백오프로 재시도합니다. close()되면 False."""
+        try:
+            dead.close()
+        except Exception:
+            pass
+        delay = FALLBACK_POLL_MIN
+        while not self._stop.wait(delay * random.uniform(0.8, 1.2)):
+            try:
+                ws = self._open()
+            except Exception:
+                delay = min(delay * 2, FALLBACK_POLL_MAX)
+                continue
+            if self._closed:
+                ws.close()
+                return False
+            self._ws = ws
+            self._connected = True
+            self.reconnects += 1
+            self._call_in_loop(self._on_reconnect)
+            return True
+        return False
+
+    def _on_disconnect(self) -> None:
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_loop())
+
+    def _on_reconnect(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _poll_loop(self) -> None:
+        """
+        연결이 끊긴 동안 기다리는 prompt의 완료를 폴링으로 확인합니다.
+        변화가 없으면 간격을 늘리고, 다시 연결되면 끊긴 사이에 끝난 prompt를 한 번 더 확인하고 끝냅니다.
+        """
+        interval = FALLBACK_POLL_MIN
+        last_contact = time.monotonic()
+        while not self._closed:
+            reconciling = self._connected
+            self._wake.clear()
+            waiting = [pid for pid, fut in self._waiters.items() if not fut.done()]
+            finished: Optional[Dict[str, Optional[ExecutionError]]] = {}
+            if waiting:
+                try:
+                    finished, running = await asyncio.to_thread(
+                        _poll_prompts, self.server, waiting, self.request_timeout
+                    )
+                except (requests.exceptions.RequestException, ValueError):
+                    finished = None
+            if finished is None:
+                if not self._connected and time.monotonic() - last_contact > WS_RECONNECT_GIVE_UP:
+                    self._fail_all(ConnectionError(f"서버와 연결할 수 없습니다: {self.server}"))
+                    return
+            else:
+                last_contact = time.monotonic()
+                for pid in waiting:
+                    collector = self._collectors.get(pid)
+                    # 끊긴 동안 실행된 websocket 모드 prompt는 이미지 프레임을 놓쳤을 수 있음
+                    if collector is not None and (pid in finished or (not reconciling and pid in running)):
+                        collector.missed = True
+                for pid, error in finished.items():
+                    self._resolve(pid, error)
+                if reconciling:
+                    return
+                interval = FALLBACK_POLL_MIN if finished else min(interval * 1.5, FALLBACK_POLL_MAX)
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _call_in_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # 이벤트 루프가 이미 종료됨
+            pass
+
+    def _dispatch(self, msg: dict) -> None:
+        """이벤트 루프 스레드에서 WebSocket 메시지를 처리합니다."""
+        error = _execution_failure(msg)
+        if error is None and not _is_execution_done(msg):
+            return
+        prompt_id = msg.get("data", {}).get("prompt_id")
+        if prompt_id is None:
+            return
+        self._resolve(prompt_id, error)
+
+    def _resolve(self, prompt_id: str, error: Optional[ExecutionError]) -> None:
+        """prompt가 끝났음을 기다리는 쪽에 알립니다 (WebSocket 메시지 또는 폴링)."""
+        fut = self._waiters.get(prompt_id)
+        if fut is None:
+            # 실패 뒤에 오는 완료(node None) 메시지가 실패 기록을 덮지 않게 함
+            if error is not None or prompt_id not in self._early_done:
+                self._early_done[prompt_id] = error
+            while len(self._early_done) > 1024:
+                self._early_done.popitem(last=False)
+            return
+        if fut.done():
+            return
+        if error is not None:
+            # 실패하면 이미지가 오지 않으므로 수신기도 정리
+            self._collectors.pop(prompt_id, None)
+            fut.set_exception(error)
+        else:
+            fut.set_result(None)
+
+    def _fail_all(self, exc: BaseException) -> None:
+        for fut in self._waiters.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        self._collectors.clear()
+
+    @property
+    def listening(self) -> bool:
+        """수신 스레드가 살아 있는지 (끊겨도 다시 연결하는 중이면 True)."""
+        return not self._closed and self._reader is not None and self._reader.is_alive()
+
+    def pending(self) -> List[str]:
+        """완료를 기다리는 prompt_id 목록."""
+        return [prompt_id for prompt_id, fut in self._waiters.items() if not fut.done()]
+
+    def _register(self, prompt_id: str) -> asyncio.Future:
+        fut = self._waiters.get(prompt_id)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters[prompt_id] = fut
+        if prompt_id in self._early_done:
+            error = self._early_done.pop(prompt_id)
+            if not fut.done():
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(None)
+        return fut
+
+    async def submit(
+        self,
+        workflow: dict,
+        output_mode: str = "history",
+        save_dir: Optional[Union[str, Path]] = None,
+        on_image: Optional[Callable[[bytes, dict], None]] = None,
+        prompt_id: Optional[str] = None,
+        front: bool = False,
+    ) -> str:
+        """
+        워크플로를 큐에 넣고 prompt_id를 반환합니다. 완료는 wait()로 기다립니다.
+        완료 메시지를 놓치지 않도록 prompt_id를 먼저 만들어 Future를 등록한 뒤 전송합니다.
+        prompt_id를 주면 그 ID로 보냅니다 (전송 전에 작업 기록에 남겨 둘 때).
+        front=True면 대기 중인 prompt들보다 앞에 넣습니다.
+        output_mode="websocket"이면 이미지를 WebSocket 프레임으로 받아 save_dir에 쓰거나
+        on_image(bytes, info)에 넘깁니다 (on_image는 WebSocket 수신 스레드에서 호출됨).
+        """
+        if self._ws is None:
+            raise RuntimeError("connect()를 먼저 호출하세요.")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"output_mode는 {OUTPUT_MODES} 중 하나여야 합니다: {output_mode}")
+        collector = None
+        if output_mode == "websocket":
+            workflow, prefixes = use_websocket_output(workflow)
+            out_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
+            out_dir.mkdir(parents=True, exist_ok=True)
+            collector = _WsImageCollector(prefixes, out_dir, on_image)
+        prompt_id = prompt_id or str(uuid.uuid4())
+        self._register(prompt_id)
+        if collector is not None:
+            collector.prompt_id = prompt_id
+            self._collectors[prompt_id] = collector
+        if self.telemetry is not None:
+            self.telemetry.begin(prompt_id, workflow, self.server)
+        try:
+            actual_id = await asyncio.to_thread(
+                queue_prompt,
+                workflow,
+                server=self.server,
+                client_id=self.client_id,
+                prompt_id=prompt_id,
+                timeout=self.request_timeout,
+                front=front,
+            )
+        except BaseException:
+            self._waiters.pop(prompt_id, None)
+            self._collectors.pop(prompt_id, None)
+            if self.telemetry is not None:
+                self.telemetry.discard(prompt_id)
+            raise
+        if actual_id != prompt_id:
+            # 구버전 ComfyUI는 요청한 prompt_id를 무시하고 새로 발급합니다.
+            self._waiters.pop(prompt_id, None)
+            self._register(actual_id)
+            if self.telemetry is not None:
+                self.telemetry.rename(prompt_id, actual_id)
+            if collector is not None:
+                collector.prompt_id = actual_id
+                self._collectors[actual_id] = self._collectors.pop(prompt_id)
+        return actual_id
+
+    async def wait(self, prompt_id: str, timeout: Optional[float] = None) -> None:
+        """
+        prompt 실행이 끝날 때까지 기다립니다.
+        서버가 실행 실패·중단을 알리면 바로 ExecutionError를 던집니다.
+        timeout(초)을 넘기면 서버에서 prompt를 취소(대기 중이면 큐에서 삭제, 실행 중이면 /interrupt)하고 TimeoutError.
+        """
+        fut = self._register(prompt_id)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            self._waiters.pop(prompt_id, None)
+            self._collectors.pop(prompt_id, None)
+            await asyncio.to_thread(_cancel_quietly, self.server, prompt_id, self.request_timeout)
+            raise TimeoutError(f"실행 대기 시간 초과 (prompt_id={prompt_id})") from None
+        except asyncio.CancelledError:
+            # 기다리던 쪽이 그만두면 더 알릴 곳이 없으므로 등록을 지움 (연결 종료 시 미처리 예외 경고 방지)
+            self._waiters.pop(prompt_id, None)
+            self._collectors.pop(prompt_id, None)
+            raise
+        finally:
+            if fut.done():
+                self._waiters.pop(prompt_id, None)
+
+    async def fetch_outputs(
+        self,
+        prompt_id: str,
+        save_dir: Optional[Union[str, Path]] = None,
+    ) -> List[Path]:
+        """
+        완료된 prompt의 결과 이미지를 save_dir(기본 OUTPUTS_DIR)에 저장합니다.
+        websocket 모드로 제출한 prompt면 이미 받은 이미지 경로를 반환합니다.
+        """
+        collector = self._collectors.pop(prompt_id, None)
+        if collector is not None:
+            if collector.error is not None:
+                raise collector.error
+            return collector.result()
+        out_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        return await asyncio.to_thread(
+            collect_outputs, self.server, prompt_id, out_dir, self.request_timeout
+        )
+
+    async def generate(
+        self,
+        workflow: dict,
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = WS_RECV_TIMEOUT,
+        cache: Optional[ResultCache] = None,
+        output_mode: str = "history",
+        on_image: Optional[Callable[[bytes, dict], None]] = None,
+        front: bool = False,
+    ) -> List[Path]:
+        """generate_image()의 비동기 버전: (캐시 확인 →) 제출 → 완료 대기 → 결과 저장."""
+        key, cached = await _cache_lookup(cache, workflow, save_dir)
+        if cached is not None:
+            return cached
+        prompt_id = await self.submit(workflow, output_mode, save_dir, on_image, front=front)
+        await self.wait(prompt_id, timeout=timeout)
+        paths = await self.fetch_outputs(prompt_id, save_dir)
+        await _cache_store(cache, key, paths)
+        return paths
+
+    async def generate_many(
+        self,
+        workflows: Iterable[dict],
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = WS_RECV_TIMEOUT,
+        return_exceptions: bool = False,
+        cache: Optional[ResultCache] = None,
+        output_mode: str = "history",
+    ) -> List[Any]:
+        """
+        여러 워크플로를 입력 순서대로 모두 큐에 넣은 뒤, 완료와 결과 저장을 동시에 기다립니다.
+        결과 순서는 입력 순서와 같습니다. return_exceptions=True면 실패한 항목 자리에 예외가 들어갑니다.
+        cache를 주면 이미 결과가 있는 워크플로는 제출하지 않습니다.
+        """
+        # 제출은 순서대로 (서버 큐 순서 = 입력 순서), 대기/다운로드만 병렬로
+        submitted: List[Any] = []
+        for wf in workflows:
+            try:
+                key, cached = await _cache_lookup(cache, wf, save_dir)
+                if cached is None:
+                    cached = await self.submit(wf, output_mode, save_dir)
+                submitted.append((key, cached))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                submitted.append((None, e))
+
+        async def finish(item: Any) -> List[Path]:
+            key, value = item
+            if isinstance(value, Exception):
+                raise value
+            if isinstance(value, list):
+                return value  # 캐시 적중
+            await self.wait(value, timeout=timeout)
+            paths = await self.fetch_outputs(value, save_dir)
+            await _cache_store(cache, key, paths)
+            return paths
+
+        return await asyncio.gather(
+            *(finish(item) for item in submitted), return_exceptions=return_exceptions
+        )
+
+
+# ---------------------------------------------------------------------------
+# 여러 서버(파드) 부하 분산
+# ---------------------------------------------------------------------------
+class _ServerState:
+    """ServerPool이 서버마다 기억하는 상태."""
+
+    def __init__(self) -> None:
+        self.healthy = True
+        self.queue_depth = 0
+        # 마지막 /queue 조회 이후 이 프로세스가 보낸 작업 수 - 끝난 작업 수
+        self.local_delta = 0
+        self.last_poll = 0.0
+        self.failed_at = 0.0
+        self.checkpoints: Optional[List[str]] = None
+        self.checkpoints_at = 0.0
+
+    @property
+    def load(self) -> int:
+        return max(0, self.queue_depth + self.local_delta)
+
+
+class ServerPool:
+    """
+    여러 ComfyUI 서버 중 작업을 보낼 서버를 고릅니다.
+    - 각 서버의 /queue (queue_running + queue_pending)를 주기적으로 조회해 가장 한가한 서버 선택
+    - /models/checkpoints 목록에 필요한 체크포인트가 있는 서버만 후보로 사용
+    - 조회에 실패한 서버는 retry_after초 동안 후보에서 제외 후 다시 확인
+    """
+
+    def __init__(
+        self,
+        servers: Sequence[str],
+        poll_interval: float = POOL_POLL_INTERVAL,
+        retry_after: float = POOL_RETRY_AFTER,
+        checkpoint_ttl: float = POOL_CHECKPOINT_TTL,
+        timeout: int = REQUEST_TIMEOUT,
+    ) -> None:
+        if not servers:
+            raise ValueError("servers가 비어 있을 수 없습니다.")
+        self.servers = [s.rstrip("/") for s in servers]
+        self.poll_interval = poll_interval
+        self.retry_after = retry_after
+        self.checkpoint_ttl = checkpoint_ttl
+        self.timeout = timeout
+        self._states = {s: _ServerState() for s in self.servers}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    def _poll(self, server: str) -> None:
+        state = self._states[server]
+        now = time.monotonic()
+        try:
+            queue = get_queue(server, timeout=self.timeout)
+            checkpoints = state.checkpoints
+            if checkpoints is None or now - state.checkpoints_at > self.checkpoint_ttl:
+                checkpoints = get_available_checkpoints(server, timeout=self.timeout)
+        except Exception:
+            with self._lock:
+                state.healthy = False
+                state.failed_at = now
+                state.last_poll = now
+            return
+        with self._lock:
+            state.healthy = True
+            state.queue_depth = len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+            state.local_delta = 0
+            state.last_poll = now
+            if checkpoints is not state.checkpoints:
+                state.checkpoints = list(checkpoints)
+                state.checkpoints_at = now
+
+    def refresh(self, force: bool = False) -> None:
+        """오래된 서버 상태를 병렬로 다시 조회합니다. 실패한 서버는 retry_after가 지나야 재확인."""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for server, state in self._states.items():
+                if not state.healthy and now - state.failed_at < self.retry_after and not force:
+                    continue
+                if force or now - state.last_poll >= self.poll_interval:
+                    stale.append(server)
+        if len(stale) == 1:
+            self._poll(stale[0])
+        elif stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as ex:
+                list(ex.map(self._poll, stale))
+
+    def acquire(self, required_checkpoints: Iterable[str] = ()) -> str:
+        """
+        필요한 체크포인트가 모두 있는 정상 서버 중 부하가 가장 작은 서버를 골라 반환합니다.
+        반환된 서버는 작업이 끝나면 release()로 돌려주세요 (lease() 권장).
+        """
+        required = [c for c in required_checkpoints if c]
+        self.refresh()
+        with self._lock:
+            candidates = []
+            for index, server in enumerate(self.servers):
+                state = self._states[server]
+                if not state.healthy:
+                    continue
+                if state.checkpoints is not None and any(c not in state.checkpoints for c in required):
+                    continue
+                candidates.append((state.load, index, server))
+            if not candidates:
+                raise RuntimeError(
+                    f"사용 가능한 ComfyUI 서버가 없습니다 (필요 체크포인트: {required or '없음'}, "
+                    f"서버: {self.servers})"
+                )
+            _, _, server = min(candidates)
+            self._states[server].local_delta += 1
+            return server
+
+    def release(self, server: str) -> None:
+        """acquire()로 받은 서버의 작업이 끝났음을 알립니다."""
+        with self._lock:
+            state = self._states.get(server.rstrip("/"))
+            if state is not None:
+                state.local_delta -= 1
+
+    def mark_failed(self, server: str) -> None:
+        """서버를 retry_after초 동안 후보에서 제외합니다."""
+        with self._lock:
+            state = self._states.get(server.rstrip("/"))
+            if state is not None:
+                state.healthy = False
+                state.failed_at = time.monotonic()
+
+    @contextmanager
+    def lease(self, required_checkpoints: Iterable[str] = ()) -> Iterator[str]:
+        """
+        with pool.lease(["model.safetensors"]) as server: ...
+        연결 오류가 나면 해당 서버를 후보에서 제외합니다.
+        """
+        server = self.acquire(required_checkpoints)
+        try:
+            yield server
+        except (requests.exceptions.ConnectionError, websocket.WebSocketException, ConnectionError):
+            self.mark_failed(server)
+            raise
+        finally:
+            self.release(server)
+
+    def status(self) -> Dict[str, dict]:
+        """서버별 상태 요약 (healthy, load, checkpoints 개수)."""
+        with self._lock:
+            return {
+                server: {
+                    "healthy": state.healthy,
+                    "load": state.load,
+                    "checkpoints": None if state.checkpoints is None else len(state.checkpoints),
+                }
+                for server, state in self._states.items()
+            }
+
+
+ServerSpec = Union[str, Sequence[str], ServerPool]
+_POOLS: Dict[tuple, ServerPool] = {}
+
+
+def as_server_pool(server: ServerSpec) -> Optional[ServerPool]:
+    """
+    server 인자가 여러 서버를 뜻하면 ServerPool을, 단일 URL이면 None을 반환합니다.
+    같은 서버 목록에는 같은 ServerPool을 재사용합니다 (상태 공유).
+    """
+    if isinstance(server, ServerPool):
+        return server
+    if isinstance(server, str):
+        return None
+    servers = tuple(s.rstrip("/") for s in server)
+    if len(servers) == 1:
+        return None
+    pool = _POOLS.get(servers)
+    if pool is None:
+        pool = _POOLS[servers] = ServerPool(servers)
+    return pool
+
+
+def single_server(server: ServerSpec) -> str:
+    """단일 서버 URL로 바꿉니다 (리스트가 1개짜리일 때)."""
+    if isinstance(server, str):
+        return server
+    if isinstance(server, ServerPool):
+        raise ValueError("ServerPool은 단일 서버로 바꿀 수 없습니다. acquire()를 사용하세요.")
+    return list(server)[0]
+
+
+def servers_from_env(default: str = DEFAULT_SERVER) -> List[str]:
+    """환경변수 COMFY_SERVERS(쉼표 구분)에서 서버 목록을 읽습니다. 없으면 [default]."""
+    raw = os.getenv(SERVERS_ENV, "")
+    servers = [s.strip() for s in raw.split(",") if s.strip()]
+    return servers or [default]
+
+
+class AsyncComfyPool:
+    """
+    여러 서버에 AsyncComfyClient를 하나씩 두고, 작업마다 ServerPool로 서버를 골라 보냅니다.
+    서버가 하나면 AsyncComfyClient와 같게 동작하므로 스윕 스크립트는 항상 이 클래스를 써도 됩니다.
+
+        async with AsyncComfyPool(cw.servers_from_env()) as pool:
+            results = await pool.generate_many(workflows, return_exceptions=True)
+    """
+
+    def __init__(
+        self,
+        servers: Union[Sequence[str], ServerPool],
+        request_timeout: int = REQUEST_TIMEOUT,
+        telemetry: Optional[TelemetryStore] = None,
+    ) -> None:
+        self.pool = servers if isinstance(servers, ServerPool) else ServerPool(list(servers))
+        self.request_timeout = request_timeout
+        self.telemetry = telemetry
+        self.clients: Dict[str, AsyncComfyClient] = {}
+        # 연결 중인 클라이언트: 동시에 들어온 제출이 연결이 끝나기 전에 보내지 않게 함께 기다림
+        self._connecting: Dict[str, asyncio.Future] = {}
+        # 서버별: WebSocket 오류로 닫은 클라이언트로 보낸 prompt → wait()가 HTTP 폴링으로 이어서 기다림
+        self._detached: Dict[str, Set[str]] = {}
+
+    async def __aenter__(self) -> "AsyncComfyPool":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, {}
+        self._connecting.clear()
+        self._detached.clear()
+        for client in clients.values():
+            await client.close()
+
+    async def _client(self, server: str) -> AsyncComfyClient:
+        client = self.clients.get(server)
+        if client is None:
+            client = AsyncComfyClient(server, request_timeout=self.request_timeout, telemetry=self.telemetry)
+            self.clients[server] = client
+            self._connecting[server] = asyncio.ensure_future(client.connect())
+        connecting = self._connecting.get(server)
+        if connecting is not None:
+            try:
+                await asyncio.shield(connecting)
+            except BaseException:
+                if connecting.done():
+                    await self._drop(server, client)
+                raise
+            finally:
+                if connecting.done() and self._connecting.get(server) is connecting:
+                    del self._connecting[server]
+        return client
+
+    async def _drop(self, server: str, client: AsyncComfyClient) -> None:
+        """
+        연결 오류가 난 클라이언트를 닫고(수신 스레드·WebSocket 정리) 다음 제출에서 새로 연결하게 합니다.
+        이 클라이언트로 보낸 prompt는 서버에서 계속 실행되므로 wait()가 HTTP 폴링으로 이어서 기다립니다.
+        """
+        if self.clients.get(server) is client:
+            del self.clients[server]
+            self._connecting.pop(server, None)
+        self._detached.setdefault(server, set()).update(client.pending())
+        await client.close()
+
+    async def submit(
+        self,
+        workflow: dict,
+        output_mode: str = "history",
+        save_dir: Optional[Union[str, Path]] = None,
+        on_image: Optional[Callable[[bytes, dict], None]] = None,
+        prompt_id: Optional[str] = None,
+        front: bool = False,
+    ) -> tuple:
+        """작업을 가장 한가한 서버에 넣고 (server, prompt_id)를 반환합니다. 인자는 AsyncComfyClient.submit과 같음."""
+        server = await asyncio.to_thread(self.pool.acquire, workflow_checkpoints(workflow))
+        client = None
+        try:
+            client = await self._client(server)
+            return server, await client.submit(workflow, output_mode, save_dir, on_image, prompt_id, front)
+        except (requests.exceptions.ConnectionError, websocket.WebSocketException, OSError) as e:
+            self.pool.mark_failed(server)
+            self.pool.release(server)
+            # 연결 실패는 _client()가 이미 정리함. POST /prompt만 실패했으면 WebSocket은 살아 있으므로
+            # 클라이언트를 그대로 두어 기다리는 prompt(websocket 모드 이미지 수신 포함)를 잃지 않음
+            if client is not None and (isinstance(e, websocket.WebSocketException) or not client.listening):
+                await self._drop(server, client)
+            raise
+        except BaseException:
+            self.pool.release(server)
+            raise
+
+    async def wait(self, server: str, prompt_id: str, timeout: Optional[float] = WS_RECV_TIMEOUT) -> None:
+        """
+        submit()한 작업의 실행이 끝날 때까지 기다립니다. 끝나면(실패해도) 서버 부하 계산에서 뺍니다.
+        결과 다운로드는 GPU를 쓰지 않으므로 그 전에 다음 작업이 이 서버로 갈 수 있습니다.
+        연결 오류로 클라이언트를 닫았으면(기다리던 중이어도) /queue·/history 폴링으로 이어서 기다립니다.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        detached = self._detached.get(server, set())
+        try:
+            client = self.clients.get(server)
+            if client is not None and prompt_id not in detached:
+                try:
+                    await client.wait(prompt_id, timeout=timeout)
+                    return
+                except ConnectionError:
+                    detached = self._detached.get(server, set())
+                    if prompt_id not in detached:
+                        raise
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await _wait_polling(server, prompt_id, remaining, self.request_timeout)
+        finally:
+            detached.discard(prompt_id)
+            self.pool.release(server)
+
+    async def fetch_outputs(
+        self,
+        server: str,
+        prompt_id: str,
+        save_dir: Optional[Union[str, Path]] = None,
+    ) -> List[Path]:
+        """wait()가 끝난 작업의 결과를 저장합니다 (AsyncComfyClient.fetch_outputs와 같음)."""
+        client = self.clients.get(server)
+        if client is not None:
+            return await client.fetch_outputs(prompt_id, save_dir)
+        # 클라이언트를 닫은 뒤: history 모드 결과는 /history·/view로 그대로 받을 수 있음
+        out_dir = Path(save_dir) if save_dir else OUTPUTS_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        return await asyncio.to_thread(collect_outputs, server, prompt_id, out_dir, self.request_timeout)
+
+    async def finish(
+        self,
+        server: str,
+        prompt_id: str,
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = WS_RECV_TIMEOUT,
+    ) -> List[Path]:
+        """submit()한 작업의 완료를 기다리고 결과를 저장합니다."""
+        await self.wait(server, prompt_id, timeout)
+        return await self.fetch_outputs(server, prompt_id, save_dir)
+
+    async def generate(
+        self,
+        workflow: dict,
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = WS_RECV_TIMEOUT,
+        cache: Optional[ResultCache] = None,
+        output_mode: str = "history",
+        on_image: Optional[Callable[[bytes, dict], None]] = None,
+        front: bool = False,
+    ) -> List[Path]:
+        key, cached = await _cache_lookup(cache, workflow, save_dir)
+        if cached is not None:
+            return cached
+        server, prompt_id = await self.submit(workflow, output_mode, save_dir, on_image, front=front)
+        paths = await self.finish(server, prompt_id, save_dir, timeout)
+        await _cache_store(cache, key, paths)
+        return paths
+
+    async def generate_many(
+        self,
+        workflows: Iterable[dict],
+        save_dir: Optional[Union[str, Path]] = None,
+        timeout: Optional[float] = WS_RECV_TIMEOUT,
+        return_exceptions: bool = False,
+        cache: Optional[ResultCache] = None,
+        output_mode: str = "history",
+    ) -> List[Any]:
+        """AsyncComfyClient.generate_many와 같지만 작업마다 서버를 골라 분산합니다."""
+        submitted: List[Any] = []
+        for wf in workflows:
+            try:
+                key, cached = await _cache_lookup(cache, wf, save_dir)
+                if cached is None:
+                    cached = await self.submit(wf, output_mode, save_dir)
+                submitted.append((key, cached))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                submitted.append((None, e))
+
+        async def finish(item: Any) -> List[Path]:
+            key, value = item
+            if isinstance(value, Exception):
+                raise value
+            if isinstance(value, list):
+                return value  # 캐시 적중
+            paths = await self.finish(value[0], value[1], save_dir, timeout)
+            await _cache_store(cache, key, paths)
+            return paths
+
+        return await asyncio.gather(
+            *(finish(item) for item in submitted), return_exceptions=return_exceptions
+        )
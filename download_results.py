@@ -1,43 +1,60 @@
-import requests
-import json
+import argparse
 import os
+import sys
+
+from comfy_sync import SYNC_WORKERS, HistorySync
 
 BASE_URL = "https://w2672t3cq8hyic-8188.proxy.runpod.net"
+# Several pods: pass URLs as arguments or set COMFY_SERVERS="https://a-8188...,https://b-8188..."
+SERVERS = [s.strip() for s in os.getenv("COMFY_SERVERS", BASE_URL).split(",") if s.strip()]
 OUTPUT_DIR = r"c:\Users\jhk92\OneDrive\문서\GitHub\ai\Moltbot\output"
 
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-
-def download_recent():
-    r = requests.get(f"{BASE_URL}/history")
-    history = r.json()
-    
-    # Get last 5 jobs
-    items = list(history.values())[-5:]
-    
-    print(f"Checking last 5 jobs for outputs...")
-    for item in items:
-        outputs = item.get('outputs', {})
-        for node_id, out in outputs.items():
-            if 'images' in out:
-                for img in out['images']:
-                    fn = img['filename']
-                    local_path = os.path.join(OUTPUT_DIR, fn)
-                    
-                    if os.path.exists(local_path):
-                        print(f"Skipping {fn}, already exists.")
-                        continue
-                        
-                    print(f"Downloading {fn}...")
-                    img_url = f"{BASE_URL}/view?filename={fn}&type=output"
-                    try:
-                        img_res = requests.get(img_url)
-                        img_res.raise_for_status()
-                        with open(local_path, 'wb') as f:
-                            f.write(img_res.content)
-                        print(f"  Saved to {local_path}")
-                    except Exception as e:
-                        print(f"  Error downloading {fn}: {e}")
+
+def download_new(sync, base_url=BASE_URL, prompt_ids=None):
+    """Download outputs of prompts finished since the last run (cursor in .comfy_sync.json)."""
+    base_url = base_url.rstrip("/")
+    print(f"Syncing new outputs from {base_url}...")
+    try:
+        result = sync.sync(base_url, prompt_ids)
+    except Exception as e:
+        print(f"  Error reading history: {e}")
+        return None
+    for path in result["downloaded"]:
+        print(f"  Saved {path.name}")
+    skipped = len(result["files"]) - len(result["downloaded"])
+    print(
+        f"  {result['entries']} new prompt(s), {len(result['downloaded'])} file(s) saved to {sync.save_dir}"
+        + (f", {skipped} already present" if skipped else "")
+        + (f", {result['errors']} failed on the server" if result["errors"] else "")
+        + (f", {result['failed']} to retry next run" if result["failed"] else "")
+        + (f", pruned {result['pruned']} from server history" if result["pruned"] else "")
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download new ComfyUI outputs from /history")
+    parser.add_argument("servers", nargs="*", help="Server URLs (default: COMFY_SERVERS or BASE_URL)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--prompt", action="append", dest="prompt_ids", metavar="PROMPT_ID",
+                        help="Only fetch these prompts via /history/{id} (repeatable)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete fully downloaded prompts from the server history so later syncs stay small")
+    parser.add_argument("--full", action="store_true",
+                        help="Forget the cursor and re-check the whole history (existing files are skipped)")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS, help="Parallel downloads")
+    args = parser.parse_args()
+
+    sync = HistorySync(args.output_dir, prune=args.prune, workers=args.workers)
+    if args.full:
+        sync.reset()
+    failed = 0
+    for server in args.servers or SERVERS:
+        result = download_new(sync, server, args.prompt_ids)
+        if result is None or result["failed"]:
+            failed += 1
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
-    download_recent()
+    sys.exit(main())
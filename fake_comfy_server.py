@@ -0,0 +1,633 @@
+# -*- coding: utf-8 -*-
+"""
+벤치마크·로컬 확인용 가짜 ComfyUI 서버 (표준 라이브러리만 사용, GPU·외부 네트워크 불필요).
+실제 서버와 같은 HTTP/WebSocket 프로토콜로 응답하므로 comfy_workflow 클라이언트를 그대로 붙일 수 있습니다.
+
+    with FakeComfyServer(job_latency=0.05, image_width=512, image_height=512) as server:
+        cw.generate_image(workflow, server=server.url)
+
+- 작업은 큐 순서대로 하나씩 실행하며, job_latency(초)를 노드 수로 나눠 노드마다 executing을 보냄
+- KSampler는 steps만큼 progress 메시지를 보냄
+- SaveImage/PreviewImage는 image_width×image_height PNG를 만들고 (image_bytes로 크기 부풀리기 가능),
+  SaveImageWebsocket은 바이너리 프레임으로 보냄
+- fail_class 노드는 execution_error로 실패하고, /interrupt는 실행 중인 작업을 execution_interrupted로 멈춤
+- drop_websockets()로 프록시가 WebSocket을 끊는 상황을 흉내 냄 (refuse_for초 동안 재연결 거부)
+- RunPod 정지 API(POST /v1/user/pods/{pod_id}/stop)도 흉내 냄: RUNPOD_API_URL=server.url + "/v1"로
+  pod_manager.stop_pod()·pod_watchdog을 시험하고, stops에 정지 요청 시각과 그때 남아 있던 큐 길이를 남김
+- stats에 엔드포인트별 호출 수를 셈
+
+직접 띄우기: python fake_comfy_server.py --port 8188 --latency 0.5
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OUTPUT_CLASSES = ("SaveImage", "PreviewImage", "SaveImageWebsocket")
+SAMPLERS = ["euler", "euler_ancestral", "heun", "dpm_2", "dpmpp_2m", "dpmpp_2m_sde", "dpmpp_sde", "lcm", "ddim", "uni_pc"]
+SCHEDULERS = ["normal", "karras", "exponential", "sgm_uniform", "simple", "ddim_uniform", "beta"]
+INT_MAX = 0xFFFFFFFFFFFFFFFF
+
+
+def _node(required: dict, output: List[str], output_node: bool = False, hidden: Optional[dict] = None) -> dict:
+    entry = {"input": {"required": required}, "output": output, "output_name": output, "output_node": output_node}
+    if hidden:
+        entry["input"]["hidden"] = hidden
+    return entry
+
+
+def make_object_info(checkpoints: List[str], loras: List[str]) -> dict:
+    """템플릿(node_templates/)에 쓰이는 노드만 담은 /object_info 응답 (실제 ComfyUI와 같은 형식)."""
+    image_out = {"images": ["IMAGE"]}
+    save_hidden = {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"}
+    return {
+        "CheckpointLoaderSimple": _node({"ckpt_name": [checkpoints]}, ["MODEL", "CLIP", "VAE"]),
+        "LoraLoader": _node(
+            {
+                "model": ["MODEL"],
+                "clip": ["CLIP"],
+                "lora_name": [loras],
+                "strength_model": ["FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0}],
+                "strength_clip": ["FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0}],
+            },
+            ["MODEL", "CLIP"],
+        ),
+        "VAELoader": _node({"vae_name": [["sdxl_vae.safetensors"]]}, ["VAE"]),
+        "ControlNetLoader": _node({"control_net_name": [["control_v11p_sd15_canny.pth"]]}, ["CONTROL_NET"]),
+        "ControlNetApply": _node(
+            {
+                "conditioning": ["CONDITIONING"],
+                "control_net": ["CONTROL_NET"],
+                "image": ["IMAGE"],
+                "strength": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0}],
+            },
+            ["CONDITIONING"],
+        ),
+        "UpscaleModelLoader": _node({"model_name": [["RealESRGAN_x4plus.pth"]]}, ["UPSCALE_MODEL"]),
+        "ImageUpscaleWithModel": _node({"upscale_model": ["UPSCALE_MODEL"], "image": ["IMAGE"]}, ["IMAGE"]),
+        "LoadImage": _node({"image": [[], {"image_upload": True}]}, ["IMAGE", "MASK"]),
+        "EmptyLatentImage": _node(
+            {
+                "width": ["INT", {"default": 512, "min": 16, "max": 16384}],
+                "height": ["INT", {"default": 512, "min": 16, "max": 16384}],
+                "batch_size": ["INT", {"default": 1, "min": 1, "max": 4096}],
+            },
+            ["LATENT"],
+        ),
+        "CLIPTextEncode": _node({"text": ["STRING", {"multiline": True}], "clip": ["CLIP"]}, ["CONDITIONING"]),
+        "KSampler": _node(
+            {
+                "model": ["MODEL"],
+                "seed": ["INT", {"default": 0, "min": 0, "max": INT_MAX}],
+                "steps": ["INT", {"default": 20, "min": 1, "max": 10000}],
+                "cfg": ["FLOAT", {"default": 8.0, "min": 0.0, "max": 100.0}],
+                "sampler_name": [SAMPLERS],
+                "scheduler": [SCHEDULERS],
+                "positive": ["CONDITIONING"],
+                "negative": ["CONDITIONING"],
+                "latent_image": ["LATENT"],
+                "denoise": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0}],
+            },
+            ["LATENT"],
+        ),
+        "VAEDecode": _node({"samples": ["LATENT"], "vae": ["VAE"]}, ["IMAGE"]),
+        "VAEEncode": _node({"pixels": ["IMAGE"], "vae": ["VAE"]}, ["LATENT"]),
+        "SaveImage": _node(
+            dict(image_out, filename_prefix=["STRING", {"default": "ComfyUI"}]), [], True, save_hidden
+        ),
+        "PreviewImage": _node(dict(image_out), [], True, save_hidden),
+        "SaveImageWebsocket": _node(dict(image_out), [], True),
+    }
+
+
+def make_png(width: int, height: int, min_bytes: int = 0) -> bytes:
+    """단색 RGB PNG. min_bytes보다 작으면 tEXt 청크로 채웁니다."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + b"\x80\x40\x20" * width for _ in range(height))
+    png = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    png += chunk(b"IDAT", zlib.compress(raw, 9))
+    pad = min_bytes - len(png) - 12 - 12
+    if pad > 0:
+        png += chunk(b"tEXt", b"pad\x00" + b"x" * pad)
+    return png + chunk(b"IEND", b"")
+
+
+class _WsConn:
+    """서버 → 클라이언트 방향 WebSocket 프레임만 보내는 최소 구현."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.alive = True
+
+    def send(self, payload: Any, binary: bool = False) -> None:
+        data = payload if binary else json.dumps(payload).encode("utf-8")
+        opcode = 0x2 if binary else 0x1
+        n = len(data)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        with self.lock:
+            if not self.alive:
+                return
+            try:
+                self.sock.sendall(header + data)
+            except OSError:
+                self.alive = False
+
+    def close(self) -> None:
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _NodeFailed(Exception):
+    def __init__(self, node_id: str, node_type: str, message: str) -> None:
+        super().__init__(message)
+        self.node_id = node_id
+        self.node_type = node_type
+        self.message = message
+
+
+class FakeComfyServer:
+    """
+    /prompt, /ws, /history, /view, /upload/image, /queue, /models/checkpoints, /object_info,
+    /system_stats, /interrupt를 흉내 내는 서버.
+
+    :param port: 0이면 빈 포트를 골라 씀 (url 속성으로 확인)
+    :param job_latency: 작업 하나의 실행 시간(초)
+    :param image_width: 결과 이미지 너비
+    :param image_height: 결과 이미지 높이
+    :param image_bytes: 결과 PNG의 최소 크기 (다운로드 벤치마크용)
+    :param checkpoints: /models/checkpoints 응답 (/object_info의 ckpt_name 선택지)
+    :param loras: /object_info의 lora_name 선택지
+    :param node_cache: True면 직전 prompt와 입력(상류 포함)이 같은 노드를 실행하지 않고 execution_cached로 알림
+    :param fail_class: 이 class_type 노드를 실행하면 execution_error로 실패 (실패 처리 확인용)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        job_latency: float = 0.0,
+        image_width: int = 64,
+        image_height: int = 64,
+        image_bytes: int = 0,
+        checkpoints: Optional[List[str]] = None,
+        node_cache: bool = False,
+        loras: Optional[List[str]] = None,
+        fail_class: Optional[str] = None,
+    ) -> None:
+        self.job_latency = job_latency
+        self.fail_class = fail_class
+        self.node_cache = node_cache
+        # 직전 prompt의 노드 서명 → 출력 (node_cache=True일 때 ComfyUI 기본 캐시처럼 동작)
+        self._last_outputs: Dict[str, Optional[dict]] = {}
+        self.image_width = image_width
+        self.image_height = image_height
+        self.image_bytes = image_bytes
+        self.checkpoints = list(checkpoints or ["v1-5-pruned-emaonly.safetensors"])
+        self.loras = list(loras or [])
+        self.history: Dict[str, dict] = {}
+        self.files: Dict[tuple, bytes] = {}
+        self.uploads: Dict[str, bytes] = {}
+        self.pending: List[list] = []
+        self.running: Optional[list] = None
+        self.clients: Dict[str, _WsConn] = {}
+        self.counter = 0
+        self.number = 0
+        self.stats = {"prompt": 0, "view": 0, "upload": 0, "history": 0, "object_info": 0, "stop": 0}
+        # RunPod 정지 요청 기록: {"pod_id", "at", "queue"(그때 실행 중 + 대기 prompt 수)}
+        self.stops: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._stop = False
+        self._interrupt = False
+        # 이 시각(time.monotonic)까지 /ws 연결을 거부
+        self._refuse_ws_until = 0.0
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeComfyServer":
+        for target in (self.httpd.serve_forever, self._worker):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for conn in list(self.clients.values()):
+            conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def drop_websockets(self, refuse_for: float = 0.0) -> None:
+        """열린 WebSocket을 모두 끊고, refuse_for초 동안 새 연결을 503으로 거부합니다. 작업은 계속 실행됨."""
+        self._refuse_ws_until = time.monotonic() + refuse_for
+        for conn in list(self.clients.values()):
+            conn.close()
+
+    def __enter__(self) -> "FakeComfyServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    def _send(self, client_id: Optional[str], msg: dict) -> None:
+        conn = self.clients.get(client_id or "")
+        if conn is not None:
+            conn.send(msg)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self.pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                item = self.pending.pop(0)
+                self.running = item
+                self._interrupt = False
+            try:
+                self._execute(item)
+            finally:
+                with self._cond:
+                    self.running = None
+
+    def _sleep(self, seconds: float) -> None:
+        """seconds 동안 쉬되, /interrupt가 오면 바로 _Interrupted."""
+        end = time.monotonic() + seconds
+        while True:
+            if self._interrupt:
+                raise _Interrupted()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.01))
+
+    def _execute(self, item: list) -> None:
+        number, prompt_id, prompt, extra, _ = item
+        cid = extra.get("client_id")
+        started = {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)}
+        self._send(cid, {"type": "execution_start", "data": started})
+        executed: List[str] = []
+        outputs: Dict[str, dict] = {}
+        try:
+            outputs = self._run_nodes(prompt_id, prompt, cid, executed)
+        except _Interrupted:
+            node_id = executed[-1] if executed else None
+            event = ("execution_interrupted", {
+                "prompt_id": prompt_id,
+                "node_id": node_id,
+                "node_type": prompt[node_id].get("class_type") if node_id else None,
+                "executed": executed[:-1],
+            })
+        except _NodeFailed as e:
+            event = ("execution_error", {
+                "prompt_id": prompt_id,
+                "node_id": e.node_id,
+                "node_type": e.node_type,
+                "executed": executed[:-1],
+                "exception_message": e.message,
+                "exception_type": "RuntimeError",
+                "traceback": [f"  File \"nodes.py\", line 1, in {e.node_type}\n", f"RuntimeError: {e.message}\n"],
+                "current_inputs": {},
+                "current_outputs": {},
+            })
+        else:
+            event = None
+        status = {"status_str": "success", "completed": True, "messages": []}
+        if event is not None:
+            # 실제 ComfyUI처럼: 실패 알림 → 기록(status error) → executing node None
+            self._send(cid, {"type": event[0], "data": event[1]})
+            messages = [["execution_start", started], list(event)]
+            status = {"status_str": "error", "completed": False, "messages": messages}
+        self.history[prompt_id] = {"prompt": [number, prompt_id, prompt, extra, []], "outputs": outputs, "status": status}
+        self._send(cid, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+
+    def _run_nodes(self, prompt_id: str, prompt: dict, cid: Optional[str], executed: List[str]) -> Dict[str, dict]:
+        """노드를 순서대로 실행하고 출력 노드의 결과를 반환합니다. 실행한 노드는 executed에 쌓음."""
+        signatures = self._signatures(prompt) if self.node_cache else {}
+        cached = [node_id for node_id in prompt if signatures.get(node_id) in self._last_outputs]
+        self._send(cid, {"type": "execution_cached", "data": {"nodes": cached, "prompt_id": prompt_id}})
+        outputs: Dict[str, dict] = {}
+        per_node = self.job_latency / max(1, len(prompt))
+        for node_id in cached:
+            if self._last_outputs[signatures[node_id]] is not None:
+                outputs[node_id] = self._last_outputs[signatures[node_id]]
+        for node_id, node in prompt.items():
+            if node_id in cached:
+                continue
+            self._send(cid, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+            executed.append(node_id)
+            cls = node.get("class_type")
+            if cls == self.fail_class:
+                raise _NodeFailed(node_id, cls, f"{cls} failed (fake)")
+            steps = node.get("inputs", {}).get("steps") if cls in ("KSampler", "KSamplerAdvanced") else None
+            if isinstance(steps, int) and steps > 0:
+                for step in range(1, steps + 1):
+                    if per_node:
+                        self._sleep(per_node / steps)
+                    self._send(
+                        cid,
+                        {"type": "progress", "data": {"value": step, "max": steps, "prompt_id": prompt_id, "node": node_id}},
+                    )
+            elif per_node:
+                self._sleep(per_node)
+            if cls in OUTPUT_CLASSES:
+                batch = self._batch_size(prompt)
+                images = []
+                for _ in range(batch):
+                    self.counter += 1
+                    data = make_png(self.image_width, self.image_height, self.image_bytes)
+                    if cls == "SaveImageWebsocket":
+                        conn = self.clients.get(cid or "")
+                        if conn is not None:
+                            conn.send(struct.pack(">II", 1, 2) + data, binary=True)
+                        continue
+                    prefix = str(node.get("inputs", {}).get("filename_prefix", "ComfyUI"))
+                    folder = "output" if cls == "SaveImage" else "temp"
+                    name = f"{prefix}_{self.counter:05}_.png"
+                    self.files[(folder, "", name)] = data
+                    images.append({"filename": name, "subfolder": "", "type": folder})
+                if images:
+                    outputs[node_id] = {"images": images}
+                    self._send(
+                        cid,
+                        {
+                            "type": "executed",
+                            "data": {"node": node_id, "output": outputs[node_id], "prompt_id": prompt_id},
+                        },
+                    )
+        if self.node_cache:
+            self._last_outputs = {signatures[node_id]: outputs.get(node_id) for node_id in prompt}
+        return outputs
+
+    @staticmethod
+    def _signatures(prompt: dict) -> Dict[str, str]:
+        """노드마다 (class_type, 값 입력, 상류 노드 서명)의 해시."""
+        signatures: Dict[str, str] = {}
+
+        def sign(node_id: str, depth: int = 0) -> str:
+            if node_id not in signatures:
+                node = prompt[node_id]
+                resolved = {}
+                for key, value in node.get("inputs", {}).items():
+                    if isinstance(value, list) and len(value) == 2 and value[0] in prompt and depth < 500:
+                        resolved[key] = [sign(value[0], depth + 1), value[1]]
+                    else:
+                        resolved[key] = value
+                source = json.dumps([node.get("class_type"), resolved], sort_keys=True)
+                signatures[node_id] = hashlib.sha1(source.encode("utf-8")).hexdigest()
+            return signatures[node_id]
+
+        for node_id in prompt:
+            sign(node_id)
+        return signatures
+
+    @staticmethod
+    def _batch_size(prompt: dict) -> int:
+        for node in prompt.values():
+            if node.get("class_type") == "EmptyLatentImage":
+                try:
+                    return int(node.get("inputs", {}).get("batch_size", 1))
+                except (TypeError, ValueError):
+                    return 1
+        return 1
+
+    # ------------------------------------------------------------------
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _json(self, obj: Any, status: int = 200) -> None:
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                n = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(n) if n else b""
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+                path = url.path
+                if path == "/ws":
+                    if time.monotonic() < server._refuse_ws_until:
+                        return self._json({"error": "websocket unavailable"}, 503)
+                    return self._websocket(qs.get("clientId") or str(uuid.uuid4()))
+                if path == "/queue":
+                    with server._cond:
+                        running = [server.running] if server.running else []
+                        pending = list(server.pending)
+                    return self._json({"queue_running": running, "queue_pending": pending})
+                if path.startswith("/history"):
+                    server.stats["history"] += 1
+                    rest = path[len("/history"):].strip("/")
+                    if rest:
+                        entry = server.history.get(rest)
+                        return self._json({rest: entry} if entry else {})
+                    items = list(server.history.items())
+                    if "max_items" in qs:
+                        items = items[-int(qs["max_items"]):]
+                    return self._json(dict(items))
+                if path == "/view":
+                    server.stats["view"] += 1
+                    key = (qs.get("type", "output"), qs.get("subfolder", ""), qs.get("filename", ""))
+                    data = server.files.get(key)
+                    if data is None and key[0] == "input":
+                        data = server.uploads.get(key[2])
+                    if data is None:
+                        return self._json({"error": "not found"}, 404)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/png")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                if path == "/models/checkpoints":
+                    return self._json(server.checkpoints)
+                if path == "/object_info":
+                    server.stats["object_info"] += 1
+                    return self._json(make_object_info(server.checkpoints, server.loras))
+                if path == "/system_stats":
+                    return self._json({"system": {"comfyui_version": "fake-0.1"}, "devices": []})
+                return self._json({"error": "not found"}, 404)
+
+            def do_POST(self) -> None:
+                path = urlparse(self.path).path
+                body = self._body()
+                if path == "/prompt":
+                    server.stats["prompt"] += 1
+                    data = json.loads(body or b"{}")
+                    prompt = data.get("prompt")
+                    if not isinstance(prompt, dict) or not prompt:
+                        return self._json({"error": {"message": "invalid prompt"}, "node_errors": {}}, 400)
+                    prompt_id = str(data.get("prompt_id") or uuid.uuid4())
+                    with server._cond:
+                        server.number += 1
+                        number = -server.number if data.get("front") else server.number
+                        item = [number, prompt_id, prompt, {"client_id": data.get("client_id")}, []]
+                        if data.get("front"):
+                            server.pending.insert(0, item)
+                        else:
+                            server.pending.append(item)
+                        server._cond.notify_all()
+                    return self._json({"prompt_id": prompt_id, "number": number, "node_errors": {}})
+                if path == "/upload/image":
+                    server.stats["upload"] += 1
+                    ctype = self.headers.get("Content-Type", "")
+                    msg = BytesParser(policy=email_policy).parsebytes(
+                        b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + body
+                    )
+                    name, blob, fields = "upload.png", b"", {}
+                    for part in msg.iter_parts():
+                        field = part.get_param("name", header="content-disposition")
+                        if field == "image":
+                            name = part.get_filename() or name
+                            blob = part.get_payload(decode=True) or b""
+                        else:
+                            fields[field] = part.get_content()
+                    server.uploads[name] = blob
+                    return self._json({"name": name, "subfolder": fields.get("subfolder", ""), "type": "input"})
+                if path == "/queue":
+                    data = json.loads(body or b"{}")
+                    with server._cond:
+                        if data.get("clear"):
+                            server.pending.clear()
+                        ids = set(data.get("delete", []))
+                        server.pending = [p for p in server.pending if p[1] not in ids]
+                    return self._json({})
+                if path == "/history":
+                    data = json.loads(body or b"{}")
+                    if data.get("clear"):
+                        server.history.clear()
+                    for pid in data.get("delete", []):
+                        server.history.pop(pid, None)
+                    return self._json({})
+                if path.startswith("/v1/user/pods/") and path.endswith("/stop"):
+                    server.stats["stop"] += 1
+                    if not self.headers.get("Authorization", "").startswith("Bearer "):
+                        return self._json({"error": "unauthorized"}, 401)
+                    pod_id = path[len("/v1/user/pods/"):-len("/stop")]
+                    with server._cond:
+                        queue = len(server.pending) + (1 if server.running else 0)
+                    server.stops.append({"pod_id": pod_id, "at": time.time(), "queue": queue})
+                    return self._json({"id": pod_id, "desiredStatus": "EXITED"})
+                if path == "/interrupt":
+                    # prompt_id를 주면 그 prompt가 실행 중일 때만 중단 (최신 ComfyUI와 같음)
+                    target = json.loads(body or b"{}").get("prompt_id")
+                    with server._cond:
+                        if server.running is not None and target in (None, server.running[1]):
+                            server._interrupt = True
+                    return self._json({})
+                return self._json({"error": "not found"}, 404)
+
+            def _websocket(self, client_id: str) -> None:
+                key = self.headers.get("Sec-WebSocket-Key", "")
+                accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+                self.send_response(101, "Switching Protocols")
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.wfile.flush()
+                conn = _WsConn(self.connection)
+                server.clients[client_id] = conn
+                conn.send({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 0}}, "sid": client_id}})
+                try:
+                    while conn.alive:
+                        head = self.rfile.read(2)
+                        if len(head) < 2:
+                            break
+                        opcode = head[0] & 0x0F
+                        n = head[1] & 0x7F
+                        if n == 126:
+                            n = struct.unpack("!H", self.rfile.read(2))[0]
+                        elif n == 127:
+                            n = struct.unpack("!Q", self.rfile.read(8))[0]
+                        if head[1] & 0x80:
+                            self.rfile.read(4)  # 마스크 키 (본문은 읽고 버림)
+                        self.rfile.read(n)
+                        if opcode == 0x8:
+                            break
+                except OSError:
+                    pass
+                finally:
+                    conn.alive = False
+                    if server.clients.get(client_id) is conn:
+                        del server.clients[client_id]
+                    self.close_connection = True
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="가짜 ComfyUI 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--latency", type=float, default=0.5, help="작업당 실행 시간(초)")
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--checkpoints", default="", help="쉼표 구분 체크포인트 목록")
+    parser.add_argument("--loras", default="", help="쉼표 구분 LoRA 목록 (/object_info 선택지)")
+    args = parser.parse_args()
+    checkpoints = [c.strip() for c in args.checkpoints.split(",") if c.strip()] or None
+    loras = [c.strip() for c in args.loras.split(",") if c.strip()]
+    server = FakeComfyServer(
+        args.host, args.port, args.latency, args.width, args.height, checkpoints=checkpoints, loras=loras
+    ).start()
+    print(f"가짜 ComfyUI 서버: {server.url} (Ctrl+C로 종료)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,32 +6,35 @@ load_dotenv()
 
 # RunPod API Key should be in .env as RUNPOD_API_KEY
 API_KEY = os.getenv("RUNPOD_API_KEY")
+# RunPod API base URL; point it at a local stand-in (fake_comfy_server: "<server.url>/v1") to test shutdowns
+API_URL = os.getenv("RUNPOD_API_URL", "https://api.runpod.io/v1").rstrip("/")
 # Target Pod ID
-POD_ID = "w2672t3cq8hyic"
+POD_ID = os.getenv("RUNPOD_POD_ID", "w2672t3cq8hyic")
 
-def stop_pod(pod_id=POD_ID):
-    if not API_KEY:
+def stop_pod(pod_id=POD_ID, api_url=None, api_key=None):
+    api_key = api_key or API_KEY
+    if not api_key:
         print("ERROR: RUNPOD_API_KEY not found in environment variables.")
         return False
-        
+
     print(f"Attempting to stop pod {pod_id}...")
-    
+
     # RunPod API v1 Stop Endpoint
-    url = f"https://api.runpod.io/v1/user/pods/{pod_id}/stop"
-    
+    url = f"{(api_url or API_URL).rstrip('/')}/user/pods/{pod_id}/stop"
+
     headers = {
-        "Authorization": f"Bearer {API_KEY}",
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-    
+
     try:
-        response = requests.post(url, headers=headers)
+        response = requests.post(url, headers=headers, timeout=30)
         response.raise_for_status()
         print(f"SUCCESS: Pod {pod_id} shutdown signal sent.")
         return True
     except Exception as e:
         print(f"FAILED to stop pod: {e}")
-        if hasattr(e, 'response') and e.response:
+        if getattr(e, 'response', None) is not None:
             print(f"Response: {e.response.text}")
         return False
 
@@ -0,0 +1,229 @@
+"""
+Idle-aware pod shutdown. Watches the ComfyUI queue (and the client job journal) and stops the RunPod pod
+only after the queue has stayed empty for a grace period, logging images per GPU-hour and cost per image.
+
+    python pod_watchdog.py --grace 600 --hourly-rate 0.79          # COMFY_SERVERS or BASE_URL, RUNPOD_POD_ID
+    python pod_watchdog.py http://127.0.0.1:8188 --api-url http://127.0.0.1:8188/v1 --grace 5
+                                                                   # against fake_comfy_server (stand-in stop endpoint)
+
+- Busy: any server has a running or pending prompt, or .comfy_journal.sqlite3 changed within the grace period
+  (a client is still building, downloading or about to queue), or the caller holds the pod (run(ready=event))
+- A server that cannot be reached never counts as idle, so a network blip does not stop a working pod
+- Images: outputs of prompts that finish while the watchdog runs. Each poll reads /history?max_items=HISTORY_PAGE
+  and widens the window until it reaches a prompt already counted (comfy_sync.history_after), so bursts
+  of more than HISTORY_PAGE completions between polls are still counted; failed prompts yield no accepted image
+- GPU-hours: wall time since the watchdog started (one pod)
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+import comfy_workflow as cw
+from comfy_journal import JOURNAL_DB, JobJournal
+from comfy_sync import entry_failed, entry_images, history_after
+from pod_manager import POD_ID, stop_pod
+
+BASE_URL = "https://w2672t3cq8hyic-8188.proxy.runpod.net"
+# Seconds between /queue checks
+WATCH_POLL = 15.0
+# Seconds the queue must stay empty before the pod is stopped
+WATCH_GRACE = 600.0
+# Recent /history entries read first on each poll (widened while every entry is new)
+HISTORY_PAGE = 32
+# Seconds between throughput log lines while the pod is busy (0 = only when stopping)
+REPORT_EVERY = 300.0
+# Pod price per hour (e.g. RUNPOD_HOURLY_RATE=0.79) for cost per image; unset = cost not reported
+HOURLY_RATE = float(os.getenv("RUNPOD_HOURLY_RATE") or 0) or None
+
+
+def _log(message: str) -> None:
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+class PodWatchdog:
+    """
+    Stops a pod once its ComfyUI queue has been empty for `grace` seconds.
+
+    :param servers: ComfyUI URLs served by the pod
+    :param pod_id: RunPod pod to stop
+    :param grace: seconds the pod must stay idle before it is stopped
+    :param poll: seconds between checks
+    :param journal: JobJournal whose updates count as client activity (None = queue only)
+    :param hourly_rate: pod price per hour, for cost per image (default RUNPOD_HOURLY_RATE, None = not reported)
+    :param stop: called with pod_id to stop the pod; returns True on success (default pod_manager.stop_pod)
+    """
+
+    def __init__(
+        self,
+        servers: Iterable[str],
+        pod_id: str = POD_ID,
+        grace: float = WATCH_GRACE,
+        poll: float = WATCH_POLL,
+        journal: Optional[JobJournal] = None,
+        hourly_rate: Optional[float] = HOURLY_RATE,
+        stop: Callable[[str], bool] = stop_pod,
+        report_every: float = REPORT_EVERY,
+    ) -> None:
+        self.servers = [s.rstrip("/") for s in servers]
+        if not self.servers:
+            raise ValueError("At least one server is required")
+        if grace < 0 or poll <= 0:
+            raise ValueError("grace must be >= 0 and poll > 0")
+        self.pod_id = pod_id
+        self.grace = grace
+        self.poll = poll
+        self.journal = journal
+        self.hourly_rate = hourly_rate
+        self.stop = stop
+        self.report_every = report_every
+        self.started = time.time()
+        self.last_busy = self.started
+        self.images = 0
+        self.prompts = 0
+        self.failed = 0
+        self.stopped = False
+        # Per server: prompt_ids already in /history (the first poll's entries finished before we started)
+        self._seen: Dict[str, Set[str]] = {}
+
+    # -- checks -------------------------------------------------------------
+    def _count_finished(self, server: str) -> None:
+        seen = self._seen.get(server)
+        if seen is None:
+            self._seen[server] = set(cw.get_recent_history(server, HISTORY_PAGE))
+            return
+        for prompt_id, entry in history_after(server, seen, HISTORY_PAGE).items():
+            seen.add(prompt_id)
+            self.prompts += 1
+            if entry_failed(entry):
+                self.failed += 1
+            else:
+                self.images += len(entry_images(entry))
+
+    def check(self) -> Dict[str, Any]:
+        """
+        One poll: queue length on every server, newly finished prompts, journal activity.
+        :return: {"queued", "reachable", "idle_for"} (idle_for is 0 while busy or while a server is unreachable)
+        """
+        now = time.time()
+        queued = 0
+        reachable = True
+        for server in self.servers:
+            try:
+                queue = cw.get_queue(server)
+                queued += len(cw.queue_prompt_ids(queue, "queue_running"))
+                queued += len(cw.queue_prompt_ids(queue, "queue_pending"))
+                self._count_finished(server)
+            except Exception as e:
+                reachable = False
+                _log(f"{server} unreachable: {e}")
+        if queued:
+            self.last_busy = now
+        if self.journal is not None:
+            updated = self.journal.last_update()
+            if updated is not None:
+                self.last_busy = max(self.last_busy, min(updated, now))
+        idle_for = now - self.last_busy if reachable else 0.0
+        return {"queued": queued, "reachable": reachable, "idle_for": idle_for}
+
+    # -- accounting -----------------------------------------------------------
+    def summary(self) -> Dict[str, Any]:
+        """Images, prompts, failures, GPU-hours, images per GPU-hour and (with hourly_rate) cost per image."""
+        hours = (time.time() - self.started) / 3600
+        cost = self.hourly_rate * hours if self.hourly_rate is not None else None
+        return {
+            "images": self.images,
+            "prompts": self.prompts,
+            "failed": self.failed,
+            "gpu_hours": hours,
+            "images_per_gpu_hour": self.images / hours if hours else 0.0,
+            "cost": cost,
+            "cost_per_image": cost / self.images if cost is not None and self.images else None,
+        }
+
+    def report(self) -> str:
+        entry = self.summary()
+        line = (
+            f"{entry['images']} image(s) from {entry['prompts']} prompt(s) ({entry['failed']} failed) in "
+            f"{entry['gpu_hours']:.2f} GPU-h: {entry['images_per_gpu_hour']:.1f} images/GPU-h"
+        )
+        if entry["cost"] is not None:
+            per_image = f"${entry['cost_per_image']:.3f}/image" if entry["cost_per_image"] is not None else "no images"
+            line += f", {per_image} (${entry['cost']:.2f} total)"
+        return line
+
+    # -- loop -----------------------------------------------------------------
+    def watch(self, until: threading.Event) -> None:
+        """Count finished prompts every poll until `until` is set, then poll once more. Never stops the pod."""
+        self.check()
+        while not until.wait(self.poll):
+            self.check()
+        self.check()
+
+    def run(self, ready: Optional[threading.Event] = None, dry_run: bool = False) -> bool:
+        """
+        Poll until the pod has been idle for `grace` seconds, then stop it.
+        :param ready: while given and not set, the pod counts as busy (the caller still needs it, e.g. for downloads)
+        :param dry_run: log what would happen but do not stop the pod
+        :return: True if the pod was stopped
+        """
+        _log(f"Watching {', '.join(self.servers)} (pod {self.pod_id}, grace {self.grace:g}s, poll {self.poll:g}s)")
+        next_report = self.started + self.report_every
+        while True:
+            status = self.check()
+            if ready is not None and not ready.is_set():
+                self.last_busy = time.time()
+                status["idle_for"] = 0.0
+            if status["idle_for"] >= self.grace:
+                break
+            if self.report_every and time.time() >= next_report:
+                _log(f"queue {status['queued']} | {self.report()}")
+                next_report = time.time() + self.report_every
+            # Wake up right when the grace period would run out
+            time.sleep(max(0.05, min(self.poll, self.grace - status["idle_for"])))
+        _log(f"Queue empty for {status['idle_for']:.0f}s | {self.report()}")
+        if dry_run:
+            _log(f"Dry run: not stopping pod {self.pod_id}")
+            return False
+        self.stopped = bool(self.stop(self.pod_id))
+        return self.stopped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stop the RunPod pod once its ComfyUI queue stays empty")
+    parser.add_argument("servers", nargs="*", help="ComfyUI URLs on the pod (default: COMFY_SERVERS or BASE_URL)")
+    parser.add_argument("--pod-id", default=POD_ID)
+    parser.add_argument("--grace", type=float, default=WATCH_GRACE, help="Seconds the queue must stay empty")
+    parser.add_argument("--poll", type=float, default=WATCH_POLL, help="Seconds between checks")
+    parser.add_argument("--hourly-rate", type=float, default=HOURLY_RATE,
+                        help="Pod price per hour for cost per image (default RUNPOD_HOURLY_RATE)")
+    parser.add_argument("--api-url", help="RunPod API base URL (default RUNPOD_API_URL or the public API)")
+    parser.add_argument("--report-every", type=float, default=REPORT_EVERY, help="Seconds between throughput log lines")
+    parser.add_argument("--no-journal", action="store_true", help="Ignore .comfy_journal.sqlite3 activity")
+    parser.add_argument("--dry-run", action="store_true", help="Log when the pod would be stopped, but do not stop it")
+    args = parser.parse_args(argv)
+    journal = JobJournal() if not args.no_journal and JOURNAL_DB.exists() else None
+    watchdog = PodWatchdog(
+        args.servers or cw.servers_from_env(BASE_URL),
+        pod_id=args.pod_id,
+        grace=args.grace,
+        poll=args.poll,
+        journal=journal,
+        hourly_rate=args.hourly_rate,
+        stop=partial(stop_pod, api_url=args.api_url),
+        report_every=args.report_every,
+    )
+    try:
+        stopped = watchdog.run(dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        _log(f"Interrupted | {watchdog.report()}")
+        return 130
+    return 0 if stopped or args.dry_run else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,7 @@ import argparse
 import json
 import re
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 
 import comfy_workflow as cw
 
@@ -93,25 +93,23 @@ def load_config(path: Path) -> dict:
         return json.load(f)
 
 
-def run_pipeline(
+def prepare_pipeline_job(
     config_path: Path,
     server: str = DEFAULT_SERVER,
-    save_dir: Optional[Path] = None,
     seed_override: Optional[int] = None,
     denoise_override: Optional[float] = None,
     ckpt_override: Optional[str] = None,
-) -> List[Path]:
+) -> Tuple[dict, dict]:
     """
-    설정 파일 기준으로 캐릭터 이미지 1장 생성.
-    - base_image 있음 → img2img (Identity Lock, denoise 0.4 전후)
-    - base_image 없음 → txt2img (베이스 1회 생성, denoise 1.0)
+    설정 파일로 실행할 워크플로와 메타데이터를 만듭니다 (실행은 하지 않음).
+    img2img면 기준 이미지를 server에 업로드합니다 (같은 이미지는 서버마다 한 번만).
+    :return: (workflow, meta)
     """
     config = load_config(config_path)
     base = config.get("base_character", {})
     seed = seed_override if seed_override is not None else base.get("seed", 42)
     ckpt_name = ckpt_override or base.get("ckpt_name", "v1-5-pruned-emaonly.safetensors")
     negative = config.get("negative_prompt", "blur, soft gradient, anti-aliasing, realistic, photograph")
-    out_dir = save_dir or OUTPUTS_DIR
     base_image_path = config.get("base_image")
 
     if base_image_path:
@@ -121,7 +119,9 @@ def run_pipeline(
             base_image_path = (config_path.parent / base_image_path).resolve()
         if not base_image_path.exists():
             raise FileNotFoundError(f"base_image을 찾을 수 없습니다: {base_image_path}")
-        upload_result = cw.upload_image(server, base_image_path, folder_type="input")
+        # 같은 기준 이미지는 서버마다 한 번만 업로드, 목표 해상도가 있으면 그 크기로 줄여서 보냄
+        max_size = (base["width"], base["height"]) if base.get("width") and base.get("height") else None
+        upload_result = cw.upload_reference(server, base_image_path, max_size=max_size)
         image_input = [upload_result["name"], upload_result.get("subfolder", "")]
         denoise = denoise_override if denoise_override is not None else IMG2IMG_DENOISE
         cfg = base.get("cfg_img2img", IMG2IMG_CFG)
@@ -168,9 +168,7 @@ def run_pipeline(
         }
 
     workflow = cw.build_workflow(workflow_config)
-    paths = cw.generate_image(workflow, server=server, save_dir=out_dir)
-    
-    # Save metadata
+
     meta = {
         "ckpt_name": ckpt_name,
         "seed": seed,
@@ -185,12 +183,59 @@ def run_pipeline(
         meta["base_image"] = str(base_image_path)
         meta["denoise"] = denoise
         meta["cfg_img2img"] = cfg
-    
+    return workflow, meta
+
+
+def save_metadata(paths: List[Path], meta: dict) -> None:
+    """각 이미지 옆에 {이름}.metadata.json 으로 메타데이터를 저장합니다."""
     for p in paths:
         meta_path = p.with_suffix(".metadata.json")
         with open(meta_path, "w", encoding="utf-8") as f:
             json.dump(meta, f, indent=2, ensure_ascii=False)
 
+
+def run_pipeline(
+    config_path: Path,
+    server: Union[str, Sequence[str]] = DEFAULT_SERVER,
+    save_dir: Optional[Path] = None,
+    seed_override: Optional[int] = None,
+    denoise_override: Optional[float] = None,
+    ckpt_override: Optional[str] = None,
+    front: bool = False,
+) -> List[Path]:
+    """
+    설정 파일 기준으로 캐릭터 이미지 1장 생성.
+    - base_image 있음 → img2img (Identity Lock, denoise 0.4 전후)
+    - base_image 없음 → txt2img (베이스 1회 생성, denoise 1.0)
+    server에 URL 리스트를 주면 ServerPool로 가장 한가한 서버를 골라 실행합니다.
+    front=True면 서버 큐에서 기다리는 스윕 prompt보다 먼저 실행합니다.
+    """
+    pool = cw.as_server_pool(server)
+    if pool is not None:
+        # 여러 서버: 체크포인트가 있는 가장 한가한 서버를 먼저 고르고, 업로드·실행 모두 그 서버에서
+        base = load_config(config_path).get("base_character", {})
+        ckpt_name = ckpt_override or base.get("ckpt_name", "v1-5-pruned-emaonly.safetensors")
+        with pool.lease([ckpt_name]) as chosen:
+            return run_pipeline(
+                config_path,
+                server=chosen,
+                save_dir=save_dir,
+                seed_override=seed_override,
+                denoise_override=denoise_override,
+                ckpt_override=ckpt_override,
+                front=front,
+            )
+
+    server = cw.single_server(server)
+    workflow, meta = prepare_pipeline_job(
+        config_path,
+        server=server,
+        seed_override=seed_override,
+        denoise_override=denoise_override,
+        ckpt_override=ckpt_override,
+    )
+    paths = cw.generate_image(workflow, server=server, save_dir=save_dir or OUTPUTS_DIR, front=front)
+    save_metadata(paths, meta)
     return paths
 
 
@@ -203,11 +248,21 @@ def main():
         type=Path,
         help="캐릭터 설정 JSON 경로 (기본: configs/example_character.json)",
     )
-    parser.add_argument("--server", default=DEFAULT_SERVER, help="ComfyUI 서버 URL")
+    parser.add_argument(
+        "--server",
+        nargs="+",
+        default=cw.servers_from_env(DEFAULT_SERVER),
+        help="ComfyUI 서버 URL (여러 개면 큐가 가장 짧은 서버 사용, 기본: COMFY_SERVERS 또는 로컬)",
+    )
     parser.add_argument("--out", type=Path, default=None, help="저장 폴더 (기본: outputs/)")
     parser.add_argument("--seed", type=int, default=None, help="시드 고정 (설정 파일보다 우선)")
     parser.add_argument("--denoise", type=float, default=None, help="img2img denoise (0.35~0.45, 기본 0.4)")
     parser.add_argument("--ckpt", type=str, default=None, help="체크포인트 파일명 (예: anything-v5.0-pruned.safetensors)")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="큐 맨 뒤에 넣기 (기본: 손으로 돌리는 작업이므로 대기 중인 스윕 prompt보다 먼저 실행)",
+    )
     args = parser.parse_args()
 
     if not args.config.exists():
@@ -222,6 +277,7 @@ def main():
         seed_override=args.seed,
         denoise_override=args.denoise,
         ckpt_override=args.ckpt,
+        front=not args.batch,
     )
     print("저장된 이미지:", paths)
     return 0
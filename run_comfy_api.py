@@ -1,41 +1,48 @@
-import requests
+import argparse
+import asyncio
+import copy
 import json
+import os
 import random
+import threading
+
+import comfy_workflow as cw
+from comfy_journal import JobJournal
+from comfy_runner import RUNNER_IN_FLIGHT, PipelinedRunner
+from pod_watchdog import PodWatchdog
 
-# ComfyUI API Address (RunPod Proxy)
+# ComfyUI API Address (RunPod Proxy); COMFY_SERVERS="http://a:8188,http://b:8188" overrides it
 BASE_URL = "https://w2672t3cq8hyic-8188.proxy.runpod.net"
-PROMPT_API = f"{BASE_URL}/prompt"
 
-# 1) 로컬에 저장한 workflow JSON 불러오기
+# 1) 로컬에 저장한 workflow JSON 경로
 # 사용자의 hidream_i1_full.json 파일 경로
 JSON_PATH = r"c:\Users\jhk92\Downloads\hidream_i1_full.json"
 
-with open(JSON_PATH, "r", encoding="utf-8") as f:
-    workflow = json.load(f)
+OUTPUT_DIR = r"c:\Users\jhk92\OneDrive\문서\GitHub\ai\Moltbot\output"
 
 # --- Improvement Iteration 1: Composition & Detail Enhancers ---
 COMPOSITION_BOOSTERS = [
-    "cinematic lighting", "dramatic backlighting", "rim lighting", 
+    "cinematic lighting", "dramatic backlighting", "rim lighting",
     "low angle shot", "extreme close-up", "composition symmetry",
     "volumetric fog", "floating particles"
 ]
 
 DETAIL_BOOSTERS = [
-    "intricate mechanical joints", "exposed hydraulic cables", 
-    "coolant steam venting", "micro-chips visible", 
+    "intricate mechanical joints", "exposed hydraulic cables",
+    "coolant steam venting", "micro-chips visible",
     "scratched metal texture", "weathered armor"
 ]
 
-def get_enhanced_prompts(base_pos, base_neg):
+def get_enhanced_prompts(base_pos, base_neg, rng=random):
     # Select random enhancers
-    comp = random.choice(COMPOSITION_BOOSTERS)
-    detail = random.sample(DETAIL_BOOSTERS, 2)
-    
+    comp = rng.choice(COMPOSITION_BOOSTERS)
+    detail = rng.sample(DETAIL_BOOSTERS, 2)
+
     enhanced_pos = f"{base_pos}, {comp}, {', '.join(detail)}, masterpiece, highly detailed"
     enhanced_neg = f"{base_neg}, out of focus, blurry background, flat lighting"
     return enhanced_pos, enhanced_neg
 
-# 2) 워크플로 안에서 노드 찾아서 파라미터 수정
+# 2) 워크플로 안에서 수정할 노드
 POS_NODE_ID = "91"
 NEG_NODE_ID = "85"
 LATENT_NODE_ID = "86"
@@ -56,26 +63,6 @@ BASE_NEGATIVE = (
     "missing fingers, extra digit"
 )
 
-# 3) ComfyUI API용 payload 구성
-print(f"--- Starting Batch Generation (4 Images) ---")
-
-for i in range(4):
-    # 시드 및 파라미터 개별 설정
-    current_seed = random.randint(1, 1125899906842624)
-    workflow[SAMPLER_NODE_ID]["inputs"]["seed"] = current_seed
-    workflow[SAVE_NODE_ID]["inputs"]["filename_prefix"] = f"pixel_ceo_villain_batch_{current_seed}"
-    
-    payload = {"prompt": workflow}
-    
-    print(f"[{i+1}/4] Sending Seed: {current_seed}...")
-    try:
-        res = requests.post(PROMPT_API, json=payload, timeout=30)
-        res.raise_for_status()
-        result = res.json()
-        print(f"    SUCCESS: Prompt ID {result.get('prompt_id')}")
-    except Exception as e:
-        print(f"    ERROR: {e}")
-
 # --- Improvement Iteration 2: Technical Diversity ---
 ASPECT_RATIOS = {
     "square": (768, 768),
@@ -83,127 +70,156 @@ ASPECT_RATIOS = {
     "cinematic": (1024, 768)
 }
 
-# 3) 배치 생성 실행
-print(f"--- Starting Enhanced Batch Generation (4 Images) ---")
-
-for i in range(4):
-    current_seed = random.randint(1, 1125899906842624)
-    ar_name, (width, height) = random.choice(list(ASPECT_RATIOS.items()))
-    
-    # Apply Iteration 1: Enhanced Prompts
-    pos, neg = get_enhanced_prompts(BASE_POSITIVE, BASE_NEGATIVE)
-    
-    workflow[POS_NODE_ID]["inputs"]["text"] = pos
-    workflow[NEG_NODE_ID]["inputs"]["text"] = neg
-    workflow[SAMPLER_NODE_ID]["inputs"]["seed"] = current_seed
-    workflow[LATENT_NODE_ID]["inputs"]["width"] = width
-    workflow[LATENT_NODE_ID]["inputs"]["height"] = height
-    
-    # CFG/Steps Tweak based on aspect ratio (Technical Diversity)
-    workflow[SAMPLER_NODE_ID]["inputs"]["steps"] = 28 if ar_name != "square" else 24
-    workflow[SAMPLER_NODE_ID]["inputs"]["cfg"] = 8.0 if "lighting" in pos else 7.0
-    
-    workflow[SAVE_NODE_ID]["inputs"]["filename_prefix"] = f"pixel_ceo_v2_{ar_name}_{current_seed}"
-    
-    # 4) ComfyUI API용 payload 구성 및 요청
-    payload = {"prompt": workflow}
-    
-    print(f"[{i+1}/4] AR: {ar_name} | Seed: {current_seed}...")
-    try:
-        res = requests.post(PROMPT_API, json=payload, timeout=30)
-        res.raise_for_status()
-        result = res.json()
-        print(f"    SUCCESS: Prompt ID {result.get('prompt_id')}")
-    except Exception as e:
-        print(f"    ERROR: {type(e).__name__}")
-
-# --- Improvement Iteration 3: Workflow Intelligence ---
-ASPECT_RATIOS = {
-    "square": (768, 768),
-    "portrait": (768, 1024),
-    "cinematic": (1024, 768)
-}
-
-import os
-import time
-
-OUTPUT_DIR = r"c:\Users\jhk92\OneDrive\문서\GitHub\ai\Moltbot\output"
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-
-def download_image(filename):
-    print(f"    Downloading {filename}...")
-    url = f"{BASE_URL}/view?filename={filename}&type=output"
-    try:
-        # Wait a bit for file to be ready on disk
-        time.sleep(2)
-        r = requests.get(url)
-        r.raise_for_status()
-        with open(os.path.join(OUTPUT_DIR, filename), 'wb') as f:
-            f.write(r.content)
-        print(f"    Saved: {filename}")
-    except Exception as e:
-        print(f"    Download Failed: {e}")
-
-# --- Improvement Iteration 3: Workflow Intelligence ---
-print(f"--- Starting MASTER BATCH (Iteration 3) ---")
-
-for i in range(4):
-    current_seed = random.randint(1, 1125899906842624)
-    ar_name, (width, height) = random.choice(list(ASPECT_RATIOS.items()))
-    
-    pos, neg = get_enhanced_prompts(BASE_POSITIVE, BASE_NEGATIVE)
-    
-    workflow[POS_NODE_ID]["inputs"]["text"] = pos
-    workflow[NEG_NODE_ID]["inputs"]["text"] = neg
-    workflow[SAMPLER_NODE_ID]["inputs"]["seed"] = current_seed
-    workflow[LATENT_NODE_ID]["inputs"]["width"] = width
-    workflow[LATENT_NODE_ID]["inputs"]["height"] = height
-    workflow[SAMPLER_NODE_ID]["inputs"]["steps"] = 30 # High quality for final pass
-    
-    prefix = f"iteration_3_{ar_name}_{current_seed}"
-    workflow[SAVE_NODE_ID]["inputs"]["filename_prefix"] = prefix
-    
+IMAGES_PER_ITERATION = 4
+
+
+def iteration_jobs(rng=random):
+    """Parameters for every image of the three iterations, in submission order.
+    Each job only lists the inputs it changes; the rest comes from the loaded workflow JSON.
+    The same seeded rng yields the same jobs, which is what lets a rerun reattach through the journal."""
+    # Iteration 1: seed sweep on the base workflow
+    for i in range(IMAGES_PER_ITERATION):
+        seed = rng.randint(1, 1125899906842624)
+        yield {"iteration": 1, "index": i, "seed": seed, "prefix": f"pixel_ceo_villain_batch_{seed}"}
+
+    # Iteration 2: enhanced prompts, random aspect ratio, steps/cfg tweaked per ratio
+    for i in range(IMAGES_PER_ITERATION):
+        seed = rng.randint(1, 1125899906842624)
+        ar_name, (width, height) = rng.choice(list(ASPECT_RATIOS.items()))
+        pos, neg = get_enhanced_prompts(BASE_POSITIVE, BASE_NEGATIVE, rng)
+        yield {
+            "iteration": 2, "index": i, "seed": seed, "ar": ar_name, "width": width, "height": height,
+            "pos": pos, "neg": neg,
+            "steps": 28 if ar_name != "square" else 24,
+            "cfg": 8.0 if "lighting" in pos else 7.0,
+            "prefix": f"pixel_ceo_v2_{ar_name}_{seed}",
+        }
+
+    # Iteration 3: master pass, high quality steps + prompt log next to the image
+    for i in range(IMAGES_PER_ITERATION):
+        seed = rng.randint(1, 1125899906842624)
+        ar_name, (width, height) = rng.choice(list(ASPECT_RATIOS.items()))
+        pos, neg = get_enhanced_prompts(BASE_POSITIVE, BASE_NEGATIVE, rng)
+        yield {
+            "iteration": 3, "index": i, "seed": seed, "ar": ar_name, "width": width, "height": height,
+            "pos": pos, "neg": neg, "steps": 30,  # High quality for final pass
+            "prefix": f"iteration_3_{ar_name}_{seed}",
+        }
+
+
+def describe(job):
+    text = f"[iter {job['iteration']} {job['index'] + 1}/{IMAGES_PER_ITERATION}]"
+    if "ar" in job:
+        text += f" AR: {job['ar']} |"
+    return f"{text} Seed: {job['seed']}"
+
+
+def write_prompt_log(job, output_dir):
     # --- Autonomous Prompt Logging ---
-    prompt_log_path = os.path.join(OUTPUT_DIR, f"{prefix}_prompt.txt")
+    prompt_log_path = os.path.join(output_dir, f"{job['prefix']}_prompt.txt")
     try:
         with open(prompt_log_path, "w", encoding="utf-8") as pf:
-            pf.write(f"--- POSITIVE PROMPT ---\n{pos}\n\n")
-            pf.write(f"--- NEGATIVE PROMPT ---\n{neg}\n\n")
-            pf.write(f"--- TECHNICAL DATA ---\nAR: {ar_name} | Seed: {current_seed} | Steps: 30")
-        print(f"    Prompt Log Saved: {prefix}_prompt.txt")
+            pf.write(f"--- POSITIVE PROMPT ---\n{job['pos']}\n\n")
+            pf.write(f"--- NEGATIVE PROMPT ---\n{job['neg']}\n\n")
+            pf.write(f"--- TECHNICAL DATA ---\nAR: {job['ar']} | Seed: {job['seed']} | Steps: {job['steps']}")
+        print(f"    Prompt Log Saved: {job['prefix']}_prompt.txt")
     except Exception as e:
         print(f"    Failed to save prompt log: {e}")
 
-    payload = {"prompt": workflow}
-    
-    print(f"[{i+1}/4] Mode: Master | AR: {ar_name} | Seed: {current_seed}...")
+
+def make_prepare(base_workflow, output_dir):
+    """Build one job's workflow from a private copy of the loaded JSON (runs in a worker thread)."""
+    def prepare(job):
+        workflow = copy.deepcopy(base_workflow)
+        workflow[SAMPLER_NODE_ID]["inputs"]["seed"] = job["seed"]
+        workflow[SAVE_NODE_ID]["inputs"]["filename_prefix"] = job["prefix"]
+        if "pos" in job:
+            workflow[POS_NODE_ID]["inputs"]["text"] = job["pos"]
+            workflow[NEG_NODE_ID]["inputs"]["text"] = job["neg"]
+        if "width" in job:
+            workflow[LATENT_NODE_ID]["inputs"]["width"] = job["width"]
+            workflow[LATENT_NODE_ID]["inputs"]["height"] = job["height"]
+        if "steps" in job:
+            workflow[SAMPLER_NODE_ID]["inputs"]["steps"] = job["steps"]
+        if "cfg" in job:
+            workflow[SAMPLER_NODE_ID]["inputs"]["cfg"] = job["cfg"]
+        if job["iteration"] == 3:
+            write_prompt_log(job, output_dir)
+        return workflow
+    return prepare
+
+
+async def run_batches(base_workflow, servers, output_dir=OUTPUT_DIR, in_flight=RUNNER_IN_FLIGHT, run_seed=None,
+                      journal=None):
+    """Keep `in_flight` prompts queued on the server while the next jobs are built and finished
+    images are downloaded, so the GPU never idles and every result lands in output_dir.
+    With a journal, rerunning with the same run_seed picks up prompts a crashed run already queued."""
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"--- Starting Generation ({3 * IMAGES_PER_ITERATION} Images, {in_flight} in flight) ---")
+    failed = 0
+    async with cw.AsyncComfyPool(servers) as client:
+        runner = PipelinedRunner(client, in_flight=in_flight, save_dir=output_dir, journal=journal)
+        jobs = iteration_jobs(random.Random(run_seed))
+        async for job, result in runner.run(jobs, prepare=make_prepare(base_workflow, output_dir)):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"{describe(job)} ERROR: {type(result).__name__}: {result}")
+                continue
+            print(f"{describe(job)} Saved: {', '.join(p.name for p in result)}")
+        print(runner.report())
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HiDream pixel villain batches (3 iterations x 4 images)")
+    parser.add_argument("json_path", nargs="?", default=JSON_PATH, help="API-format workflow JSON")
+    parser.add_argument("--in-flight", type=int, default=RUNNER_IN_FLIGHT, metavar="K",
+                        help="prompts kept queued on the server at once")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--seed", type=int, help="Seed for the random prompt/seed/aspect choices; rerun with the same value to resume")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record queued prompts to .comfy_journal.sqlite3 (no reattach after a crash)")
+    parser.add_argument("--stop-grace", type=float, default=60.0, metavar="SECONDS",
+                        help="Stop the pod once its queue has stayed empty this long after the run (other clients keep it alive)")
+    parser.add_argument("--no-stop", action="store_true", help="Leave the pod running after the run")
+    args = parser.parse_args()
+    run_seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    print(f"Run seed: {run_seed} (rerun with --seed {run_seed} to resume this batch)")
+    journal = None if args.no_journal else JobJournal()
+
+    with open(args.json_path, "r", encoding="utf-8") as f:
+        workflow = json.load(f)
+
+    servers = cw.servers_from_env(BASE_URL)
+    # The watchdog counts images from the start of the run and holds the pod until every result is downloaded;
+    # after that it stops the pod only once the queue (ours or another client's) stays empty for --stop-grace
+    done = threading.Event()
+    watchdog = PodWatchdog(servers, grace=args.stop_grace, poll=min(15.0, max(1.0, args.stop_grace / 4)),
+                           journal=journal, report_every=0)
+    shutdown = not args.no_stop and bool(os.getenv("RUNPOD_API_KEY"))
+    if shutdown:
+        watcher = threading.Thread(target=watchdog.run, kwargs={"ready": done}, daemon=True)
+    else:
+        watcher = threading.Thread(target=watchdog.watch, args=(done,), daemon=True)
+    watcher.start()
+
     try:
-        res = requests.post(PROMPT_API, json=payload, timeout=30)
-        res.raise_for_status()
-        result = res.json()
-        prompt_id = result.get('prompt_id')
-        print(f"    Queued: {prompt_id}")
-        
-        # Note: In a real async environment, we'd poll /history.
-        # Here we'll notify that download is available via download_results.py later
-        # OR attempt immediate download (might fail if not processed yet).
-        # We will assume the user has download_results.py for the real cleanup.
-        
-    except Exception as e:
-        print(f"    ERROR: {e}")
-
-from pod_manager import stop_pod
-
-# --- Master Workflow Complete. ---
-print("--- Master Workflow Complete. ---")
-
-# --- Autonomous Shutdown Logic ---
-if os.getenv("RUNPOD_API_KEY"):
-    print("Initiating autonomous pod shutdown...")
-    # Give a short buffer for the last request to be fully registered
-    time.sleep(5)
-    stop_pod()
-else:
-    print("NOTE: RUNPOD_API_KEY not found. Skipping automatic shutdown.")
-    print("Please add RUNPOD_API_KEY to your .env file to enable this feature.")
+        failed = asyncio.run(run_batches(workflow, servers, args.output_dir, args.in_flight, run_seed, journal))
+    finally:
+        done.set()
+
+    # --- Master Workflow Complete. ---
+    print(f"--- Master Workflow Complete. ({failed} failed) ---")
+
+    # --- Autonomous Shutdown Logic ---
+    if shutdown:
+        print(f"Waiting for the queue to stay empty for {args.stop_grace:.0f}s before stopping the pod...")
+    watcher.join()
+    if not shutdown:
+        print(watchdog.report())
+        if not args.no_stop:
+            print("NOTE: RUNPOD_API_KEY not found. Skipping automatic shutdown.")
+            print("Please add RUNPOD_API_KEY to your .env file to enable this feature.")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,17 @@ Animagine XL 3.1, Illustrious-XL, Bulldozer BETA 3체크포인트 비교.
 이전 AOM3A1 vs anything-v5와 동일한 프롬프트/설정, 시드 100·101·102 각 3장씩 생성.
 ComfyUI에 없는 체크포인트는 건너뛰고, 사용 가능한 체크포인트만 사용합니다.
 """
+import argparse
+import asyncio
 from pathlib import Path
 import run_character_pipeline as pipeline
+import comfy_sweep as sweep
 import comfy_workflow as cw
+from comfy_cache import ResultCache
+from comfy_cost import CostMeter, CostModel, budget_report, fit_budget
+from comfy_journal import JobJournal
+from comfy_telemetry import TelemetryStore
+from comfy_validate import WorkflowValidator
 
 CONFIG = Path(__file__).resolve().parent / "configs" / "compare_two_ckpts.json"
 PREFERRED_CHECKPOINTS = [
@@ -15,18 +23,31 @@ PREFERRED_CHECKPOINTS = [
     "SDXLAnimeBulldozer_v20.safetensors",
 ]
 SEEDS = [100, 101, 102]
+# 여러 서버면 COMFY_SERVERS="http://a:8188,http://b:8188" (체크포인트가 있는 가장 한가한 서버로 분산)
+SERVERS = cw.servers_from_env()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="체크포인트 3종 비교")
+    parser.add_argument("--shard", type=sweep.parse_shard, default=(0, 1), help="계획을 n개로 나눠 i번째만 실행 (예: 0/2)")
+    parser.add_argument("--batch", type=int, default=1, help="시드 N개를 한 프롬프트(batch_size)로 묶기 (기본 끔. 배치 첫 장만 요청한 시드와 같은 이미지, 메타데이터 seed_exact 참고)")
+    parser.add_argument("--no-cache", action="store_true", help="이미 생성한 조합도 다시 생성")
+    parser.add_argument("--no-journal", action="store_true", help="큐에 넣은 prompt를 .comfy_journal.sqlite3에 기록하지 않기 (중단 후 다시 붙지 않음)")
+    parser.add_argument("--no-telemetry", action="store_true", help="노드별 실행 시간을 .comfy_telemetry.sqlite3에 기록하지 않기")
+    parser.add_argument("--budget", type=float, metavar="GPU_MINUTES", help="예상 GPU 시간이 이 예산(분) 안에 들도록 시드 수를 줄이기")
+    parser.add_argument("--ws-output", action="store_true", help="결과 이미지를 다운로드 대신 WebSocket(SaveImageWebsocket)으로 받기")
+    args = parser.parse_args()
     if not CONFIG.exists():
         print(f"설정 없음: {CONFIG}")
         return 1
-    # ComfyUI에 실제로 있는 체크포인트만 사용
+    # ComfyUI에 실제로 있는 체크포인트만 사용 (서버별 /object_info 저장본에서 읽고, 같은 스키마로 작업도 미리 검사)
+    validator = WorkflowValidator(SERVERS)
     try:
-        available = cw.get_available_checkpoints(server=cw.DEFAULT_SERVER)
+        available = validator.checkpoints
     except Exception as e:
         print(f"체크포인트 목록 조회 실패: {e}")
         available = []
+        validator = None
     if available:
         checkpoints = [c for c in PREFERRED_CHECKPOINTS if c in available]
         if not checkpoints:
@@ -38,32 +59,69 @@ def main():
     else:
         checkpoints = PREFERRED_CHECKPOINTS
         print("체크포인트 목록을 가져오지 못해 선호 목록 그대로 시도합니다.")
-    total = len(checkpoints) * len(SEEDS)
-    n = 0
+    cache = None if args.no_cache else ResultCache()
+    telemetry = None if args.no_telemetry else TelemetryStore()
+    journal = None if args.no_journal else JobJournal()
+    output_mode = "websocket" if args.ws_output else "history"
+    # 텔레메트리 기록이 있으면 실제 실행 시간으로 맞춘 비용 모델, 없으면 기본 계수
+    cost_model = CostModel.from_telemetry(telemetry) if telemetry else CostModel()
+    return asyncio.run(run_all(checkpoints, *args.shard, batch=args.batch, cache=cache, output_mode=output_mode, telemetry=telemetry,
+                               validator=validator, journal=journal, cost_model=cost_model, budget=args.budget))
+
+
+def build_plan(checkpoints) -> sweep.SweepPlan:
+    """체크포인트 × 시드 조합 (체크포인트가 바깥 루프라 모델 재로딩이 체크포인트당 1번)."""
+    spec = sweep.SweepSpec(config=CONFIG, seeds=SEEDS, checkpoints=checkpoints)
+    # run_character_pipeline의 txt2img 기본값과 동일
+    return sweep.SweepPlan(
+        [spec],
+        defaults={"width": 512, "height": 512, "steps": 30, "cfg": 8.5},
+        negative_default="blur, soft gradient, anti-aliasing, realistic, photograph",
+    )
+
+
+async def run_all(checkpoints, shard=0, num_shards=1, batch=1, cache=None, output_mode="history", telemetry=None,
+                  validator=None, journal=None, cost_model=None, budget=None):
+    """
+    스윕 작업을 순서대로 큐에 흘려 넣고 서버마다 WebSocket 하나로 완료를 기다립니다.
+    batch > 1이면 같은 체크포인트의 시드들을 batch_size 프롬프트 하나로 묶습니다.
+    cache가 있으면 이미 생성한 조합은 서버에 보내지 않습니다 (중간에 실패한 실행을 이어서 돌릴 때).
+    output_mode="websocket"이면 이미지를 /view 다운로드 없이 WebSocket으로 받습니다.
+    validator가 있으면 각 워크플로를 서버 스키마로 먼저 검사해, 틀린 작업은 큐에 넣지 않습니다.
+    journal이 있으면 큐에 넣은 prompt를 기록해, 스크립트가 죽은 뒤 다시 실행하면 다시 보내지 않고 결과만 받습니다.
+    budget(GPU 분)을 주면 cost_model 예측이 예산 안에 들도록 시드 수를 줄이고, 끝나면 예상과 실제 GPU 시간을 비교합니다.
+    """
+    cost_model = cost_model or CostModel()
+    plan = build_plan(checkpoints)
+    if budget is not None:
+        plan, entries = fit_budget(plan, cost_model, budget * 60)
+        print(budget_report(entries, budget * 60))
+    meter = CostMeter(cost_model)
+    total = plan.count()
+    print(f"{total}개 작업을 큐에 넣습니다 (체크포인트 순서 유지, 조각 {shard}/{num_shards}).")
     ok_count = 0
     fail_count = 0
-    for ckpt in checkpoints:
-        for seed in SEEDS:
-            n += 1
-            print(f"[{n}/{total}] {ckpt} seed={seed} ...")
-            try:
-                paths = pipeline.run_pipeline(
-                    CONFIG,
-                    seed_override=seed,
-                    ckpt_override=ckpt,
-                )
-                if paths:
-                    print(f"  -> {paths[0]}")
-                    ok_count += 1
-                else:
-                    print("  -> (실패: 저장된 이미지 없음)")
-                    fail_count += 1
-            except Exception as e:
-                print(f"  오류: {e}")
+    async with cw.AsyncComfyPool(SERVERS, telemetry=telemetry) as client:
+        jobs = plan.jobs(shard, num_shards)
+        if batch > 1:
+            jobs = sweep.batch_by_seed(jobs, max_batch=batch)
+        jobs = meter.order(jobs)
+        async for job, paths in sweep.iter_results(jobs, client, save_dir=pipeline.OUTPUTS_DIR, cache=cache, output_mode=output_mode,
+                                                    validator=validator, journal=journal):
+            print(f"[{job.index + 1}/{total}] {job.meta['ckpt_name']} seed={job.meta['seed']} ...")
+            if isinstance(paths, Exception):
+                print(f"  오류: {paths}")
+                fail_count += 1
+            elif paths:
+                pipeline.save_metadata(paths, job.meta)
+                print(f"  -> {paths[0]}")
+                ok_count += 1
+            else:
+                print("  -> (실패: 저장된 이미지 없음)")
                 fail_count += 1
     print("전체 완료. 성공:", ok_count, "실패:", fail_count)
+    print(meter.report(telemetry))
     return 0 if fail_count == 0 else 1
 
-
 if __name__ == "__main__":
     raise SystemExit(main())
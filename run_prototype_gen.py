@@ -1,13 +1,26 @@
+import argparse
+import asyncio
 import json
 import sys
 import os
-import traceback
 from pathlib import Path
 
 # Add current dir to path
 sys.path.append(os.path.abspath("."))
-import run_character_pipeline as pipeline
+import comfy_sweep as sweep
 import comfy_workflow as cw
+from comfy_cache import ResultCache
+from comfy_cost import CostMeter, CostModel, budget_report, fit_budget
+from comfy_graph import CachePlanner
+from comfy_journal import JobJournal
+from comfy_scheduler import AffinityScheduler, reload_seconds_from
+from comfy_telemetry import TelemetryStore
+from comfy_validate import WorkflowValidator
+
+# One or more ComfyUI servers (COMFY_SERVERS="http://a:8188,http://b:8188"); jobs go to the least-loaded one
+SERVERS = cw.servers_from_env()
+
+OUTPUT_DIR = Path(r"c:\Users\jhk92\OneDrive\문서\GitHub\comfy\outputs")
 
 # Execution Plan for Standard Prototype (BG + Objects) + Specialization
 EXECUTION_PLAN = [
@@ -16,96 +29,96 @@ EXECUTION_PLAN = [
     {"config": "configs/lora_test_pixel_items.json", "seeds": [900]}
 ]
 
-def run_lora_pipeline(config_path: Path, seed: int):
-    config = pipeline.load_config(config_path)
-    base = config.get("base_character", {})
-    
-    prompt = pipeline.build_prompt_from_config(config)
-    prefix = pipeline.build_filename_prefix(config)
-    negative = config.get("negative_prompt", "")
-    
-    lora_name = base.get("lora_name")
-    
-    if lora_name:
-        verified_loras = {
-            "JJ's Isometric Room XL v1.0.safetensors": "JJsIsometricRoom_XL.safetensors"
-        }
-        target_lora = verified_loras.get(lora_name, lora_name)
+VERIFIED_LORAS = {
+    "JJ's Isometric Room XL v1.0.safetensors": "JJsIsometricRoom_XL.safetensors"
+}
+
+def build_plan(root: Path) -> sweep.SweepPlan:
+    """Lazy plan over EXECUTION_PLAN (one built graph per config, only the varying inputs are filled)."""
+    return sweep.SweepPlan.from_entries(
+        EXECUTION_PLAN,
+        root=root,
+        defaults={"width": 1024, "height": 1024, "steps": 32, "cfg": 6.0, "lora_weight": 0.45},
+        lora_aliases=VERIFIED_LORAS,
+        prefix="proto_",
+    )
 
-        wf_config = {
-            "modes": ["pixel_character", "lora_loader"],
-            "placeholders": {
-                "__PROMPT__": prompt,
-                "__NEGATIVE__": negative,
-                "__SEED__": seed,
-                "__CKPT_NAME__": base.get("ckpt_name"),
-                "__FILENAME_PREFIX__": f"proto_{prefix}",
-                "__WIDTH__": base.get("width", 1024),
-                "__HEIGHT__": base.get("height", 1024),
-                "__STEPS__": base.get("steps", 32),
-                "__CFG__": base.get("cfg", 6.0),
-                "__SAMPLER__": base.get("sampler_name", "dpmpp_2m"),
-                "__SCHEDULER__": base.get("scheduler", "karras"),
-                
-                "__LORA_NAME__": target_lora,
-                "__LORA_STRENGTH__": base.get("lora_weight", 0.45),
-                "__MODEL_INPUT__": ["4", 0], 
-                "__CLIP_INPUT__": ["4", 1],
-            }
-        }
-        workflow = cw.build_workflow(wf_config)
-        cw.connect(workflow, "1001", "3", "model", 0)
-        cw.connect(workflow, "1001", "6", "clip", 1)
-        cw.connect(workflow, "1001", "7", "clip", 1)
-        cw.connect(workflow, "4", "8", "vae", 2)
-    else:
-        wf_config = {
-            "modes": ["pixel_character"],
-            "placeholders": {
-                "__PROMPT__": prompt,
-                "__NEGATIVE__": negative,
-                "__SEED__": seed,
-                "__CKPT_NAME__": base.get("ckpt_name"),
-                "__FILENAME_PREFIX__": f"proto_{prefix}",
-                "__WIDTH__": base.get("width", 1024),
-                "__HEIGHT__": base.get("height", 1024),
-                "__STEPS__": base.get("steps", 32),
-                "__CFG__": base.get("cfg", 6.0),
-                "__SAMPLER__": base.get("sampler_name", "dpmpp_2m"),
-                "__SCHEDULER__": base.get("scheduler", "karras")
-            }
-        }
-        workflow = cw.build_workflow(wf_config)
-        cw.connect(workflow, "4", "8", "vae", 2)
+def save_metadata(paths, meta: dict):
+    for p in paths:
+        meta_p = p.with_suffix(".metadata.json")
+        with open(meta_p, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
 
-    try:
-        abs_outputs = Path(r"c:\Users\jhk92\OneDrive\문서\GitHub\comfy\outputs")
-        abs_outputs.mkdir(parents=True, exist_ok=True)
-        paths = cw.generate_image(workflow, save_dir=abs_outputs)
-        
-        # Save Metadata
-        meta = {
-            "config": config_path.name,
-            "seed": seed,
-            "prompt": prompt,
-            "lora_weight": base.get("lora_weight")
-        }
-        for p in paths:
-            meta_p = p.with_suffix(".metadata.json")
-            with open(meta_p, "w", encoding="utf-8") as f:
-                json.dump(meta, f, indent=2, ensure_ascii=False)
-        return paths
-    except Exception as e:
-        print(f"Failed: {e}")
-        return []
+async def run_plan_async(plan: sweep.SweepPlan, shard: int = 0, num_shards: int = 1, batch: int = 1, cache=None,
+                         output_mode: str = "history", telemetry=None, scheduler=None, planner=None,
+                         fuse: int = 1, validator=None, journal=None, meter=None):
+    """Stream the plan into the server queue; metadata is written as each job finishes.
+    fuse > 1 merges up to N variants of the same config/checkpoint into one prompt that shares upstream nodes.
+    With a scheduler, jobs sharing a checkpoint/VAE/LoRA stack are grouped to avoid model reloads;
+    a planner then orders neighbours so consecutive prompts reuse the server's node cache.
+    A validator checks each workflow against the server's /object_info schema before it is queued.
+    A journal records every queued prompt so a rerun after a crash reattaches to it instead of resubmitting.
+    A meter (CostMeter) predicts the GPU time of each prompt as it is queued and compares it with telemetry at the end."""
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    jobs = plan.jobs(shard, num_shards)
+    if scheduler is not None:
+        jobs = scheduler.order(jobs)
+    if batch > 1:
+        jobs = sweep.batch_by_seed(jobs, max_batch=batch)
+    if fuse > 1:
+        jobs = sweep.fuse_variants(jobs, max_branches=fuse)
+    if planner is not None:
+        jobs = planner.order(jobs)
+    if meter is not None:
+        jobs = meter.order(jobs)
+    async with cw.AsyncComfyPool(SERVERS, telemetry=telemetry) as client:
+        async for job, result in sweep.iter_results(jobs, client, save_dir=OUTPUT_DIR, cache=cache, output_mode=output_mode,
+                                                  validator=validator, journal=journal):
+            if isinstance(result, Exception):
+                print(f"Failed: {job.config.name} seed={job.meta['seed']}: {result}")
+                continue
+            print(f"Generated {job.config.name} (Seed {job.meta['seed']})")
+            save_metadata(result, job.meta)
+    if scheduler is not None:
+        print(scheduler.report())
+    if planner is not None:
+        print(planner.report(telemetry))
+    if meter is not None:
+        print(meter.report(telemetry))
 
 def main():
-    root = Path(__file__).resolve().parent
-    for entry in EXECUTION_PLAN:
-        cfg_path = root / entry["config"]
-        for seed in entry["seeds"]:
-            print(f"Generating {cfg_path.name} (Seed {seed})...")
-            run_lora_pipeline(cfg_path, seed)
+    parser = argparse.ArgumentParser(description="Prototype asset generation")
+    parser.add_argument("--shard", type=sweep.parse_shard, default=(0, 1), help="Run only part i of n of the plan, e.g. 0/2")
+    parser.add_argument("--batch", type=int, default=1, help="Batch up to N seeds per prompt via EmptyLatentImage batch_size (off by default; only the first image of a batch matches its requested seed)")
+    parser.add_argument("--fuse", type=int, default=1, help="Fuse up to N variants of one config into one prompt sharing upstream nodes")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate even if the same workflow already has results")
+    parser.add_argument("--no-telemetry", action="store_true", help="Do not record per-node timings to .comfy_telemetry.sqlite3")
+    parser.add_argument("--no-reorder", action="store_true", help="Submit in plan order instead of grouping jobs by checkpoint/VAE/LoRA and shared nodes")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record queued prompts to .comfy_journal.sqlite3 (no reattach after a crash)")
+    parser.add_argument("--no-validate", action="store_true", help="Skip checking workflows against the server's /object_info schema before queueing")
+    parser.add_argument("--budget", type=float, metavar="GPU_MINUTES",
+                        help="Trim seeds per config (then drop trailing entries) so the predicted GPU time fits this budget")
+    parser.add_argument("--ws-output", action="store_true", help="Receive images over the WebSocket (SaveImageWebsocket) instead of downloading them")
+    args = parser.parse_args()
+    cache = None if args.no_cache else ResultCache()
+    telemetry = None if args.no_telemetry else TelemetryStore()
+    validator = None if args.no_validate else WorkflowValidator(SERVERS)
+    journal = None if args.no_journal else JobJournal()
+    scheduler = planner = None
+    if not args.no_reorder:
+        planner = CachePlanner()
+        # Reload estimates come from recorded loader timings when telemetry is on
+        scheduler = AffinityScheduler(reload_seconds=reload_seconds_from(telemetry) if telemetry else None)
+    # Seconds per prompt come from recorded timings when telemetry is on, otherwise from built-in defaults
+    cost_model = CostModel.from_telemetry(telemetry) if telemetry else CostModel()
+    plan = build_plan(Path(__file__).resolve().parent)
+    if args.budget is not None:
+        plan, entries = fit_budget(plan, cost_model, args.budget * 60)
+        print(budget_report(entries, args.budget * 60))
+    asyncio.run(run_plan_async(plan, *args.shard, batch=args.batch, cache=cache,
+                               output_mode="websocket" if args.ws_output else "history", telemetry=telemetry,
+                               scheduler=scheduler, planner=planner, fuse=args.fuse,
+                               validator=validator, journal=journal, meter=CostMeter(cost_model)))
 
 if __name__ == "__main__":
     main()
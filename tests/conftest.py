@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""fake_comfy_server 기반 동작 테스트 공용 fixture (GPU·외부 네트워크 불필요)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import comfy_workflow as cw  # noqa: E402
+from fake_comfy_server import FakeComfyServer  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    """작업 지연 없는 가짜 서버."""
+    with FakeComfyServer() as srv:
+        yield srv
+
+
+@pytest.fixture
+def slow_server():
+    """작업마다 0.5초 걸리는 가짜 서버 (대기·연결 끊김 확인용)."""
+    with FakeComfyServer(job_latency=0.5) as srv:
+        yield srv
+
+
+def text2img(seed: int = 1) -> dict:
+    return cw.build_workflow({"modes": ["text2img"], "placeholders": {"__PROMPT__": "a cat", "__SEED__": seed}})
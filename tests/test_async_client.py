@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""AsyncComfyClient: WebSocket 하나로 여러 prompt 제출·완료 대기, 실행 실패·시간 초과."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import comfy_workflow as cw
+from comfy_runner import PipelinedRunner
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def _reader_threads() -> int:
+    return sum(1 for t in threading.enumerate() if t.name.startswith("comfy-ws-"))
+
+
+def test_generate_many_shares_one_websocket(server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            results = await client.generate_many([text2img(seed) for seed in range(5)], save_dir=tmp_path)
+            assert len(server.clients) == 1
+            return results
+
+    results = asyncio.run(main())
+    assert len(results) == 5
+    assert all(len(paths) == 1 and paths[0].exists() for paths in results)
+    assert server.stats["prompt"] == 5
+
+
+def test_submit_then_wait_in_any_order(server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            ids = [await client.submit(text2img(seed)) for seed in range(3)]
+            # 완료 메시지가 wait() 전에 와도 놓치지 않아야 함
+            await asyncio.sleep(0.2)
+            for prompt_id in reversed(ids):
+                await client.wait(prompt_id, timeout=10)
+            return [await client.fetch_outputs(prompt_id, tmp_path) for prompt_id in ids]
+
+    assert all(paths for paths in asyncio.run(main()))
+
+
+def test_close_fails_pending_waits_and_stops_reader(slow_server):
+    async def main():
+        client = cw.AsyncComfyClient(slow_server.url)
+        await client.connect()
+        prompt_id = await client.submit(text2img())
+        waiting = asyncio.ensure_future(client.wait(prompt_id))
+        await asyncio.sleep(0.05)
+        await client.close()
+        with pytest.raises(ConnectionError):
+            await waiting
+
+    before = _reader_threads()
+    asyncio.run(main())
+    assert _reader_threads() == before
+
+
+def test_execution_error_fails_fast():
+    async def main(url):
+        async with cw.AsyncComfyClient(url) as client:
+            prompt_id = await client.submit(text2img())
+            await client.wait(prompt_id, timeout=10)
+
+    with FakeComfyServer(fail_class="KSampler", job_latency=0.5) as srv:
+        started = time.monotonic()
+        with pytest.raises(cw.ExecutionError) as info:
+            asyncio.run(main(srv.url))
+        # 실패 알림을 받자마자 끝남 (history 폴링·시간 초과를 기다리지 않음)
+        assert time.monotonic() - started < 2.0
+    assert info.value.node_type == "KSampler" and not info.value.interrupted
+
+
+def test_deadline_interrupts_running_prompt_and_frees_the_gpu(tmp_path):
+    async def main(url):
+        async with cw.AsyncComfyClient(url) as client:
+            first = await client.submit(text2img(1))
+            second = await client.submit(text2img(2))
+            with pytest.raises(TimeoutError):
+                await client.wait(first, timeout=0.2)
+            started = time.monotonic()
+            await client.wait(second, timeout=10)
+            return time.monotonic() - started
+
+    with FakeComfyServer(job_latency=2.0) as srv:
+        # 시간이 넘은 작업을 멈추므로 다음 작업이 남은 실행 시간을 기다리지 않음
+        assert asyncio.run(main(srv.url)) < 3.0
+        queue = cw.get_queue(srv.url)
+        assert not queue["queue_running"] and not queue["queue_pending"]
+
+
+def test_runner_reports_deadline_per_job(tmp_path):
+    async def main(url):
+        async with cw.AsyncComfyClient(url) as client:
+            runner = PipelinedRunner(client, in_flight=1, save_dir=tmp_path, timeout=0.3)
+            return [item async for item in runner.run([text2img(1)])]
+
+    with FakeComfyServer(job_latency=5.0) as srv:
+        [(_, result)] = asyncio.run(main(srv.url))
+        assert isinstance(result, TimeoutError)
+        assert not cw.get_queue(srv.url)["queue_pending"]
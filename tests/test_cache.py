@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""ResultCache: 같은 워크플로는 다시 보내지 않음, 용량을 넘으면 가장 오래 안 쓴 항목부터 지움."""
+
+import asyncio
+import time
+
+import comfy_workflow as cw
+from comfy_cache import ResultCache, workflow_hash
+from conftest import text2img
+
+
+def test_hash_ignores_filename_prefix_and_key_order():
+    workflow = text2img(1)
+    renamed = {node_id: dict(node) for node_id, node in reversed(list(workflow.items()))}
+    renamed["9"] = dict(workflow["9"], inputs=dict(workflow["9"]["inputs"], filename_prefix="other"))
+    assert workflow_hash(renamed) == workflow_hash(workflow)
+    assert workflow_hash(text2img(2)) != workflow_hash(workflow)
+
+
+def test_cache_hit_skips_the_server(server, tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            first = await client.generate(text2img(1), save_dir=tmp_path / "a", cache=cache)
+            second = await client.generate(text2img(1), save_dir=tmp_path / "b", cache=cache)
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert server.stats["prompt"] == 1
+    assert [p.name for p in second] == [p.name for p in first]
+    assert second[0].parent == tmp_path / "b" and second[0].read_bytes() == first[0].read_bytes()
+    cache.close()
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=250)
+    for name in ("a", "b", "c"):
+        image = tmp_path / f"{name}.png"
+        image.write_bytes(b"x" * 100)
+        cache.put(name, [image])
+        time.sleep(0.01)
+        if name == "b":
+            # a를 다시 쓰면 b가 가장 오래 안 쓴 항목이 됨
+            assert cache.get("a", tmp_path / "out")
+            time.sleep(0.01)
+    assert cache.get("b", tmp_path / "out") is None
+    assert cache.get("a", tmp_path / "out") and cache.get("c", tmp_path / "out")
+    assert cache.total_bytes() == 200
+    cache.close()
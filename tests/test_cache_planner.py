@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""CachePlanner: 직전 prompt와 같은 노드가 많은 작업을 먼저 보내 서버 노드 캐시 적중을 늘림."""
+
+import asyncio
+from pathlib import Path
+
+import comfy_sweep as sweep
+import comfy_workflow as cw
+from comfy_graph import CachePlanner, node_hashes
+from comfy_telemetry import TelemetryStore
+from fake_comfy_server import FakeComfyServer
+
+PROMPTS = ["a castle", "a forest"]
+
+
+def _jobs(count: int) -> list:
+    """프롬프트가 번갈아 바뀌는 작업들 (같은 프롬프트끼리는 CLIPTextEncode까지 같음)."""
+    jobs = []
+    for index in range(count):
+        workflow = cw.build_workflow(
+            {"modes": ["text2img"], "placeholders": {"__PROMPT__": PROMPTS[index % 2], "__SEED__": index}}
+        )
+        jobs.append(sweep.SweepJob(index, Path("c.json"), workflow, {"seed": index}))
+    return jobs
+
+
+def _observed_cached(jobs, tmp_path) -> int:
+    store = TelemetryStore(tmp_path / "telemetry.sqlite3")
+
+    async def main(url):
+        async with cw.AsyncComfyPool([url], telemetry=store) as pool:
+            async for _ in sweep.iter_results(jobs, pool, save_dir=tmp_path, max_pending=1):
+                pass
+
+    with FakeComfyServer(node_cache=True) as srv:
+        asyncio.run(main(srv.url))
+    cached = store.cache_summary()["cached"]
+    store.close()
+    return cached
+
+
+def test_node_hashes_follow_upstream():
+    first, second = (job.workflow for job in _jobs(2))
+    a, b = node_hashes(first), node_hashes(second)
+    # 체크포인트 로더는 같고, 프롬프트가 다른 인코더와 그 하류는 다름
+    assert a["4"] == b["4"] and a["6"] != b["6"] and a["3"] != b["3"]
+
+
+def test_planner_order_raises_server_cache_hits(tmp_path):
+    planner = CachePlanner(window=8, max_delay=8)
+    ordered = list(planner.order(_jobs(8)))
+    assert sorted(job.index for job in ordered) == list(range(8))
+    assert [job.index % 2 for job in ordered] == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert planner.cached_after > planner.cached_before
+
+    before = _observed_cached(_jobs(8), tmp_path / "before")
+    after = _observed_cached(ordered, tmp_path / "after")
+    assert after > before
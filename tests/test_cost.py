@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""comfy_cost: 텔레메트리로 실행 시간을 예측하고, GPU 예산에 맞춰 시드를 줄임."""
+
+import asyncio
+
+import comfy_sweep as sweep
+import comfy_workflow as cw
+from comfy_cost import CostMeter, CostModel, fit_budget
+from comfy_telemetry import TelemetryStore
+from conftest import ROOT_DIR
+from fake_comfy_server import FakeComfyServer
+
+CONFIG = ROOT_DIR / "configs" / "lora_test_bg_v2.json"
+CHECKPOINT = "Illustrious-XL-v2.0.safetensors"
+
+
+def _plan() -> sweep.SweepPlan:
+    return sweep.SweepPlan(
+        [
+            sweep.SweepSpec(CONFIG, seeds=range(6)),
+            sweep.SweepSpec(CONFIG, seeds=range(2), samplers=["dpmpp_2m"]),
+        ]
+    )
+
+
+def _run(jobs, url: str, save_dir, store=None) -> list:
+    async def main():
+        async with cw.AsyncComfyPool([url], telemetry=store) as pool:
+            return [item async for item in sweep.iter_results(jobs, pool, save_dir=save_dir, max_pending=1)]
+
+    return asyncio.run(main())
+
+
+def test_fit_budget_trims_the_widest_seed_axis_first(tmp_path):
+    model = CostModel()
+    plan = _plan()
+    _, full = fit_budget(plan, model, budget_seconds=float("inf"))
+    total = sum(entry["full_seconds"] for entry in full)
+    assert [entry["kept"] for entry in full] == [6, 2]
+
+    # 시드 하나 줄이는 만큼보다 조금 적은 예산: 시드가 많은 첫 설정에서만 줄어듦
+    budget = total - full[0]["full_seconds"] / 6 * 2.5
+    trimmed, entries = fit_budget(plan, model, budget_seconds=budget)
+    assert [entry["kept"] for entry in entries] == [3, 2]
+    assert sum(entry["seconds"] for entry in entries) <= budget
+    assert trimmed.count() == 5
+
+    with FakeComfyServer(checkpoints=[CHECKPOINT]) as srv:
+        results = _run(trimmed.jobs(), srv.url, tmp_path)
+        assert srv.stats["prompt"] == 5
+    assert sorted(job.meta["seed"] for job, _ in results) == [0, 0, 1, 1, 2]
+
+
+def test_fit_budget_drops_trailing_specs_below_min_seeds():
+    model = CostModel()
+    plan = _plan()
+    # 첫 설정의 시드 하나만 들어가는 예산: 두 설정을 다 시드 하나로 줄여도 넘음
+    budget = model.predict(next(plan.jobs()).workflow) * 1.2
+    trimmed, entries = fit_budget(plan, model, budget_seconds=budget)
+    assert [entry["kept"] for entry in entries] == [1, 0]
+    assert trimmed.count() == 1
+
+
+def test_model_learned_from_telemetry_matches_observed_time(tmp_path):
+    store = TelemetryStore(tmp_path / "telemetry.sqlite3")
+    plan = sweep.SweepPlan([sweep.SweepSpec(CONFIG, seeds=range(3))])
+    with FakeComfyServer(job_latency=0.3, checkpoints=[CHECKPOINT]) as srv:
+        _run(plan.jobs(), srv.url, tmp_path / "learn", store)
+        model = CostModel.from_telemetry(store)
+        assert model.samples[("sdxl", "")] == 3
+
+        meter = CostMeter(model)
+        later = plan.with_specs([plan.specs[0]._replace(seeds=range(3, 6))])
+        _run(meter.order(later.jobs()), srv.url, tmp_path, store)
+    summary = meter.summary(store)
+    assert summary["jobs"] == summary["prompts"] == 3
+    # 기본 계수(수 초)가 아니라 기록(작업당 0.3초 남짓)에 맞춘 예측
+    assert abs(summary["predicted"] - summary["actual"]) < 0.5 * summary["actual"]
+    store.close()
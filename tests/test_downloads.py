@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""결과 다운로드: 여러 장은 동시에, 중간에 끊기면 기존 파일을 그대로 두고 처음부터 다시."""
+
+import pytest
+import requests
+
+import comfy_workflow as cw
+from conftest import text2img
+
+
+def _cut_first_stream(monkeypatch, cuts: int = 1) -> None:
+    """처음 cuts번의 응답 본문은 첫 청크 뒤에 끊깁니다."""
+    iter_content = requests.Response.iter_content
+    left = [cuts]
+
+    def cut(self, *args, **kwargs):
+        chunks = iter_content(self, *args, **kwargs)
+        if left[0] <= 0:
+            return chunks
+        left[0] -= 1
+
+        def broken():
+            yield next(chunks)
+            raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+        return broken()
+
+    monkeypatch.setattr(requests.Response, "iter_content", cut)
+
+
+def _leftovers(directory) -> list:
+    return [p.name for p in directory.iterdir() if p.name.endswith(".tmp")]
+
+
+def _first_image(server, tmp_path) -> str:
+    """작업 하나를 끝내고 서버에 남은 결과 파일명을 반환합니다."""
+    return cw.generate_image(text2img(1), server=server.url, save_dir=tmp_path / "first")[0].name
+
+
+def test_failed_download_keeps_the_old_file(server, tmp_path, monkeypatch):
+    server.image_bytes = 3 * cw.DOWNLOAD_CHUNK_SIZE
+    name = _first_image(server, tmp_path)
+    dest = tmp_path / name
+    dest.write_bytes(b"old")
+    _cut_first_stream(monkeypatch, cuts=10)
+    client = cw.ComfyClient(server.url, max_retries=0)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.download_image(name, dest)
+    assert dest.read_bytes() == b"old" and not _leftovers(tmp_path)
+
+
+def test_cut_download_is_retried_from_the_start(server, tmp_path, monkeypatch):
+    server.image_bytes = 3 * cw.DOWNLOAD_CHUNK_SIZE
+    name = _first_image(server, tmp_path)
+    expected = (tmp_path / "first" / name).read_bytes()
+    _cut_first_stream(monkeypatch)
+    dest = cw.ComfyClient(server.url, backoff=0).download_image(name, tmp_path / name)
+    assert dest.read_bytes() == expected and not _leftovers(tmp_path)
+
+
+def test_collect_outputs_saves_every_image(server, tmp_path):
+    paths = cw.generate_image(cw.make_seed_batch(text2img(1), 4), server=server.url, save_dir=tmp_path)
+    assert len(paths) == 4 and len({p.name for p in paths}) == 4
+    assert all(p.exists() and p.stat().st_size > 0 for p in paths)
+    assert server.stats["view"] == 4 and not _leftovers(tmp_path)
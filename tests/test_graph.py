@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""build_workflow("optimize") / comfy_graph.optimize_workflow의 그래프 정리 규칙."""
+
+import pytest
+
+import comfy_workflow as cw
+from comfy_graph import INTERMEDIATE_NODE_CLASSES, OUTPUT_NODE_CLASSES, node_hashes, optimize_workflow
+from comfy_validate import ObjectInfo
+from fake_comfy_server import make_object_info
+
+UPSCALE_CONFIG = {
+    "modes": ["text2img", "upscale"],
+    "placeholders": {"__PROMPT__": "a cat", "__SEED__": 1},
+    "connections": [{"from_node": "8", "from_slot": 0, "to_node": "1003", "to_input": "image"}],
+}
+
+
+def _graph() -> dict:
+    """SaveImage 하나, 출력에 닿지 않는 LoadImage 하나, 커스텀 노드(VHS_VideoCombine)로 이어지는 가지 하나."""
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "a.safetensors"}},
+        "2": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+        "3": {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0], "vae": ["1", 2]}},
+        "4": {"class_type": "SaveImage", "inputs": {"images": ["3", 0], "filename_prefix": "x"}},
+        "5": {"class_type": "ImageScaleBy", "inputs": {"image": ["3", 0], "upscale_method": "nearest-exact", "scale_by": 2}},
+        "6": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["5", 0]}},
+        "7": {"class_type": "LoadImage", "inputs": {"image": "ref.png"}},
+    }
+
+
+def test_build_workflow_keeps_every_node_by_default():
+    workflow = cw.build_workflow(UPSCALE_CONFIG)
+    assert "1001" in workflow
+    # 빌드한 뒤에도 어느 노드에든 이어 붙일 수 있음
+    cw.connect(workflow, "8", "1001", "image")
+    assert workflow["1001"]["inputs"]["image"] == ["8", 0]
+    cw.remove_node(workflow, "1001")
+    assert "1001" not in workflow
+
+
+def test_build_workflow_optimize_drops_disconnected_nodes():
+    workflow = cw.build_workflow(dict(UPSCALE_CONFIG, optimize=True))
+    assert "1001" not in workflow
+    assert workflow["1003"]["inputs"]["image"] == ["8", 0]
+    assert {"9", "1004"} <= set(workflow)
+
+
+def test_connect_checks_only_the_input_node():
+    workflow = cw.build_workflow(UPSCALE_CONFIG)
+    cw.connect(workflow, "404", "1003", "image")
+    assert workflow["1003"]["inputs"]["image"] == ["404", 0]
+    with pytest.raises(KeyError):
+        cw.connect(workflow, "8", "404", "image")
+
+
+def test_unknown_class_is_kept_with_its_upstream():
+    workflow = _graph()
+    removed = optimize_workflow(workflow)
+    assert removed == {"7": None}
+    assert {"5", "6"} <= set(workflow)
+
+
+def test_unknown_class_is_never_merged():
+    workflow = _graph()
+    workflow["8"] = dict(workflow["6"], inputs=dict(workflow["6"]["inputs"]))
+    optimize_workflow(workflow)
+    assert {"6", "8"} <= set(workflow)
+
+
+def test_only_listed_classes_count_without_unknown_nodes():
+    workflow = _graph()
+    del workflow["6"]
+    removed = optimize_workflow(workflow)
+    assert set(removed) == {"5", "7"}
+
+
+def test_output_and_known_classes():
+    extra = {"VHS_VideoCombine"}
+    workflow = _graph()
+    assert optimize_workflow(workflow, OUTPUT_NODE_CLASSES | extra) == {"7": None}
+    # 출력이 아닌 것으로 알려 준 클래스는 일반 노드처럼 상류째 제거
+    workflow = _graph()
+    removed = optimize_workflow(workflow, known_classes=OUTPUT_NODE_CLASSES | INTERMEDIATE_NODE_CLASSES | extra)
+    assert set(removed) == {"5", "6", "7"}
+
+
+def test_object_info_output_node_flag():
+    info = make_object_info(["a.safetensors"], [])
+    info["VHS_VideoCombine"] = {"input": {"required": {"images": ["IMAGE"]}}, "output": [], "output_node": True}
+    info["ImageScaleBy"] = {"input": {"required": {"image": ["IMAGE"]}}, "output": ["IMAGE"], "output_node": False}
+    info["MyPreview"] = {"input": {"required": {"images": ["IMAGE"]}}, "output": [], "output_node": False}
+    schema = ObjectInfo(info)
+    assert {"SaveImage", "VHS_VideoCombine"} <= schema.output_classes
+    assert "ImageScaleBy" not in schema.output_classes
+
+    workflow = _graph()
+    workflow["8"] = {"class_type": "MyPreview", "inputs": {"images": ["3", 0]}}
+    workflow["9"] = {"class_type": "NotOnServer", "inputs": {"image": ["7", 0]}}
+    removed = schema.optimize(workflow)
+    # 서버가 출력이 아니라고 한 MyPreview는 지우고, 서버에 없는 클래스는 상류(LoadImage)와 함께 남김
+    assert removed == {"8": None}
+    assert {"6", "7", "9"} <= set(workflow)
+
+
+def test_duplicate_loaders_collapse_to_lowest_id():
+    workflow = _graph()
+    workflow["11"] = dict(workflow["1"])
+    workflow["12"] = {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0], "vae": ["11", 2]}}
+    workflow["13"] = {"class_type": "SaveImage", "inputs": {"images": ["12", 0], "filename_prefix": "y"}}
+    before = node_hashes(workflow)
+    removed = optimize_workflow(workflow)
+    assert removed["11"] == "1" and removed["12"] == "3"
+    assert workflow["13"]["inputs"]["images"] == ["3", 0]
+    assert before["11"] == before["1"]
+
+
+def test_dangling_reference_raises():
+    workflow = _graph()
+    workflow["4"]["inputs"]["images"] = ["99", 0]
+    with pytest.raises(ValueError):
+        optimize_workflow(workflow)
+
+
+def test_update_workflow_by_node_id():
+    workflow = _graph()
+    cw.update_workflow_by_node_id(workflow, 2, {"width": 768, "height": 1024})
+    assert workflow["2"]["inputs"]["width"] == 768
+    with pytest.raises(KeyError):
+        cw.update_workflow_by_node_id(workflow, "404", {"seed": 1})
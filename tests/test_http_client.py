@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""ComfyClient: 재시도 범위, 업로드 중복 방지, 다운로드 재시도와 회로 차단."""
+
+import pytest
+import requests
+
+import comfy_workflow as cw
+
+DEAD_SERVER = "http://127.0.0.1:9"
+
+
+def _count_requests(client: cw.ComfyClient, monkeypatch) -> list:
+    calls = []
+    send = client.session.request
+
+    def counted(method, url, **kwargs):
+        calls.append((method, url))
+        return send(method, url, **kwargs)
+
+    monkeypatch.setattr(client.session, "request", counted)
+    return calls
+
+
+def test_download_retries_in_one_layer(tmp_path, monkeypatch):
+    client = cw.ComfyClient(DEAD_SERVER, max_retries=2, backoff=0, failure_threshold=100)
+    calls = _count_requests(client, monkeypatch)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.download_image("a.png", tmp_path / "a.png")
+    assert len(calls) == 3
+    assert not (tmp_path / "a.png").exists()
+
+
+def test_download_does_not_retry_open_circuit(tmp_path, monkeypatch):
+    client = cw.ComfyClient(DEAD_SERVER, max_retries=3, backoff=0, failure_threshold=1, reset_timeout=60)
+    calls = _count_requests(client, monkeypatch)
+    with pytest.raises(cw.CircuitOpenError):
+        client.download_image("a.png", tmp_path / "a.png")
+    assert len(calls) == 1
+
+
+def test_upload_without_overwrite_is_not_resent(server, monkeypatch):
+    client = cw.ComfyClient(server.url, max_retries=3, backoff=0, failure_threshold=100)
+    calls = []
+
+    def reset(method, url, **kwargs):
+        calls.append((method, url))
+        raise requests.exceptions.ConnectionError("connection reset by peer")
+
+    monkeypatch.setattr(client.session, "request", reset)
+    # 서버가 받았을 수도 있는 업로드를 다시 보내면 이름만 바꾼 파일이 하나 더 생김
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.upload_bytes(b"png", "ref.png")
+    assert len(calls) == 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.upload_bytes(b"png", "ref.png", overwrite=True)
+    assert len(calls) == 1 + 4
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""JobJournal + PipelinedRunner: 이전 실행이 넣은 prompt에 다시 붙고, 상태를 모르면 다시 제출하지 않음."""
+
+import asyncio
+import uuid
+
+import comfy_journal as journal_mod
+import comfy_workflow as cw
+from comfy_cache import workflow_hash
+from comfy_journal import JobJournal
+from comfy_runner import PipelinedRunner
+from conftest import text2img
+
+DEAD_SERVER = "http://127.0.0.1:9"
+
+
+def _run(url, workflows, journal, save_dir):
+    async def main():
+        async with cw.AsyncComfyPool([url]) as pool:
+            runner = PipelinedRunner(pool, journal=journal, save_dir=save_dir, timeout=30)
+            results = [result async for _, result in runner.run(workflows)]
+            return runner, results
+
+    return asyncio.run(main())
+
+
+def test_reattaches_to_prompt_left_on_server(slow_server, tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    workflow = text2img()
+    key = workflow_hash(workflow)
+    prompt_id = str(uuid.uuid4())
+    # 이전 실행이 제출 직후 죽은 상황: 기록은 queued, prompt는 서버 큐에 있음
+    journal.submitting(key, prompt_id)
+    cw.queue_prompt(workflow, server=slow_server.url, prompt_id=prompt_id)
+    journal.queued(key, slow_server.url, prompt_id)
+
+    runner, results = _run(slow_server.url, [workflow], journal, tmp_path / "out")
+    assert runner.reattached == 1 and runner.submitted == 0
+    assert slow_server.stats["prompt"] == 1
+    assert len(results[0]) == 1 and results[0][0].exists()
+    assert journal.get(key).state == journal_mod.DONE
+
+    # 결과 파일이 남아 있으면 서버에 묻지도 않고 그대로 돌려줌
+    runner, results = _run(slow_server.url, [workflow], journal, tmp_path / "out")
+    assert runner.resumed == 1 and slow_server.stats["prompt"] == 1
+    journal.close()
+
+
+def test_submitting_row_is_found_on_any_server(server, tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    workflow = text2img()
+    key = workflow_hash(workflow)
+    prompt_id = str(uuid.uuid4())
+    journal.submitting(key, prompt_id)
+    cw.queue_prompt(workflow, server=server.url, prompt_id=prompt_id)
+    entry = journal.get(key)
+    located, status = journal.locate(entry, [DEAD_SERVER, server.url])
+    assert located == server.url
+    assert status in journal_mod.LIVE_STATUSES
+    journal.close()
+
+
+def test_unreachable_recorded_server_is_not_resubmitted(server, tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    workflow = text2img()
+    key = workflow_hash(workflow)
+    journal.submitting(key, "old-prompt")
+    journal.queued(key, DEAD_SERVER, "old-prompt")
+    before = journal.get(key)
+
+    assert journal.locate(before, [server.url]) == (DEAD_SERVER, journal_mod.STATUS_UNKNOWN)
+    runner, results = _run(server.url, [workflow], journal, tmp_path / "out")
+    assert isinstance(results[0], ConnectionError)
+    assert runner.submitted == 0 and server.stats["prompt"] == 0
+    after = journal.get(key)
+    assert (after.state, after.server, after.prompt_id) == (journal_mod.QUEUED, DEAD_SERVER, "old-prompt")
+    journal.close()
+
+
+def test_missing_prompt_is_resubmitted(server, tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    workflow = text2img()
+    key = workflow_hash(workflow)
+    journal.submitting(key, "lost-prompt")
+    journal.queued(key, server.url, "lost-prompt")
+
+    runner, results = _run(server.url, [workflow], journal, tmp_path / "out")
+    assert runner.submitted == 1 and results[0]
+    assert journal.get(key).prompt_id != "lost-prompt"
+    journal.close()
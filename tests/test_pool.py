@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""AsyncComfyPool: 서버 분산, 제출 실패 시 서버 건너뛰기와 클라이언트 유지."""
+
+import asyncio
+
+import pytest
+import requests
+
+import comfy_workflow as cw
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def test_pool_spreads_jobs_over_servers(tmp_path):
+    async def main(urls):
+        async with cw.AsyncComfyPool(urls) as pool:
+            return await pool.generate_many([text2img(seed) for seed in range(6)], save_dir=tmp_path)
+
+    with FakeComfyServer(job_latency=0.2) as a, FakeComfyServer(job_latency=0.2) as b:
+        results = asyncio.run(main([a.url, b.url]))
+        assert len(results) == 6 and all(results)
+        assert a.stats["prompt"] > 0 and b.stats["prompt"] > 0
+
+
+def test_http_failure_keeps_client_and_websocket_outputs(slow_server, tmp_path, monkeypatch):
+    async def main():
+        pool = cw.AsyncComfyPool(cw.ServerPool([slow_server.url], retry_after=0.2, poll_interval=0))
+        async with pool:
+            server, first = await pool.submit(text2img(1), output_mode="websocket", save_dir=tmp_path)
+            client = pool.clients[server]
+            waiting = asyncio.ensure_future(pool.wait(server, first, timeout=10))
+            await asyncio.sleep(0.05)
+
+            def unreachable(*args, **kwargs):
+                raise requests.exceptions.ConnectionError("down")
+
+            with monkeypatch.context() as patch:
+                patch.setattr(cw, "queue_prompt", unreachable)
+                with pytest.raises(requests.exceptions.ConnectionError):
+                    await pool.submit(text2img(2))
+            # POST /prompt만 실패: 서버는 잠시 건너뛰지만 WebSocket 클라이언트는 그대로
+            assert pool.clients[server] is client and client.listening
+            assert not pool.pool.status()[server]["healthy"]
+            await waiting
+            paths = await pool.fetch_outputs(server, first, tmp_path)
+            assert len(paths) == 1 and paths[0].exists()
+
+            await asyncio.sleep(0.3)
+            server, second = await pool.submit(text2img(3))
+            assert pool.clients[server] is client
+            return await pool.finish(server, second, tmp_path)
+
+    assert asyncio.run(main())
+    # 이미지는 WebSocket 프레임으로 받았으므로 /view를 부르지 않음 (두 번째 작업은 history 모드)
+    assert slow_server.stats["view"] == 1
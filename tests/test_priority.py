@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""PriorityScheduler: interactive 작업은 쌓인 batch보다 먼저, 서버에는 batch_window개만."""
+
+import asyncio
+
+import pytest
+
+import comfy_workflow as cw
+from comfy_priority import BATCH, INTERACTIVE, PriorityScheduler
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def _run_order(srv: FakeComfyServer) -> list:
+    """서버가 실행을 마친 순서대로의 시드."""
+    return [entry["prompt"][2]["3"]["inputs"]["seed"] for entry in srv.history.values()]
+
+
+@pytest.mark.parametrize("batch_window", [1, 3])
+def test_interactive_job_jumps_the_batch_queue(tmp_path, batch_window):
+    async def main(url):
+        async with cw.AsyncComfyPool([url]) as pool:
+            scheduler = PriorityScheduler(pool, batch_window=batch_window, save_dir=tmp_path)
+            batch = asyncio.ensure_future(scheduler.generate_many([text2img(seed) for seed in range(6)]))
+            await asyncio.sleep(0.05)
+            assert scheduler.held == 6 - batch_window
+            await scheduler.generate(text2img(100), priority=INTERACTIVE)
+            await batch
+            return scheduler
+
+    with FakeComfyServer(job_latency=0.1) as srv:
+        scheduler = asyncio.run(main(srv.url))
+        order = _run_order(srv)
+    # interactive 작업은 이미 실행 중인 것 하나만 기다림
+    assert order.index(100) == 1
+    assert sorted(order) == [0, 1, 2, 3, 4, 5, 100]
+    summary = scheduler.summary()
+    assert summary[INTERACTIVE]["jobs"] == 1 and summary[BATCH]["jobs"] == 6
+    assert summary[INTERACTIVE]["p95"] < summary[BATCH]["max"]
+
+
+def test_unknown_priority_is_rejected(server):
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            await PriorityScheduler(client).generate(text2img(), priority="urgent")
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
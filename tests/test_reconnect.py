@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""WebSocket이 끊겨도 폴링으로 완료를 확인하고, 다시 연결되면 WebSocket으로 돌아감."""
+
+import asyncio
+
+import pytest
+
+import comfy_workflow as cw
+from conftest import text2img
+
+
+def test_wait_survives_websocket_drop(slow_server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(slow_server.url) as client:
+            prompt_id = await client.submit(text2img())
+            await asyncio.sleep(0.1)
+            slow_server.drop_websockets(refuse_for=0.3)
+            await client.wait(prompt_id, timeout=10)
+            assert client.reconnects >= 1
+            # 다시 연결된 뒤의 작업은 WebSocket 완료 메시지로 끝남
+            again = await client.submit(text2img(2))
+            await client.wait(again, timeout=10)
+            return await client.fetch_outputs(prompt_id, tmp_path)
+
+    assert asyncio.run(main())
+
+
+def test_completion_is_polled_while_disconnected(slow_server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(slow_server.url) as client:
+            prompt_id = await client.submit(text2img())
+            await asyncio.sleep(0.1)
+            # 작업(0.5초)이 끝난 뒤에도 한참 연결을 받지 않음: 완료는 /history 폴링으로만 알 수 있음
+            slow_server.drop_websockets(refuse_for=5.0)
+            await client.wait(prompt_id, timeout=4)
+            assert client.reconnects == 0
+            return await client.fetch_outputs(prompt_id, tmp_path)
+
+    assert len(asyncio.run(main())) == 1
+
+
+def test_websocket_output_missed_while_disconnected_is_reported(slow_server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(slow_server.url) as client:
+            prompt_id = await client.submit(text2img(), "websocket", tmp_path)
+            await asyncio.sleep(0.1)
+            slow_server.drop_websockets(refuse_for=5.0)
+            await client.wait(prompt_id, timeout=4)
+            # SaveImageWebsocket 결과는 서버에 남지 않으므로 놓쳤다고 알림
+            with pytest.raises(ConnectionError):
+                await client.fetch_outputs(prompt_id)
+
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""PipelinedRunner: 서버 큐에는 in_flight개까지만, 준비·다운로드는 실행과 겹쳐 진행."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import comfy_workflow as cw
+from comfy_runner import PipelinedRunner
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def _watch_queue(url: str, stop: threading.Event, depths: list) -> None:
+    while not stop.is_set():
+        queue = cw.get_queue(url)
+        depths.append(len(queue["queue_running"]) + len(queue["queue_pending"]))
+        time.sleep(0.01)
+
+
+def test_server_queue_never_exceeds_in_flight(tmp_path):
+    def prepare(seed: int) -> dict:
+        if seed == 3:
+            raise ValueError("bad job")
+        time.sleep(0.02)
+        return text2img(seed)
+
+    async def main(url):
+        async with cw.AsyncComfyPool([url]) as pool:
+            runner = PipelinedRunner(pool, in_flight=2, save_dir=tmp_path)
+            results = [item async for item in runner.run(range(8), prepare=prepare)]
+            return runner, results
+
+    depths: list = []
+    stop = threading.Event()
+    with FakeComfyServer(job_latency=0.15) as srv:
+        watcher = threading.Thread(target=_watch_queue, args=(srv.url, stop, depths))
+        watcher.start()
+        try:
+            runner, results = asyncio.run(main(srv.url))
+        finally:
+            stop.set()
+            watcher.join()
+        assert srv.stats["prompt"] == 7
+
+    assert sorted(seed for seed, _ in results) == list(range(8))
+    failed = [seed for seed, result in results if isinstance(result, Exception)]
+    assert failed == [3]
+    assert all(len(result) == 1 for seed, result in results if seed != 3)
+    assert max(depths) <= 2 and runner.peak_in_flight == 2
+    assert runner.submitted == 7 and runner.failed == 1 and runner.images == 7
+
+
+def test_in_flight_must_be_positive(server):
+    with pytest.raises(ValueError):
+        PipelinedRunner(cw.AsyncComfyPool([server.url]), in_flight=0)
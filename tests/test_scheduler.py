@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""AffinityScheduler: 같은 모델 조합을 연달아 보내되 어떤 작업도 max_delay번 넘게 밀리지 않음."""
+
+import asyncio
+from itertools import groupby
+from pathlib import Path
+
+import comfy_sweep as sweep
+import comfy_workflow as cw
+from comfy_scheduler import AffinityScheduler, model_key
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+CHECKPOINTS = ["a.safetensors", "b.safetensors"]
+
+
+def _jobs(count: int) -> list:
+    """체크포인트가 번갈아 바뀌는 작업들."""
+    jobs = []
+    for index in range(count):
+        workflow = text2img(index)
+        ckpt = CHECKPOINTS[index % 2]
+        cw.set_node_input(workflow, "4", "ckpt_name", ckpt)
+        jobs.append(sweep.SweepJob(index, Path("c.json"), workflow, {"ckpt_name": ckpt, "seed": index}))
+    return jobs
+
+
+def _runs(names) -> int:
+    return len([name for name, _ in groupby(names)])
+
+
+def test_model_key_ignores_node_ids():
+    workflow = text2img(1)
+    moved = {str(int(node_id) + 1000): node for node_id, node in workflow.items()}
+    assert model_key(moved) == model_key(workflow)
+    assert model_key(_jobs(2)[1].workflow) != model_key(workflow)
+
+
+def test_server_sees_grouped_checkpoints(tmp_path):
+    scheduler = AffinityScheduler(window=8, max_delay=8)
+
+    async def main(url):
+        async with cw.AsyncComfyPool([url]) as pool:
+            jobs = scheduler.order(_jobs(8))
+            return [job async for job, _ in sweep.iter_results(jobs, pool, save_dir=tmp_path, max_pending=1)]
+
+    with FakeComfyServer(checkpoints=CHECKPOINTS) as srv:
+        done = asyncio.run(main(srv.url))
+        queued = sorted(srv.history.values(), key=lambda entry: entry["prompt"][0])
+        served = [entry["prompt"][2]["4"]["inputs"]["ckpt_name"] for entry in queued]
+    assert sorted(job.index for job in done) == list(range(8))
+    assert _runs(served) == 2
+    assert scheduler.switches_before == 7 and scheduler.switches_after == 1
+    assert scheduler.saved_seconds > 0
+
+
+def test_max_delay_bounds_overtaking():
+    scheduler = AffinityScheduler(window=16, max_delay=2)
+    order = [job.index for job in scheduler.order(_jobs(12))]
+    assert sorted(order) == list(range(12))
+    assert scheduler.max_overtaken <= 2
+    for position, index in enumerate(order):
+        # 뒤에 들어온 작업에 추월당한 횟수 = 먼저 나간 작업 중 번호가 더 큰 것
+        assert sum(1 for earlier in order[:position] if earlier > index) <= 2
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""HistorySync: 커서 뒤의 새 기록만 받고, 받은 기록은 서버에서 지우고, 못 받은 것은 다음에 다시."""
+
+import pytest
+
+import comfy_sync
+import comfy_workflow as cw
+from comfy_sync import HistorySync
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def _run(url: str, seeds, tmp_path) -> None:
+    for seed in seeds:
+        cw.generate_image(text2img(seed), server=url, save_dir=tmp_path / "generated")
+
+
+def test_cursor_survives_restart_and_widens(server, tmp_path):
+    state = tmp_path / "sync.json"
+    _run(server.url, range(3), tmp_path)
+    first = HistorySync(tmp_path / "out", state_path=state, page=2).sync(server.url)
+    assert first["entries"] == 3 and len(first["downloaded"]) == 3
+
+    # 새 프로세스: 커서를 파일에서 읽어 그 뒤의 기록만
+    sync = HistorySync(tmp_path / "out", state_path=state, page=2)
+    assert sync.sync(server.url)["entries"] == 0
+    _run(server.url, range(3, 8), tmp_path)
+    second = sync.sync(server.url)
+    assert second["entries"] == 5 and len(second["files"]) == 5
+
+
+def test_prune_keeps_failed_prompts(tmp_path):
+    with FakeComfyServer(fail_class="VAEDecode") as failing:
+        with pytest.raises(cw.ExecutionError):
+            _run(failing.url, [1], tmp_path)
+        summary = HistorySync(tmp_path / "out", state_path=None, prune=True).sync(failing.url)
+        assert summary["errors"] == 1 and summary["pruned"] == 0
+        assert len(failing.history) == 1
+
+    with FakeComfyServer() as srv:
+        _run(srv.url, range(2), tmp_path)
+        summary = HistorySync(tmp_path / "out", state_path=None, prune=True).sync(srv.url)
+        assert summary["pruned"] == 2 and not srv.history
+
+
+def test_failed_download_is_retried_next_sync(server, tmp_path, monkeypatch):
+    state = tmp_path / "sync.json"
+    _run(server.url, range(2), tmp_path)
+    download = cw.download_image
+    broken = []
+
+    def flaky(url, filename, dest, **kwargs):
+        if not broken:
+            broken.append(filename)
+            raise OSError("disk full")
+        return download(url, filename, dest, **kwargs)
+
+    monkeypatch.setattr(comfy_sync.cw, "download_image", flaky)
+    first = HistorySync(tmp_path / "out", state_path=state).sync(server.url)
+    assert first["failed"] == 1 and len(first["files"]) == 1
+
+    second = HistorySync(tmp_path / "out", state_path=state).sync(server.url)
+    assert second["entries"] == 1 and second["failed"] == 0
+    assert [path.name for path in second["downloaded"]] == broken
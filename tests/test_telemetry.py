@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""TelemetryStore: WebSocket 이벤트로 노드별 실행 시간·캐시 적중·steps를 기록."""
+
+import asyncio
+
+import comfy_workflow as cw
+from comfy_telemetry import TelemetryStore
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+
+
+def _generate(url: str, store: TelemetryStore, workflows, save_dir) -> list:
+    async def main():
+        async with cw.AsyncComfyClient(url, telemetry=store) as client:
+            return await client.generate_many(workflows, save_dir=save_dir, return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_node_rows_and_cache_hits(tmp_path):
+    store = TelemetryStore(tmp_path / "telemetry.sqlite3")
+    with FakeComfyServer(job_latency=0.2, node_cache=True) as srv:
+        _generate(srv.url, store, [text2img(1)], tmp_path)
+        # 같은 워크플로를 다시 보내면 서버가 모든 노드를 캐시에서 꺼냄
+        _generate(srv.url, store, [text2img(1)], tmp_path)
+
+    summary = store.cache_summary()
+    assert summary["prompts"] == 2 and summary["cached"] == summary["nodes"] // 2
+    sampler = store.node_stats(by=("ckpt",), class_type="KSampler")
+    assert len(sampler) == 1
+    assert sampler[0]["runs"] == 1 and sampler[0]["cached"] == 1 and sampler[0]["p50"] > 0
+    runs = store.node_runs(["KSampler"])
+    assert [row["steps"] for row in runs] == [text2img(1)["3"]["inputs"]["steps"]]
+    assert store.prompt_stats()["prompts"] == 2
+    store.close()
+
+
+def test_failed_prompt_is_recorded_but_not_aggregated(tmp_path):
+    store = TelemetryStore(tmp_path / "telemetry.sqlite3")
+    with FakeComfyServer(fail_class="VAEDecode") as srv:
+        results = _generate(srv.url, store, [text2img(1)], tmp_path)
+    assert isinstance(results[0], cw.ExecutionError)
+    assert store.cache_summary()["prompts"] == 1
+    assert store.node_stats() == [] and store.prompt_stats()["prompts"] == 0
+    store.close()
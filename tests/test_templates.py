@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""컴파일된 템플릿 캐시: 캐시 없이 만든 워크플로와 같은 결과, 복사본 격리, 파일 수정 반영."""
+
+import json
+import os
+
+import comfy_workflow as cw
+
+CONFIG = {
+    "modes": ["text2img", "upscale"],
+    "placeholders": {"__PROMPT__": "a cat", "__SEED__": 7},
+    "connections": [{"from_node": "8", "from_slot": 0, "to_node": "1003", "to_input": "image"}],
+}
+
+
+def _uncached(config: dict) -> dict:
+    """파일을 직접 읽어 오프셋·연결·치환을 차례로 적용한 기준 워크플로."""
+    workflow = {}
+    for i, mode in enumerate(config["modes"]):
+        with open(cw.TEMPLATES_DIR / f"{mode}.json", "r", encoding="utf-8") as f:
+            workflow.update(cw.apply_offset(json.load(f), i * cw.NODE_ID_OFFSET))
+    for conn in config.get("connections", []):
+        cw.connect(workflow, conn["from_node"], conn["to_node"], conn["to_input"], conn.get("from_slot", 0))
+    cw.apply_placeholders(workflow, config["placeholders"])
+    return workflow
+
+
+def test_cached_build_matches_uncached_build(server):
+    expected = _uncached(CONFIG)
+    first = cw.build_workflow(CONFIG)
+    second = cw.build_workflow(CONFIG)
+    assert first == expected and second == expected
+    # 캐시된 결과는 매번 새 복사본
+    first["3"]["inputs"]["seed"] = 99
+    assert cw.build_workflow(CONFIG)["3"]["inputs"]["seed"] == 7
+    assert cw.queue_prompt(second, server=server.url)
+
+
+def test_prepared_fill_matches_build():
+    prepared = cw.prepare_workflow(CONFIG, ["__SEED__"])
+    assert prepared.variables == ("__SEED__",)
+    for seed in (1, 2):
+        expected = cw.build_workflow(dict(CONFIG, placeholders=dict(CONFIG["placeholders"], __SEED__=seed)))
+        assert prepared.fill({"__SEED__": seed}) == expected
+
+
+def test_template_is_reread_after_edit(tmp_path, monkeypatch):
+    monkeypatch.setattr(cw, "TEMPLATES_DIR", tmp_path)
+    monkeypatch.setattr(cw, "TEMPLATE_CHECK_INTERVAL", 0)
+    path = tmp_path / "tiny.json"
+    path.write_text(json.dumps({"1": {"class_type": "A", "inputs": {"x": "__X__"}}}), encoding="utf-8")
+    assert cw.build_workflow({"modes": ["tiny"], "placeholders": {"__X__": 1}})["1"]["inputs"] == {"x": 1}
+    path.write_text(json.dumps({"1": {"class_type": "A", "inputs": {"y": "__X__"}}}), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cw.build_workflow({"modes": ["tiny"], "placeholders": {"__X__": 1}})["1"]["inputs"] == {"y": 1}
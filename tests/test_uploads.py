@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""UploadManager: 같은 내용은 서버마다 한 번만, 큰 기준 이미지는 올리기 전에 축소."""
+
+import io
+
+import pytest
+
+import comfy_workflow as cw
+from fake_comfy_server import FakeComfyServer, make_png
+
+
+def test_same_content_is_uploaded_once_per_server(server, tmp_path):
+    first = tmp_path / "a.png"
+    second = tmp_path / "copy_of_a.png"
+    first.write_bytes(make_png(16, 16))
+    second.write_bytes(first.read_bytes())
+    uploads = cw.UploadManager()
+
+    name = uploads.upload(server.url, first)["name"]
+    assert uploads.upload(server.url, second)["name"] == name
+    assert server.stats["upload"] == 1 and name.startswith("ref_")
+    with FakeComfyServer() as other:
+        assert uploads.upload(other.url, first)["name"] == name
+        assert other.stats["upload"] == 1
+    # 서버 input 폴더가 비었을 때는 기록을 지우고 다시 올림
+    uploads.forget(server.url)
+    uploads.upload(server.url, first)
+    assert server.stats["upload"] == 2
+
+
+def test_large_reference_is_resized_before_upload(server, tmp_path):
+    image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "big.png"
+    path.write_bytes(make_png(300, 200))
+    name = cw.UploadManager(max_size=(100, 100)).upload(server.url, path)["name"]
+    with image.open(io.BytesIO(server.uploads[name])) as uploaded:
+        # 비율 유지, 8의 배수
+        assert uploaded.size == (96, 64)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""WorkflowValidator: /object_info 스키마로 큐잉 전 검사, 디스크 저장, 응답 없는 서버 제외."""
+
+import asyncio
+import threading
+
+import pytest
+import requests
+
+import comfy_validate
+import comfy_workflow as cw
+from comfy_runner import PipelinedRunner
+from comfy_validate import WorkflowValidationError, WorkflowValidator
+from conftest import text2img
+
+DEAD_SERVER = "http://127.0.0.1:9"
+
+
+def test_reports_bad_slot_and_choice(server, tmp_path):
+    validator = WorkflowValidator(server.url, cache_dir=tmp_path)
+    workflow = text2img()
+    validator(workflow)
+    sampler = cw.find_nodes_by_class(workflow, "KSampler")[0]
+    decode = cw.find_nodes_by_class(workflow, "VAEDecode")[0]
+    workflow[sampler]["inputs"]["sampler_name"] = "eulr"
+    workflow[decode]["inputs"]["vae"] = [workflow[decode]["inputs"]["vae"][0], 7]
+    with pytest.raises(WorkflowValidationError) as info:
+        validator(workflow)
+    problems = "\n".join(info.value.problems)
+    assert "sampler_name" in problems and "슬롯 7" in problems
+
+
+def test_schema_is_read_from_disk_on_next_run(server, tmp_path):
+    WorkflowValidator(server.url, cache_dir=tmp_path)(text2img())
+    assert server.stats["object_info"] == 1
+    WorkflowValidator(server.url, cache_dir=tmp_path)(text2img())
+    assert server.stats["object_info"] == 1
+
+
+def test_unreachable_server_is_skipped_and_remembered(server, tmp_path, monkeypatch):
+    calls = []
+    load = comfy_validate.load_object_info
+
+    def counting(target, *args, **kwargs):
+        calls.append(target)
+        return load(target, *args, **kwargs)
+
+    monkeypatch.setattr(comfy_validate, "load_object_info", counting)
+    validator = WorkflowValidator([DEAD_SERVER, server.url], cache_dir=tmp_path)
+    validator(text2img())
+    validator.refresh()
+    assert calls.count(DEAD_SERVER) == 1 and calls.count(server.url) == 2
+
+
+def test_no_reachable_server_raises(tmp_path):
+    validator = WorkflowValidator([DEAD_SERVER], cache_dir=tmp_path)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        validator(text2img())
+
+
+def test_runner_validates_off_the_event_loop(server, tmp_path):
+    threads = []
+
+    def validator(workflow):
+        threads.append(threading.current_thread())
+        raise WorkflowValidationError(["bad"])
+
+    async def main():
+        async with cw.AsyncComfyPool([server.url]) as pool:
+            runner = PipelinedRunner(pool, save_dir=tmp_path, validator=validator)
+            return [result async for _, result in runner.run([text2img()])]
+
+    results = asyncio.run(main())
+    assert isinstance(results[0], WorkflowValidationError)
+    assert threads and threads[0] is not threading.main_thread()
+    assert server.stats["prompt"] == 0
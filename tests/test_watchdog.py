@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""PodWatchdog: 큐가 grace 동안 비어 있을 때만 파드를 멈추고, 끝난 prompt를 빠짐없이 셈."""
+
+import threading
+import time
+from functools import partial
+
+import comfy_workflow as cw
+from comfy_journal import JobJournal
+from conftest import text2img
+from fake_comfy_server import FakeComfyServer
+from pod_manager import stop_pod
+from pod_watchdog import HISTORY_PAGE, PodWatchdog
+
+
+def _drain(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        queue = cw.get_queue(url)
+        if not queue["queue_running"] and not queue["queue_pending"]:
+            return
+        time.sleep(0.02)
+    raise TimeoutError(url)
+
+
+def _watchdog(url: str, **kwargs) -> PodWatchdog:
+    kwargs.setdefault("stop", partial(stop_pod, api_url=f"{url}/v1", api_key="test"))
+    return PodWatchdog([url], pod_id="pod-1", poll=0.05, report_every=0, **kwargs)
+
+
+def test_stops_only_after_grace(server):
+    watchdog = _watchdog(server.url, grace=0.3)
+    started = time.monotonic()
+    assert watchdog.run() is True
+    assert time.monotonic() - started >= 0.3
+    assert [stop["pod_id"] for stop in server.stops] == ["pod-1"]
+
+
+def test_busy_queue_delays_stop():
+    with FakeComfyServer(job_latency=0.3) as srv:
+        for seed in range(3):
+            cw.queue_prompt(text2img(seed), server=srv.url)
+        watchdog = _watchdog(srv.url, grace=0.2)
+        assert watchdog.run() is True
+        assert srv.stops[0]["queue"] == 0
+        assert watchdog.prompts == 3 and watchdog.images == 3
+
+
+def test_unreachable_server_is_never_idle():
+    stops = []
+    watchdog = PodWatchdog(["http://127.0.0.1:9"], pod_id="pod-1", grace=0, poll=0.05, stop=stops.append)
+    status = watchdog.check()
+    assert status["reachable"] is False and status["idle_for"] == 0.0
+    assert not stops
+
+
+def test_ready_event_holds_the_pod(server):
+    ready = threading.Event()
+    result = []
+    watchdog = _watchdog(server.url, grace=0.1)
+    thread = threading.Thread(target=lambda: result.append(watchdog.run(ready=ready)))
+    thread.start()
+    time.sleep(0.4)
+    assert not server.stops
+    ready.set()
+    thread.join(10)
+    assert result == [True] and len(server.stops) == 1
+
+
+def test_journal_activity_counts_as_busy(server, tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    watchdog = _watchdog(server.url, grace=0.5, journal=journal)
+    time.sleep(0.6)
+    journal.queued("job", server.url, "prompt-1")
+    assert watchdog.check()["idle_for"] < 0.5
+    journal.close()
+
+
+def test_dry_run_does_not_stop(server):
+    assert _watchdog(server.url, grace=0).run(dry_run=True) is False
+    assert not server.stops
+
+
+def test_counts_more_completions_than_one_history_page(server):
+    for seed in range(5):
+        cw.queue_prompt(text2img(seed), server=server.url)
+    _drain(server.url)
+    watchdog = _watchdog(server.url, grace=0)
+    watchdog.check()  # 이미 끝나 있던 prompt는 세지 않음
+    burst = HISTORY_PAGE * 2 + 3
+    for seed in range(burst):
+        cw.queue_prompt(text2img(100 + seed), server=server.url)
+    _drain(server.url)
+    watchdog.check()
+    assert watchdog.prompts == burst and watchdog.images == burst
+    watchdog.check()
+    assert watchdog.prompts == burst
+
+
+def test_failed_prompts_yield_no_images():
+    with FakeComfyServer(fail_class="KSampler") as srv:
+        watchdog = _watchdog(srv.url, grace=0)
+        watchdog.check()
+        cw.queue_prompt(text2img(), server=srv.url)
+        _drain(srv.url)
+        watchdog.check()
+        assert watchdog.prompts == 1 and watchdog.failed == 1 and watchdog.images == 0
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""websocket 출력 모드: SaveImageWebsocket 프레임을 /history·/view 없이 파일이나 콜백으로 받음."""
+
+import asyncio
+
+import pytest
+
+import comfy_workflow as cw
+from conftest import text2img
+from fake_comfy_server import make_png
+
+
+def test_use_websocket_output_swaps_save_nodes():
+    workflow = text2img(1)
+    converted, prefixes = cw.use_websocket_output(workflow)
+    assert converted["9"]["class_type"] == "SaveImageWebsocket"
+    assert workflow["9"]["class_type"] == "SaveImage"
+    assert prefixes == {"9": workflow["9"]["inputs"]["filename_prefix"]}
+    with pytest.raises(ValueError):
+        cw.use_websocket_output({"1": {"class_type": "EmptyLatentImage", "inputs": {}}})
+
+
+def test_batch_images_arrive_as_frames(server, tmp_path):
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            return await client.generate(cw.make_seed_batch(text2img(1), 3), tmp_path, output_mode="websocket")
+
+    paths = asyncio.run(main())
+    assert len(paths) == 3 and all(p.parent == tmp_path for p in paths)
+    assert all(p.read_bytes() == make_png(server.image_width, server.image_height) for p in paths)
+    assert server.stats["view"] == 0
+
+
+def test_on_image_gets_bytes_without_files(server, tmp_path):
+    frames = []
+
+    async def main():
+        async with cw.AsyncComfyClient(server.url) as client:
+            prompt_id = await client.submit(
+                text2img(1), "websocket", tmp_path, on_image=lambda data, info: frames.append((data, info))
+            )
+            await client.wait(prompt_id, timeout=10)
+            return prompt_id, await client.fetch_outputs(prompt_id)
+
+    prompt_id, paths = asyncio.run(main())
+    assert paths == [] and not list(tmp_path.iterdir())
+    assert len(frames) == 1
+    data, info = frames[0]
+    assert data.startswith(b"\x89PNG") and info["prompt_id"] == prompt_id and info["node_id"] == "9"